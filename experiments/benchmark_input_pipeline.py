@@ -0,0 +1,133 @@
+"""Compare the update rates of the feed_dict and input pipeline paths.
+
+The feed_dict path samples a batch in Python and passes it to the graph via
+`update_from_batch`, while the input pipeline path samples the batch within
+the session call of `update`.
+
+Usage
+    python benchmark_input_pipeline.py --alg TD3 --batch_size 1024
+"""
+import argparse
+import sys
+import time
+import numpy as np
+import tensorflow as tf
+from gym.spaces import Box
+
+from hbaselines.algorithms.rl_algorithm import TD3_PARAMS
+from hbaselines.algorithms.rl_algorithm import SAC_PARAMS
+from hbaselines.algorithms.rl_algorithm import FEEDFORWARD_PARAMS
+
+
+def parse_args(args):
+    """Parse the benchmark arguments."""
+    parser = argparse.ArgumentParser(
+        description='Compare the update rates of the feed_dict and input '
+                    'pipeline paths of the feed-forward policies.')
+    parser.add_argument(
+        '--alg', type=str, default='TD3',
+        help='the algorithm to use. Must be one of [TD3, SAC].')
+    parser.add_argument(
+        '--batch_size', type=int, default=1024,
+        help='the size of the sampled batches')
+    parser.add_argument(
+        '--ob_dim', type=int, default=256,
+        help='the number of elements in the observations')
+    parser.add_argument(
+        '--ac_dim', type=int, default=8,
+        help='the number of elements in the actions')
+    parser.add_argument(
+        '--buffer_size', type=int, default=100000,
+        help='the number of transitions stored in the replay buffer')
+    parser.add_argument(
+        '--num_updates', type=int, default=1000,
+        help='the number of timed updates per path')
+    parser.add_argument(
+        '--prioritized_replay', action='store_true',
+        help='whether to use prioritized experience replay')
+
+    return parser.parse_args(args)
+
+
+def create_policy(args):
+    """Create a policy with a filled replay buffer."""
+    if args.alg == "TD3":
+        from hbaselines.fcnet.td3 import FeedForwardPolicy
+        policy_params = TD3_PARAMS.copy()
+    elif args.alg == "SAC":
+        from hbaselines.fcnet.sac import FeedForwardPolicy
+        policy_params = SAC_PARAMS.copy()
+    else:
+        raise ValueError("Unknown algorithm: {}".format(args.alg))
+
+    policy_params.update(FEEDFORWARD_PARAMS.copy())
+    policy_params.update(
+        sess=tf.compat.v1.Session(),
+        ob_space=Box(low=-1, high=1, shape=(args.ob_dim,)),
+        ac_space=Box(low=-1, high=1, shape=(args.ac_dim,)),
+        co_space=None,
+        verbose=0,
+        buffer_size=args.buffer_size,
+        batch_size=args.batch_size,
+        prioritized_replay=args.prioritized_replay,
+    )
+    policy = FeedForwardPolicy(**policy_params)
+
+    policy.sess.run(tf.compat.v1.global_variables_initializer())
+    policy.initialize()
+
+    for _ in range(args.buffer_size):
+        policy.replay_buffer.add(
+            obs_t=np.random.uniform(-1, 1, args.ob_dim),
+            action=np.random.uniform(-1, 1, args.ac_dim),
+            reward=np.random.uniform(),
+            obs_tp1=np.random.uniform(-1, 1, args.ob_dim),
+            done=0.,
+        )
+
+    return policy
+
+
+def feed_dict_update(policy):
+    """Perform an update step via the feed_dict path."""
+    if policy.prioritized_replay:
+        obs0, actions, rewards, obs1, done1, weights, idxes = \
+            policy.replay_buffer.sample(with_weights=True)
+        td_error = policy.update_from_batch(
+            obs0, actions, rewards, obs1, done1, weights=weights)
+        policy.replay_buffer.update_priorities(idxes, td_error)
+    else:
+        policy.update_from_batch(*policy.replay_buffer.sample())
+
+
+def updates_per_second(update_fn, num_updates):
+    """Return the number of updates per second of an update method."""
+    # Warm up, to exclude the first session calls.
+    for _ in range(10):
+        update_fn()
+
+    t0 = time.time()
+    for _ in range(num_updates):
+        update_fn()
+
+    return num_updates / (time.time() - t0)
+
+
+def main(args):
+    """Run the benchmark."""
+    args = parse_args(args)
+    policy = create_policy(args)
+
+    feed_dict_rate = updates_per_second(
+        lambda: feed_dict_update(policy), args.num_updates)
+    pipeline_rate = updates_per_second(policy.update, args.num_updates)
+
+    print("feed_dict:      {:.1f} updates/sec".format(feed_dict_rate))
+    print("input pipeline: {:.1f} updates/sec".format(pipeline_rate))
+    print("speedup:        {:.2f}x".format(pipeline_rate / feed_dict_rate))
+
+    policy.sess.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
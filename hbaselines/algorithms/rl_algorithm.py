@@ -32,8 +32,11 @@ from hbaselines.algorithms.utils import is_goal_conditioned_policy
 from hbaselines.algorithms.utils import is_multiagent_policy
 from hbaselines.algorithms.utils import get_obs
 from hbaselines.utils.tf_util import make_session
+from hbaselines.utils.tf_util import get_actor_vars
+from hbaselines.utils.tf_util import GetFlat
 from hbaselines.utils.misc import ensure_dir
 from hbaselines.utils.misc import recursive_update
+from hbaselines.utils.prefetch import PrefetchReplayBuffer
 from hbaselines.utils.env_util import create_env
 
 
@@ -57,6 +60,16 @@ TD3_PARAMS = dict(
     # specifies whether to use the huber distance function as the loss for the
     # critic. If set to False, the mean-squared error metric is used instead
     use_huber=False,
+    # whether to use prioritized experience replay, with the absolute TD errors
+    # of the sampled transitions used as their new priorities
+    prioritized_replay=False,
+    # the directory in which the replay buffer is stored as memory-mapped
+    # files. If set to None, the replay buffer is stored in memory.
+    replay_buffer_path=None,
+    # whether to store the observations in the replay buffer with reduced
+    # precision, with the image channels quantized to uint8 and the remaining
+    # elements stored as float16
+    reduced_precision_replay=False,
     # scaling term to the range of the action space, that is subsequently used
     # as the standard deviation of Gaussian noise added to the action if
     # `apply_noise` is set to True in `get_action`
@@ -66,6 +79,9 @@ TD3_PARAMS = dict(
     target_policy_noise=0.2,
     # clipping term for the noise injected in the target actor policy
     target_noise_clip=0.5,
+    # whether to perform the training steps of a training iteration within a
+    # single session call, via an in-graph loop
+    fused_update=False,
 )
 
 
@@ -89,6 +105,16 @@ SAC_PARAMS = dict(
     # specifies whether to use the huber distance function as the loss for the
     # critic. If set to False, the mean-squared error metric is used instead
     use_huber=False,
+    # whether to use prioritized experience replay, with the absolute TD errors
+    # of the sampled transitions used as their new priorities
+    prioritized_replay=False,
+    # the directory in which the replay buffer is stored as memory-mapped
+    # files. If set to None, the replay buffer is stored in memory.
+    replay_buffer_path=None,
+    # whether to store the observations in the replay buffer with reduced
+    # precision, with the image channels quantized to uint8 and the remaining
+    # elements stored as float16
+    reduced_precision_replay=False,
     # target entropy used when learning the entropy coefficient. If set to
     # None, a heuristic value is used.
     target_entropy=None,
@@ -151,6 +177,9 @@ TRPO_PARAMS = dict(
     cg_damping=1e-2,
     # the Kullback-Leibler loss threshold
     max_kl=0.01,
+    # the fraction of the batch used to compute the Fisher-vector products of
+    # the conjugate gradient calculation
+    fisher_fraction=0.2,
 )
 
 
@@ -225,6 +254,11 @@ GOAL_CONDITIONED_PARAMS = recursive_update(FEEDFORWARD_PARAMS.copy(), dict(
     # rate at which the original (non-hindsight) sample is stored in the
     # replay buffer as well. Used only if `hindsight` is set to True.
     subgoal_testing_rate=0.3,
+    # the probability that a sample is relabeled with hindsight goals and
+    # rewards when it is sampled from the replay buffer. If set to None,
+    # hindsight samples are instead computed and stored in the replay buffer
+    # when every meta-period ends. Used only if `hindsight` is set to True.
+    hindsight_relabel_prob=None,
     # whether to use the cooperative gradient update procedure for the
     # higher-level policies. See: https://arxiv.org/abs/1912.02368v1
     cooperative_gradients=False,
@@ -259,6 +293,10 @@ MULTIAGENT_PARAMS = recursive_update(FEEDFORWARD_PARAMS.copy(), dict(
     # the expected number of agents in the environment. Only relevant if using
     # shared policies with MADDPG or goal-conditioned hierarchies.
     n_agents=1,
+    # whether to update all agents of an independent MADDPG policy within a
+    # single session call, using batches sampled at common indices from the
+    # replay buffers of every agent
+    joint_update=False,
 ))
 
 
@@ -275,8 +313,8 @@ class RLAlgorithm(object):
         name of the environment. Affects the action bounds of the higher-level
         policies
     sampler : list of hbaselines.utils.sampler.Sampler
-        the training environment sampler object. One environment is provided
-        for each CPU
+        the training environment sampler object. One sampler is provided for
+        each CPU, and each sampler holds `envs_per_worker` environments
     eval_env : gym.Env or list of gym.Env
         the environment(s) to evaluate from
     total_steps : int
@@ -312,6 +350,34 @@ class RLAlgorithm(object):
         number of environments used to run simulations in parallel. Each
         environment is run on a separate CPUS and uses the same policy as the
         rest. Must be less than or equal to nb_rollout_steps.
+    envs_per_worker : int
+        number of environments stepped within each sampler process. If greater
+        than one, the `num_envs` environments are divided between
+        ceil(num_envs / envs_per_worker) processes, and are stepped inline if a
+        single process is required.
+    num_workers : int
+        number of sampler processes
+    policy_lag : int
+        the maximum number of policy updates that may occur between the
+        computation of an action and the storage of the resulting sample. If
+        set to a value greater than zero and multiple environments are used,
+        environments continue stepping while the policy is being trained.
+        Otherwise, samples are collected synchronously.
+    worker_sync_freq : int or None
+        if set, and multiple environments are used, each sampler holds a copy
+        of the policy and computes actions locally for the entire rollout. The
+        actor weights of the samplers are updated every `worker_sync_freq`
+        policy updates. If set to None, actions are computed by the learner.
+    shared_memory : bool
+        whether the samplers pass the observations, actions, rewards, and done
+        masks to the learner through shared memory instead of Ray's object
+        store. Only utilized by single-agent policies with multiple sampler
+        processes.
+    prefetch_batches : int
+        the maximum number of batches that are sampled from the replay buffer
+        by a background thread, ahead of the policy updates that consume them.
+        If set to zero, batches are sampled within the policy updates. Only
+        utilized by off-policy (TD3 and SAC) policies.
     verbose : int
         the verbosity level: 0 none, 1 training information, 2 tensorflow debug
     ac_space : gym.spaces.*
@@ -399,6 +465,11 @@ class RLAlgorithm(object):
                  eval_deterministic=True,
                  save_replay_buffer=False,
                  num_envs=1,
+                 envs_per_worker=1,
+                 policy_lag=0,
+                 worker_sync_freq=None,
+                 shared_memory=False,
+                 prefetch_batches=0,
                  verbose=0,
                  policy_kwargs=None,
                  _init_setup_model=True):
@@ -446,6 +517,37 @@ class RLAlgorithm(object):
             number of environments used to run simulations in parallel. Each
             environment is run on a separate CPUS and uses the same policy as
             the rest. Must be less than or equal to nb_rollout_steps.
+        envs_per_worker : int
+            number of environments stepped within each sampler process. If
+            greater than one, the `num_envs` environments are divided between
+            ceil(num_envs / envs_per_worker) processes, and are stepped inline
+            if a single process is required.
+        policy_lag : int
+            the maximum number of policy updates that may occur between the
+            computation of an action and the storage of the resulting sample.
+            If set to a value greater than zero and multiple environments are
+            used, environments continue stepping while the policy is being
+            trained. Otherwise, samples are collected synchronously.
+        worker_sync_freq : int or None
+            if set, and multiple environments are used, each sampler holds a
+            copy of the policy and computes actions locally for the entire
+            rollout. The actor weights of the samplers are updated every
+            `worker_sync_freq` policy updates. If set to None, actions are
+            computed by the learner.
+        shared_memory : bool
+            whether the samplers pass the observations, actions, rewards, and
+            done masks to the learner through shared memory instead of Ray's
+            object store. Only utilized by single-agent policies with multiple
+            sampler processes.
+        prefetch_batches : int
+            the maximum number of batches that are sampled from the replay
+            buffer by a background thread, ahead of the policy updates that
+            consume them. The prefetched batches are discarded whenever the
+            content of the replay buffer changes, and the batches are sampled
+            with random number generators that are seeded from the global
+            seed, see PrefetchReplayBuffer. If set to zero, batches are
+            sampled within the policy updates. Only utilized by off-policy
+            (TD3 and SAC) policies.
         verbose : int
             the verbosity level: 0 none, 1 training information, 2 tensorflow
             debug
@@ -479,6 +581,50 @@ class RLAlgorithm(object):
             if nb_train_steps is not None:
                 print("WARNING: nb_train_steps is not utilized when running"
                       " PPO/TRPO. Ignoring.")
+            if policy_lag > 0:
+                print("WARNING: policy_lag is not utilized when running"
+                      " PPO/TRPO. Ignoring.")
+                policy_lag = 0
+
+        # Include warnings for unsupported multi-environment samplers.
+        if envs_per_worker > 1:
+            if policy_lag > 0:
+                print("WARNING: policy_lag is not utilized when "
+                      "envs_per_worker > 1. Ignoring.")
+                policy_lag = 0
+            if worker_sync_freq is not None:
+                print("WARNING: worker_sync_freq is not utilized when "
+                      "envs_per_worker > 1. Ignoring.")
+                worker_sync_freq = None
+
+        # Include warnings for unsupported worker-side policy configurations.
+        if worker_sync_freq is not None:
+            if is_multiagent_policy(policy):
+                print("WARNING: worker_sync_freq is not utilized by "
+                      "multi-agent policies. Ignoring.")
+                worker_sync_freq = None
+            elif policy_lag > 0:
+                print("WARNING: policy_lag is not utilized when "
+                      "worker_sync_freq is set. Ignoring.")
+                policy_lag = 0
+
+        # Include warnings for unsupported shared-memory configurations.
+        if shared_memory:
+            if is_multiagent_policy(policy):
+                print("WARNING: shared_memory is not utilized by multi-agent "
+                      "policies. Ignoring.")
+                shared_memory = False
+            elif worker_sync_freq is not None:
+                print("WARNING: shared_memory is not utilized when "
+                      "worker_sync_freq is set. Ignoring.")
+                shared_memory = False
+
+        # Include warnings for unsupported prefetching configurations.
+        if prefetch_batches > 0 and not (
+                is_td3_policy(policy) or is_sac_policy(policy)):
+            print("WARNING: prefetch_batches is only utilized by off-policy "
+                  "(TD3 and SAC) policies. Ignoring.")
+            prefetch_batches = 0
 
         # Check for the number of levels in the network, for visualization
         # purposes.
@@ -491,8 +637,9 @@ class RLAlgorithm(object):
             num_levels = 1
 
         # Instantiate the ray instance.
-        if num_envs > 1:
-            ray.init(num_cpus=num_envs+1, ignore_reinit_error=True)
+        num_workers = math.ceil(num_envs / envs_per_worker)
+        if num_workers > 1:
+            ray.init(num_cpus=num_workers+1, ignore_reinit_error=True)
 
         self.policy = policy
         self.env_name = deepcopy(env) if isinstance(env, str) \
@@ -511,6 +658,12 @@ class RLAlgorithm(object):
         self.eval_deterministic = eval_deterministic
         self.save_replay_buffer = save_replay_buffer
         self.num_envs = num_envs
+        self.envs_per_worker = envs_per_worker
+        self.num_workers = num_workers
+        self.policy_lag = policy_lag
+        self.worker_sync_freq = worker_sync_freq if num_envs > 1 else None
+        self.shared_memory = shared_memory and num_workers > 1
+        self.prefetch_batches = prefetch_batches
         self.verbose = verbose
         self.policy_kwargs = {'verbose': verbose, 'num_envs': num_envs}
 
@@ -522,6 +675,11 @@ class RLAlgorithm(object):
         self.ac_space, self.ob_space, self.co_space, all_ob_space = \
             self.get_spaces()
 
+        # Create the shared-memory arrays that samples are passed through.
+        self._transport = None
+        if self.shared_memory:
+            self._transport = self.setup_transport()
+
         # Add the default policy kwargs to the policy_kwargs term.
         if is_feedforward_policy(policy):
             self.policy_kwargs.update(FEEDFORWARD_PARAMS.copy())
@@ -549,7 +707,7 @@ class RLAlgorithm(object):
 
         # Compute the time horizon, which is used to check if an environment
         # terminated early and used to compute the done mask for TD3.
-        if self.num_envs > 1:
+        if self.num_workers > 1:
             self.horizon = ray.get(self.sampler[0].horizon.remote())
         else:
             self.horizon = self.sampler[0].horizon()
@@ -575,6 +733,9 @@ class RLAlgorithm(object):
         self.eval_rew_ph = None
         self.eval_success_ph = None
         self.saver = None
+        self._n_updates = 0
+        self._pending = {}
+        self._get_flat = None
 
         # Create the model variables and operations.
         if _init_setup_model:
@@ -598,7 +759,8 @@ class RLAlgorithm(object):
 
         Returns
         -------
-        list of Sampler or list of RaySampler
+        list of Sampler or list of RaySampler or list of VecSampler or list of
+        RayVecSampler
             the sampler objects
         list of array_like or list of dict < str, array_like >
             the initial observation. If the environment is multi-agent, this
@@ -609,7 +771,29 @@ class RLAlgorithm(object):
             policy to pass full-state information. One element for each
             environment
         """
-        if self.num_envs > 1:
+        if self.envs_per_worker > 1:
+            from hbaselines.utils.sampler import VecSampler
+            from hbaselines.utils.sampler import RayVecSampler
+            kwargs = [dict(
+                env_name=env,
+                render=render,
+                shared=shared,
+                maddpg=maddpg,
+                env_num=env_num,
+                evaluate=False,
+                num_envs=min(self.envs_per_worker, self.num_envs - env_num),
+            ) for env_num in range(0, self.num_envs, self.envs_per_worker)]
+
+            if self.num_workers > 1:
+                sampler = [RayVecSampler.remote(**kw) for kw in kwargs]
+                ob = ray.get([s.get_init_obs.remote() for s in sampler])
+            else:
+                sampler = [VecSampler(**kw) for kw in kwargs]
+                ob = [s.get_init_obs() for s in sampler]
+
+            # Flatten the observations of all environments.
+            ob = [o for ob_i in ob for o in ob_i]
+        elif self.num_envs > 1:
             from hbaselines.utils.sampler import RaySampler
             sampler = [
                 RaySampler.remote(
@@ -643,6 +827,42 @@ class RLAlgorithm(object):
 
         return sampler, obs, all_obs
 
+    def setup_transport(self):
+        """Create the shared-memory transport and attach it to the samplers.
+
+        Two slots are allocated per environment, ensuring that the sample of
+        an environment is not overwritten before it is processed. The files of
+        the memory-mapped arrays are removed once every sampler has opened
+        them, so that the memory is released when the processes exit.
+
+        Returns
+        -------
+        hbaselines.utils.transport.SharedMemoryTransport
+            the transport object of the learner
+        """
+        from hbaselines.utils.transport import SharedMemoryTransport
+
+        transport = SharedMemoryTransport(
+            num_envs=self.num_envs,
+            capacity=2,
+            ob_shape=self.ob_space.shape,
+            ac_shape=self.ac_space.shape,
+        )
+
+        ray.get([
+            sampler.attach_transport.remote(
+                path=transport.path,
+                num_envs=self.num_envs,
+                capacity=transport.capacity,
+                ob_shape=self.ob_space.shape,
+                ac_shape=self.ac_space.shape,
+            )
+            for sampler in self.sampler
+        ])
+        transport.unlink()
+
+        return transport
+
     def get_spaces(self):
         """Collect the spaces of the environments.
 
@@ -660,7 +880,7 @@ class RLAlgorithm(object):
         """
         sampler = self.sampler[0]
 
-        if self.num_envs > 1:
+        if self.num_workers > 1:
             ac_space = ray.get(sampler.action_space.remote())
             ob_space = ray.get(sampler.observation_space.remote())
             co_space = ray.get(sampler.context_space.remote())
@@ -689,6 +909,10 @@ class RLAlgorithm(object):
                 **self.policy_kwargs
             )
 
+            # Sample the batches of the policy updates in a background thread.
+            if self.prefetch_batches > 0:
+                self._setup_prefetch(self.policy_tf)
+
             # for tensorboard logging
             with tf.compat.v1.variable_scope("Train"):
                 self.rew_ph = tf.compat.v1.placeholder(tf.float32)
@@ -705,9 +929,47 @@ class RLAlgorithm(object):
                 self.sess.run(tf.compat.v1.global_variables_initializer())
                 self.policy_tf.initialize()
 
+            # Create the copies of the policy within the samplers.
+            if self.worker_sync_freq is not None:
+                self._get_flat = GetFlat(get_actor_vars(), sess=self.sess)
+                for sampler in self.sampler:
+                    sampler.setup_policy.remote(
+                        policy=self.policy,
+                        ob_space=self.ob_space,
+                        ac_space=self.ac_space,
+                        co_space=self.co_space,
+                        policy_kwargs=self.policy_kwargs,
+                    )
+                self._sync_worker_weights()
+
             return tf.compat.v1.get_collection(
                 tf.compat.v1.GraphKeys.TRAINABLE_VARIABLES)
 
+    def _setup_prefetch(self, policy):
+        """Wrap the replay buffers of a policy to prefetch their batches.
+
+        This is done recursively for the agents of multi-agent policies that
+        do not use MADDPG.
+
+        Parameters
+        ----------
+        policy : hbaselines.base_policies.Policy
+            the policy object
+        """
+        for agent in getattr(policy, "agents", {}).values():
+            self._setup_prefetch(agent)
+
+        replay_buffer = getattr(policy, "replay_buffer", None)
+        if isinstance(replay_buffer, dict):
+            policy.replay_buffer = {
+                key: PrefetchReplayBuffer(
+                    replay_buffer[key], queue_size=self.prefetch_batches)
+                for key in replay_buffer.keys()
+            }
+        elif replay_buffer is not None:
+            policy.replay_buffer = PrefetchReplayBuffer(
+                replay_buffer, queue_size=self.prefetch_batches)
+
     def _policy(self,
                 obs,
                 context,
@@ -738,7 +1000,81 @@ class RLAlgorithm(object):
         list of float
             the action value
         """
-        # Reshape the observation to match the input structure of the policy.
+        return self._policy_batch(
+            obs=[obs],
+            context=[context],
+            apply_noise=apply_noise,
+            random_actions=random_actions,
+            env_num=[env_num],
+        )[0]
+
+    def _policy_batch(self,
+                      obs,
+                      context,
+                      apply_noise=True,
+                      random_actions=False,
+                      env_num=None):
+        """Get the actions from the observations of multiple environments.
+
+        The actions of all environments are computed by a single call to the
+        policy, thereby avoiding one forward pass per environment.
+
+        Parameters
+        ----------
+        obs : list of array_like
+            the observation from each environment
+        context : list of array_like or None
+            the contextual term from each environment. Set to None if no
+            context is provided by the environment.
+        apply_noise : bool
+            enable the noise
+        random_actions : bool
+            if set to True, actions are sampled randomly from the action space
+            instead of being computed by the policy. This is used for
+            exploration purposes.
+        env_num : list of int
+            the environment number of each element in `obs`. Defaults to the
+            first len(obs) environments.
+
+        Returns
+        -------
+        list of list of float
+            the action value for each environment
+        """
+        if env_num is None:
+            env_num = list(range(len(obs)))
+
+        # Reshape the observations to match the input structure of the policy.
+        obs = [self._reshape_obs(obs_i) for obs_i in obs]
+
+        action = self.policy_tf.get_action_batch(
+            obs, context,
+            apply_noise=apply_noise,
+            random_actions=random_actions,
+            env_num=env_num,
+        )
+
+        # Flatten the actions. Dictionaries correspond to multi-agent policies.
+        return [
+            {key: action_i[key].flatten() for key in action_i.keys()}
+            if isinstance(action_i, dict) else action_i.flatten()
+            for action_i in action
+        ]
+
+    def _reshape_obs(self, obs):
+        """Reshape an observation to match the input structure of the policy.
+
+        Parameters
+        ----------
+        obs : array_like or dict of array_like
+            the observation. Dictionaries correspond to multi-agent
+            environments.
+
+        Returns
+        -------
+        array_like or dict of array_like
+            the reshaped observation
+        """
         if isinstance(obs, dict):
             # In multi-agent environments, observations come in dict form
             for key in obs.keys():
@@ -753,20 +1089,7 @@ class RLAlgorithm(object):
         else:
             obs = np.array(obs).reshape((-1,) + self.ob_space.shape)
 
-        action = self.policy_tf.get_action(
-            obs, context,
-            apply_noise=apply_noise,
-            random_actions=random_actions,
-            env_num=env_num,
-        )
-
-        # Flatten the actions. Dictionaries correspond to multi-agent policies.
-        if isinstance(action, dict):
-            action = {key: action[key].flatten() for key in action.keys()}
-        else:
-            action = action.flatten()
-
-        return action
+        return obs
 
     def _store_transition(self,
                           obs0,
@@ -881,6 +1204,8 @@ class RLAlgorithm(object):
         # Load an existing checkpoint if provided.
         if ckpt_path is not None:
             self.saver.restore(self.sess, ckpt_path)
+            if self.worker_sync_freq is not None:
+                self._sync_worker_weights()
 
         # Make sure that the log directory exists, and if not, make it.
         ensure_dir(log_dir)
@@ -1030,6 +1355,8 @@ class RLAlgorithm(object):
             location of the checkpoint
         """
         self.saver.restore(self.sess, load_path)
+        if self.worker_sync_freq is not None:
+            self._sync_worker_weights()
 
         # Load pre-existing replay buffers.
         if self.save_replay_buffer:
@@ -1055,94 +1382,352 @@ class RLAlgorithm(object):
         # require to run through each environment in parallel until the number
         # of required steps have been collected.
         run_steps = run_steps or self.nb_rollout_steps
+
+        # Compute actions within the samplers if they hold policy copies.
+        if self.worker_sync_freq is not None:
+            self._collect_samples_worker(run_steps, random_actions)
+            return
+
+        # Collect samples asynchronously if a policy lag is permitted.
+        if self.policy_lag > 0 and self.num_envs > 1:
+            self._collect_samples_async(run_steps, random_actions)
+            return
+
         n_itr = math.ceil(run_steps / self.num_envs)
         for itr in range(n_itr):
             n_steps = self.num_envs if itr < n_itr - 1 \
                 else run_steps - (n_itr - 1) * self.num_envs
 
             # Collect the most recent contextual term from every environment.
-            if self.num_envs > 1:
-                context = [ray.get(self.sampler[env_num].get_context.remote())
-                           for env_num in range(self.num_envs)]
-            else:
-                context = [self.sampler[0].get_context()]
+            context = self._get_context(list(range(n_steps)))
 
-            # Predict next action. Use random actions when initializing the
-            # replay buffer.
-            action = [self._policy(
-                obs=self.obs[env_num],
-                context=context[env_num],
+            # Predict next action for all environments in a single call. Use
+            # random actions when initializing the replay buffer.
+            action = self._policy_batch(
+                obs=[self.obs[env_num] for env_num in range(n_steps)],
+                context=context,
                 apply_noise=True,
                 random_actions=random_actions,
-                env_num=env_num,
-            ) for env_num in range(n_steps)]
+                env_num=list(range(n_steps)),
+            )
 
             # Update the environment.
-            if self.num_envs > 1:
+            ret = self._collect_sample(list(range(n_steps)), action)
+
+            for ret_i in ret:
+                self._process_sample(ret_i)
+
+    def _worker_groups(self, env_nums):
+        """Group environment numbers by the sampler that holds them.
+
+        Parameters
+        ----------
+        env_nums : list of int
+            the environment numbers
+
+        Returns
+        -------
+        list of (int, list of int)
+            the index of every sampler that holds at least one of the
+            environments, and the environment numbers held by it
+        """
+        groups = {}
+        for num in env_nums:
+            groups.setdefault(num // self.envs_per_worker, []).append(num)
+        return sorted(groups.items())
+
+    def _get_context(self, env_nums):
+        """Collect the most recent contextual terms from the environments.
+
+        Parameters
+        ----------
+        env_nums : list of int
+            the environment numbers, in ascending order
+
+        Returns
+        -------
+        list of array_like or list of None
+            the contextual term of each environment
+        """
+        if self.envs_per_worker > 1:
+            groups = self._worker_groups(env_nums)
+            if self.num_workers > 1:
+                context = ray.get([
+                    self.sampler[i].get_context.remote(env_num=nums)
+                    for i, nums in groups])
+            else:
+                context = [self.sampler[i].get_context(env_num=nums)
+                           for i, nums in groups]
+            return [c for context_i in context for c in context_i]
+        elif self.num_workers > 1:
+            return ray.get([
+                self.sampler[num].get_context.remote() for num in env_nums])
+        else:
+            return [self.sampler[0].get_context()]
+
+    def _collect_sample(self, env_nums, action):
+        """Perform a single step within the environments.
+
+        Parameters
+        ----------
+        env_nums : list of int
+            the environment numbers, in ascending order
+        action : list of array_like
+            the action to perform within each environment
+
+        Returns
+        -------
+        list of dict
+            the output from `collect_sample` for each environment
+        """
+        if self.envs_per_worker > 1:
+            groups = self._worker_groups(env_nums)
+            action = {num: action_i for num, action_i in zip(env_nums, action)}
+            if self.num_workers > 1:
                 ret = ray.get([
-                    self.sampler[env_num].collect_sample.remote(
-                        action=action[env_num])
-                    for env_num in range(n_steps)
-                ])
+                    self.sampler[i].collect_sample.remote(
+                        action=[action[num] for num in nums], env_num=nums)
+                    for i, nums in groups])
             else:
-                ret = [self.sampler[0].collect_sample(action=action[0])]
+                ret = [self.sampler[i].collect_sample(
+                    action=[action[num] for num in nums], env_num=nums)
+                    for i, nums in groups]
+            return [r for ret_i in ret for r in ret_i]
+        elif self.num_workers > 1:
+            return ray.get([
+                self.sampler[num].collect_sample.remote(action=action_i)
+                for num, action_i in zip(env_nums, action)])
+        else:
+            return [self.sampler[0].collect_sample(action=action[0])]
+
+    def _collect_samples_worker(self, run_steps, random_actions):
+        """Perform the sample collection operation within the samplers.
+
+        The steps are divided evenly between the environments, and every
+        sampler computes the actions of its environment with its local copy of
+        the policy. This avoids communicating with the learner at every step.
 
+        Parameters
+        ----------
+        run_steps : int
+            number of steps to collect samples from
+        random_actions : bool
+            if set to True, actions are sampled randomly from the action space
+            instead of being computed by the policy. This is used for
+            exploration purposes.
+        """
+        n_steps = [run_steps // self.num_envs
+                   + int(num < run_steps % self.num_envs)
+                   for num in range(self.num_envs)]
+
+        ret = ray.get([
+            self.sampler[num].collect_samples.remote(
+                obs=self.obs[num],
+                n_steps=n_steps[num],
+                apply_noise=True,
+                random_actions=random_actions,
+            )
+            for num in range(self.num_envs) if n_steps[num] > 0
+        ])
+
+        for samples in ret:
+            for sample in samples:
+                self._process_sample(sample)
+
+    def _sync_worker_weights(self):
+        """Send the actor weights of the learner to the samplers.
+
+        The weights are placed in the object store once and shared by all
+        samplers. Since the tasks of an actor are executed in order, the new
+        weights are used by all subsequent sample collection operations. The
+        step count of goal-conditioned policies is sent as well, so that the
+        pretraining phase of every level ends after the configured number of
+        total steps.
+        """
+        weights = ray.put(self._get_flat())
+        steps = getattr(self.policy_tf, "_steps", None)
+        for sampler in self.sampler:
+            sampler.set_weights.remote(weights, steps)
+
+    def _collect_samples_async(self, run_steps, random_actions):
+        """Perform the sample collection operation asynchronously.
+
+        Actions are provided to every environment that is not stepping, and
+        the samples of environments are stored as soon as they are available.
+        Before returning, all idle environments are provided new actions, so
+        that the environments continue stepping while the policy is trained.
+        The staleness of these actions is bounded by `policy_lag`; see
+        `_bound_policy_lag`.
+
+        Parameters
+        ----------
+        run_steps : int
+            number of steps to collect samples from
+        random_actions : bool
+            if set to True, actions are sampled randomly from the action space
+            instead of being computed by the policy. This is used for
+            exploration purposes.
+        """
+        n_collected = 0
+        while n_collected < run_steps:
+            # Provide new actions to the environments that are not stepping.
+            self._dispatch_samples(random_actions)
+
+            # Wait for at least one environment to complete its step, and
+            # collect the samples of all environments that have done so.
+            env_nums = sorted(self._pending.keys())
+            futures = [self._pending[num][0] for num in env_nums]
+            ray.wait(futures, num_returns=1)
+            ready, _ = ray.wait(futures, num_returns=len(futures), timeout=0)
+            env_nums = [num for num, future in zip(env_nums, futures)
+                        if future in ready][:run_steps - n_collected]
+
+            ret = ray.get([self._pending.pop(num)[0] for num in env_nums])
             for ret_i in ret:
-                num = ret_i["env_num"]
-                context = ret_i["context"]
-                action = ret_i["action"]
-                reward = ret_i["reward"]
-                obs = ret_i["obs"]
-                done = ret_i["done"]
-                all_obs = ret_i["all_obs"]
-                info = ret_i["info"]
-                reset = done["__all__"] if isinstance(done, dict) else done
-
-                # Store a transition in the replay buffer.
-                self._store_transition(
-                    obs0=self.obs[num],
-                    context0=context,
-                    action=action,
-                    reward=reward,
-                    obs1=obs[0] if reset else obs,
-                    context1=context,
-                    terminal1=done,
-                    is_final_step=(self.episode_step[num] >= self.horizon - 1),
-                    all_obs0=self.all_obs[num],
-                    all_obs1=all_obs[0] if reset else all_obs,
-                    env_num=num,
-                )
+                self._process_sample(ret_i)
+            n_collected += len(ret)
 
-                # Book-keeping.
-                self.steps += 1
-                self.episode_step[num] += 1
-                if isinstance(reward, dict):
-                    self.episode_reward[num] += np.mean(
-                        [reward[k] for k in reward.keys()])
-                else:
-                    self.episode_reward[num] += reward
-
-                # Update the current observation.
-                self.obs[num] = (obs[1] if reset else obs).copy()
-                self.all_obs[num] = all_obs[1] if reset else all_obs
-
-                # Handle episode done.
-                if reset:
-                    self.epoch_episode_rewards.append(self.episode_reward[num])
-                    self.episode_rew_history.append(self.episode_reward[num])
-                    self.epoch_episode_steps.append(self.episode_step[num])
-                    self.episode_reward[num] = 0
-                    self.episode_step[num] = 0
-                    self.epoch_episodes += 1
-                    self.episodes += 1
-
-                    for key in info.keys():
-                        # If the key is not available, add it.
-                        if key not in self.info_at_done:
-                            self.info_at_done[key] = deque(maxlen=100)
-
-                        # Store the info value at the end of the rollout.
-                        self.info_at_done[key].append(info[key])
+        # Continue stepping the environments while the policy is trained.
+        if not random_actions:
+            self._dispatch_samples(random_actions)
+
+    def _dispatch_samples(self, random_actions):
+        """Provide new actions to the environments that are not stepping.
+
+        Parameters
+        ----------
+        random_actions : bool
+            if set to True, actions are sampled randomly from the action space
+            instead of being computed by the policy. This is used for
+            exploration purposes.
+        """
+        env_nums = [num for num in range(self.num_envs)
+                    if num not in self._pending]
+
+        if len(env_nums) == 0:
+            return
+
+        # Collect the most recent contextual term from every idle environment.
+        context = ray.get([
+            self.sampler[num].get_context.remote() for num in env_nums])
+
+        # Predict next action for all idle environments in a single call.
+        action = self._policy_batch(
+            obs=[self.obs[num] for num in env_nums],
+            context=context,
+            apply_noise=True,
+            random_actions=random_actions,
+            env_num=env_nums,
+        )
+
+        # Start stepping the environments. The number of policy updates at
+        # the time the action was computed is stored to bound the policy lag.
+        for num, action_i in zip(env_nums, action):
+            self._pending[num] = (
+                self.sampler[num].collect_sample.remote(action=action_i),
+                self._n_updates,
+            )
+
+    def _bound_policy_lag(self, num_updates=0):
+        """Store the in-flight samples that would exceed the policy lag.
+
+        This is called before every policy update. Samples whose actions were
+        computed `policy_lag` or more updates ago are waited on and stored in
+        the replay buffer before the update is performed.
+
+        Parameters
+        ----------
+        num_updates : int
+            the number of additional updates performed before the next call to
+            this method. Used by fused updates, which perform several updates
+            within a single session call.
+        """
+        env_nums = [num for num in sorted(self._pending.keys())
+                    if self._n_updates + num_updates - self._pending[num][1]
+                    >= self.policy_lag]
+
+        if len(env_nums) > 0:
+            ret = ray.get([self._pending.pop(num)[0] for num in env_nums])
+            for ret_i in ret:
+                self._process_sample(ret_i)
+
+    def _process_sample(self, sample):
+        """Store a sample from an environment and perform book-keeping.
+
+        Parameters
+        ----------
+        sample : dict
+            the output from the `collect_sample` method of a sampler
+        """
+        # Read the sample from shared memory, if it was written there.
+        if self._transport is not None:
+            sample = self._transport.get(sample)
+
+        num = sample["env_num"]
+
+        # Set the meta-actions the sample was computed under, if it was
+        # collected by a goal-conditioned policy within a sampler.
+        if "meta_action" in sample:
+            self.policy_tf.meta_action[num] = sample["meta_action"]
+
+            # The action was not computed by the policy of the learner, so
+            # its step count is incremented here.
+            self.policy_tf._steps += 1
+
+        context = sample["context"]
+        action = sample["action"]
+        reward = sample["reward"]
+        obs = sample["obs"]
+        done = sample["done"]
+        all_obs = sample["all_obs"]
+        info = sample["info"]
+        reset = done["__all__"] if isinstance(done, dict) else done
+
+        # Store a transition in the replay buffer.
+        self._store_transition(
+            obs0=self.obs[num],
+            context0=context,
+            action=action,
+            reward=reward,
+            obs1=obs[0] if reset else obs,
+            context1=context,
+            terminal1=done,
+            is_final_step=(self.episode_step[num] >= self.horizon - 1),
+            all_obs0=self.all_obs[num],
+            all_obs1=all_obs[0] if reset else all_obs,
+            env_num=num,
+        )
+
+        # Book-keeping.
+        self.steps += 1
+        self.episode_step[num] += 1
+        if isinstance(reward, dict):
+            self.episode_reward[num] += np.mean(
+                [reward[k] for k in reward.keys()])
+        else:
+            self.episode_reward[num] += reward
+
+        # Update the current observation.
+        self.obs[num] = (obs[1] if reset else obs).copy()
+        self.all_obs[num] = all_obs[1] if reset else all_obs
+
+        # Handle episode done.
+        if reset:
+            self.epoch_episode_rewards.append(self.episode_reward[num])
+            self.episode_rew_history.append(self.episode_reward[num])
+            self.epoch_episode_steps.append(self.episode_step[num])
+            self.episode_reward[num] = 0
+            self.episode_step[num] = 0
+            self.epoch_episodes += 1
+            self.episodes += 1
+
+            for key in info.keys():
+                # If the key is not available, add it.
+                if key not in self.info_at_done:
+                    self.info_at_done[key] = deque(maxlen=100)
+
+                # Store the info value at the end of the rollout.
+                self.info_at_done[key].append(info[key])
 
     def _train(self):
         """Perform the training operation."""
@@ -1173,12 +1758,48 @@ class RLAlgorithm(object):
             # update frequency.
             update = train_itr % self.actor_update_freq == 0
 
+            if getattr(self.policy_tf, "fused_update", False):
+                # Store in-flight samples that would otherwise exceed the
+                # permitted policy lag.
+                if len(self._pending) > 0:
+                    self._bound_policy_lag(num_updates=self.nb_train_steps)
+
+                # Run all steps of training within a single session call.
+                self.policy_tf.update_fused(
+                    self.nb_train_steps, update_actor=update)
+                n_updates = self._n_updates
+                self._n_updates += self.nb_train_steps
+
+                # Send the new actor weights to the samplers.
+                if self.worker_sync_freq is not None and \
+                        self._n_updates // self.worker_sync_freq > \
+                        n_updates // self.worker_sync_freq:
+                    self._sync_worker_weights()
+                return
+
             # Run a step of training from batch.
             for _ in range(self.nb_train_steps):
+                # Store in-flight samples that would otherwise exceed the
+                # permitted policy lag.
+                if len(self._pending) > 0:
+                    self._bound_policy_lag()
+
                 self.policy_tf.update(update_actor=update, **kwargs)
+                self._n_updates += 1
+
+                # Send the new actor weights to the samplers.
+                if self.worker_sync_freq is not None and \
+                        self._n_updates % self.worker_sync_freq == 0:
+                    self._sync_worker_weights()
         else:
             # for PPO policies
             self.policy_tf.update()
+            self._n_updates += 1
+
+            # Send the new actor weights to the samplers.
+            if self.worker_sync_freq is not None and \
+                    self._n_updates % self.worker_sync_freq == 0:
+                self._sync_worker_weights()
 
     def _evaluate(self, env):
         """Perform the evaluation operation.
@@ -195,6 +195,53 @@ class Policy(object):
         """
         raise NotImplementedError
 
+    def get_action_batch(self,
+                         obs,
+                         context,
+                         apply_noise,
+                         random_actions,
+                         env_num):
+        """Compute the actions for multiple environments in a single call.
+
+        The observations (and contextual terms) of every environment are
+        stacked into one batch, passed through `get_action` once, and the
+        resulting actions are split back between the environments. Policies
+        that maintain environment-specific memory override this method.
+
+        Parameters
+        ----------
+        obs : list of array_like
+            the observation from each environment
+        context : list of array_like or None
+            the contextual term from each environment. Set to None if no
+            context is provided by the environment.
+        apply_noise : bool
+            whether to add Gaussian noise to the output of the actor. Defaults
+            to False
+        random_actions : bool
+            if set to True, actions are sampled randomly from the action space
+            instead of being computed by the policy. This is used for
+            exploration purposes.
+        env_num : list of int
+            the environment number of each element in `obs`
+
+        Returns
+        -------
+        list of array_like
+            computed action by the policy for each environment
+        """
+        sizes = [np.shape(ob)[0] for ob in obs]
+
+        action = self.get_action(
+            obs=np.concatenate(obs, axis=0),
+            context=self._stack_context(context, sizes),
+            apply_noise=apply_noise,
+            random_actions=random_actions,
+            env_num=env_num[0],
+        )
+
+        return np.split(action, np.cumsum(sizes)[:-1], axis=0)
+
     def store_transition(self, obs0, context0, action, reward, obs1, context1,
                          done, is_final_step, env_num=0, evaluate=False):
         """Store a transition in the replay buffer.
@@ -230,12 +277,78 @@ class Policy(object):
         """
         raise NotImplementedError
 
+    def store_transition_batch(self,
+                               obs0,
+                               context0,
+                               action,
+                               reward,
+                               obs1,
+                               context1,
+                               done,
+                               is_final_step,
+                               env_num,
+                               evaluate=False):
+        """Store the transitions of multiple environments.
+
+        By default, the transitions are stored one at a time via
+        `store_transition`. Policies whose replay buffers support adding
+        batches of samples override this method.
+
+        Parameters
+        ----------
+        obs0 : list of array_like
+            the last observation from each environment
+        context0 : list of array_like or None
+            the last contextual term from each environment. Set to None if no
+            context is provided by the environment.
+        action : list of array_like
+            the action of each environment
+        reward : list of float
+            the reward of each environment
+        obs1 : list of array_like
+            the current observation from each environment
+        context1 : list of array_like or None
+            the current contextual term from each environment. Set to None if
+            no context is provided by the environment.
+        done : list of float
+            is the episode done, for each environment
+        is_final_step : bool
+            whether the time horizon was met in the step corresponding to the
+            current samples. This is used by the TD3 algorithm to augment the
+            done mask.
+        env_num : list of int
+            the environment number of each element in `obs0`
+        evaluate : bool
+            whether the samples are being provided by the evaluation
+            environment. If so, the data is not stored in the replay buffer.
+        """
+        for j in range(len(env_num)):
+            self.store_transition(
+                obs0=obs0[j],
+                context0=None if context0 is None else context0[j],
+                action=action[j],
+                reward=reward[j],
+                obs1=obs1[j],
+                context1=None if context1 is None else context1[j],
+                done=done[j],
+                is_final_step=is_final_step,
+                env_num=env_num[j],
+                evaluate=evaluate,
+            )
+
     def get_td_map(self):
         """Return dict map for the summary (to be run in the algorithm)."""
         raise NotImplementedError
 
     def clear_memory(self, env_num):
-        """Clear internal memory that is used by the replay buffer."""
+        """Clear internal memory that is used by the replay buffer.
+
+        Parameters
+        ----------
+        env_num : int or array_like of int
+            the environment number, or the numbers of all environments whose
+            memory is cleared at once
+        """
         pass
 
     @staticmethod
@@ -270,6 +383,32 @@ class Policy(object):
             obs = np.concatenate((obs, context), axis=axis)
         return obs
 
+    @staticmethod
+    def _stack_context(context, sizes):
+        """Stack the contextual terms of multiple environments.
+
+        Parameters
+        ----------
+        context : list of array_like or None
+            the contextual term from each environment. Set to None if no
+            context is provided by the environment.
+        sizes : list of int
+            the number of observations provided by each environment
+
+        Returns
+        -------
+        array_like or None
+            the contextual terms, with one row per observation. None if no
+            context is provided by the environment.
+        """
+        if context is None or context[0] is None:
+            return None
+
+        return np.concatenate([
+            np.asarray(context_i).reshape(size, -1)
+            for context_i, size in zip(context, sizes)
+        ], axis=0)
+
     @staticmethod
     def _get_ob_dim(ob_space, co_space):
         """Return the processed observation dimension.
@@ -294,6 +433,36 @@ class Policy(object):
             ob_dim = tuple(map(sum, zip(ob_dim, co_space.shape)))
         return ob_dim
 
+    @staticmethod
+    def _get_storage_dtype(model_params):
+        """Return the reduced-precision storage format of the observations.
+
+        For convolutional models, the image channels at the start of the
+        observations are normalized to [0, 1], and are quantized to uint8. The
+        remaining elements of the observations are stored as float16.
+
+        Parameters
+        ----------
+        model_params : dict
+            dictionary of model-specific parameters
+
+        Returns
+        -------
+        list of (int or None, str)
+            the number of elements and data type of every segment of the
+            observations. See the QuantizedArray object in
+            hbaselines/fcnet/replay_buffer.py.
+        """
+        storage_dtype = [(None, "float16")]
+
+        if model_params["model_type"] == "conv":
+            image_size = model_params["image_height"] \
+                * model_params["image_width"] \
+                * model_params["image_channels"]
+            storage_dtype.insert(0, (image_size, "uint8"))
+
+        return storage_dtype
+
     @staticmethod
     def _l2_loss(l2_penalty, scope_name):
         """Compute the L2 regularization penalty.
@@ -12,6 +12,9 @@ from copy import deepcopy
 
 from hbaselines.envs.mixed_autonomy.envs.utils import get_rl_accel
 from hbaselines.envs.mixed_autonomy.envs.utils import v_eq_function
+from hbaselines.envs.mixed_autonomy.envs.utils import InitialStateStore
+from hbaselines.envs.mixed_autonomy.envs.utils import load_initial_states
+from hbaselines.envs.mixed_autonomy.envs.utils import convert_initial_states
 
 # the length of the individual vehicles
 VEHICLE_LENGTH = 5.0
@@ -26,13 +29,13 @@ class RingEnv(gym.Env):
 
     Attributes
     ----------
-    initial_state : str or None
+    initial_state : str or None or InitialStateStore
         the initial state. Must be one of the following:
         * None: in this case, vehicles are evenly distributed
         * "random": in this case, vehicles are randomly placed with a minimum
           gap between vehicles specified by "min_gap"
-        * str: A string that is not "random" is assumed to be a path to a json
-          file specifying initial vehicle positions and speeds
+        * InitialStateStore: the initial vehicle positions and speeds, loaded
+          from the path that was provided during instantiation
     length : float
         the length of the ring at the current time step
     num_vehicles : int
@@ -138,7 +141,8 @@ class RingEnv(gym.Env):
             * "random": in this case, vehicles are randomly placed with a
               minimum gap between vehicles specified by "min_gap"
             * str: A string that is not "random" is assumed to be a path to a
-              json file specifying initial vehicle positions and speeds
+              json file specifying initial vehicle positions and speeds, or to
+              its binary equivalent (see convert_initial_states)
         maddpg : bool
             whether to use a variant that is compatible with MADDPG
         obs_frames : int
@@ -149,9 +153,8 @@ class RingEnv(gym.Env):
 
         # Load the initial state (if needed).
         if isinstance(initial_state, str) and initial_state != "random":
-            with open(initial_state, "r") as fp:
-                self.initial_state = json.load(fp)
-            self._length = list(self.initial_state.keys())
+            self.initial_state = load_initial_states(initial_state)
+            self._length = self.initial_state.keys()
         else:
             self.initial_state = initial_state
 
@@ -238,7 +241,7 @@ class RingEnv(gym.Env):
             the length of the ring road
         num_vehicles : int
             number of vehicles in the network
-        initial_state : str or None or dict
+        initial_state : str or None or dict or InitialStateStore
             the initial state. See description in __init__.
 
         Returns
@@ -250,7 +253,7 @@ class RingEnv(gym.Env):
         """
         if initial_state is None:
             # uniformly distributed vehicles
-            pos = np.arange(0, length, length / num_vehicles)
+            pos = np.arange(num_vehicles) * length / num_vehicles
             # no initial speed (0 m/s)
             vel = np.array([0. for _ in range(num_vehicles)])
         elif initial_state == "random":
@@ -263,6 +266,9 @@ class RingEnv(gym.Env):
             pos += (VEHICLE_LENGTH + min_gap) * np.arange(num_vehicles)
             # no initial speed (0 m/s)
             vel = np.array([0. for _ in range(num_vehicles)])
+        elif isinstance(initial_state, InitialStateStore):
+            # Choose from the available initial states.
+            pos, vel = initial_state.sample(length)
         else:
             # Choose from the available initial states.
             pos_vel = random.choice(initial_state[str(length)])
@@ -735,6 +741,500 @@ class RingMultiAgentEnv(RingEnv):
         return obs
 
 
+class RingVecEnv(object):
+    """Vectorized variant of the single agent ring environment.
+
+    This object simulates several rings at once. The states of all rings are
+    stored as (num_envs, num_vehicles) arrays, and the car-following, failsafe,
+    and RL acceleration computations of all rings are performed within a
+    single vectorized call. The lengths of the rings are sampled individually.
+
+    The object follows a gym-style vectorized environment API: observations,
+    rewards, and done masks are returned with one row per ring, and rings are
+    reset automatically once they are done, in which case the returned
+    observation is the initial observation of the next rollout and the final
+    observation is included in the info dict under "terminal_observation".
+    The dynamics and observations match those of RingSingleAgentEnv.
+
+    Attributes
+    ----------
+    num_envs : int
+        the number of rings
+    initial_state : str or None or InitialStateStore
+        the initial state. See description in RingEnv.
+    length : array_like
+        the length of every ring at the current time step
+    num_vehicles : int
+        number of vehicles in every ring
+    dt : float
+        seconds per simulation step
+    horizon : int
+        the environment time horizon, in steps
+    sims_per_step : int
+        the number of simulation steps per environment step
+    max_accel : float
+        scaling factor for the AV accelerations, in m/s^2
+    min_gap : float
+        the minimum allowable gap by all vehicles. This is used during the
+        failsafe computations.
+    rl_ids : array_like
+        the indices of vehicles that are treated as automated, or RL, vehicles
+    num_rl : int
+        the number of automated, or RL, vehicles
+    warmup_steps : int
+        number of steps performed before the initialization of training during
+        a rollout
+    obs_frames : int
+        number of observation frames to use
+    t : array_like
+        number of simulation steps since the start of the current rollout of
+        every ring
+    positions : array_like
+        positions of all vehicles in every ring
+    speeds : array_like
+        speeds of all vehicles in every ring
+    headways : array_like
+        bumper-to-bumper gaps of all vehicles in every ring
+    accelerations : array_like
+        previous step accelerations by the individual vehicles in every ring
+    """
+
+    def __init__(self,
+                 num_envs,
+                 length,
+                 num_vehicles,
+                 dt,
+                 horizon,
+                 sims_per_step,
+                 max_accel=1.0,
+                 min_gap=1.0,
+                 rl_ids=None,
+                 warmup_steps=0,
+                 initial_state=None,
+                 obs_frames=5):
+        """Instantiate the environment class.
+
+        Parameters
+        ----------
+        num_envs : int
+            the number of rings
+        length : float or [float, float]
+            the length of the ring if a float, and a range of [min, max] length
+            values that are sampled from during the reset procedure
+        num_vehicles : int
+            total number of vehicles in every ring
+        dt : float
+            seconds per simulation step
+        horizon : int
+            the environment time horizon, in steps
+        sims_per_step : int
+            the number of simulation steps per environment step
+        max_accel : float
+            scaling factor for the AV accelerations, in m/s^2
+        min_gap : float
+            the minimum allowable gap by all vehicles. This is used during the
+            failsafe computations.
+        rl_ids : list of int or None
+            the indices of vehicles that are treated as automated, or RL,
+            vehicles
+        warmup_steps : int
+            number of steps performed before the initialization of training
+            during a rollout
+        initial_state : str or None
+            the initial state. See description in RingEnv.
+        obs_frames : int
+            number of observation frames to use. Additional frames are
+            provided from previous time steps.
+        """
+        self._length = length
+
+        # Load the initial state (if needed).
+        if isinstance(initial_state, str) and initial_state != "random":
+            self.initial_state = load_initial_states(initial_state)
+            self._length = self.initial_state.keys()
+        else:
+            self.initial_state = initial_state
+
+        self.num_envs = num_envs
+        self.num_vehicles = num_vehicles
+        self.dt = dt
+        self.horizon = horizon
+        self.sims_per_step = sims_per_step
+        self.max_accel = max_accel
+        self.min_gap = min_gap
+        self.rl_ids = np.asarray(rl_ids if rl_ids is not None else [])
+        self.num_rl = len(self.rl_ids)
+        self.warmup_steps = warmup_steps
+        self.obs_frames = obs_frames
+
+        # human-driver model parameters
+        self.v0 = 30
+        self.T = 1
+        self.a = 1.3
+        self.b = 2.0
+        self.delta = 4
+        self.s0 = 2
+        self.noise = 0.2
+
+        # failsafe parameters
+        self.decel = 4.5
+        self.delay = self.dt
+
+        # simulation parameters
+        self.t = np.zeros(num_envs, dtype=int)
+        self.length = np.zeros(num_envs)
+        self.positions = np.zeros((num_envs, num_vehicles))
+        self.speeds = np.zeros((num_envs, num_vehicles))
+        self.headways = np.zeros((num_envs, num_vehicles))
+        self.accelerations = np.zeros((num_envs, num_vehicles))
+
+        # observations from previous time steps, with the most recent
+        # observation at index 0
+        self._obs_history = np.zeros(
+            (num_envs, self.num_rl, 10 * obs_frames, 3))
+
+        # equilibrium speeds, and the running sums used to compute the info
+        # dict of every ring
+        self._v_eq = np.zeros(num_envs)
+        self._v_eq_cache = {}
+        self._speed_sum = np.zeros(num_envs)
+        self._accel_sum = np.zeros(num_envs)
+        self._num_samples = np.zeros(num_envs)
+
+        self._reset_rings(np.arange(num_envs))
+
+    @property
+    def action_space(self):
+        """Return the action space of an individual ring."""
+        return Box(
+            low=-1.0,
+            high=1.0,
+            shape=(self.num_rl,),
+            dtype=np.float32)
+
+    @property
+    def observation_space(self):
+        """Return the observation space of an individual ring."""
+        return Box(
+            low=-float('inf'),
+            high=float('inf'),
+            shape=(15 * self.num_rl,),
+            dtype=np.float32)
+
+    def _compute_headway(self):
+        """Compute the current step headway for all vehicles."""
+        # compute the individual headways
+        headway = np.roll(self.positions, -1, axis=1) - self.positions \
+            - VEHICLE_LENGTH
+
+        # dealing with wraparound
+        headway[np.arange(self.num_envs), np.argmax(self.positions, 1)] += \
+            self.length
+
+        return headway
+
+    def _get_accel(self):
+        """Compute the IDM accelerations of all vehicles in every ring."""
+        vel = self.speeds
+        lead_vel = np.roll(vel, -1, axis=1)
+        s_star = self.s0 + np.clip(
+            vel * self.T + np.multiply(vel, vel - lead_vel) /
+            (2 * np.sqrt(self.a * self.b)),
+            a_min=0,
+            a_max=np.inf,
+        )
+
+        accel = self.a * (
+            1 - np.power(vel/self.v0, self.delta)
+            - np.power(s_star/self.headways, 2))
+
+        return accel + np.random.normal(0, self.noise, vel.shape)
+
+    def _failsafe(self):
+        """Compute the failsafe maximum acceleration of all vehicles.
+
+        Returns
+        -------
+        array_like
+            maximum accelerations
+        """
+        lead_vel = np.roll(self.speeds, -1, axis=1)
+
+        # how much we can reduce the speed in each time step
+        speed_reduction = self.decel * self.dt
+        # how many steps to get the speed to zero
+        steps_to_zero = np.round(lead_vel / speed_reduction)
+        brake_distance = self.dt * (
+            np.multiply(steps_to_zero, lead_vel) -
+            0.5 * speed_reduction * np.multiply(steps_to_zero, steps_to_zero+1)
+        )
+        brake_distance = self.headways + brake_distance - self.min_gap
+
+        # Only vehicles with a positive brake distance may have a non-zero
+        # safe speed. The remaining distances are replaced to avoid warnings.
+        indx_nonzero = brake_distance > 0
+        brake_distance = np.where(indx_nonzero, brake_distance, 1.)
+
+        s = self.dt
+        t = self.delay
+
+        # h = the distance that would be covered if it were possible to
+        # stop exactly after gap and decelerate with max_deaccel every
+        # simulation step
+        sqrt_quantity = np.sqrt(
+            ((s * s)
+             + (4.0 * ((s * (2.0 * brake_distance / speed_reduction - t))
+                       + (t * t))))) * -0.5
+        n = np.floor(.5 - ((t + sqrt_quantity) / s))
+        h = 0.5 * n * (n-1) * speed_reduction * s + n * speed_reduction * t
+        assert np.all(h[indx_nonzero] <= brake_distance[indx_nonzero] + 1e-6)
+        # compute the additional speed that must be used during deceleration to
+        # fix the discrepancy between g and h
+        r = (brake_distance - h) / (n * s + t)
+        x = n * speed_reduction + r
+        assert np.all(x[indx_nonzero] >= 0)
+
+        v_safe = np.where(indx_nonzero, x, 0.)
+
+        return (v_safe - self.speeds) / self.dt
+
+    def _get_rl_accel(self, action):
+        """Compute the RL accelerations from the actions of every ring.
+
+        See hbaselines.envs.mixed_autonomy.envs.utils.get_rl_accel.
+        """
+        vel = self.speeds[:, self.rl_ids]
+        accel = self.max_accel * np.clip(action, a_min=-1, a_max=1)
+
+        # Redefine if below a speed threshold so that all actions result in
+        # non-negative desired speeds.
+        ac_range = 2. * self.max_accel
+        return np.where(
+            vel < 0.5 * ac_range * self.dt,
+            accel + 0.5 * ac_range - vel / self.dt,
+            accel)
+
+    def _simulate(self, active, action):
+        """Advance the simulation of the active rings by one simulation step.
+
+        Parameters
+        ----------
+        active : array_like
+            a boolean mask of the rings to advance
+        action : array_like or None
+            the actions of the RL vehicles in every ring. If set to None, the
+            RL vehicles are treated as human-driven vehicles.
+        """
+        self.t[active] += 1
+
+        # Compute the accelerations, clipped by safe, non-negative bounds.
+        accel_min = - self.speeds / self.dt
+        accel_max = self._failsafe()
+        accel = np.clip(self._get_accel(), a_max=accel_max, a_min=accel_min)
+
+        if self.num_rl > 0 and action is not None:
+            # Compute the accelerations for RL vehicles.
+            accel[:, self.rl_ids] = np.clip(
+                self._get_rl_accel(action),
+                a_max=accel_max[:, self.rl_ids],
+                a_min=accel_min[:, self.rl_ids])
+
+        accel = np.where(active[:, None], accel, self.accelerations)
+
+        # Update the speeds, positions, and headways.
+        dt = np.where(active, self.dt, 0.)[:, None]
+        self.positions = np.mod(
+            self.positions + self.speeds * dt + 0.5 * accel * dt ** 2,
+            self.length[:, None])
+        self.speeds = self.speeds + accel * dt
+        self.accelerations = accel
+        self.headways = self._compute_headway()
+
+    def get_state(self, env_ids=None):
+        """Compute the observations of the specified rings.
+
+        The current observations of the RL vehicles are added to the
+        observation history of these rings.
+
+        Parameters
+        ----------
+        env_ids : array_like or None
+            the indices of the rings. Defaults to all rings.
+
+        Returns
+        -------
+        array_like
+            (len(env_ids), 15 * num_rl) matrix of observations
+        """
+        if env_ids is None:
+            env_ids = np.arange(self.num_envs)
+
+        lead_ids = (self.rl_ids + 1) % self.num_vehicles
+        speeds = self.speeds[env_ids]
+        obs_t = np.stack([
+            # ego speed
+            speeds[:, self.rl_ids] / MAX_SPEED,
+            # lead speed
+            speeds[:, lead_ids] / MAX_SPEED,
+            # lead gap
+            np.minimum(
+                self.headways[env_ids][:, self.rl_ids] / MAX_HEADWAY, 5.0),
+        ], axis=2)
+
+        # Add the current observation to the history.
+        history = self._obs_history[env_ids]
+        history[:, :, 1:] = history[:, :, :-1]
+        history[:, :, 0] = obs_t
+        self._obs_history[env_ids] = history
+
+        # Concatenate the past n samples for a given time delta in the output
+        # observations. Unavailable samples are filled with zeros.
+        return history[:, :, ::10].reshape(len(env_ids), -1)
+
+    def compute_reward(self):
+        """Compute the reward of every ring."""
+        c1 = 0.005  # reward scale for the speeds
+        c2 = 0.100  # reward scale for the accelerations
+
+        return - c1 * (self.speeds[:, self.rl_ids[0]] - self._v_eq) ** 2 \
+            - c2 * self.accelerations[:, self.rl_ids[0]] ** 2
+
+    def _reset_rings(self, env_ids):
+        """Reset the specified rings.
+
+        Parameters
+        ----------
+        env_ids : array_like
+            the indices of the rings to reset
+        """
+        for i in env_ids:
+            length = RingEnv._set_length(self._length)
+            self.length[i] = length
+            self.positions[i], self.speeds[i] = RingEnv._set_initial_state(
+                length=length,
+                num_vehicles=self.num_vehicles,
+                initial_state=self.initial_state,
+                min_gap=self.min_gap,
+            )
+
+            # solve for the velocity upper bound of the ring
+            if length not in self._v_eq_cache:
+                self._v_eq_cache[length] = fsolve(
+                    v_eq_function, np.array(4),
+                    args=(self.num_vehicles, length))[0]
+            self._v_eq[i] = self._v_eq_cache[length]
+
+        self.t[env_ids] = 0
+        self.accelerations[env_ids] = 0.
+        self._speed_sum[env_ids] = 0.
+        self._accel_sum[env_ids] = 0.
+        self._num_samples[env_ids] = 0.
+        self.headways = self._compute_headway()
+
+        active = np.zeros(self.num_envs, dtype=bool)
+        active[env_ids] = True
+        for _ in range(self.warmup_steps * self.sims_per_step):
+            self._simulate(active, action=None)
+
+        # observations from previous time steps
+        self._obs_history[env_ids] = 0.
+
+    def reset(self):
+        """Reset all rings.
+
+        Returns
+        -------
+        array_like
+            (num_envs, 15 * num_rl) matrix of initial observations
+        """
+        self._reset_rings(np.arange(self.num_envs))
+        return self.get_state()
+
+    def step(self, action, env_ids=None):
+        """Advance the simulation of the specified rings by one step.
+
+        Parameters
+        ----------
+        action : array_like
+            (len(env_ids), num_rl) matrix of actions
+        env_ids : array_like or None
+            the indices of the rings to advance. Defaults to all rings.
+
+        Returns
+        -------
+        array_like
+            (len(env_ids), 15 * num_rl) matrix of observations. For rings that
+            are done, this is the initial observation of the next rollout.
+        array_like
+            (len(env_ids),) vector of rewards
+        array_like
+            (len(env_ids),) vector of done masks
+        list of dict
+            the info dict of every ring
+        """
+        if env_ids is None:
+            env_ids = np.arange(self.num_envs)
+        env_ids = np.asarray(env_ids)
+
+        full_action = np.zeros((self.num_envs, self.num_rl))
+        full_action[env_ids] = np.reshape(action, (len(env_ids), self.num_rl))
+
+        active = np.zeros(self.num_envs, dtype=bool)
+        active[env_ids] = True
+        collision = np.zeros(self.num_envs, dtype=bool)
+        for _ in range(self.sims_per_step):
+            self._simulate(active, full_action)
+
+            # Determine whether the rollouts are done. Rings that are done
+            # are not advanced further.
+            collision |= active & np.any(self.headways < 0, axis=1)
+            active &= ~collision & (
+                self.t < (self.warmup_steps + self.horizon)
+                * self.sims_per_step)
+
+            if not np.any(active):
+                break
+
+        done = ~active[env_ids]
+
+        # Update the statistics of the rings.
+        measured = self.t[env_ids] > self.warmup_steps * self.sims_per_step
+        speed = np.mean(self.speeds[env_ids], axis=1)
+        self._speed_sum[env_ids] += np.where(measured, speed, 0.)
+        self._accel_sum[env_ids] += np.where(
+            measured, np.mean(np.abs(self.accelerations[env_ids]), axis=1), 0.)
+        self._num_samples[env_ids] += measured
+
+        info = []
+        for i, env_id in enumerate(env_ids):
+            if not measured[i]:
+                info.append({})
+                continue
+            v_eq = self._v_eq[env_id]
+            mean_speed = self._speed_sum[env_id] / self._num_samples[env_id]
+            info.append({
+                "v_eq": v_eq,
+                "v_eq_frac": mean_speed / v_eq,
+                "v_eq_frac_final": speed[i] / v_eq,
+                "speed": mean_speed,
+                "abs_accel":
+                    self._accel_sum[env_id] / self._num_samples[env_id],
+            })
+
+        obs = self.get_state(env_ids)
+        reward = self.compute_reward()[env_ids]
+
+        # Reset the rings that are done, and return the initial observations
+        # of their next rollouts.
+        if np.any(done):
+            for i in np.where(done)[0]:
+                info[i]["terminal_observation"] = obs[i].copy()
+            self._reset_rings(env_ids[done])
+            obs[done] = self.get_state(env_ids[done])
+
+        return obs, reward, done, info
+
+
 if __name__ == "__main__":
     for scale in range(1, 6):
         res = defaultdict(list)
@@ -759,3 +1259,4 @@ if __name__ == "__main__":
                 res[ring_length].append(sorted(xy))
             with open("ring-v{}.json".format(scale - 1), "w") as out_fp:
                 json.dump(res, out_fp)
+        convert_initial_states("ring-v{}.json".format(scale - 1))
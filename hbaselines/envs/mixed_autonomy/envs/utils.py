@@ -1,4 +1,9 @@
 """Script containing utility methods shared amount the environments."""
+import os
+import json
+import hashlib
+import random
+import tempfile
 import numpy as np
 
 # These edges have an extra lane that RL vehicles do not traverse (since they
@@ -15,6 +20,9 @@ EXTRA_LANE_EDGES = [
 MAX_HEADWAY = 100.0
 # a normalizing term for the vehicle speeds
 MAX_SPEED = 10.0
+# initial state stores that have been opened by the current process, indexed
+# by path. These are shared by all environments within the process.
+_INITIAL_STATE_STORES = {}
 
 
 def get_relative_obs(env, veh_id):
@@ -189,3 +197,172 @@ def get_rl_accel(accel, vel, max_accel, dt):
             accel[i] += 0.5 * ac_range - vel[i] / dt
 
     return accel
+
+
+class InitialStateStore(object):
+    """Memory-mapped store of initial vehicle positions and speeds.
+
+    The initial states of all ring lengths are stored in a single binary array
+    of shape (num_states, num_vehicles, 2), where the last dimension consists
+    of the position and speed of every vehicle. The states of every length
+    occupy a contiguous block of this array, whose bounds are specified by an
+    offset index that is stored alongside it. See `convert_initial_states`.
+
+    The array is memory-mapped, and as a result the operating system shares a
+    single copy of it between all processes that open the same file.
+
+    Attributes
+    ----------
+    path : str
+        the path to the binary array
+    states : np.memmap
+        the initial states of all ring lengths
+    """
+
+    def __init__(self, path):
+        """Open the store.
+
+        Parameters
+        ----------
+        path : str
+            the path to the binary array, as created by
+            `convert_initial_states`
+        """
+        self.path = path
+        self.states = np.load(path, mmap_mode="r")
+
+        index = np.load(_get_index_path(path))
+        self._offsets = {
+            int(length): (int(start), int(end)) for length, start, end in zip(
+                index["lengths"], index["offsets"][:-1], index["offsets"][1:])
+        }
+
+    def keys(self):
+        """Return the ring lengths with available initial states."""
+        return [str(length) for length in self._offsets.keys()]
+
+    def sample(self, length):
+        """Choose an initial state for a ring of a given length.
+
+        Parameters
+        ----------
+        length : int
+            the length of the ring road
+
+        Returns
+        -------
+        array_like
+            initial vehicle positions. This is a view of the memory-mapped
+            array.
+        array_like
+            initial vehicle speeds. This is a view of the memory-mapped array.
+        """
+        start, end = self._offsets[int(length)]
+        state = self.states[random.choice(range(start, end))]
+        return state[:, 0], state[:, 1]
+
+
+def _get_index_path(path):
+    """Return the path to the offset index of a binary initial state array."""
+    return os.path.splitext(path)[0] + ".index.npz"
+
+
+def convert_initial_states(json_path, path=None):
+    """Convert initial states from the json format to the binary format.
+
+    The json file consists of a dictionary of initial states for every ring
+    length, indexed by the length. Every initial state is a list of [position,
+    speed] pairs for each vehicle.
+
+    Parameters
+    ----------
+    json_path : str
+        the path to the json file
+    path : str or None
+        the path to the binary array. The offset index is stored in the same
+        directory under the extension ".index.npz". Defaults to the path of the
+        json file with the extension ".npy".
+
+    Returns
+    -------
+    str
+        the path to the binary array
+    """
+    if path is None:
+        path = os.path.splitext(json_path)[0] + ".npy"
+
+    with open(json_path, "r") as fp:
+        initial_state = json.load(fp)
+
+    lengths = sorted(initial_state.keys(), key=int)
+    states = np.array(
+        [pos_vel for length in lengths for pos_vel in initial_state[length]],
+        dtype=np.float64)
+    offsets = np.cumsum(
+        [0] + [len(initial_state[length]) for length in lengths])
+
+    # Write to temporary files first, so that processes that are converting
+    # the same file concurrently never open partially written files.
+    dirname = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(
+            dir=dirname, suffix=".npy", delete=False) as fp:
+        np.save(fp, states)
+    tmp_path = fp.name
+    with tempfile.NamedTemporaryFile(
+            dir=dirname, suffix=".npz", delete=False) as fp:
+        np.savez(fp, lengths=np.array(lengths, dtype=int), offsets=offsets)
+    tmp_index_path = fp.name
+    os.replace(tmp_index_path, _get_index_path(path))
+    os.replace(tmp_path, path)
+
+    return path
+
+
+def _is_up_to_date(bin_path, path):
+    """Check whether a converted file exists and is newer than its source."""
+    return os.path.exists(bin_path) and \
+        os.path.getmtime(bin_path) >= os.path.getmtime(path)
+
+
+def load_initial_states(path):
+    """Return the initial state store located at a given path.
+
+    Stores are opened once per process and shared by all environments within
+    it. Json files are converted to the binary format the first time they are
+    loaded, and the converted files are stored next to them (or in the
+    temporary directory if this location is not writable).
+
+    Parameters
+    ----------
+    path : str
+        the path to a binary initial state array or a json file of initial
+        states
+
+    Returns
+    -------
+    InitialStateStore
+        the initial state store
+    """
+    path = os.path.abspath(path)
+
+    if path not in _INITIAL_STATE_STORES:
+        bin_path = path
+        if path.endswith(".json"):
+            bin_path = os.path.splitext(path)[0] + ".npy"
+            if not _is_up_to_date(bin_path, path):
+                try:
+                    convert_initial_states(path, bin_path)
+                except OSError:
+                    # The temporary file is keyed by the full path of the json
+                    # file, so that json files with the same name do not share
+                    # converted files.
+                    bin_path = os.path.join(
+                        tempfile.gettempdir(), "{}-{}.npy".format(
+                            os.path.splitext(os.path.basename(path))[0],
+                            hashlib.sha1(path.encode()).hexdigest()[:16]))
+                    if not _is_up_to_date(bin_path, path):
+                        convert_initial_states(path, bin_path)
+
+        _INITIAL_STATE_STORES[path] = InitialStateStore(bin_path)
+
+    return _INITIAL_STATE_STORES[path]
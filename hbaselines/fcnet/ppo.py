@@ -3,6 +3,7 @@ import numpy as np
 import tensorflow as tf
 
 from hbaselines.base_policies import Policy
+from hbaselines.fcnet.replay_buffer import RolloutBuffer
 from hbaselines.utils.tf_util import create_fcnet
 from hbaselines.utils.tf_util import create_conv
 from hbaselines.utils.tf_util import get_trainable_vars
@@ -44,6 +45,8 @@ class FeedForwardPolicy(Policy):
         you have to pass a negative value (e.g. -1).
     num_envs : int
         number of environments used to run simulations in parallel.
+    rollout_buffer : hbaselines.fcnet.replay_buffer.RolloutBuffer
+        the storage of the on-policy samples of every environment
     mb_rewards : array_like
         a minibatch of environment rewards
     mb_obs : array_like
@@ -58,8 +61,6 @@ class FeedForwardPolicy(Policy):
         a minibatch of the negative log-likelihood of performed actions
     mb_dones : array_like
         a minibatch of done masks
-    mb_all_obs : array_like
-        a minibatch of full-state observations
     mb_returns : array_like
         a minibatch of expected discounted returns
     last_obs : array_like
@@ -94,8 +95,8 @@ class FeedForwardPolicy(Policy):
     pi_std : tf.Variable
         the expnonential of the pi_logstd term
     neglogp : tf.Variable
-        a differentiable form of the negative log-probability of actions by the
-        current policy
+        a differentiable form of the negative log-probability of the actions
+        in action_ph by the current policy
     value_fn : tf.Variable
         the output from the value function
     value_flat : tf.Variable
@@ -204,17 +205,9 @@ class FeedForwardPolicy(Policy):
         self.cliprange_vf = cliprange_vf
 
         # Create variables to store on-policy data.
-        self.mb_rewards = [[] for _ in range(num_envs)]
-        self.mb_obs = [[] for _ in range(num_envs)]
-        self.mb_contexts = [[] for _ in range(num_envs)]
-        self.mb_actions = [[] for _ in range(num_envs)]
-        self.mb_values = [[] for _ in range(num_envs)]
-        self.mb_neglogpacs = [[] for _ in range(num_envs)]
-        self.mb_dones = [[] for _ in range(num_envs)]
-        self.mb_all_obs = [[] for _ in range(num_envs)]
-        self.mb_returns = [[] for _ in range(num_envs)]
+        self.rollout_buffer = RolloutBuffer(num_envs)
         self.last_obs = [None for _ in range(num_envs)]
-        self.mb_advs = None
+        self._clear_minibatch()
 
         # Compute the shape of the input observation space, which may include
         # the contextual term.
@@ -267,8 +260,8 @@ class FeedForwardPolicy(Policy):
                 self.obs_ph, scope="pi")
             self.pi_std = tf.exp(self.pi_logstd)
 
-            # Create a method the log-probability of current actions.
-            self.neglogp = self._neglogp(self.action)
+            # Create a method the log-probability of performed actions.
+            self.neglogp = self._neglogp(self.action_ph)
 
             # Create the value function.
             self.value_fn = self.make_critic(self.obs_ph, scope="vf")
@@ -443,7 +436,7 @@ class FeedForwardPolicy(Policy):
             print('setting up critic optimizer')
             print_params_shape("{}vf/".format(scope_name), "critic")
 
-        neglogpac = self._neglogp(self.action_ph)
+        neglogpac = self.neglogp
         self.entropy = tf.reduce_sum(
             tf.reshape(self.pi_logstd, [-1])
             + .5 * np.log(2.0 * np.pi * np.e), axis=-1)
@@ -582,24 +575,17 @@ class FeedForwardPolicy(Policy):
             whether the sample is being provided by the evaluation environment.
             If so, the data is not stored in the replay buffer.
         """
-        # Update the minibatch of samples.
-        self.mb_rewards[env_num].append(reward)
-        self.mb_obs[env_num].append(obs0.reshape(1, -1))
-        self.mb_contexts[env_num].append(context0)
-        self.mb_actions[env_num].append(action.reshape(1, -1))
-        self.mb_dones[env_num].append(done)
-
-        # Store information on the values and negative-log likelihood.
-        values, neglogpacs = self.sess.run(
-            [self.value_flat, self.neglogp],
-            feed_dict={
-                self.obs_ph: obs0.reshape(1, -1),
-                self.phase_ph: 0,
-                self.rate_ph: 0.0,
-            }
+        # Update the minibatch of samples. The values and negative-log
+        # likelihoods are computed for all samples at once, see `update`.
+        samples = dict(
+            obs=obs0.flatten(),
+            action=action.flatten(),
+            reward=reward,
+            done=done,
         )
-        self.mb_values[env_num].append(values)
-        self.mb_neglogpacs[env_num].append(neglogpacs)
+        if context0 is not None:
+            samples["context"] = np.asarray(context0).flatten()
+        self.rollout_buffer.add(env_num, **samples)
 
         # Update the last observation (to compute the last value for the GAE
         # expected returns).
@@ -607,57 +593,61 @@ class FeedForwardPolicy(Policy):
 
     def update(self, **kwargs):
         """See parent class."""
-        # In case not all environment numbers were used, reduce the shape of
-        # the datasets.
-        indices = [
+        # In case not all environment numbers were used, only use the
+        # samples of the environments that were.
+        env_nums = [
             i for i in range(self.num_envs) if self.last_obs[i] is not None]
-        num_envs = len(indices)
-
-        self.mb_rewards = self._sample(self.mb_rewards, indices)
-        self.mb_obs = self._sample(self.mb_obs, indices)
-        self.mb_contexts = self._sample(self.mb_contexts, indices)
-        self.mb_actions = self._sample(self.mb_actions, indices)
-        self.mb_values = self._sample(self.mb_values, indices)
-        self.mb_dones = self._sample(self.mb_dones, indices)
-        self.mb_all_obs = self._sample(self.mb_all_obs, indices)
-        self.mb_returns = self._sample(self.mb_returns, indices)
-        self.last_obs = self._sample(self.last_obs, indices)
-
-        # Compute the last estimated value.
-        last_values = [
-            self.sess.run(
-                self.value_flat,
-                feed_dict={
-                    self.obs_ph: self.last_obs[env_num],
-                    self.phase_ph: 0,
-                    self.rate_ph: 0.0,
-                })
-            for env_num in range(num_envs)
-        ]
+        samples, num_steps = self.rollout_buffer.get(env_nums)
+
+        # Compute the estimated values and negative-log likelihoods of all
+        # samples in a single pass. The policy has not been updated since the
+        # samples were collected.
+        mask = np.arange(samples["obs"].shape[1]) < num_steps[:, None]
+        samples["value"] = np.zeros(mask.shape, dtype=np.float32)
+        samples["neglogp"] = np.zeros(mask.shape, dtype=np.float32)
+        samples["value"][mask], samples["neglogp"][mask] = self.sess.run(
+            [self.value_flat, self.neglogp],
+            feed_dict={
+                self.obs_ph: self._get_obs(
+                    samples["obs"][mask],
+                    samples["context"][mask] if "context" in samples
+                    else None,
+                    axis=1),
+                self.action_ph: samples["action"][mask],
+                self.phase_ph: 0,
+                self.rate_ph: 0.0,
+            })
+
+        # Compute the last estimated values of all environments.
+        last_values = self.sess.run(
+            self.value_flat,
+            feed_dict={
+                self.obs_ph: np.concatenate(
+                    [self.last_obs[i] for i in env_nums], axis=0),
+                self.phase_ph: 0,
+                self.rate_ph: 0.0,
+            })
 
         (self.mb_obs,
          self.mb_contexts,
          self.mb_actions,
          self.mb_values,
          self.mb_neglogpacs,
-         self.mb_all_obs,
          self.mb_rewards,
          self.mb_returns,
          self.mb_dones,
          self.mb_advs, n_steps) = process_minibatch(
-            mb_obs=self.mb_obs,
-            mb_contexts=self.mb_contexts,
-            mb_actions=self.mb_actions,
-            mb_values=self.mb_values,
-            mb_neglogpacs=self.mb_neglogpacs,
-            mb_all_obs=self.mb_all_obs,
-            mb_rewards=self.mb_rewards,
-            mb_returns=self.mb_returns,
-            mb_dones=self.mb_dones,
+            mb_obs=samples["obs"],
+            mb_contexts=samples.get("context"),
+            mb_actions=samples["action"],
+            mb_values=samples["value"],
+            mb_neglogpacs=samples["neglogp"],
+            mb_rewards=samples["reward"],
+            mb_dones=samples["done"],
+            mb_lengths=num_steps,
             last_values=last_values,
             gamma=self.gamma,
             lam=self.lam,
-            num_envs=num_envs,
         )
 
         # Run the optimization procedure.
@@ -671,7 +661,7 @@ class FeedForwardPolicy(Policy):
                 mbinds = inds[start:end]
                 self.update_from_batch(
                     obs=self.mb_obs[mbinds],
-                    context=None if self.mb_contexts[0] is None
+                    context=None if self.mb_contexts is None
                     else self.mb_contexts[mbinds],
                     returns=self.mb_returns[mbinds],
                     actions=self.mb_actions[mbinds],
@@ -724,8 +714,7 @@ class FeedForwardPolicy(Policy):
     def get_td_map(self):
         """See parent class."""
         # Add the contextual observation, if applicable.
-        context = None if self.mb_contexts[0] is None else self.mb_contexts
-        obs = self._get_obs(self.mb_obs, context, axis=1)
+        obs = self._get_obs(self.mb_obs, self.mb_contexts, axis=1)
 
         td_map = self.get_td_map_from_batch(
             obs=obs.copy(),
@@ -737,17 +726,9 @@ class FeedForwardPolicy(Policy):
         )
 
         # Clear memory
-        self.mb_rewards = [[] for _ in range(self.num_envs)]
-        self.mb_obs = [[] for _ in range(self.num_envs)]
-        self.mb_contexts = [[] for _ in range(self.num_envs)]
-        self.mb_actions = [[] for _ in range(self.num_envs)]
-        self.mb_values = [[] for _ in range(self.num_envs)]
-        self.mb_neglogpacs = [[] for _ in range(self.num_envs)]
-        self.mb_dones = [[] for _ in range(self.num_envs)]
-        self.mb_all_obs = [[] for _ in range(self.num_envs)]
-        self.mb_returns = [[] for _ in range(self.num_envs)]
+        self.rollout_buffer.clear()
         self.last_obs = [None for _ in range(self.num_envs)]
-        self.mb_advs = None
+        self._clear_minibatch()
 
         return td_map
 
@@ -770,7 +751,14 @@ class FeedForwardPolicy(Policy):
             self.rate_ph: 0.0,
         }
 
-    @staticmethod
-    def _sample(vals, indices):
-        """Sample indices from a list."""
-        return [vals[i] for i in range(len(vals)) if i in indices]
+    def _clear_minibatch(self):
+        """Remove the processed minibatch of samples."""
+        self.mb_rewards = None
+        self.mb_obs = None
+        self.mb_contexts = None
+        self.mb_actions = None
+        self.mb_values = None
+        self.mb_neglogpacs = None
+        self.mb_dones = None
+        self.mb_returns = None
+        self.mb_advs = None
@@ -1,11 +1,481 @@
 """Script containing the ReplayBuffer object."""
+import os
 import numpy as np
 
+from hbaselines.utils.misc import create_array
+from hbaselines.utils.misc import ensure_dir
+from hbaselines.utils.segment_tree import SumSegmentTree
+from hbaselines.utils.segment_tree import MinSegmentTree
+
+
+class NextObservations(object):
+    """Next observations of a replay buffer with a sequential-frame layout.
+
+    Within an episode, the next observation of a transition is the observation
+    of the following transition of the same environment, and is therefore not
+    stored a second time. Instead, the index of this following transition is
+    stored in a preallocated array. The next observations of the last
+    transition of every episode are kept in a side table, and those of the
+    most recent transition of every environment are kept until the next
+    transition of that environment is added.
+
+    A transition is considered to continue the previous transition of its
+    environment if its observations are equal to the next observations of the
+    previous transition. Transitions of multiple environments may therefore be
+    interleaved in the buffer.
+
+    Attributes
+    ----------
+    next_idx : array_like
+        the index of the transition whose observations are the next
+        observations of every transition, or -1 if the next observations are
+        kept in the side table or are pending
+    table : dict < int, tuple of array_like >
+        the next observations of every field, for the indices of the last
+        transitions of completed episodes
+    pending : dict < int, (int, tuple of array_like) >
+        the index and next observations of every field of the most recent
+        transition of every environment
+    """
+
+    def __init__(self, buffer_size):
+        """Instantiate the object.
+
+        Parameters
+        ----------
+        buffer_size : int
+            Max number of transitions stored in the buffer
+        """
+        self._maxsize = buffer_size
+        self.next_idx = np.full(buffer_size, -1, dtype=np.int64)
+        self.table = {}
+        self.pending = {}
+
+        # the environment number of the pending transition at every index
+        self._pending_env = {}
+        # the arrays that store the pending next observations of every
+        # environment, which are reused until the episode ends
+        self._pending_obs = {}
+
+    def add(self, idx, obs_t, obs_tp1, env_num=0):
+        """Record the next observations of a new transition.
+
+        Parameters
+        ----------
+        idx : int
+            the index of the new transition
+        obs_t : list of array_like
+            the observations of every field of the transition
+        obs_tp1 : list of array_like
+            the next observations of every field of the transition
+        env_num : int
+            the environment number of the transition. The transition may only
+            continue the previous transition of the same environment.
+        """
+        # Remove the transition that is being overwritten.
+        self.next_idx[idx] = -1
+        self.table.pop(idx, None)
+        self._pop_pending(idx)
+
+        # If the transition continues the previous one of its environment, the
+        # next observations of the previous transition are the observations at
+        # this index. Otherwise, the previous transition ended an episode.
+        prev = self.pending.get(env_num)
+        if prev is not None:
+            prev_idx, prev_obs_tp1 = prev
+            if all(np.array_equal(a, np.asarray(b, dtype=np.float32))
+                   for a, b in zip(prev_obs_tp1, obs_t)):
+                self.next_idx[prev_idx] = idx
+            else:
+                self._end_episode(env_num)
+
+        self._set_pending(env_num, idx, obs_tp1)
+
+    def add_batch(self, idxes, obs_t, obs_tp1, env_num=0):
+        """Record the next observations of a batch of new transitions.
+
+        The transitions are added in order, with the same outcome as calling
+        `add` for each of them. The continuity of the transitions is checked
+        for the entire batch at once.
+
+        Parameters
+        ----------
+        idxes : array_like
+            the indices of the new transitions
+        obs_t : list of array_like
+            the observations of every field, with one row per transition
+        obs_tp1 : list of array_like
+            the next observations of every field, with one row per transition
+        env_num : int or array_like
+            the environment number of every transition
+        """
+        idxes = np.asarray(idxes, dtype=np.int64)
+        num_samples = len(idxes)
+        if num_samples == 0:
+            return
+        env_num = np.broadcast_to(env_num, (num_samples,))
+        obs_t = [np.asarray(obs, dtype=np.float32).reshape(num_samples, -1)
+                 for obs in obs_t]
+        obs_tp1 = [np.asarray(obs, dtype=np.float32) for obs in obs_tp1]
+
+        # Remove the transitions that are being overwritten. Previous
+        # transitions of an environment that are overwritten by the batch are
+        # never continued by its transitions. The indices of the batch are
+        # assumed to be unique.
+        self.next_idx[idxes] = -1
+        overwritten = set(idxes.tolist())
+        for idx in overwritten & self.table.keys():
+            del self.table[idx]
+        for idx in overwritten & self._pending_env.keys():
+            self._pop_pending(idx)
+
+        # Match every transition with the previous transition of its
+        # environment within the batch.
+        order = np.argsort(env_num, kind="stable")
+        same_env = env_num[order[1:]] == env_num[order[:-1]]
+        cur, prev = order[1:][same_env], order[:-1][same_env]
+
+        # Check the continuity of all transitions with a previous transition
+        # in the batch at once.
+        continues = np.ones(len(cur), dtype=bool)
+        for obs_t_i, obs_tp1_i in zip(obs_t, obs_tp1):
+            obs_tp1_i = obs_tp1_i.reshape(num_samples, -1)
+            continues &= np.all(obs_t_i[cur] == obs_tp1_i[prev], axis=1)
+        self.next_idx[idxes[prev[continues]]] = idxes[cur[continues]]
+        for j in prev[~continues]:
+            self.table[int(idxes[j])] = tuple(obs[j].copy() for obs in obs_tp1)
+
+        # Check the continuity of the first transition of every environment
+        # with its pending transition, and replace the pending transition with
+        # the last transition of every environment.
+        first = np.ones(num_samples, dtype=bool)
+        first[cur] = False
+        last = np.ones(num_samples, dtype=bool)
+        last[prev] = False
+        for j, k in zip(np.flatnonzero(first[order]), np.flatnonzero(
+                last[order])):
+            j, k = order[j], order[k]
+            num = env_num[j].item()
+            pending = self.pending.get(num)
+            if pending is not None:
+                if all(np.array_equal(a, obs[j])
+                       for a, obs in zip(pending[1], obs_t)):
+                    self.next_idx[pending[0]] = idxes[j]
+                else:
+                    self._end_episode(num)
+            self._set_pending(
+                num, int(idxes[k]), [obs[k] for obs in obs_tp1])
+
+    def get(self, idxes, obs):
+        """Return the next observations of a batch of transitions.
+
+        Parameters
+        ----------
+        idxes : array_like
+            the indices of the transitions
+        obs : list of array_like
+            the observations of every field, for all indices in the buffer
+
+        Returns
+        -------
+        list of array_like
+            the next observations of every field, for the given indices
+        """
+        idxes = np.asarray(idxes)
+        next_idx = self.next_idx[idxes]
+        missing = np.flatnonzero(next_idx < 0)
+
+        obs_tp1 = [obs_i[np.where(next_idx < 0, idxes, next_idx)]
+                   for obs_i in obs]
+
+        for j in missing:
+            idx = int(idxes[j])
+            obs_tp1_j = self.table.get(idx)
+            if obs_tp1_j is None:
+                obs_tp1_j = self.pending[self._pending_env[idx]][1]
+            for obs_tp1_i, obs_tp1_ij in zip(obs_tp1, obs_tp1_j):
+                obs_tp1_i[j] = obs_tp1_ij
+
+        return obs_tp1
+
+    def _set_pending(self, env_num, idx, obs_tp1):
+        """Store the next observations of the most recent transition.
+
+        The next observations are copied into the arrays of the environment,
+        which are only allocated once per episode.
+        """
+        pending_obs = self._pending_obs.get(env_num)
+        if pending_obs is None:
+            pending_obs = tuple(
+                np.array(obs, dtype=np.float32) for obs in obs_tp1)
+            self._pending_obs[env_num] = pending_obs
+        else:
+            for pending_obs_i, obs in zip(pending_obs, obs_tp1):
+                pending_obs_i[...] = obs
+
+        prev = self.pending.get(env_num)
+        if prev is not None:
+            del self._pending_env[prev[0]]
+        self.pending[env_num] = (idx, pending_obs)
+        self._pending_env[idx] = env_num
+
+    def _pop_pending(self, idx):
+        """Remove the pending transition at an index, if any."""
+        env_num = self._pending_env.pop(idx, None)
+        if env_num is not None:
+            del self.pending[env_num]
+
+    def _end_episode(self, env_num):
+        """Move the pending next observations of an environment to the table.
+
+        The arrays of the next observations are handed over to the side table,
+        and new arrays are allocated for the next episode.
+        """
+        idx, obs_tp1 = self.pending.pop(env_num)
+        del self._pending_env[idx]
+        del self._pending_obs[env_num]
+        self.table[idx] = obs_tp1
+
+    def save(self, save_path):
+        """Save the successor indices and side table.
+
+        The pending next observations are saved in the side table.
+        """
+        table = dict(self.table)
+        table.update(dict(self.pending.values()))
+
+        idxes = sorted(table.keys())
+        np.save(save_path + '.next_obs_idx.npy', self.next_idx)
+        np.save(save_path + '.next_idx.npy', np.array(idxes, dtype=np.int64))
+        for i, obs_tp1 in enumerate(zip(*[table[j] for j in idxes])):
+            np.save(save_path + '.next_obs_{}.npy'.format(i), obs_tp1)
+
+    def load(self, save_path, num_fields):
+        """Load the successor indices and side table.
+
+        Parameters
+        ----------
+        save_path : str
+            the prefix of the saved files
+        num_fields : int
+            the number of observation fields
+        """
+        self.next_idx[:] = np.load(save_path + '.next_obs_idx.npy')
+        self.pending = {}
+        self._pending_env = {}
+        self._pending_obs = {}
+
+        idxes = np.load(save_path + '.next_idx.npy')
+        if len(idxes) == 0:
+            self.table = {}
+            return
+
+        obs_tp1 = [np.load(save_path + '.next_obs_{}.npy'.format(i))
+                   for i in range(num_fields)]
+        self.table = {
+            int(idx): tuple(obs_i[j] for obs_i in obs_tp1)
+            for j, idx in enumerate(idxes)}
+
+
+class QuantizedArray(object):
+    """Two-dimensional float array stored with reduced precision.
+
+    The columns of the array are split into consecutive segments, each of
+    which is stored with its own data type:
+
+    * "float32": stored without loss of precision
+    * "float16": stored in half precision, for bounded features
+    * "uint8": quantized to 256 levels over the range [0, 1], for normalized
+      image channels
+
+    The content is converted back to float32 when the array is read, so that
+    the array may be used in place of a float32 numpy array of the same shape
+    for row-wise reads and writes.
+
+    Attributes
+    ----------
+    shape : tuple of int
+        the shape of the (float32) array
+    segments : list of (int, int, str)
+        the first column, last column (exclusive), and data type of every
+        segment
+    arrays : list of array_like
+        the storage of every segment
+    """
+
+    def __init__(self, shape, segments, path=None):
+        """Instantiate the array.
+
+        Parameters
+        ----------
+        shape : tuple of int
+            the shape of the (float32) array, as (num_rows, num_columns)
+        segments : list of (int or None, str)
+            the number of columns and data type of every segment, in order. A
+            number of columns of None assigns all remaining columns to the
+            segment.
+        path : str or None
+            the prefix of the .npy files of the memory-mapped segments, see
+            `create_array`. If set to None, the segments are stored in memory.
+        """
+        self.shape = tuple(shape)
+        self.segments = []
+        self.arrays = []
+
+        start = 0
+        for i, (num_columns, dtype) in enumerate(segments):
+            if num_columns is None:
+                num_columns = self.shape[1] - start
+            end = min(start + num_columns, self.shape[1])
+            assert dtype in ("float32", "float16", "uint8"), \
+                "Unknown storage type: {}".format(dtype)
+
+            self.segments.append((start, end, dtype))
+            self.arrays.append(create_array(
+                shape=(self.shape[0], end - start),
+                dtype=np.dtype(dtype),
+                path=None if path is None else "{}.{}.npy".format(path, i)))
+            start = end
+
+        assert start == self.shape[1], \
+            "The segments do not cover all columns of the array."
+
+    def __len__(self):
+        """Return the number of rows."""
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        """Return the content of the array as a float32 numpy array."""
+        array = self[:]
+        return array if dtype is None else array.astype(dtype)
+
+    def __getitem__(self, key):
+        """Return the (float32) content of a set of rows and columns."""
+        rows, columns = key if isinstance(key, tuple) else (key, slice(None))
+        values = [array[rows] for array in self.arrays]
+
+        out = np.empty(values[0].shape[:-1] + (self.shape[1],), np.float32)
+        for (start, end, dtype), value in zip(self.segments, values):
+            if dtype == "uint8":
+                np.multiply(value, 1. / 255., out=out[..., start:end])
+            else:
+                out[..., start:end] = value
+
+        return out[..., columns]
+
+    def __setitem__(self, key, value):
+        """Set the content of a set of rows.
+
+        Only the rows may be indexed. Column indices, if provided, must select
+        all columns.
+        """
+        rows = key[0] if isinstance(key, tuple) else key
+        value = np.asarray(value, dtype=np.float32)
+
+        for (start, end, dtype), array in zip(self.segments, self.arrays):
+            value_i = value[..., start:end]
+            if dtype == "uint8":
+                value_i = np.round(np.clip(value_i, 0., 1.) * 255.)
+            array[rows] = value_i
+
+    def flush(self):
+        """Write the content of memory-mapped segments to disk."""
+        for array in self.arrays:
+            if isinstance(array, np.memmap):
+                array.flush()
+
+
+def ring_slices(start, num_samples, buffer_size):
+    """Return the slices written by a batch of samples in a ring buffer.
+
+    Parameters
+    ----------
+    start : int
+        the index of the first sample in the buffer
+    num_samples : int
+        the number of samples. Must not exceed the buffer size.
+    buffer_size : int
+        the number of elements in the buffer
+
+    Returns
+    -------
+    list of (slice, slice)
+        the slices of the buffer and of the batch of samples. A second pair
+        of slices is included if the samples wrap around the end of the
+        buffer.
+    """
+    assert num_samples <= buffer_size, \
+        "Cannot add more samples than the size of the buffer."
+
+    end = min(start + num_samples, buffer_size)
+    slices = [(slice(start, end), slice(0, end - start))]
+    if end - start < num_samples:
+        slices.append(
+            (slice(0, num_samples - end + start),
+             slice(end - start, num_samples)))
+
+    return slices
+
+
+def create_buffer_array(shape, storage_dtype=None, path=None):
+    """Create a float32 array of a replay buffer, optionally quantized.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        the shape of the array
+    storage_dtype : str or list of (int or None, str) or None
+        the data type used to store the array, or the number of columns and
+        data type of every segment of a two-dimensional array, see
+        QuantizedArray. If set to None, the array is stored as float32.
+    path : str or None
+        the prefix of the .npy file(s) of the memory-mapped array, without the
+        extension. If set to None, the array is stored in memory.
+
+    Returns
+    -------
+    array_like
+        the array
+    """
+    if isinstance(storage_dtype, str):
+        storage_dtype = [(None, storage_dtype)]
+
+    if storage_dtype is None or \
+            all(dtype == "float32" for _, dtype in storage_dtype):
+        return create_array(
+            shape=shape,
+            dtype=np.float32,
+            path=None if path is None else "{}.npy".format(path))
+    else:
+        return QuantizedArray(shape, storage_dtype, path)
+
 
 class ReplayBuffer(object):
-    """Experience replay buffer."""
+    """Experience replay buffer.
 
-    def __init__(self, buffer_size, batch_size, obs_dim, ac_dim):
+    The buffer uses a sequential-frame layout, in which the next observation
+    of a transition is only stored if it is not the observation of the
+    following transition of the same environment. See NextObservations.
+
+    Attributes
+    ----------
+    storage_path : str or None
+        the directory of the memory-mapped files that store the content of the
+        buffer. None if the buffer is stored in memory.
+    next_obs : NextObservations
+        the next observations that are not stored in `obs_t`
+    rng : numpy.random.RandomState or module
+        the random number generator used to sample batches. Defaults to the
+        global generator of numpy.
+    """
+
+    def __init__(self,
+                 buffer_size,
+                 batch_size,
+                 obs_dim,
+                 ac_dim,
+                 storage_path=None,
+                 storage_dtype=None):
         """Instantiate a ring buffer (FIFO).
 
         Parameters
@@ -19,26 +489,60 @@ class ReplayBuffer(object):
             number of elements in the observations
         ac_dim : int
             number of elements in the actions
+        storage_path : str or None
+            the directory in which the content of the buffer is stored as
+            memory-mapped files. If these files already exist, they are
+            reopened in place. If set to None, the buffer is stored in memory.
+        storage_dtype : dict or None
+            the reduced-precision data type of the observations, under the key
+            "obs_t". This is either a data type ("float32", "float16", or
+            "uint8") or a list of (number of columns, data type) segments, see
+            QuantizedArray. The observations are converted back to float32
+            when sampled. If set to None, all elements are stored as float32.
         """
         self._maxsize = buffer_size
         self._size = 0
         self._current_idx = 0
         self._next_idx = 0
         self._batch_size = batch_size
+        self.storage_path = storage_path
+        self.storage_dtype = storage_dtype or {}
+
+        if storage_path is not None:
+            ensure_dir(storage_path)
+
+        def _create(name, shape):
+            return create_buffer_array(
+                shape=shape,
+                storage_dtype=self.storage_dtype.get(name),
+                path=None if storage_path is None else os.path.join(
+                    storage_path, name))
 
-        self.obs_t = np.zeros((buffer_size, obs_dim), dtype=np.float32)
-        self.action_t = np.zeros((buffer_size, ac_dim), dtype=np.float32)
-        self.reward = np.zeros(buffer_size, dtype=np.float32)
-        self.obs_tp1 = np.zeros((buffer_size, obs_dim), dtype=np.float32)
-        self.done = np.zeros(buffer_size, dtype=np.float32)
+        self.obs_t = _create("obs_t", (buffer_size, obs_dim))
+        self.action_t = _create("action_t", (buffer_size, ac_dim))
+        self.reward = _create("reward", (buffer_size,))
+        self.done = _create("done", (buffer_size,))
+        self.next_obs = NextObservations(buffer_size)
+        self.rng = np.random
 
     def save(self, save_path):
-        """Save parameters for the replay buffer."""
-        np.save(save_path + '.obs_t.npy', self.obs_t)
-        np.save(save_path + '.action_t.npy', self.action_t)
-        np.save(save_path + '.reward.npy', self.reward)
-        np.save(save_path + '.obs_tp1.npy', self.obs_tp1)
-        np.save(save_path + '.done.npy', self.done)
+        """Save parameters for the replay buffer.
+
+        If the buffer is stored in memory-mapped files, these files are
+        flushed to disk in place, and only the configuration of the buffer is
+        saved under `save_path`.
+        """
+        if self.storage_path is None:
+            np.save(save_path + '.obs_t.npy', self.obs_t)
+            np.save(save_path + '.action_t.npy', self.action_t)
+            np.save(save_path + '.reward.npy', self.reward)
+            np.save(save_path + '.done.npy', self.done)
+        else:
+            for array in [self.obs_t, self.action_t, self.reward, self.done]:
+                array.flush()
+
+        self.next_obs.save(save_path)
+
         np.save(save_path + '.config.npy', np.array([
             self._maxsize,
             self._size,
@@ -47,12 +551,20 @@ class ReplayBuffer(object):
             self._batch_size]))
 
     def load(self, save_path):
-        """Load parameters for the replay buffer."""
-        self.obs_t = np.load(save_path + '.obs_t.npy')
-        self.action_t = np.load(save_path + '.action_t.npy')
-        self.reward = np.load(save_path + '.reward.npy')
-        self.obs_tp1 = np.load(save_path + '.obs_tp1.npy')
-        self.done = np.load(save_path + '.done.npy')
+        """Load parameters for the replay buffer.
+
+        If the buffer is stored in memory-mapped files, the content of these
+        files (reopened in place when the buffer was created) is used, and
+        only the configuration of the buffer is loaded from `save_path`.
+        """
+        if self.storage_path is None:
+            self.obs_t[:] = np.load(save_path + '.obs_t.npy')
+            self.action_t = np.load(save_path + '.action_t.npy')
+            self.reward = np.load(save_path + '.reward.npy')
+            self.done = np.load(save_path + '.done.npy')
+
+        self.next_obs.load(save_path, num_fields=1)
+
         (self._maxsize,
          self._size,
          self._current_idx,
@@ -88,7 +600,7 @@ class ReplayBuffer(object):
         """
         return len(self) == self.buffer_size
 
-    def add(self, obs_t, action, reward, obs_tp1, done):
+    def add(self, obs_t, action, reward, obs_tp1, done, env_num=0):
         """Add a new transition to the buffer.
 
         Parameters
@@ -103,18 +615,61 @@ class ReplayBuffer(object):
             the current observation
         done : float
             is the episode done
+        env_num : int
+            the environment number of the transition
         """
         self.obs_t[self._next_idx, :] = obs_t
         self.action_t[self._next_idx, :] = action
         self.reward[self._next_idx] = reward
-        self.obs_tp1[self._next_idx, :] = obs_tp1
         self.done[self._next_idx] = done
+        self.next_obs.add(self._next_idx, [obs_t], [obs_tp1], env_num)
 
         # Increment the next index and size terms
         self._current_idx = self._next_idx
         self._next_idx = (self._next_idx + 1) % self._maxsize
         self._size = min(self._size + 1, self._maxsize)
 
+    def add_batch(self, obs_t, action, reward, obs_tp1, done, env_num=0):
+        """Add a batch of new transitions to the buffer.
+
+        The transitions are written with one slice assignment per element (two
+        if the batch wraps around the end of the buffer), and are stored in
+        the same order as if they were added one at a time.
+
+        Parameters
+        ----------
+        obs_t : array_like
+            the last observations, with one row per transition
+        action : array_like
+            the actions, with one row per transition
+        reward : array_like
+            the rewards of the transitions
+        obs_tp1 : array_like
+            the current observations, with one row per transition
+        done : array_like
+            the done masks of the transitions
+        env_num : int or array_like
+            the environment number of every transition
+        """
+        obs_t, action, reward, obs_tp1, done = map(
+            np.asarray, (obs_t, action, reward, obs_tp1, done))
+
+        num_samples = len(obs_t)
+        idxes = (self._next_idx + np.arange(num_samples)) % self._maxsize
+
+        for buffer_slice, batch_slice in ring_slices(
+                self._next_idx, num_samples, self._maxsize):
+            self.obs_t[buffer_slice, :] = obs_t[batch_slice]
+            self.action_t[buffer_slice, :] = action[batch_slice]
+            self.reward[buffer_slice] = reward[batch_slice]
+            self.done[buffer_slice] = done[batch_slice]
+        self.next_obs.add_batch(idxes, [obs_t], [obs_tp1], env_num)
+
+        # Increment the next index and size terms
+        self._current_idx = int(idxes[-1])
+        self._next_idx = (self._next_idx + num_samples) % self._maxsize
+        self._size = min(self._size + num_samples, self._maxsize)
+
     def sample(self):
         """Sample a batch of experiences.
 
@@ -132,7 +687,305 @@ class ReplayBuffer(object):
             done_mask[i] = 1 if executing act_batch[i] resulted in the end of
             an episode and 0 otherwise.
         """
-        idxes = np.random.randint(0, self._size, size=self._batch_size)
+        idxes = self.rng.randint(0, self._size, size=self._batch_size)
+
+        if self.storage_path is not None:
+            # Read the memory-mapped files in increasing order of the indices,
+            # to reduce the number of page faults and random disk accesses.
+            idxes.sort()
+
+        return self._encode_sample(idxes)
+
+    def _encode_sample(self, idxes):
+        """Convert the indices to appropriate samples."""
+        obs_tp1, = self.next_obs.get(idxes, [self.obs_t])
 
         return self.obs_t[idxes, :], self.action_t[idxes, :], \
-            self.reward[idxes], self.obs_tp1[idxes, :], self.done[idxes]
+            self.reward[idxes], obs_tp1, self.done[idxes]
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """Prioritized experience replay buffer.
+
+    Transitions are sampled with a probability proportional to their priority
+    raised to the power alpha, and the bias introduced by this non-uniform
+    sampling is corrected by importance sampling weights. The priorities are
+    stored in array-based segment trees, which support batched sampling and
+    priority updates in O(log N) operations per element.
+
+    See: https://arxiv.org/abs/1511.05952
+    """
+
+    def __init__(self,
+                 buffer_size,
+                 batch_size,
+                 obs_dim,
+                 ac_dim,
+                 storage_path=None,
+                 storage_dtype=None,
+                 alpha=0.6,
+                 beta=0.4,
+                 eps=1e-6):
+        """Instantiate a prioritized ring buffer (FIFO).
+
+        Parameters
+        ----------
+        buffer_size : int
+            Max number of transitions to store in the buffer. When the buffer
+            overflows the old memories are dropped.
+        batch_size : int
+            number of elements that are to be returned as a batch
+        obs_dim : int
+            number of elements in the observations
+        ac_dim : int
+            number of elements in the actions
+        storage_path : str or None
+            the directory in which the content of the buffer is stored as
+            memory-mapped files. The priorities are always stored in memory.
+        storage_dtype : dict or None
+            the reduced-precision data type of the observations. See parent
+            class.
+        alpha : float
+            how much prioritization is used (0 - no prioritization, 1 - full
+            prioritization)
+        beta : float
+            to what degree to use importance weights (0 - no corrections, 1 -
+            full correction)
+        eps : float
+            small value that is added to the priorities to ensure that every
+            transition can be sampled
+        """
+        super(PrioritizedReplayBuffer, self).__init__(
+            buffer_size=buffer_size,
+            batch_size=batch_size,
+            obs_dim=obs_dim,
+            ac_dim=ac_dim,
+            storage_path=storage_path,
+            storage_dtype=storage_dtype,
+        )
+
+        self.alpha = alpha
+        self.beta = beta
+        self.eps = eps
+
+        self._it_sum = SumSegmentTree(buffer_size)
+        self._it_min = MinSegmentTree(buffer_size)
+        self._max_priority = 1.0
+
+    def save(self, save_path):
+        """See parent class."""
+        super(PrioritizedReplayBuffer, self).save(save_path)
+        np.save(save_path + '.priority.npy',
+                self._it_sum[np.arange(self._size)])
+
+    def load(self, save_path):
+        """See parent class."""
+        super(PrioritizedReplayBuffer, self).load(save_path)
+        priority = np.load(save_path + '.priority.npy')
+        self._it_sum[np.arange(len(priority))] = priority
+        self._it_min[np.arange(len(priority))] = priority
+        if len(priority) > 0:
+            self._max_priority = np.max(priority) ** (1 / self.alpha)
+
+    def add(self, obs_t, action, reward, obs_tp1, done, env_num=0):
+        """See parent class.
+
+        New transitions are assigned the maximum priority seen so far, to
+        ensure that they are sampled at least once.
+        """
+        idx = self._next_idx
+
+        super(PrioritizedReplayBuffer, self).add(
+            obs_t, action, reward, obs_tp1, done, env_num)
+
+        self._it_sum[idx] = self._max_priority ** self.alpha
+        self._it_min[idx] = self._max_priority ** self.alpha
+
+    def add_batch(self, obs_t, action, reward, obs_tp1, done, env_num=0):
+        """See parent class.
+
+        New transitions are assigned the maximum priority seen so far, to
+        ensure that they are sampled at least once.
+        """
+        idxes = (self._next_idx + np.arange(len(obs_t))) % self._maxsize
+
+        super(PrioritizedReplayBuffer, self).add_batch(
+            obs_t, action, reward, obs_tp1, done, env_num)
+
+        self._it_sum[idxes] = self._max_priority ** self.alpha
+        self._it_min[idxes] = self._max_priority ** self.alpha
+
+    def sample(self, with_weights=False):
+        """Sample a batch of experiences.
+
+        The batch is stratified, with one element sampled from each of
+        `batch_size` equally sized ranges of the cumulative priorities.
+
+        Parameters
+        ----------
+        with_weights : bool
+            whether to return the importance sampling weights and the indices
+            of the sampled transitions as well
+
+        Returns
+        -------
+        array_like
+            batch of observations
+        array_like
+            batch of actions executed given obs_batch
+        array_like
+            rewards received as results of executing act_batch
+        array_like
+            next set of observations seen after executing act_batch
+        numpy bool
+            done_mask[i] = 1 if executing act_batch[i] resulted in the end of
+            an episode and 0 otherwise.
+        array_like
+            importance sampling weights of every element in the batch,
+            normalized by the maximum possible weight. Only returned if
+            `with_weights` is set to True.
+        array_like
+            the indices of the sampled transitions, to be passed to
+            `update_priorities`. Only returned if `with_weights` is set to
+            True.
+        """
+        total = self._it_sum.reduce()
+        prefixsums = (np.arange(self._batch_size)
+                      + self.rng.uniform(size=self._batch_size)) \
+            * total / self._batch_size
+        idxes = np.minimum(
+            self._it_sum.find_prefixsum_idx(prefixsums), self._size - 1)
+
+        batch = self._encode_sample(idxes)
+
+        if not with_weights:
+            return batch
+
+        # Compute the importance sampling weights, normalized by the weight of
+        # the transition with the lowest priority.
+        p_min = self._it_min.reduce() / total
+        p_sample = self._it_sum[idxes] / total
+        weights = (p_sample / p_min) ** -self.beta
+
+        return batch + (weights.astype(np.float32), idxes)
+
+    def update_priorities(self, idxes, td_errors):
+        """Update the priorities of a batch of sampled transitions.
+
+        Parameters
+        ----------
+        idxes : array_like
+            the indices of the transitions, as returned by `sample`
+        td_errors : array_like
+            the TD errors of the transitions. The absolute value of these
+            terms (plus a small constant) are used as the new priorities.
+        """
+        priorities = np.abs(np.ravel(td_errors)) + self.eps
+
+        self._it_sum[idxes] = priorities ** self.alpha
+        self._it_min[idxes] = priorities ** self.alpha
+
+        self._max_priority = max(self._max_priority, np.max(priorities))
+
+
+class RolloutBuffer(object):
+    """Storage of the on-policy samples of multiple environments.
+
+    The samples of every field are written in place into a preallocated array
+    of shape (num_envs, capacity, ...), with the steps of every environment
+    stored along the second axis. The arrays are created when the first
+    sample is added, and their capacity is doubled whenever an environment
+    exceeds it.
+
+    Attributes
+    ----------
+    num_envs : int
+        number of environments used to run simulations in parallel
+    capacity : int
+        the number of steps that can be stored per environment
+    num_steps : array_like
+        the number of steps stored for every environment
+    storage : dict < str, array_like >
+        the array of every field
+    """
+
+    def __init__(self, num_envs, capacity=128):
+        """Instantiate the storage.
+
+        Parameters
+        ----------
+        num_envs : int
+            number of environments used to run simulations in parallel
+        capacity : int
+            the initial number of steps that can be stored per environment
+        """
+        self.num_envs = num_envs
+        self.capacity = capacity
+        self.num_steps = np.zeros(num_envs, dtype=np.int64)
+        self.storage = {}
+
+    def add(self, env_num, **samples):
+        """Add the samples of a single step of an environment.
+
+        Parameters
+        ----------
+        env_num : int
+            the environment number
+        samples : dict < str, array_like >
+            the sample of every field. The set of fields and their shapes must
+            remain the same between calls.
+        """
+        idx = self.num_steps[env_num]
+
+        if idx == self.capacity:
+            # Double the capacity of all arrays.
+            self.capacity *= 2
+            for key, array in self.storage.items():
+                new_array = np.zeros(
+                    (self.num_envs, self.capacity) + array.shape[2:],
+                    dtype=array.dtype)
+                new_array[:, :idx] = array
+                self.storage[key] = new_array
+
+        for key, val in samples.items():
+            if key not in self.storage:
+                val = np.asarray(val, dtype=np.float32)
+                self.storage[key] = np.zeros(
+                    (self.num_envs, self.capacity) + val.shape,
+                    dtype=np.float32)
+            self.storage[key][env_num, idx] = val
+
+        self.num_steps[env_num] += 1
+
+    def get(self, env_nums):
+        """Return the samples of a subset of the environments.
+
+        Parameters
+        ----------
+        env_nums : list of int
+            the environment numbers
+
+        Returns
+        -------
+        dict < str, array_like >
+            the samples of every field, of shape (len(env_nums), n_steps, ...)
+            with n_steps the maximum number of steps of these environments.
+            The elements after the last step of an environment are
+            unspecified.
+        array_like
+            the number of steps of every environment
+        """
+        num_steps = self.num_steps[env_nums]
+        max_steps = num_steps.max(initial=0)
+
+        return {
+            key: array[env_nums, :max_steps]
+            for key, array in self.storage.items()
+        }, num_steps
+
+    def clear(self):
+        """Remove all samples.
+
+        The arrays are kept and overwritten by the following samples.
+        """
+        self.num_steps[:] = 0
@@ -4,9 +4,11 @@ import numpy as np
 
 from hbaselines.base_policies import Policy
 from hbaselines.fcnet.replay_buffer import ReplayBuffer
+from hbaselines.fcnet.replay_buffer import PrioritizedReplayBuffer
 from hbaselines.utils.tf_util import create_fcnet
 from hbaselines.utils.tf_util import create_conv
 from hbaselines.utils.tf_util import get_trainable_vars
+from hbaselines.utils.tf_util import replay_iterator
 from hbaselines.utils.tf_util import reduce_std
 from hbaselines.utils.tf_util import gaussian_likelihood
 from hbaselines.utils.tf_util import apply_squashing_func
@@ -50,6 +52,16 @@ class FeedForwardPolicy(Policy):
         specifies whether to use the huber distance function as the loss for
         the critic. If set to False, the mean-squared error metric is used
         instead
+    prioritized_replay : bool
+        whether to use prioritized experience replay, with the absolute TD
+        errors of the sampled transitions used as their new priorities. See:
+        https://arxiv.org/abs/1511.05952
+    replay_buffer_path : str or None
+        the directory in which the replay buffer is stored as memory-mapped
+        files. None if the replay buffer is stored in memory.
+    reduced_precision_replay : bool
+        whether the observations in the replay buffer are stored with reduced
+        precision
     model_params : dict
         dictionary of model-specific parameters. See parent class.
     target_entropy : float
@@ -69,8 +81,13 @@ class FeedForwardPolicy(Policy):
     phase_ph : tf.compat.v1.placeholder
         a placeholder that defines whether training is occurring for the batch
         normalization layer. Set to True in training and False in testing.
+        Defaults to False if not fed.
     rate_ph : tf.compat.v1.placeholder
-        the probability that each element is dropped if dropout is implemented
+        the probability that each element is dropped if dropout is implemented.
+        Defaults to 0.0 if not fed.
+    weight_ph : tf.compat.v1.placeholder
+        placeholder for the importance sampling weights of the samples.
+        Defaults to ones if not fed.
     deterministic_action : tf.Variable
         the output from the deterministic actor
     policy_out : tf.Variable
@@ -115,8 +132,28 @@ class FeedForwardPolicy(Policy):
         the operation that updates the trainable parameters of the actor
     critic_loss : tf.Operation
         the operation that returns the loss of the critic
+    td_error : tf.Variable
+        the TD errors of the first Q-function
     critic_optimizer : tf.Operation
         the operation that updates the trainable parameters of the critic
+    batch_put : tf.Operation
+        the operation that samples a minibatch from the replay buffer and
+        places it in the staging area of the input pipeline
+    batch_idxes : tf.Tensor or None
+        the indices of the transitions of the minibatch consumed from the input
+        pipeline. Only used by prioritized experience replay.
+    pipeline_td_error : tf.Tensor
+        the TD errors of the first Q-function for the minibatch consumed from
+        the input pipeline
+    pipeline_critic_optimizer : tf.Operation
+        the operation that updates the trainable parameters of the critic
+        using the minibatch consumed from the input pipeline
+    pipeline_actor_optimizer : tf.Operation
+        the operation that updates the trainable parameters of the actor using
+        the minibatch consumed from the input pipeline
+    pipeline_alpha_optimizer : tf.Operation
+        the operation that updates the trainable parameters of the entropy
+        term using the minibatch consumed from the input pipeline
     """
 
     def __init__(self,
@@ -132,6 +169,9 @@ class FeedForwardPolicy(Policy):
                  tau,
                  gamma,
                  use_huber,
+                 prioritized_replay,
+                 replay_buffer_path,
+                 reduced_precision_replay,
                  l2_penalty,
                  model_params,
                  target_entropy,
@@ -168,6 +208,21 @@ class FeedForwardPolicy(Policy):
             specifies whether to use the huber distance function as the loss
             for the critic. If set to False, the mean-squared error metric is
             used instead
+        prioritized_replay : bool
+            whether to use prioritized experience replay, with the absolute TD
+            errors of the sampled transitions used as their new priorities.
+            See: https://arxiv.org/abs/1511.05952
+        replay_buffer_path : str or None
+            the directory in which the replay buffer is stored as
+            memory-mapped files, allowing buffers that do not fit in memory.
+            If the files already exist, they are reopened in place, which
+            allows runs to be resumed. If set to None, the replay buffer is
+            stored in memory.
+        reduced_precision_replay : bool
+            whether to store the observations in the replay buffer with reduced
+            precision, with the image channels quantized to uint8 and the
+            remaining elements stored as float16. The observations are
+            converted back to float32 when sampled.
         l2_penalty : float
             L2 regularization penalty. This is applied to the policy network.
         model_params : dict
@@ -196,6 +251,10 @@ class FeedForwardPolicy(Policy):
         self.tau = tau
         self.gamma = gamma
         self.use_huber = use_huber
+        self.prioritized_replay = prioritized_replay
+        self.replay_buffer_path = replay_buffer_path
+        self.reduced_precision_replay = reduced_precision_replay
+        self._batch_staged = False
 
         if target_entropy is None:
             self.target_entropy = -np.prod(self.ac_space.shape)
@@ -213,11 +272,20 @@ class FeedForwardPolicy(Policy):
         # Step 1: Create a replay buffer object.                              #
         # =================================================================== #
 
-        self.replay_buffer = ReplayBuffer(
+        if prioritized_replay:
+            replay_buffer_cls = PrioritizedReplayBuffer
+        else:
+            replay_buffer_cls = ReplayBuffer
+
+        self.replay_buffer = replay_buffer_cls(
             buffer_size=self.buffer_size,
             batch_size=self.batch_size,
             obs_dim=ob_dim[0],
             ac_dim=self.ac_space.shape[0],
+            storage_path=replay_buffer_path,
+            storage_dtype=dict(
+                obs_t=self._get_storage_dtype(self.model_params),
+            ) if reduced_precision_replay else None,
         )
 
         # =================================================================== #
@@ -245,12 +313,18 @@ class FeedForwardPolicy(Policy):
                 tf.float32,
                 shape=(None,) + ob_dim,
                 name='obs1')
-            self.phase_ph = tf.compat.v1.placeholder(
-                tf.bool,
+            self.phase_ph = tf.compat.v1.placeholder_with_default(
+                False,
+                shape=(),
                 name='phase')
-            self.rate_ph = tf.compat.v1.placeholder(
-                tf.float32,
+            self.rate_ph = tf.compat.v1.placeholder_with_default(
+                0.0,
+                shape=(),
                 name='rate')
+            self.weight_ph = tf.compat.v1.placeholder_with_default(
+                tf.ones_like(self.rew_ph),
+                shape=(None, 1),
+                name='weights')
 
         # =================================================================== #
         # Step 3: Create actor and critic variables.                          #
@@ -304,6 +378,13 @@ class FeedForwardPolicy(Policy):
         # and outputs.
         self.stats_ops, self.stats_names = self._setup_stats(scope or "Model")
 
+        # =================================================================== #
+        # Step 6: Setup the training operations of the input pipeline.        #
+        # =================================================================== #
+
+        with tf.compat.v1.variable_scope("input_pipeline", reuse=False):
+            self._setup_pipeline_update(ob_dim, scope)
+
     def make_actor(self, obs, action, reuse=False, scope="pi"):
         """Create the actor variables.
 
@@ -490,18 +571,38 @@ class FeedForwardPolicy(Policy):
         return qf1, qf2, value_fn
 
     def update(self, **kwargs):
-        """Perform a gradient update step."""
+        """Perform a gradient update step.
+
+        **Note**; The batch is consumed from the input pipeline, and is sampled
+        from the replay buffer during the previous call to this method, while
+        the previous update step is performed. The priorities used to sample
+        it when using prioritized experience replay therefore do not include
+        the priorities updated by the previous update step.
+        """
         # Not enough samples in the replay buffer.
         if not self.replay_buffer.can_sample():
             return
 
-        # Get a batch
-        obs0, actions, rewards, obs1, done1 = self.replay_buffer.sample()
+        # Stage the batch of the first update step.
+        if not self._batch_staged:
+            self.sess.run(self.batch_put)
+            self._batch_staged = True
+
+        step_ops = self._update_ops(pipeline=True)
+        feed_dict = {self.phase_ph: 1, self.rate_ph: 0.5}
+
+        if self.prioritized_replay:
+            td_error, idxes = self.sess.run(
+                [step_ops[0], self.batch_idxes] + step_ops[1:],
+                feed_dict)[:2]
 
-        return self.update_from_batch(obs0, actions, rewards, obs1, done1)
+            # Update the priorities of the sampled transitions.
+            self.replay_buffer.update_priorities(idxes, td_error)
+        else:
+            self.sess.run(step_ops, feed_dict)
 
     def update_from_batch(self, obs0, actions, rewards, obs1, terminals1,
-                          update_actor=True):
+                          update_actor=True, weights=None):
         """Perform gradient update step given a batch of data.
 
         Parameters
@@ -519,6 +620,15 @@ class FeedForwardPolicy(Policy):
             an episode and 0 otherwise.
         update_actor : bool
             whether to update the actor policy. Unused by this method.
+        weights : array_like or None
+            importance sampling weights of the elements in the batch. If set
+            to None, all elements are weighted equally.
+
+        Returns
+        -------
+        array_like
+            the TD errors of the elements in the batch, computed by the first
+            Q-function before the update
         """
         del update_actor  # unused by this method
 
@@ -529,13 +639,7 @@ class FeedForwardPolicy(Policy):
         rewards = rewards.reshape(-1, 1)
         terminals1 = terminals1.reshape(-1, 1)
 
-        # Collect all update and loss call operations.
-        step_ops = [
-            self.critic_optimizer,
-            self.actor_optimizer,
-            self.alpha_optimizer,
-            self.target_soft_updates,
-        ]
+        step_ops = self._update_ops()
 
         # Prepare the feed_dict information.
         feed_dict = {
@@ -547,9 +651,37 @@ class FeedForwardPolicy(Policy):
             self.phase_ph: 1,
             self.rate_ph: 0.5,
         }
+        if weights is not None:
+            feed_dict[self.weight_ph] = weights.reshape(-1, 1)
 
         # Perform the update operations.
-        self.sess.run(step_ops, feed_dict)
+        return self.sess.run(step_ops, feed_dict)[0]
+
+    def _update_ops(self, pipeline=False):
+        """Return the operations of a gradient update step.
+
+        The TD errors of the batch are the first element. If `pipeline` is set
+        to True, the operations consume the batch from the input pipeline and
+        stage the batch of the next step.
+        """
+        # Collect all update and loss call operations.
+        if pipeline:
+            return [
+                self.pipeline_td_error,
+                self.pipeline_critic_optimizer,
+                self.pipeline_actor_optimizer,
+                self.pipeline_alpha_optimizer,
+                self.target_soft_updates,
+                self.batch_put,
+            ]
+        else:
+            return [
+                self.td_error,
+                self.critic_optimizer,
+                self.actor_optimizer,
+                self.alpha_optimizer,
+                self.target_soft_updates,
+            ]
 
     def get_action(self, obs, context, apply_noise, random_actions, env_num=0):
         """See parent class."""
@@ -557,7 +689,8 @@ class FeedForwardPolicy(Policy):
         obs = self._get_obs(obs, context, axis=1)
 
         if random_actions:
-            return np.array([self.ac_space.sample()])
+            return np.array([
+                self.ac_space.sample() for _ in range(len(obs))])
         elif apply_noise:
             normalized_action = self.sess.run(
                 self.policy_out, feed_dict={
@@ -590,13 +723,59 @@ class FeedForwardPolicy(Policy):
                 scope_i = '{}/{}'.format(scope_name, name)
                 print_params_shape(scope_i, name)
 
+        # the TD errors of the first Q-function, used as the priorities of the
+        # samples when using prioritized experience replay
+        self.td_error, self.critic_loss = self._critic_loss(
+            qf1=self.qf1,
+            qf2=self.qf2,
+            value_fn=self.value_fn,
+            qf1_pi=self.qf1_pi,
+            qf2_pi=self.qf2_pi,
+            logp_pi=self.logp_pi,
+            value_target=self.value_target,
+            rewards=self.rew_ph,
+            terminals1=self.terminals1,
+            weights=self.weight_ph,
+        )
+
+        # Combine the loss functions for the optimizer.
+        critic_loss = sum(self.critic_loss)
+
+        # Critic train op. The optimizer object is reused by the training
+        # operations of the input pipeline.
+        critic_optimizer = tf.compat.v1.train.AdamOptimizer(self.critic_lr)
+        self._critic_opt = critic_optimizer
+
+        self.critic_optimizer = critic_optimizer.minimize(
+            critic_loss,
+            var_list=get_trainable_vars(scope_name))
+
+    def _critic_loss(self,
+                     qf1,
+                     qf2,
+                     value_fn,
+                     qf1_pi,
+                     qf2_pi,
+                     logp_pi,
+                     value_target,
+                     rewards,
+                     terminals1,
+                     weights):
+        """Compute the TD errors and the losses of the critic.
+
+        Returns
+        -------
+        tf.Tensor
+            the TD errors of the first Q-function
+        tuple of tf.Tensor
+            the losses of the two Q-functions and the value function
+        """
         # Take the min of the two Q-Values (Double-Q Learning)
-        min_qf_pi = tf.minimum(self.qf1_pi, self.qf2_pi)
+        min_qf_pi = tf.minimum(qf1_pi, qf2_pi)
 
         # Target for Q value regression
         q_backup = tf.stop_gradient(
-            self.rew_ph +
-            (1 - self.terminals1) * self.gamma * self.value_target)
+            rewards + (1 - terminals1) * self.gamma * value_target)
 
         # choose the loss function
         if self.use_huber:
@@ -605,25 +784,16 @@ class FeedForwardPolicy(Policy):
             loss_fn = tf.compat.v1.losses.mean_squared_error
 
         # Compute Q-Function loss
-        qf1_loss = loss_fn(q_backup, self.qf1)
-        qf2_loss = loss_fn(q_backup, self.qf2)
+        qf1_loss = loss_fn(q_backup, qf1, weights=weights)
+        qf2_loss = loss_fn(q_backup, qf2, weights=weights)
 
         # Target for value fn regression
         # We update the vf towards the min of two Q-functions in order to
         # reduce overestimation bias from function approximation error.
-        v_backup = tf.stop_gradient(min_qf_pi - self.alpha * self.logp_pi)
-        value_loss = loss_fn(self.value_fn, v_backup)
+        v_backup = tf.stop_gradient(min_qf_pi - self.alpha * logp_pi)
+        value_loss = loss_fn(value_fn, v_backup, weights=weights)
 
-        self.critic_loss = (qf1_loss, qf2_loss, value_loss)
-
-        # Combine the loss functions for the optimizer.
-        critic_loss = qf1_loss + qf2_loss + value_loss
-
-        # Critic train op
-        critic_optimizer = tf.compat.v1.train.AdamOptimizer(self.critic_lr)
-        self.critic_optimizer = critic_optimizer.minimize(
-            critic_loss,
-            var_list=get_trainable_vars(scope_name))
+        return q_backup - qf1, (qf1_loss, qf2_loss, value_loss)
 
     def _setup_actor_optimizer(self, scope):
         """Create minimization operations for policy and entropy.
@@ -642,34 +812,126 @@ class FeedForwardPolicy(Policy):
             print('setting up actor and alpha optimizers')
             print_params_shape(scope_name, "actor")
 
-        # Take the min of the two Q-Values (Double-Q Learning)
-        min_qf_pi = tf.minimum(self.qf1_pi, self.qf2_pi)
-
-        # Compute the entropy temperature loss.
-        self.alpha_loss = -tf.reduce_mean(
-            self.log_alpha
-            * tf.stop_gradient(self.logp_pi + self.target_entropy))
+        self.alpha_loss, self.actor_loss = self._actor_loss(
+            self.qf1_pi, self.qf2_pi, self.logp_pi, scope_name)
 
+        # The optimizer objects are reused by the training operations of the
+        # input pipeline.
         alpha_optimizer = tf.compat.v1.train.AdamOptimizer(self.actor_lr)
+        self._alpha_opt = alpha_optimizer
 
         self.alpha_optimizer = alpha_optimizer.minimize(
             self.alpha_loss,
             var_list=self.log_alpha)
 
-        # Compute the policy loss
-        self.actor_loss = tf.reduce_mean(self.alpha * self.logp_pi - min_qf_pi)
-
-        # Add a regularization penalty.
-        self.actor_loss += self._l2_loss(self.l2_penalty, scope_name)
-
         # Policy train op (has to be separate from value train op, because
         # min_qf_pi appears in policy_loss)
         actor_optimizer = tf.compat.v1.train.AdamOptimizer(self.actor_lr)
+        self._actor_opt = actor_optimizer
 
         self.actor_optimizer = actor_optimizer.minimize(
             self.actor_loss,
             var_list=get_trainable_vars(scope_name))
 
+    def _actor_loss(self, qf1_pi, qf2_pi, logp_pi, scope_name):
+        """Compute the losses of the entropy term and the actor.
+
+        Returns
+        -------
+        tf.Tensor
+            the loss of the entropy term
+        tf.Tensor
+            the loss of the actor
+        """
+        # Take the min of the two Q-Values (Double-Q Learning)
+        min_qf_pi = tf.minimum(qf1_pi, qf2_pi)
+
+        # Compute the entropy temperature loss.
+        alpha_loss = -tf.reduce_mean(
+            self.log_alpha * tf.stop_gradient(logp_pi + self.target_entropy))
+
+        # Compute the policy loss
+        actor_loss = tf.reduce_mean(self.alpha * logp_pi - min_qf_pi)
+
+        # Add a regularization penalty.
+        actor_loss += self._l2_loss(self.l2_penalty, scope_name)
+
+        return alpha_loss, actor_loss
+
+    def _setup_pipeline_update(self, ob_dim, scope):
+        """Create the operations of the training steps of the input pipeline.
+
+        The minibatches are sampled from the replay buffer by an in-graph input
+        pipeline (see `replay_iterator`), and are only consumed by these
+        operations. The networks reuse the parameters of the model and target
+        networks, and are updated by the same optimizer objects as the
+        operations of a training step from a fed batch.
+        """
+        scope_name = '' if scope is None else scope + '/'
+
+        # the variable scopes of the model and target parameters
+        model_scope = tf.compat.v1.VariableScope(True, scope_name + "model")
+        target_scope = tf.compat.v1.VariableScope(True, scope_name + "target")
+
+        # Create the input pipeline of the minibatches sampled from the replay
+        # buffer. The replay buffer is accessed when sampling, in case it is
+        # replaced by a wrapper.
+        batch, self.batch_put = replay_iterator(
+            sample_fn=self._sample_batch,
+            ob_dim=ob_dim,
+            ac_dim=self.ac_space.shape,
+            with_weights=self.prioritized_replay)
+        obs0, actions, rewards, obs1, terminals1 = batch[:5]
+        if self.prioritized_replay:
+            weights, self.batch_idxes = batch[5:]
+        else:
+            weights, self.batch_idxes = 1.0, None
+
+        # Normalize the actions (bounded between [-1, 1]).
+        actions = (actions - self._ac_means) / self._ac_magnitudes
+
+        with tf.compat.v1.variable_scope(model_scope):
+            _, policy_out, logp_pi, _ = self.make_actor(
+                obs0, actions, reuse=True)
+            qf1, qf2, value_fn = self.make_critic(
+                obs0, actions, create_qf=True, create_vf=True, reuse=True)
+            qf1_pi, qf2_pi, _ = self.make_critic(
+                obs0, policy_out, create_qf=True, create_vf=False, reuse=True)
+
+        with tf.compat.v1.variable_scope(target_scope):
+            _, _, value_target = self.make_critic(
+                obs1, create_qf=False, create_vf=True, reuse=True)
+
+        # Update the critic.
+        self.pipeline_td_error, critic_loss = self._critic_loss(
+            qf1=qf1,
+            qf2=qf2,
+            value_fn=value_fn,
+            qf1_pi=qf1_pi,
+            qf2_pi=qf2_pi,
+            logp_pi=logp_pi,
+            value_target=value_target,
+            rewards=rewards,
+            terminals1=terminals1,
+            weights=weights,
+        )
+
+        self.pipeline_critic_optimizer = self._critic_opt.minimize(
+            sum(critic_loss),
+            var_list=get_trainable_vars(scope_name + 'model/value_fns'))
+
+        # Update the actor and entropy term.
+        alpha_loss, actor_loss = self._actor_loss(
+            qf1_pi, qf2_pi, logp_pi, scope_name + 'model/pi/')
+
+        self.pipeline_alpha_optimizer = self._alpha_opt.minimize(
+            alpha_loss,
+            var_list=self.log_alpha)
+
+        self.pipeline_actor_optimizer = self._actor_opt.minimize(
+            actor_loss,
+            var_list=get_trainable_vars(scope_name + 'model/pi/'))
+
     def _setup_stats(self, base):
         """Create the running means and std of the model inputs and outputs.
 
@@ -748,7 +1010,40 @@ class FeedForwardPolicy(Policy):
             obs0 = self._get_obs(obs0, context0, axis=0)
             obs1 = self._get_obs(obs1, context1, axis=0)
 
-            self.replay_buffer.add(obs0, action, reward, obs1, float(done))
+            self.replay_buffer.add(
+                obs0, action, reward, obs1, float(done), env_num)
+
+    def store_transition_batch(self,
+                               obs0,
+                               context0,
+                               action,
+                               reward,
+                               obs1,
+                               context1,
+                               done,
+                               is_final_step,
+                               env_num,
+                               evaluate=False):
+        """See parent class.
+
+        The transitions are added to the replay buffer in a single call.
+        """
+        if not evaluate and len(env_num) > 0:
+            # Add the contextual observation, if applicable.
+            obs0 = self._get_obs(
+                np.stack([np.ravel(ob) for ob in obs0]),
+                self._stack_context(context0, [1] * len(obs0)),
+                axis=1)
+            obs1 = self._get_obs(
+                np.stack([np.ravel(ob) for ob in obs1]),
+                self._stack_context(context1, [1] * len(obs1)),
+                axis=1)
+
+            done = np.asarray(done, dtype=np.float32)
+
+            self.replay_buffer.add_batch(
+                obs0, np.stack([np.ravel(ac) for ac in action]),
+                np.asarray(reward, dtype=np.float32), obs1, done, env_num)
 
     def get_td_map(self):
         """See parent class."""
@@ -778,3 +1073,10 @@ class FeedForwardPolicy(Policy):
         }
 
         return td_map
+
+    def _sample_batch(self):
+        """Sample a batch for the input pipeline."""
+        if self.prioritized_replay:
+            return self.replay_buffer.sample(with_weights=True)
+        else:
+            return self.replay_buffer.sample()
@@ -4,9 +4,11 @@ import numpy as np
 
 from hbaselines.base_policies import Policy
 from hbaselines.fcnet.replay_buffer import ReplayBuffer
+from hbaselines.fcnet.replay_buffer import PrioritizedReplayBuffer
 from hbaselines.utils.tf_util import create_fcnet
 from hbaselines.utils.tf_util import create_conv
 from hbaselines.utils.tf_util import get_trainable_vars
+from hbaselines.utils.tf_util import replay_iterator
 from hbaselines.utils.tf_util import reduce_std
 from hbaselines.utils.tf_util import print_params_shape
 from hbaselines.utils.tf_util import setup_target_updates
@@ -43,6 +45,19 @@ class FeedForwardPolicy(Policy):
         specifies whether to use the huber distance function as the loss for
         the critic. If set to False, the mean-squared error metric is used
         instead
+    prioritized_replay : bool
+        whether to use prioritized experience replay, with the absolute TD
+        errors of the sampled transitions used as their new priorities. See:
+        https://arxiv.org/abs/1511.05952
+    replay_buffer_path : str or None
+        the directory in which the replay buffer is stored as memory-mapped
+        files. None if the replay buffer is stored in memory.
+    reduced_precision_replay : bool
+        whether the observations in the replay buffer are stored with reduced
+        precision
+    fused_update : bool
+        whether multiple training steps can be performed within a single
+        session call, see `update_fused`
     l2_penalty : float
         L2 regularization penalty. This is applied to the policy network.
     model_params : dict
@@ -71,8 +86,13 @@ class FeedForwardPolicy(Policy):
     phase_ph : tf.compat.v1.placeholder
         a placeholder that defines whether training is occurring for the batch
         normalization layer. Set to True in training and False in testing.
+        Defaults to False if not fed.
     rate_ph : tf.compat.v1.placeholder
-        the probability that each element is dropped if dropout is implemented
+        the probability that each element is dropped if dropout is implemented.
+        Defaults to 0.0 if not fed.
+    weight_ph : tf.compat.v1.placeholder
+        placeholder for the importance sampling weights of the samples.
+        Defaults to ones if not fed.
     actor_tf : tf.Variable
         the output from the actor network
     critic_tf : list of tf.Variable
@@ -92,8 +112,42 @@ class FeedForwardPolicy(Policy):
         the operation that updates the trainable parameters of the actor
     critic_loss : tf.Operation
         the operation that returns the loss of the critic
+    td_error : tf.Variable
+        the TD errors of the first critic
     critic_optimizer : tf.Operation
         the operation that updates the trainable parameters of the critic
+    fused_terminals1 : tf.compat.v1.placeholder
+        placeholder for the next step terminals of a stack of batches
+    fused_rew_ph : tf.compat.v1.placeholder
+        placeholder for the rewards of a stack of batches
+    fused_action_ph : tf.compat.v1.placeholder
+        placeholder for the actions of a stack of batches
+    fused_obs_ph : tf.compat.v1.placeholder
+        placeholder for the observations of a stack of batches
+    fused_obs1_ph : tf.compat.v1.placeholder
+        placeholder for the next step observations of a stack of batches
+    fused_weight_ph : tf.compat.v1.placeholder
+        placeholder for the importance sampling weights of a stack of batches.
+        Defaults to ones if not fed.
+    fused_td_error : dict < bool, tf.Tensor >
+        the TD errors of the first critic for every batch in the stack, which
+        perform the fused training steps when computed. The key specifies
+        whether the actor and target policies are updated as well.
+    batch_put : tf.Operation
+        the operation that samples a minibatch from the replay buffer and
+        places it in the staging area of the input pipeline
+    batch_idxes : tf.Tensor or None
+        the indices of the transitions of the minibatch consumed from the input
+        pipeline. Only used by prioritized experience replay.
+    pipeline_td_error : tf.Tensor
+        the TD errors of the first critic for the minibatch consumed from the
+        input pipeline
+    pipeline_critic_optimizer : list of tf.Operation
+        the operations that update the trainable parameters of the critics
+        using the minibatch consumed from the input pipeline
+    pipeline_actor_optimizer : tf.Operation
+        the operation that updates the trainable parameters of the actor using
+        the minibatch consumed from the input pipeline
     """
 
     def __init__(self,
@@ -109,11 +163,15 @@ class FeedForwardPolicy(Policy):
                  tau,
                  gamma,
                  use_huber,
+                 prioritized_replay,
+                 replay_buffer_path,
+                 reduced_precision_replay,
                  l2_penalty,
                  model_params,
                  noise,
                  target_policy_noise,
                  target_noise_clip,
+                 fused_update,
                  scope=None,
                  num_envs=1):
         """Instantiate the feed-forward neural network policy.
@@ -147,6 +205,21 @@ class FeedForwardPolicy(Policy):
             specifies whether to use the huber distance function as the loss
             for the critic. If set to False, the mean-squared error metric is
             used instead
+        prioritized_replay : bool
+            whether to use prioritized experience replay, with the absolute TD
+            errors of the sampled transitions used as their new priorities.
+            See: https://arxiv.org/abs/1511.05952
+        replay_buffer_path : str or None
+            the directory in which the replay buffer is stored as
+            memory-mapped files, allowing buffers that do not fit in memory.
+            If the files already exist, they are reopened in place, which
+            allows runs to be resumed. If set to None, the replay buffer is
+            stored in memory.
+        reduced_precision_replay : bool
+            whether to store the observations in the replay buffer with reduced
+            precision, with the image channels quantized to uint8 and the
+            remaining elements stored as float16. The observations are
+            converted back to float32 when sampled.
         l2_penalty : float
             L2 regularization penalty. This is applied to the policy network.
         model_params : dict
@@ -160,6 +233,11 @@ class FeedForwardPolicy(Policy):
             actor policy. See TD3 paper for more.
         target_noise_clip : float
             clipping term for the noise injected in the target actor policy
+        fused_update : bool
+            whether to create the operations that perform multiple training
+            steps within a single session call, see `update_fused`. The
+            parameters of the policy are stored as resource variables in this
+            case. Not supported with batch normalization.
         scope : str
             an upper-level scope term. Used by policies that call this one.
         """
@@ -184,9 +262,19 @@ class FeedForwardPolicy(Policy):
         self.tau = tau
         self.gamma = gamma
         self.use_huber = use_huber
+        self.prioritized_replay = prioritized_replay
+        self.replay_buffer_path = replay_buffer_path
+        self.reduced_precision_replay = reduced_precision_replay
         self.noise = noise * ac_mag
         self.target_policy_noise = np.array([ac_mag * target_policy_noise])
         self.target_noise_clip = np.array([ac_mag * target_noise_clip])
+        self.fused_update = fused_update
+        self._batch_staged = False
+
+        if fused_update and model_params["batch_norm"]:
+            print("WARNING: fused_update is not supported with batch "
+                  "normalization. Ignoring.")
+            self.fused_update = False
 
         # Compute the shape of the input observation space, which may include
         # the contextual term.
@@ -196,11 +284,20 @@ class FeedForwardPolicy(Policy):
         # Step 1: Create a replay buffer object.                              #
         # =================================================================== #
 
-        self.replay_buffer = ReplayBuffer(
+        if prioritized_replay:
+            replay_buffer_cls = PrioritizedReplayBuffer
+        else:
+            replay_buffer_cls = ReplayBuffer
+
+        self.replay_buffer = replay_buffer_cls(
             buffer_size=self.buffer_size,
             batch_size=self.batch_size,
             obs_dim=ob_dim[0],
             ac_dim=self.ac_space.shape[0],
+            storage_path=replay_buffer_path,
+            storage_dtype=dict(
+                obs_t=self._get_storage_dtype(self.model_params),
+            ) if reduced_precision_replay else None,
         )
 
         # =================================================================== #
@@ -228,19 +325,30 @@ class FeedForwardPolicy(Policy):
                 tf.float32,
                 shape=(None,) + ob_dim,
                 name='obs1')
-            self.phase_ph = tf.compat.v1.placeholder(
-                tf.bool,
+            self.phase_ph = tf.compat.v1.placeholder_with_default(
+                False,
+                shape=(),
                 name='phase')
-            self.rate_ph = tf.compat.v1.placeholder(
-                tf.float32,
+            self.rate_ph = tf.compat.v1.placeholder_with_default(
+                0.0,
+                shape=(),
                 name='rate')
+            self.weight_ph = tf.compat.v1.placeholder_with_default(
+                tf.ones_like(self.rew_ph),
+                shape=(None, 1),
+                name='weights')
 
         # =================================================================== #
         # Step 3: Create actor and critic variables.                          #
         # =================================================================== #
 
+        # Variables that are updated within the fused training loop must be
+        # resource variables, in order to be read anew at every iteration.
+        use_resource = True if self.fused_update else None
+
         # Create networks and core TF parts that are shared across setup parts.
-        with tf.compat.v1.variable_scope("model", reuse=False):
+        with tf.compat.v1.variable_scope(
+                "model", reuse=False, use_resource=use_resource):
             self.actor_tf = self.make_actor(self.obs_ph)
             self.critic_tf = [
                 self.make_critic(self.obs_ph, self.action_ph,
@@ -253,29 +361,9 @@ class FeedForwardPolicy(Policy):
                 for i in range(2)
             ]
 
-        with tf.compat.v1.variable_scope("target", reuse=False):
-            # create the target actor policy
-            actor_target = self.make_actor(self.obs1_ph)
-
-            # smooth target policy by adding clipped noise to target actions
-            target_noise = tf.random.normal(
-                tf.shape(actor_target), stddev=self.target_policy_noise)
-            target_noise = tf.clip_by_value(
-                target_noise, -self.target_noise_clip, self.target_noise_clip)
-
-            # clip the noisy action to remain in the bounds
-            noisy_actor_target = tf.clip_by_value(
-                actor_target + target_noise,
-                self.ac_space.low,
-                self.ac_space.high
-            )
-
-            # create the target critic policies
-            critic_target = [
-                self.make_critic(self.obs1_ph, noisy_actor_target,
-                                 scope="qf_{}".format(i))
-                for i in range(2)
-            ]
+        with tf.compat.v1.variable_scope(
+                "target", reuse=False, use_resource=use_resource):
+            critic_target = self._make_target_critic(self.obs1_ph)
 
         # Create the target update operations.
         init, soft = setup_target_updates(
@@ -299,6 +387,61 @@ class FeedForwardPolicy(Policy):
         # and outputs.
         self.stats_ops, self.stats_names = self._setup_stats(scope or "Model")
 
+        # =================================================================== #
+        # Step 6: Setup the fused training operations.                        #
+        # =================================================================== #
+
+        if self.fused_update:
+            with tf.compat.v1.variable_scope("fused", reuse=False):
+                self._setup_fused_update(ob_dim, scope)
+
+        # =================================================================== #
+        # Step 7: Setup the training operations of the input pipeline.        #
+        # =================================================================== #
+
+        with tf.compat.v1.variable_scope("input_pipeline", reuse=False):
+            self._setup_pipeline_update(ob_dim, scope)
+
+    def _make_target_critic(self, obs1, reuse=False):
+        """Create the target critic tensors.
+
+        The actions of the target actor policy are smoothed by clipped noise.
+
+        Parameters
+        ----------
+        obs1 : tf.Tensor
+            the next step observations
+        reuse : bool
+            whether or not to reuse parameters
+
+        Returns
+        -------
+        list of tf.Variable
+            the output from the two target critic networks
+        """
+        # create the target actor policy
+        actor_target = self.make_actor(obs1, reuse=reuse)
+
+        # smooth target policy by adding clipped noise to target actions
+        target_noise = tf.random.normal(
+            tf.shape(actor_target), stddev=self.target_policy_noise)
+        target_noise = tf.clip_by_value(
+            target_noise, -self.target_noise_clip, self.target_noise_clip)
+
+        # clip the noisy action to remain in the bounds
+        noisy_actor_target = tf.clip_by_value(
+            actor_target + target_noise,
+            self.ac_space.low,
+            self.ac_space.high
+        )
+
+        # create the target critic policies
+        return [
+            self.make_critic(obs1, noisy_actor_target, reuse=reuse,
+                             scope="qf_{}".format(i))
+            for i in range(2)
+        ]
+
     def _setup_actor_optimizer(self, scope):
         """Create the actor loss, gradient, and optimizer."""
         scope_name = 'model/pi/'
@@ -315,8 +458,10 @@ class FeedForwardPolicy(Policy):
         # Add a regularization penalty.
         self.actor_loss += self._l2_loss(self.l2_penalty, scope_name)
 
-        # Create an optimizer object.
+        # Create an optimizer object. This object is reused by the fused
+        # training operations.
         optimizer = tf.compat.v1.train.AdamOptimizer(self.actor_lr)
+        self._actor_opt = optimizer
 
         self.actor_optimizer = optimizer.minimize(
             self.actor_loss,
@@ -330,22 +475,21 @@ class FeedForwardPolicy(Policy):
 
         # compute the target critic term
         with tf.compat.v1.variable_scope("loss", reuse=False):
-            q_obs1 = tf.minimum(critic_target[0], critic_target[1])
-            target_q = tf.stop_gradient(
-                self.rew_ph + (1. - self.terminals1) * self.gamma * q_obs1)
+            target_q = self._target_q(
+                critic_target, self.rew_ph, self.terminals1)
 
             tf.compat.v1.summary.scalar('critic_target',
                                         tf.reduce_mean(target_q))
 
-        # choose the loss function
-        if self.use_huber:
-            loss_fn = tf.compat.v1.losses.huber_loss
-        else:
-            loss_fn = tf.compat.v1.losses.mean_squared_error
+        self.critic_loss = self._critic_loss(
+            self.critic_tf, target_q, self.weight_ph)
 
-        self.critic_loss = [loss_fn(q, target_q) for q in self.critic_tf]
+        # the TD errors of the first critic, used as the priorities of the
+        # samples when using prioritized experience replay
+        self.td_error = target_q - self.critic_tf[0]
 
         self.critic_optimizer = []
+        self._critic_opt = []
 
         for i, critic_loss in enumerate(self.critic_loss):
             scope_name = 'model/qf_{}/'.format(i)
@@ -357,12 +501,226 @@ class FeedForwardPolicy(Policy):
 
             # create an optimizer object
             optimizer = tf.compat.v1.train.AdamOptimizer(self.critic_lr)
+            self._critic_opt.append(optimizer)
 
             # create the optimizer object
             self.critic_optimizer.append(optimizer.minimize(
                 loss=critic_loss,
                 var_list=get_trainable_vars(scope_name)))
 
+    def _target_q(self, critic_target, rewards, terminals1):
+        """Compute the target critic term."""
+        q_obs1 = tf.minimum(critic_target[0], critic_target[1])
+        return tf.stop_gradient(
+            rewards + (1. - terminals1) * self.gamma * q_obs1)
+
+    def _critic_loss(self, critic, target_q, weights):
+        """Compute the (weighted) loss of every critic."""
+        # choose the loss function
+        if self.use_huber:
+            loss_fn = tf.compat.v1.losses.huber_loss
+        else:
+            loss_fn = tf.compat.v1.losses.mean_squared_error
+
+        return [loss_fn(q, target_q, weights=weights) for q in critic]
+
+    def _setup_fused_update(self, ob_dim, scope):
+        """Create the operations of the fused training steps.
+
+        The batches of all training steps are fed as a single stack of
+        batches, and the training steps are performed by a tf.while_loop with
+        one iteration per batch. Every iteration updates the critics and then,
+        if requested, the actor and the target networks, using the same
+        optimizer objects as the operations of a single training step.
+        """
+        with tf.compat.v1.variable_scope("input", reuse=False):
+            self.fused_terminals1 = tf.compat.v1.placeholder(
+                tf.float32,
+                shape=(None, None, 1),
+                name='terminals1')
+            self.fused_rew_ph = tf.compat.v1.placeholder(
+                tf.float32,
+                shape=(None, None, 1),
+                name='rewards')
+            self.fused_action_ph = tf.compat.v1.placeholder(
+                tf.float32,
+                shape=(None, None) + self.ac_space.shape,
+                name='actions')
+            self.fused_obs_ph = tf.compat.v1.placeholder(
+                tf.float32,
+                shape=(None, None) + ob_dim,
+                name='obs0')
+            self.fused_obs1_ph = tf.compat.v1.placeholder(
+                tf.float32,
+                shape=(None, None) + ob_dim,
+                name='obs1')
+            self.fused_weight_ph = tf.compat.v1.placeholder_with_default(
+                tf.ones_like(self.fused_rew_ph),
+                shape=(None, None, 1),
+                name='weights')
+
+        self.fused_td_error = {
+            update_actor: self._setup_fused_loop(update_actor, scope)
+            for update_actor in [False, True]
+        }
+
+    def _setup_fused_loop(self, update_actor, scope):
+        """Create the training loop of the fused training steps.
+
+        Parameters
+        ----------
+        update_actor : bool
+            whether to update the actor and target networks at every training
+            step
+        scope : str or None
+            the outer scope, set to None if not available
+
+        Returns
+        -------
+        tf.Tensor
+            the TD errors of the first critic for every batch, computed before
+            the corresponding training step
+        """
+        scope_name = '' if scope is None else scope + '/'
+        num_steps = tf.shape(self.fused_obs_ph)[0]
+
+        # the variable scopes of the model and target parameters, which are
+        # reused by the networks of every training step
+        model_scope = tf.compat.v1.VariableScope(True, scope_name + "model")
+        target_scope = tf.compat.v1.VariableScope(True, scope_name + "target")
+
+        def _body(i, td_error):
+            obs0 = self.fused_obs_ph[i]
+            actions = self.fused_action_ph[i]
+            rewards = self.fused_rew_ph[i]
+            obs1 = self.fused_obs1_ph[i]
+            terminals1 = self.fused_terminals1[i]
+            weights = self.fused_weight_ph[i]
+
+            # Update the critics.
+            with tf.compat.v1.variable_scope(target_scope):
+                critic_target = self._make_target_critic(obs1, reuse=True)
+            with tf.compat.v1.variable_scope(model_scope):
+                critic = [
+                    self.make_critic(obs0, actions, reuse=True,
+                                     scope="qf_{}".format(j))
+                    for j in range(2)
+                ]
+
+            target_q = self._target_q(critic_target, rewards, terminals1)
+            critic_loss = self._critic_loss(critic, target_q, weights)
+
+            update_ops = [
+                self._critic_opt[j].minimize(
+                    loss=critic_loss[j],
+                    var_list=get_trainable_vars(
+                        scope_name + 'model/qf_{}/'.format(j)))
+                for j in range(2)
+            ]
+
+            # Update the actor with the updated critic, followed by the target
+            # networks.
+            if update_actor:
+                with tf.control_dependencies(update_ops):
+                    with tf.compat.v1.variable_scope(model_scope):
+                        actor = self.make_actor(obs0, reuse=True)
+                        critic_with_actor = self.make_critic(
+                            obs0, actor, reuse=True, scope="qf_0")
+
+                    actor_loss = -tf.reduce_mean(critic_with_actor)
+                    actor_loss += self._l2_loss(
+                        self.l2_penalty, scope_name + 'model/pi/')
+
+                    update_ops = [self._actor_opt.minimize(
+                        actor_loss,
+                        var_list=get_trainable_vars(scope_name + 'model/pi/'))]
+
+                with tf.control_dependencies(update_ops):
+                    _, soft_updates = setup_target_updates(
+                        'model', 'target', scope, self.tau, 0)
+                    update_ops = [soft_updates]
+
+            with tf.control_dependencies(update_ops):
+                return i + 1, td_error.write(i, target_q - critic[0])
+
+        _, td_error = tf.while_loop(
+            cond=lambda i, _: i < num_steps,
+            body=_body,
+            loop_vars=[
+                tf.constant(0),
+                tf.TensorArray(tf.float32, size=num_steps),
+            ],
+            parallel_iterations=1,
+            back_prop=False,
+            name="update_actor" if update_actor else "update_critic",
+        )
+
+        return td_error.stack()
+
+    def _setup_pipeline_update(self, ob_dim, scope):
+        """Create the operations of the training steps of the input pipeline.
+
+        The minibatches are sampled from the replay buffer by an in-graph input
+        pipeline (see `replay_iterator`), and are only consumed by these
+        operations. The networks reuse the parameters of the model and target
+        networks, and are updated by the same optimizer objects as the
+        operations of a training step from a fed batch.
+        """
+        scope_name = '' if scope is None else scope + '/'
+
+        # the variable scopes of the model and target parameters
+        model_scope = tf.compat.v1.VariableScope(True, scope_name + "model")
+        target_scope = tf.compat.v1.VariableScope(True, scope_name + "target")
+
+        # Create the input pipeline of the minibatches sampled from the replay
+        # buffer. The replay buffer is accessed when sampling, in case it is
+        # replaced by a wrapper.
+        batch, self.batch_put = replay_iterator(
+            sample_fn=self._sample_batch,
+            ob_dim=ob_dim,
+            ac_dim=self.ac_space.shape,
+            with_weights=self.prioritized_replay)
+        obs0, actions, rewards, obs1, terminals1 = batch[:5]
+        if self.prioritized_replay:
+            weights, self.batch_idxes = batch[5:]
+        else:
+            weights, self.batch_idxes = 1.0, None
+
+        # Update the critics.
+        with tf.compat.v1.variable_scope(target_scope):
+            critic_target = self._make_target_critic(obs1, reuse=True)
+        with tf.compat.v1.variable_scope(model_scope):
+            critic = [
+                self.make_critic(obs0, actions, reuse=True,
+                                 scope="qf_{}".format(i))
+                for i in range(2)
+            ]
+
+        target_q = self._target_q(critic_target, rewards, terminals1)
+        critic_loss = self._critic_loss(critic, target_q, weights)
+        self.pipeline_td_error = target_q - critic[0]
+
+        self.pipeline_critic_optimizer = [
+            self._critic_opt[i].minimize(
+                loss=critic_loss[i],
+                var_list=get_trainable_vars(
+                    scope_name + 'model/qf_{}/'.format(i)))
+            for i in range(2)
+        ]
+
+        # Update the actor.
+        with tf.compat.v1.variable_scope(model_scope):
+            actor = self.make_actor(obs0, reuse=True)
+            critic_with_actor = self.make_critic(
+                obs0, actor, reuse=True, scope="qf_0")
+
+        actor_loss = -tf.reduce_mean(critic_with_actor)
+        actor_loss += self._l2_loss(self.l2_penalty, scope_name + 'model/pi/')
+
+        self.pipeline_actor_optimizer = self._actor_opt.minimize(
+            actor_loss,
+            var_list=get_trainable_vars(scope_name + 'model/pi/'))
+
     def make_actor(self, obs, reuse=False, scope="pi"):
         """Create an actor tensor.
 
@@ -493,6 +851,12 @@ class FeedForwardPolicy(Policy):
         **Note**; The target update soft updates occur at the same frequency as
         the actor update frequencies.
 
+        **Note**; The batch is consumed from the input pipeline, and is sampled
+        from the replay buffer during the previous call to this method, while
+        the previous update step is performed. The priorities used to sample
+        it when using prioritized experience replay therefore do not include
+        the priorities updated by the previous update step.
+
         Parameters
         ----------
         update_actor : bool
@@ -503,11 +867,23 @@ class FeedForwardPolicy(Policy):
         if not self.replay_buffer.can_sample():
             return
 
-        # Get a batch
-        obs0, actions, rewards, obs1, terminals1 = self.replay_buffer.sample()
+        # Stage the batch of the first update step.
+        if not self._batch_staged:
+            self.sess.run(self.batch_put)
+            self._batch_staged = True
+
+        step_ops = self._update_ops(update_actor, pipeline=True)
+        feed_dict = {self.phase_ph: 1, self.rate_ph: 0.5}
 
-        return self.update_from_batch(
-            obs0, actions, rewards, obs1, terminals1, update_actor)
+        if self.prioritized_replay:
+            td_error, idxes = self.sess.run(
+                [step_ops[0], self.batch_idxes] + step_ops[1:],
+                feed_dict=feed_dict)[:2]
+
+            # Update the priorities of the sampled transitions.
+            self.replay_buffer.update_priorities(idxes, td_error)
+        else:
+            self.sess.run(step_ops, feed_dict=feed_dict)
 
     def update_from_batch(self,
                           obs0,
@@ -515,7 +891,8 @@ class FeedForwardPolicy(Policy):
                           rewards,
                           obs1,
                           terminals1,
-                          update_actor=True):
+                          update_actor=True,
+                          weights=None):
         """Perform gradient update step given a batch of data.
 
         Parameters
@@ -535,22 +912,24 @@ class FeedForwardPolicy(Policy):
             specified whether to perform gradient update procedures to the
             actor policy. Default set to True. Note that the update procedure
             for the critic is always performed when calling this method.
+        weights : array_like or None
+            importance sampling weights of the elements in the batch. If set
+            to None, all elements are weighted equally.
+
+        Returns
+        -------
+        array_like
+            the TD errors of the elements in the batch, computed by the first
+            critic before the update
         """
         # Reshape to match previous behavior and placeholder shape.
         rewards = rewards.reshape(-1, 1)
         terminals1 = terminals1.reshape(-1, 1)
 
-        # Update operations for the critic networks.
-        step_ops = [self.critic_optimizer[0],
-                    self.critic_optimizer[1]]
-
-        if update_actor:
-            # Actor updates and target soft update operation.
-            step_ops += [self.actor_optimizer,
-                         self.target_soft_updates]
+        step_ops = self._update_ops(update_actor)
 
-        # Perform the update operations.
-        self.sess.run(step_ops, feed_dict={
+        # Prepare the feed_dict information.
+        feed_dict = {
             self.obs_ph: obs0,
             self.action_ph: actions,
             self.rew_ph: rewards,
@@ -558,7 +937,101 @@ class FeedForwardPolicy(Policy):
             self.terminals1: terminals1,
             self.phase_ph: 1,
             self.rate_ph: 0.5,
-        })
+        }
+        if weights is not None:
+            feed_dict[self.weight_ph] = weights.reshape(-1, 1)
+
+        # Perform the update operations.
+        return self.sess.run(step_ops, feed_dict=feed_dict)[0]
+
+    def _update_ops(self, update_actor, pipeline=False):
+        """Return the operations of a gradient update step.
+
+        The TD errors of the batch are the first element. If `pipeline` is set
+        to True, the operations consume the batch from the input pipeline and
+        stage the batch of the next step.
+        """
+        if pipeline:
+            # Update operations for the critic networks.
+            step_ops = [self.pipeline_td_error,
+                        self.pipeline_critic_optimizer[0],
+                        self.pipeline_critic_optimizer[1],
+                        self.batch_put]
+
+            if update_actor:
+                # Actor updates and target soft update operation.
+                step_ops += [self.pipeline_actor_optimizer,
+                             self.target_soft_updates]
+        else:
+            # Update operations for the critic networks.
+            step_ops = [self.td_error,
+                        self.critic_optimizer[0],
+                        self.critic_optimizer[1]]
+
+            if update_actor:
+                # Actor updates and target soft update operation.
+                step_ops += [self.actor_optimizer,
+                             self.target_soft_updates]
+
+        return step_ops
+
+    def update_fused(self, num_steps, update_actor=True):
+        """Perform multiple gradient update steps within one session call.
+
+        The batches of all steps are sampled beforehand, and the update steps
+        are performed one after the other by an in-graph loop, in the same
+        manner as `num_steps` calls to `update`. Requires `fused_update` to be
+        set to True.
+
+        **Note**; When using prioritized experience replay, the priorities of
+        the sampled transitions are updated once all steps are performed, and
+        the batches of later steps are therefore not sampled based on the
+        updated priorities of earlier steps.
+
+        Parameters
+        ----------
+        num_steps : int
+            the number of gradient update steps
+        update_actor : bool
+            specifies whether to update the actor policy and the target
+            networks at every step. The critic policy is still updated if this
+            value is set to False.
+        """
+        # Not enough samples in the replay buffer.
+        if not self.replay_buffer.can_sample():
+            return
+
+        # Sample the batches of all steps.
+        batches = [
+            self.replay_buffer.sample(with_weights=True)
+            if self.prioritized_replay else self.replay_buffer.sample()
+            for _ in range(num_steps)
+        ]
+        obs0, actions, rewards, obs1, terminals1 = [
+            np.stack([batch[i] for batch in batches]) for i in range(5)]
+
+        # Prepare the feed_dict information.
+        feed_dict = {
+            self.fused_obs_ph: obs0,
+            self.fused_action_ph: actions,
+            self.fused_rew_ph: rewards.reshape(num_steps, -1, 1),
+            self.fused_obs1_ph: obs1,
+            self.fused_terminals1: terminals1.reshape(num_steps, -1, 1),
+            self.phase_ph: 1,
+            self.rate_ph: 0.5,
+        }
+        if self.prioritized_replay:
+            feed_dict[self.fused_weight_ph] = np.stack(
+                [batch[5] for batch in batches]).reshape(num_steps, -1, 1)
+
+        # Perform the update operations.
+        td_error = self.sess.run(
+            self.fused_td_error[update_actor], feed_dict=feed_dict)
+
+        # Update the priorities of the sampled transitions.
+        if self.prioritized_replay:
+            for batch, td_error_i in zip(batches, td_error):
+                self.replay_buffer.update_priorities(batch[6], td_error_i)
 
     def get_action(self, obs, context, apply_noise, random_actions, env_num=0):
         """See parent class."""
@@ -566,7 +1039,8 @@ class FeedForwardPolicy(Policy):
         obs = self._get_obs(obs, context, axis=1)
 
         if random_actions:
-            action = np.array([self.ac_space.sample()])
+            action = np.array([
+                self.ac_space.sample() for _ in range(len(obs))])
         else:
             action = self.sess.run(self.actor_tf, {
                 self.obs_ph: obs,
@@ -596,7 +1070,42 @@ class FeedForwardPolicy(Policy):
             # masks that correspond to the final step are set to False.
             done = done and not is_final_step
 
-            self.replay_buffer.add(obs0, action, reward, obs1, float(done))
+            self.replay_buffer.add(
+                obs0, action, reward, obs1, float(done), env_num)
+
+    def store_transition_batch(self,
+                               obs0,
+                               context0,
+                               action,
+                               reward,
+                               obs1,
+                               context1,
+                               done,
+                               is_final_step,
+                               env_num,
+                               evaluate=False):
+        """See parent class.
+
+        The transitions are added to the replay buffer in a single call.
+        """
+        if not evaluate and len(env_num) > 0:
+            # Add the contextual observation, if applicable.
+            obs0 = self._get_obs(
+                np.stack([np.ravel(ob) for ob in obs0]),
+                self._stack_context(context0, [1] * len(obs0)),
+                axis=1)
+            obs1 = self._get_obs(
+                np.stack([np.ravel(ob) for ob in obs1]),
+                self._stack_context(context1, [1] * len(obs1)),
+                axis=1)
+
+            # Modify the done mask in accordance with the TD3 algorithm. Done
+            # masks that correspond to the final step are set to False.
+            done = np.logical_and(done, not is_final_step).astype(np.float32)
+
+            self.replay_buffer.add_batch(
+                obs0, np.stack([np.ravel(ac) for ac in action]),
+                np.asarray(reward, dtype=np.float32), obs1, done, env_num)
 
     def initialize(self):
         """See parent class.
@@ -686,3 +1195,10 @@ class FeedForwardPolicy(Policy):
         }
 
         return td_map
+
+    def _sample_batch(self):
+        """Sample a batch for the input pipeline."""
+        if self.prioritized_replay:
+            return self.replay_buffer.sample(with_weights=True)
+        else:
+            return self.replay_buffer.sample()
@@ -3,6 +3,7 @@ import tensorflow as tf
 import numpy as np
 
 from hbaselines.base_policies import Policy
+from hbaselines.fcnet.replay_buffer import RolloutBuffer
 from hbaselines.utils.tf_util import create_fcnet
 from hbaselines.utils.tf_util import create_conv
 from hbaselines.utils.tf_util import print_params_shape
@@ -13,6 +14,7 @@ from hbaselines.utils.tf_util import flatgrad
 from hbaselines.utils.tf_util import SetFromFlat
 from hbaselines.utils.tf_util import GetFlat
 from hbaselines.utils.tf_util import explained_variance
+from hbaselines.utils.tf_util import conjugate_gradient
 
 
 class FeedForwardPolicy(Policy):
@@ -37,6 +39,11 @@ class FeedForwardPolicy(Policy):
         the compute gradient dampening factor
     max_kl : float
         the Kullback-Leibler loss threshold
+    fisher_fraction : float
+        the fraction of the batch used to compute the Fisher-vector products
+        of the conjugate gradient calculation
+    rollout_buffer : hbaselines.fcnet.replay_buffer.RolloutBuffer
+        the storage of the on-policy samples of every environment
     mb_rewards : array_like
         a minibatch of environment rewards
     mb_obs : array_like
@@ -49,8 +56,6 @@ class FeedForwardPolicy(Policy):
         a minibatch of estimated values by the policy
     mb_dones : array_like
         a minibatch of done masks
-    mb_all_obs : array_like
-        a minibatch of full-state observations
     mb_returns : array_like
         a minibatch of expected discounted returns
     last_obs : array_like
@@ -68,8 +73,9 @@ class FeedForwardPolicy(Policy):
         placeholder for the advantages
     old_vpred_ph : tf.compat.v1.placeholder
         placeholder for the predicted value
-    flat_tangent : tf.compat.v1.placeholder
-        placeholder for the tangents
+    fisher_obs_ph : tf.compat.v1.placeholder
+        placeholder for the subsampled observations used to compute the
+        Fisher-vector products
     phase_ph : tf.compat.v1.placeholder
         a placeholder that defines whether training is occurring for the batch
         normalization layer. Set to True in training and False in testing.
@@ -96,6 +102,17 @@ class FeedForwardPolicy(Policy):
     value_flat : tf.Variable
         the output from the previous instantiation of the flattened value
         function
+    stepdir : tf.Variable
+        the natural gradient direction, computed by the conjugate gradient
+        calculation
+    fullstep : tf.Variable
+        the natural gradient step, scaled to the Kullback-Leibler loss
+        threshold
+    expected_improve : tf.Variable
+        the expected improvement of the surrogate gain after the full step
+    step_losses : tf.Variable
+        the policy losses after every step size of the line search, of shape
+        (num_stepsizes, num_losses)
     """
 
     def __init__(self,
@@ -114,6 +131,7 @@ class FeedForwardPolicy(Policy):
                  vf_stepsize,
                  cg_damping,
                  max_kl,
+                 fisher_fraction,
                  scope=None,
                  num_envs=1):
         """Instantiate the policy object.
@@ -152,6 +170,9 @@ class FeedForwardPolicy(Policy):
             the compute gradient dampening factor
         max_kl : float
             the Kullback-Leibler loss threshold
+        fisher_fraction : float
+            the fraction of the batch used to compute the Fisher-vector
+            products of the conjugate gradient calculation
         """
         super(FeedForwardPolicy, self).__init__(
             sess=sess,
@@ -172,18 +193,12 @@ class FeedForwardPolicy(Policy):
         self.vf_stepsize = vf_stepsize
         self.cg_damping = cg_damping
         self.max_kl = max_kl
+        self.fisher_fraction = fisher_fraction
 
         # Create variables to store on-policy data.
-        self.mb_rewards = [[] for _ in range(num_envs)]
-        self.mb_obs = [[] for _ in range(num_envs)]
-        self.mb_contexts = [[] for _ in range(num_envs)]
-        self.mb_actions = [[] for _ in range(num_envs)]
-        self.mb_values = [[] for _ in range(num_envs)]
-        self.mb_dones = [[] for _ in range(num_envs)]
-        self.mb_all_obs = [[] for _ in range(num_envs)]
-        self.mb_returns = [[] for _ in range(num_envs)]
+        self.rollout_buffer = RolloutBuffer(num_envs)
         self.last_obs = [None for _ in range(num_envs)]
-        self.mb_advs = None
+        self._clear_minibatch()
 
         # Compute the shape of the input observation space, which may include
         # the contextual term.
@@ -214,10 +229,10 @@ class FeedForwardPolicy(Policy):
                 tf.float32,
                 shape=(None,),
                 name="old_vpred_ph")
-            self.flat_tangent = tf.placeholder(
-                dtype=tf.float32,
-                shape=[None],
-                name="flat_tan")
+            self.fisher_obs_ph = tf.compat.v1.placeholder(
+                tf.float32,
+                shape=(None,) + ob_dim,
+                name='fisher_obs')
             self.phase_ph = tf.compat.v1.placeholder(
                 tf.bool,
                 name='phase')
@@ -412,28 +427,7 @@ class FeedForwardPolicy(Policy):
         # =================================================================== #
 
         with tf.variable_scope("loss", reuse=False):
-            # Compute the KL divergence.
-            kloldnew = tf.reduce_sum(
-                self.pi_logstd - self.old_pi_logstd + (
-                    tf.square(self.old_pi_std) +
-                    tf.square(self.old_pi_mean - self.pi_mean))
-                / (2.0 * tf.square(self.pi_std)) - 0.5, axis=-1)
-            meankl = tf.reduce_mean(kloldnew)
-
-            # Compute the entropy bonus.
-            entropy = tf.reduce_sum(
-                self.pi_logstd + .5 * np.log(2.0 * np.pi * np.e), axis=-1)
-            meanent = tf.reduce_mean(entropy)
-            entbonus = self.ent_coef * meanent
-
-            # advantage * pnew / pold
-            ratio = tf.exp(
-                self.logp(self.action_ph, old=False) -
-                self.logp(self.action_ph, old=True))
-            surrgain = tf.reduce_mean(ratio * self.advs_ph)
-
-            optimgain = surrgain + entbonus
-            self.losses = [optimgain, meankl, entbonus, surrgain, meanent]
+            self.losses = self._policy_losses(self.pi_mean, self.pi_logstd)
 
             all_var_list = get_trainable_vars(scope_name)
             var_list = [
@@ -446,20 +440,69 @@ class FeedForwardPolicy(Policy):
             self.get_flat = GetFlat(var_list, sess=self.sess)
             self.set_from_flat = SetFromFlat(var_list, sess=self.sess)
 
-            klgrads = tf.gradients(meankl, var_list)
-            shapes = [var.get_shape().as_list() for var in var_list]
-            start = 0
-            tangents = []
-            for shape in shapes:
-                var_size = int(np.prod(shape))
-                tangents.append(tf.reshape(
-                    self.flat_tangent[start: start + var_size], shape))
-                start += var_size
-            gvp = tf.add_n(
-                [tf.reduce_sum(grad * tangent)
-                 for (grad, tangent) in zip(klgrads, tangents)])
-            # Fisher vector products
-            self.fvp = flatgrad(gvp, var_list)
+            self.grad = flatgrad(self.losses[0], var_list)
+
+        # =================================================================== #
+        # Compute the natural gradient step within the graph.                 #
+        # =================================================================== #
+
+        # the variable scope of the policy parameters, which is reused by the
+        # networks created below
+        model_scope = tf.compat.v1.VariableScope(True, scope_name[:-1])
+
+        with tf.variable_scope("step", reuse=False):
+            # Compute the KL divergence on the subsampled Fisher batch. The
+            # step is computed after the old policy is updated to match the
+            # current one, so the current policy with its gradients stopped
+            # is used as the reference distribution.
+            with tf.compat.v1.variable_scope(model_scope):
+                _, fisher_mean, fisher_logstd = self.make_actor(
+                    self.fisher_obs_ph, reuse=True, scope="pi")
+            fisher_kl = tf.reduce_mean(self._gaussian_kl(
+                old_mean=tf.stop_gradient(fisher_mean),
+                old_logstd=tf.stop_gradient(fisher_logstd),
+                mean=fisher_mean,
+                logstd=fisher_logstd))
+            klgrads = tf.gradients(fisher_kl, var_list)
+
+            def fisher_vector_product(vec):
+                # The tangent is a constant of the product, not a function of
+                # the parameters.
+                vec = tf.stop_gradient(vec)
+                gvp = tf.add_n([
+                    tf.reduce_sum(grad * tangent) for (grad, tangent) in zip(
+                        klgrads, self._unflatten(vec, var_list))])
+                return flatgrad(gvp, var_list) + self.cg_damping * vec
+
+            # Solve for the step direction, and scale it to the KL threshold.
+            self.stepdir = conjugate_gradient(
+                fisher_vector_product, self.grad, cg_iters=self.cg_iters)
+            shs = .5 * tf.reduce_sum(
+                self.stepdir * fisher_vector_product(self.stepdir))
+            # abs(shs) to avoid taking square root of negative values
+            lagrange_multiplier = tf.sqrt(tf.abs(shs) / self.max_kl)
+            self.fullstep = self.stepdir / lagrange_multiplier
+            self.expected_improve = tf.reduce_sum(self.grad * self.fullstep)
+
+        # =================================================================== #
+        # Compute the losses of every line search step size.                  #
+        # =================================================================== #
+
+        self.step_losses = []
+        stepsize = 1.0
+        for i in range(10):
+            with tf.variable_scope("line_search_{}".format(i), reuse=False):
+                # Recreate the policy with the parameters offset by the step.
+                with tf.compat.v1.variable_scope(
+                        model_scope,
+                        custom_getter=self._step_getter(var_list, stepsize)):
+                    _, step_mean, step_logstd = self.make_actor(
+                        self.obs_ph, reuse=True, scope="pi")
+
+                self.step_losses.append(
+                    tf.stack(self._policy_losses(step_mean, step_logstd)))
+            stepsize *= .5
+        self.step_losses = tf.stack(self.step_losses)
 
         # =================================================================== #
         # Update the old model to match the new one.                          #
@@ -489,8 +532,6 @@ class FeedForwardPolicy(Policy):
         th_init = self.get_flat()
         self.set_from_flat(th_init)
 
-        self.grad = flatgrad(optimgain, var_list)
-
     def _setup_stats(self, base):
         """Create the running means and std of the model inputs and outputs.
 
@@ -567,23 +608,17 @@ class FeedForwardPolicy(Policy):
             whether the sample is being provided by the evaluation environment.
             If so, the data is not stored in the replay buffer.
         """
-        # Update the minibatch of samples.
-        self.mb_rewards[env_num].append(reward)
-        self.mb_obs[env_num].append(obs0.reshape(1, -1))
-        self.mb_contexts[env_num].append(context0)
-        self.mb_actions[env_num].append(action.reshape(1, -1))
-        self.mb_dones[env_num].append(done)
-
-        # Store information on the values.
-        values = self.sess.run(
-            self.value_flat,
-            feed_dict={
-                self.obs_ph: obs0.reshape(1, -1),
-                self.phase_ph: 0,
-                self.rate_ph: 0.0,
-            }
+        # Update the minibatch of samples. The values are computed for all
+        # samples at once, see `update`.
+        samples = dict(
+            obs=obs0.flatten(),
+            action=action.flatten(),
+            reward=reward,
+            done=done,
         )
-        self.mb_values[env_num].append(values)
+        if context0 is not None:
+            samples["context"] = np.asarray(context0).flatten()
+        self.rollout_buffer.add(env_num, **samples)
 
         # Update the last observation (to compute the last value for the GAE
         # expected returns).
@@ -591,62 +626,63 @@ class FeedForwardPolicy(Policy):
 
     def update(self, **kwargs):
         """See parent class."""
-        # In case not all environment numbers were used, reduce the shape of
-        # the datasets.
-        indices = [
+        # In case not all environment numbers were used, only use the
+        # samples of the environments that were.
+        env_nums = [
             i for i in range(self.num_envs) if self.last_obs[i] is not None]
-        num_envs = len(indices)
-
-        self.mb_rewards = self._sample(self.mb_rewards, indices)
-        self.mb_obs = self._sample(self.mb_obs, indices)
-        self.mb_contexts = self._sample(self.mb_contexts, indices)
-        self.mb_actions = self._sample(self.mb_actions, indices)
-        self.mb_values = self._sample(self.mb_values, indices)
-        self.mb_dones = self._sample(self.mb_dones, indices)
-        self.mb_all_obs = self._sample(self.mb_all_obs, indices)
-        self.mb_returns = self._sample(self.mb_returns, indices)
-        self.last_obs = self._sample(self.last_obs, indices)
-
-        # Compute the last estimated value.
-        last_values = [
-            self.sess.run(
-                self.value_flat,
-                feed_dict={
-                    self.obs_ph: self.last_obs[env_num],
-                    self.phase_ph: 0,
-                    self.rate_ph: 0.0,
-                })
-            for env_num in range(num_envs)
-        ]
+        samples, num_steps = self.rollout_buffer.get(env_nums)
+
+        # Compute the estimated values of all samples in a single pass. The
+        # policy has not been updated since the samples were collected.
+        mask = np.arange(samples["obs"].shape[1]) < num_steps[:, None]
+        samples["value"] = np.zeros(mask.shape, dtype=np.float32)
+        samples["value"][mask] = self.sess.run(
+            self.value_flat,
+            feed_dict={
+                self.obs_ph: self._get_obs(
+                    samples["obs"][mask],
+                    samples["context"][mask] if "context" in samples
+                    else None,
+                    axis=1),
+                self.phase_ph: 0,
+                self.rate_ph: 0.0,
+            })
+
+        # Compute the last estimated values of all environments.
+        last_values = self.sess.run(
+            self.value_flat,
+            feed_dict={
+                self.obs_ph: np.concatenate(
+                    [self.last_obs[i] for i in env_nums], axis=0),
+                self.phase_ph: 0,
+                self.rate_ph: 0.0,
+            })
 
         (self.mb_obs,
          self.mb_contexts,
          self.mb_actions,
          self.mb_values,
          _,
-         self.mb_all_obs,
          self.mb_rewards,
          self.mb_returns,
          self.mb_dones,
          self.mb_advs, n_steps) = process_minibatch(
-            mb_obs=self.mb_obs,
-            mb_contexts=self.mb_contexts,
-            mb_actions=self.mb_actions,
-            mb_values=self.mb_values,
+            mb_obs=samples["obs"],
+            mb_contexts=samples.get("context"),
+            mb_actions=samples["action"],
+            mb_values=samples["value"],
             mb_neglogpacs=None,
-            mb_all_obs=self.mb_all_obs,
-            mb_rewards=self.mb_rewards,
-            mb_returns=self.mb_returns,
-            mb_dones=self.mb_dones,
+            mb_rewards=samples["reward"],
+            mb_dones=samples["done"],
+            mb_lengths=num_steps,
             last_values=last_values,
             gamma=self.gamma,
             lam=self.lam,
-            num_envs=num_envs,
         )
 
         self.update_from_batch(
             obs=self.mb_obs,
-            context=None if self.mb_contexts[0] is None else self.mb_contexts,
+            context=self.mb_contexts,
             returns=self.mb_returns,
             actions=self.mb_actions,
             advs=self.mb_advs,
@@ -671,66 +707,38 @@ class FeedForwardPolicy(Policy):
         # Add the contextual observation, if applicable.
         obs = self._get_obs(obs, context, axis=1)
 
-        def fisher_vector_product(vec):
-            return self.sess.run(self.fvp, feed_dict={
-                self.flat_tangent: vec,
-                self.obs_ph: fvpargs[0],
-                self.action_ph: fvpargs[1],
-                self.advs_ph: fvpargs[2],
-            }) + self.cg_damping * vec
-
         # standardized advantage function estimate
         advs = (advs - advs.mean()) / (advs.std() + 1e-8)
 
         # Subsampling: see p40-42 of John Schulman thesis
         # http://joschu.net/docs/thesis.pdf
-        args = obs, actions, advs
-        fvpargs = [arr[::5] for arr in args]
+        fisher_obs = obs[::max(1, int(round(1. / self.fisher_fraction)))]
 
         self.sess.run(self.assign_old_eq_new)
 
-        # run loss backprop with summary, and save the metadata (memory,
-        # compute time, ...)
-        grad, *lossbefore = self.sess.run(
-            [self.grad] + self.losses,
-            feed_dict={
-                self.obs_ph: obs,
-                self.action_ph: actions,
-                self.advs_ph: advs,
-                self.ret_ph: returns,
-            }
-        )
+        # Compute the gradient, the natural gradient step, and the losses
+        # after every step size of the line search in a single pass.
+        grad, stepdir, fullstep, expectedimprove, lossbefore, step_losses = \
+            self.sess.run(
+                [self.grad, self.stepdir, self.fullstep,
+                 self.expected_improve, self.losses, self.step_losses],
+                feed_dict={
+                    self.obs_ph: obs,
+                    self.fisher_obs_ph: fisher_obs,
+                    self.action_ph: actions,
+                    self.advs_ph: advs,
+                    self.ret_ph: returns,
+                }
+            )
 
-        lossbefore = np.array(lossbefore)
         if np.allclose(grad, 0):
             print("Got zero gradient. not updating")
         else:
-            stepdir = self.conjugate_gradient(
-                fisher_vector_product,
-                grad,
-                cg_iters=self.cg_iters,
-                verbose=self.verbose >= 1,
-            )
             assert np.isfinite(stepdir).all()
-            shs = .5 * stepdir.dot(fisher_vector_product(stepdir))
-            # abs(shs) to avoid taking square root of negative values
-            lagrange_multiplier = np.sqrt(abs(shs) / self.max_kl)
-            fullstep = stepdir / lagrange_multiplier
-            expectedimprove = grad.dot(fullstep)
             surrbefore = lossbefore[0]
             stepsize = 1.0
-            thbefore = self.get_flat()
-            for _ in range(10):
-                thnew = thbefore + fullstep * stepsize
-                self.set_from_flat(thnew)
-                mean_losses = surr, kl_loss, *_ = self.sess.run(
-                    self.losses,
-                    feed_dict={
-                        self.obs_ph: obs,
-                        self.action_ph: actions,
-                        self.advs_ph: advs,
-                    }
-                )
+            for mean_losses in step_losses:
+                surr, kl_loss, *_ = mean_losses
                 improve = surr - surrbefore
                 print("Expected: %.3f Actual: %.3f" % (
                     expectedimprove, improve))
@@ -742,11 +750,11 @@ class FeedForwardPolicy(Policy):
                     print("surrogate didn't improve. shrinking step.")
                 else:
                     print("Stepsize OK!")
+                    self.set_from_flat(self.get_flat() + fullstep * stepsize)
                     break
                 stepsize *= .5
             else:
                 print("couldn't compute a good step")
-                self.set_from_flat(thbefore)
 
         for _ in range(self.vf_iters):
             for (mbob, mbret) in self.iterbatches(
@@ -763,8 +771,7 @@ class FeedForwardPolicy(Policy):
     def get_td_map(self):
         """See parent class."""
         # Add the contextual observation, if applicable.
-        context = None if self.mb_contexts[0] is None else self.mb_contexts
-        obs = self._get_obs(self.mb_obs, context, axis=1)
+        obs = self._get_obs(self.mb_obs, self.mb_contexts, axis=1)
 
         td_map = self.get_td_map_from_batch(
             obs=obs.copy(),
@@ -775,16 +782,9 @@ class FeedForwardPolicy(Policy):
         )
 
         # Clear memory
-        self.mb_rewards = [[] for _ in range(self.num_envs)]
-        self.mb_obs = [[] for _ in range(self.num_envs)]
-        self.mb_contexts = [[] for _ in range(self.num_envs)]
-        self.mb_actions = [[] for _ in range(self.num_envs)]
-        self.mb_values = [[] for _ in range(self.num_envs)]
-        self.mb_dones = [[] for _ in range(self.num_envs)]
-        self.mb_all_obs = [[] for _ in range(self.num_envs)]
-        self.mb_returns = [[] for _ in range(self.num_envs)]
+        self.rollout_buffer.clear()
         self.last_obs = [None for _ in range(self.num_envs)]
-        self.mb_advs = None
+        self._clear_minibatch()
 
         return td_map
 
@@ -816,12 +816,19 @@ class FeedForwardPolicy(Policy):
         else:
             return - self._neglogp(x)
 
-    def _neglogp(self, x):
-        """Return the negative-logp of the current policy."""
+    def _neglogp(self, x, pi_mean=None, pi_logstd=None):
+        """Return the negative-logp of the current policy.
+
+        If provided, the mean and log-std terms are used in place of those of
+        the current policy.
+        """
+        if pi_mean is None:
+            pi_mean, pi_logstd = self.pi_mean, self.pi_logstd
+
         return 0.5 * tf.reduce_sum(
-            tf.square((x - self.pi_mean) / self.pi_std), axis=-1) + 0.5 * \
+            tf.square((x - pi_mean) / tf.exp(pi_logstd)), axis=-1) + 0.5 * \
             np.log(2.0 * np.pi) * tf.cast(tf.shape(x)[-1], tf.float32) \
-            + tf.reduce_sum(self.pi_logstd, axis=-1)
+            + tf.reduce_sum(pi_logstd, axis=-1)
 
     def _old_neglogp(self, x):
         """Return the negative-logp of the previous policy."""
@@ -830,6 +837,86 @@ class FeedForwardPolicy(Policy):
             + 0.5 * np.log(2. * np.pi) * tf.cast(tf.shape(x)[-1], tf.float32) \
             + tf.reduce_sum(self.old_pi_logstd, axis=-1)
 
+    def _policy_losses(self, pi_mean, pi_logstd):
+        """Return the policy losses of a policy relative to the previous one.
+
+        Parameters
+        ----------
+        pi_mean : tf.Tensor
+            the output from the policy's mean term
+        pi_logstd : tf.Tensor
+            the output from the policy's log-std term
+
+        Returns
+        -------
+        list of tf.Tensor
+            the optimized gain, the mean KL divergence, the entropy bonus, the
+            surrogate gain, and the mean entropy
+        """
+        # Compute the KL divergence.
+        kloldnew = self._gaussian_kl(
+            old_mean=self.old_pi_mean,
+            old_logstd=self.old_pi_logstd,
+            mean=pi_mean,
+            logstd=pi_logstd)
+        meankl = tf.reduce_mean(kloldnew)
+
+        # Compute the entropy bonus.
+        entropy = tf.reduce_sum(
+            pi_logstd + .5 * np.log(2.0 * np.pi * np.e), axis=-1)
+        meanent = tf.reduce_mean(entropy)
+        entbonus = self.ent_coef * meanent
+
+        # advantage * pnew / pold
+        ratio = tf.exp(
+            self._old_neglogp(self.action_ph) -
+            self._neglogp(self.action_ph, pi_mean, pi_logstd))
+        surrgain = tf.reduce_mean(ratio * self.advs_ph)
+
+        optimgain = surrgain + entbonus
+
+        return [optimgain, meankl, entbonus, surrgain, meanent]
+
+    @staticmethod
+    def _gaussian_kl(old_mean, old_logstd, mean, logstd):
+        """Return the KL divergence between two diagonal Gaussian policies."""
+        return tf.reduce_sum(
+            logstd - old_logstd + (
+                tf.square(tf.exp(old_logstd)) +
+                tf.square(old_mean - mean))
+            / (2.0 * tf.square(tf.exp(logstd))) - 0.5, axis=-1)
+
+    @staticmethod
+    def _unflatten(flat_vec, var_list):
+        """Split a flat vector into tensors of the shapes of the variables."""
+        tensors = []
+        start = 0
+        for var in var_list:
+            shape = var.get_shape().as_list()
+            var_size = int(np.prod(shape))
+            tensors.append(
+                tf.reshape(flat_vec[start: start + var_size], shape))
+            start += var_size
+
+        return tensors
+
+    def _step_getter(self, var_list, stepsize):
+        """Return a custom getter that offsets the policy parameters.
+
+        The variables in var_list are replaced by their value after a step of
+        the given size along the natural gradient step. This is used to
+        evaluate every step size of the line search within the same graph.
+        """
+        steps = dict(zip(
+            [var.op.name for var in var_list],
+            self._unflatten(stepsize * self.fullstep, var_list)))
+
+        def _getter(getter, name, *args, **kwargs):
+            var = getter(name, *args, **kwargs)
+            return var + steps[name] if name in steps else var
+
+        return _getter
+
     @staticmethod
     def iterbatches(arrays,
                     *,
@@ -873,72 +960,13 @@ class FeedForwardPolicy(Policy):
             if include_final_partial_batch or len(batch_inds) == batch_size:
                 yield tuple(a[batch_inds] for a in arrays)
 
-    @staticmethod
-    def conjugate_gradient(f_ax,
-                           b_vec,
-                           cg_iters=10,
-                           verbose=False,
-                           residual_tol=1e-10):
-        """Calculate the conjugate gradient of Ax = b.
-
-        Based on https://epubs.siam.org/doi/book/10.1137/1.9781611971446 Demmel
-        p 312.
-
-        Parameters
-        ----------
-        f_ax : function
-            The function describing the Matrix A dot the vector x (x being the
-            input parameter of the function)
-        b_vec : array_like
-            vector b, where Ax = b
-        cg_iters : int
-            the maximum number of iterations for converging
-        verbose : bool
-            print extra information
-        residual_tol : float
-            the break point if the residual is below this value
-
-        Returns
-        -------
-        array_like
-            vector x, where Ax = b
-        """
-        # the first basis vector
-        first_basis_vect = b_vec.copy()
-        # the residual
-        residual = b_vec.copy()
-        # vector x, where Ax = b
-        x_var = np.zeros_like(b_vec)
-        # L2 norm of the residual
-        residual_dot_residual = residual.dot(residual)
-
-        fmt_str = "%10i %10.3g %10.3g"
-        title_str = "%10s %10s %10s"
-        if verbose:
-            print(title_str % ("iter", "residual norm", "soln norm"))
-
-        for i in range(cg_iters):
-            if verbose:
-                print(fmt_str %
-                      (i, residual_dot_residual, np.linalg.norm(x_var)))
-            z_var = f_ax(first_basis_vect)
-            v_var = residual_dot_residual / first_basis_vect.dot(z_var)
-            x_var += v_var * first_basis_vect
-            residual -= v_var * z_var
-            new_residual_dot_residual = residual.dot(residual)
-            mu_val = new_residual_dot_residual / residual_dot_residual
-            first_basis_vect = residual + mu_val * first_basis_vect
-
-            residual_dot_residual = new_residual_dot_residual
-            if residual_dot_residual < residual_tol:
-                break
-
-        if verbose:
-            print(fmt_str %
-                  (cg_iters, residual_dot_residual, np.linalg.norm(x_var)))
-        return x_var
-
-    @staticmethod
-    def _sample(vals, indices):
-        """Sample indices from a list."""
-        return [vals[i] for i in range(len(vals)) if i in indices]
+    def _clear_minibatch(self):
+        """Remove the processed minibatch of samples."""
+        self.mb_rewards = None
+        self.mb_obs = None
+        self.mb_contexts = None
+        self.mb_actions = None
+        self.mb_values = None
+        self.mb_dones = None
+        self.mb_returns = None
+        self.mb_advs = None
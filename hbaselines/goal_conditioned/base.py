@@ -59,6 +59,11 @@ class GoalConditionedPolicy(Policy):
     subgoal_testing_rate : float
         rate at which the original (non-hindsight) sample is stored in the
         replay buffer as well. Used only if `hindsight` is set to True.
+    hindsight_relabel_prob : float or None
+        the probability that a sample is relabeled with hindsight goals and
+        rewards when it is sampled from the replay buffer. If set to None,
+        hindsight samples are instead computed and stored in the replay buffer
+        when every meta-period ends. Used only if `hindsight` is set to True.
     cooperative_gradients : bool
         whether to use the cooperative gradient update procedure for the
         higher-level policy. See: https://arxiv.org/abs/1912.02368v1
@@ -102,6 +107,9 @@ class GoalConditionedPolicy(Policy):
                  tau,
                  gamma,
                  use_huber,
+                 prioritized_replay,
+                 replay_buffer_path,
+                 reduced_precision_replay,
                  l2_penalty,
                  model_params,
                  num_levels,
@@ -112,6 +120,7 @@ class GoalConditionedPolicy(Policy):
                  off_policy_corrections,
                  hindsight,
                  subgoal_testing_rate,
+                 hindsight_relabel_prob,
                  cooperative_gradients,
                  cg_weights,
                  cg_delta,
@@ -156,6 +165,15 @@ class GoalConditionedPolicy(Policy):
             specifies whether to use the huber distance function as the loss
             for the critic. If set to False, the mean-squared error metric is
             used instead
+        prioritized_replay : bool
+            whether to use prioritized experience replay. Not supported by
+            goal-conditioned policies.
+        replay_buffer_path : str or None
+            the directory in which the replay buffer is stored as memory-mapped
+            files. Not supported by goal-conditioned policies.
+        reduced_precision_replay : bool
+            whether to store the observations in the replay buffer with reduced
+            precision. Not supported by goal-conditioned policies.
         model_params : dict
             dictionary of model-specific parameters. See parent class.
         num_levels : int
@@ -201,6 +219,12 @@ class GoalConditionedPolicy(Policy):
         subgoal_testing_rate : float
             rate at which the original (non-hindsight) sample is stored in the
             replay buffer as well. Used only if `hindsight` is set to True.
+        hindsight_relabel_prob : float or None
+            the probability that a sample is relabeled with hindsight goals and
+            rewards when it is sampled from the replay buffer. If set to None,
+            hindsight samples are instead computed and stored in the replay
+            buffer when every meta-period ends. Used only if `hindsight` is set
+            to True.
         cooperative_gradients : bool
             whether to use the cooperative gradient update procedure for the
             higher-level policy. See: https://arxiv.org/abs/1912.02368v1
@@ -252,6 +276,16 @@ class GoalConditionedPolicy(Policy):
             assert num_levels == 2, \
                 "Hindsight only work for two-level hierarchies."
 
+        if prioritized_replay:
+            print("WARNING: prioritized_replay is not supported by "
+                  "goal-conditioned policies. Ignoring.")
+        if replay_buffer_path is not None:
+            print("WARNING: replay_buffer_path is not supported by "
+                  "goal-conditioned policies. Ignoring.")
+        if reduced_precision_replay:
+            print("WARNING: reduced_precision_replay is not supported by "
+                  "goal-conditioned policies. Ignoring.")
+
         # Process some variable.
         if isinstance(meta_period, list) and len(meta_period) == 1:
             meta_period = meta_period[0]
@@ -267,6 +301,7 @@ class GoalConditionedPolicy(Policy):
         self.off_policy_corrections = off_policy_corrections
         self.hindsight = hindsight
         self.subgoal_testing_rate = subgoal_testing_rate
+        self.hindsight_relabel_prob = hindsight_relabel_prob
         self.cooperative_gradients = cooperative_gradients
         self.cg_weights = cg_weights
         self.cg_delta = cg_delta
@@ -328,6 +363,9 @@ class GoalConditionedPolicy(Policy):
                     tau=tau,
                     gamma=gamma,
                     use_huber=use_huber,
+                    prioritized_replay=False,
+                    replay_buffer_path=None,
+                    reduced_precision_replay=False,
                     l2_penalty=l2_penalty,
                     model_params=model_params_i,
                     scope=scope_i,
@@ -338,20 +376,6 @@ class GoalConditionedPolicy(Policy):
         # Step 2: Create attributes for the replay buffer.                    #
         # =================================================================== #
 
-        # Create the replay buffer.
-        self.replay_buffer = HierReplayBuffer(
-            buffer_size=int(buffer_size/(
-                meta_period ** num_levels - 1 if isinstance(meta_period, int)
-                else reduce((lambda x, y: x*y), self.meta_period))),
-            batch_size=batch_size,
-            meta_period=meta_period,
-            obs_dim=ob_space.shape[0],
-            ac_dim=ac_space.shape[0],
-            co_dim=None if co_space is None else co_space.shape[0],
-            goal_dim=meta_ac_space.shape[0],
-            num_levels=num_levels
-        )
-
         # current action by the meta-level policies
         self.meta_action = [[None for _ in range(num_levels - 1)]
                             for _ in range(num_envs)]
@@ -381,6 +405,13 @@ class GoalConditionedPolicy(Policy):
         # for each environment.
         self._dones = [[] for _ in range(num_envs)]
 
+        # the goal assigned to every goal-conditioned level at every time step,
+        # ordered from highest to lowest level policy. These are used to
+        # compute the intrinsic rewards of an entire meta-period at once. A
+        # separate element is used for each environment.
+        self._goals = [[[] for _ in range(self.num_levels - 1)]
+                       for _ in range(num_envs)]
+
         # Collect the state indices for the intrinsic rewards.
         self.goal_indices = get_state_indices(ob_space, env_name)
 
@@ -406,11 +437,13 @@ class GoalConditionedPolicy(Policy):
             else:
                 scale = 1
 
+            # The reward functions below accept either a single transition or
+            # a batch of transitions, with one transition per row.
             def intrinsic_reward_fn(states, goals, next_states):
                 return negative_distance(
-                    states=states[self.goal_indices] / scale,
+                    states=states[..., self.goal_indices] / scale,
                     goals=goals / scale,
-                    next_states=next_states[self.goal_indices] / scale,
+                    next_states=next_states[..., self.goal_indices] / scale,
                     relative_context=relative_goals,
                     offset=0.0,
                 ) + offset
@@ -430,6 +463,24 @@ class GoalConditionedPolicy(Policy):
             raise ValueError("Unknown intrinsic reward type: {}".format(
                 intrinsic_reward_type))
 
+        # Create the replay buffer.
+        self.replay_buffer = HierReplayBuffer(
+            buffer_size=int(buffer_size/(
+                meta_period ** num_levels - 1 if isinstance(meta_period, int)
+                else reduce((lambda x, y: x*y), self.meta_period))),
+            batch_size=batch_size,
+            meta_period=meta_period,
+            obs_dim=ob_space.shape[0],
+            ac_dim=ac_space.shape[0],
+            co_dim=None if co_space is None else co_space.shape[0],
+            goal_dim=meta_ac_space.shape[0],
+            num_levels=num_levels,
+            relabel_prob=hindsight_relabel_prob if hindsight else None,
+            goal_indices=self.goal_indices,
+            relative_goals=relative_goals,
+            reward_fn=self._hindsight_rewards,
+        )
+
         # =================================================================== #
         # Step 3: Create algorithm-specific features.                         #
         # =================================================================== #
@@ -457,6 +508,13 @@ class GoalConditionedPolicy(Policy):
                 with tf.compat.v1.variable_scope(scope):
                     self._setup_cooperative_gradients()
 
+        if self.off_policy_corrections:
+            if scope is None:
+                self._setup_off_policy_corrections()
+            else:
+                with tf.compat.v1.variable_scope(scope):
+                    self._setup_off_policy_corrections()
+
     def initialize(self):
         """See parent class.
 
@@ -622,47 +680,158 @@ class GoalConditionedPolicy(Policy):
 
     def get_action(self, obs, context, apply_noise, random_actions, env_num=0):
         """See parent class."""
+        return self.get_action_batch(
+            obs=[obs],
+            context=[context],
+            apply_noise=apply_noise,
+            random_actions=random_actions,
+            env_num=[env_num],
+        )[0]
+
+    def get_action_batch(self,
+                         obs,
+                         context,
+                         apply_noise,
+                         random_actions,
+                         env_num):
+        """See parent class.
+
+        The meta-actions of the environments whose meta-periods have ended are
+        recomputed by a single call to the policy of the corresponding level,
+        while the meta-actions of all other environments are updated via the
+        fixed goal transition function. The worker actions of all environments
+        are then computed together.
+        """
         # Increment the internal number of get_action calls.
-        self._steps += 1
+        self._steps += len(env_num)
+
+        # Stack the observations and contextual terms of all environments.
+        obs_all = np.concatenate(obs, axis=0)
+        context_all = self._stack_context(context, [1] * len(env_num))
 
         # Loop through the policies in the hierarchy.
         for i in range(self.num_levels - 1):
-            if self._update_meta(i, env_num):
+            # Environments whose meta-action needs to be recomputed.
+            update = [j for j, num in enumerate(env_num)
+                      if self._update_meta(i, num)]
+
+            if len(update) > 0:
                 if self._pretrain_level(i):
                     # Sample goals randomly when performing pre-training.
-                    self.meta_action[env_num][i] = np.array([
-                        self.policy[i].ac_space.sample()])
+                    meta_action = np.array([
+                        self.policy[i].ac_space.sample() for _ in update])
                 else:
-                    context_i = context if i == 0 \
-                        else self.meta_action[env_num][i - 1]
+                    if i == 0:
+                        context_i = None if context_all is None \
+                            else context_all[update]
+                    else:
+                        context_i = np.concatenate([
+                            self.meta_action[env_num[j]][i - 1]
+                            for j in update], axis=0)
 
                     # Update the meta action based on the output from the
                     # policy if the time period requires is.
-                    self.meta_action[env_num][i] = self.policy[i].get_action(
-                        obs, context_i, apply_noise, random_actions)
-            else:
-                # Update the meta-action in accordance with a fixed transition
-                # function.
-                self.meta_action[env_num][i] = self.goal_transition_fn(
-                    obs0=np.array(
-                        [self._observations[env_num][-1][self.goal_indices]]),
-                    goal=self.meta_action[env_num][i],
-                    obs1=obs[:, self.goal_indices]
-                )
+                    meta_action = self.policy[i].get_action(
+                        obs_all[update], context_i, apply_noise,
+                        random_actions)
+
+                for k, j in enumerate(update):
+                    self.meta_action[env_num[j]][i] = meta_action[k:k+1]
+
+            for j, num in enumerate(env_num):
+                if j not in update:
+                    # Update the meta-action in accordance with a fixed
+                    # transition function.
+                    self.meta_action[num][i] = self.goal_transition_fn(
+                        obs0=np.array(
+                            [self._observations[num][-1][self.goal_indices]]),
+                        goal=self.meta_action[num][i],
+                        obs1=obs[j][:, self.goal_indices]
+                    )
 
         # Return the action to be performed within the environment (i.e. the
         # action by the lowest level policy).
         action = self.policy[-1].get_action(
-            obs=obs,
-            context=self.meta_action[env_num][-1],
+            obs=obs_all,
+            context=np.concatenate(
+                [self.meta_action[num][-1] for num in env_num], axis=0),
             apply_noise=apply_noise,
             random_actions=random_actions and self.pretrain_path is None)
 
-        return action
+        return [action[j:j+1] for j in range(len(env_num))]
 
     def store_transition(self, obs0, context0, action, reward, obs1, context1,
                          done, is_final_step, env_num=0, evaluate=False):
         """See parent class."""
+        self.store_transition_batch(
+            obs0=[obs0],
+            context0=[context0],
+            action=[action],
+            reward=[reward],
+            obs1=[obs1],
+            context1=[context1],
+            done=[done],
+            is_final_step=is_final_step,
+            env_num=[env_num],
+            evaluate=evaluate,
+        )
+
+    def store_transition_batch(self,
+                               obs0,
+                               context0,
+                               action,
+                               reward,
+                               obs1,
+                               context1,
+                               done,
+                               is_final_step,
+                               env_num,
+                               evaluate=False):
+        """See parent class.
+
+        The samples of all environments whose meta-periods have ended are
+        added to the replay buffer in a single call.
+        """
+        samples = []
+        for j, num in enumerate(env_num):
+            samples.extend(self._store_transition(
+                obs0=obs0[j],
+                context0=None if context0 is None else context0[j],
+                action=action[j],
+                reward=reward[j],
+                obs1=obs1[j],
+                context1=None if context1 is None else context1[j],
+                done=done[j],
+                is_final_step=is_final_step,
+                env_num=num,
+                evaluate=evaluate,
+            ))
+
+        if len(samples) > 0:
+            obs_t, context_t, action_t, reward_t, done_t = zip(*samples)
+            self.replay_buffer.add_batch(
+                obs_t=obs_t,
+                context_t=context_t,
+                action_t=action_t,
+                reward_t=reward_t,
+                done_t=done_t,
+            )
+
+    def _store_transition(self, obs0, context0, action, reward, obs1,
+                          context1, done, is_final_step, env_num, evaluate):
+        """Store a transition in the memory of an environment.
+
+        See store_transition for a description of the parameters.
+
+        Returns
+        -------
+        list of tuple
+            the samples to add to the replay buffer, as (obs_t, context_t,
+            action_t, reward_t, done_t). Samples are only returned once the
+            meta-period of the highest level ends or the episode is done.
+        """
+        samples = []
+
         # the time since the most recent sample began collecting step samples
         t_start = len(self._observations[env_num])
 
@@ -671,22 +840,16 @@ class GoalConditionedPolicy(Policy):
         obs1 = obs1.flatten()
 
         for i in range(1, self.num_levels):
-            # Actions and intrinsic rewards for the high-level policies are
-            # only updated when the action is recomputed by the graph.
+            # Actions for the high-level policies are only updated when the
+            # action is recomputed by the graph.
             if self._update_meta(self.num_levels - i, env_num):
-                self._rewards[env_num][-i].append(0)
                 self._actions[env_num][-i-1].append(
                     self.meta_action[env_num][-i].flatten())
 
-            # Compute the intrinsic rewards and append them to the list of
-            # rewards.
-            self._rewards[env_num][-i][-1] += \
-                self.intrinsic_reward_scale[-i] * \
-                self.intrinsic_reward_fn(
-                    states=obs0,
-                    goals=self.meta_action[env_num][-i].flatten(),
-                    next_states=obs1
-                )
+            # Add the current goal to the list of goals. The intrinsic rewards
+            # are computed from these once the meta-period ends.
+            self._goals[env_num][-i].append(
+                self.meta_action[env_num][-i].flatten())
 
         # The highest level policy receives the sum of environmental rewards.
         self._rewards[env_num][0][0] += reward
@@ -718,49 +881,50 @@ class GoalConditionedPolicy(Policy):
                     obs1=obs1[self.goal_indices]
                 ).flatten())
 
+            # Compute the intrinsic rewards of the goal-conditioned levels.
+            self._rewards[env_num][1:] = self._intrinsic_rewards(env_num)
+
             # Avoid storing samples when performing evaluations.
             if not evaluate:
-                if not self.hindsight \
+                # When relabeling lazily, only the original sample is stored,
+                # and the hindsight goals and rewards are computed by the
+                # replay buffer when it is sampled.
+                lazy_hindsight = self.hindsight_relabel_prob is not None
+
+                if not self.hindsight or lazy_hindsight \
                         or random.random() < self.subgoal_testing_rate:
                     # Store a sample in the replay buffer.
-                    self.replay_buffer.add(
-                        obs_t=self._observations[env_num],
-                        context_t=self._contexts[env_num],
-                        action_t=self._actions[env_num],
-                        reward_t=self._rewards[env_num],
-                        done_t=self._dones[env_num],
-                    )
-
-                if self.hindsight:
-                    # Some temporary attributes.
-                    worker_obses = [
-                        self._get_obs(self._observations[env_num][i],
-                                      self._actions[env_num][0][i], 0)
-                        for i in range(len(self._observations[env_num]))]
-                    intrinsic_rewards = self._rewards[env_num][-1]
-
+                    samples.append((
+                        self._observations[env_num],
+                        self._contexts[env_num],
+                        self._actions[env_num],
+                        self._rewards[env_num],
+                        self._dones[env_num],
+                    ))
+
+                if self.hindsight and not lazy_hindsight:
                     # Implement hindsight action and goal transitions.
                     goal, rewards = self._hindsight_actions_goals(
-                        initial_observations=worker_obses,
-                        initial_rewards=intrinsic_rewards
-                    )
+                        initial_observations=self._observations[env_num])
                     new_actions = deepcopy(self._actions[env_num])
                     new_actions[0] = goal
                     new_rewards = deepcopy(self._rewards[env_num])
                     new_rewards[-1] = rewards
 
                     # Store the hindsight sample in the replay buffer.
-                    self.replay_buffer.add(
-                        obs_t=self._observations[env_num],
-                        context_t=self._contexts[env_num],
-                        action_t=new_actions,
-                        reward_t=new_rewards,
-                        done_t=self._dones[env_num],
-                    )
+                    samples.append((
+                        self._observations[env_num],
+                        self._contexts[env_num],
+                        new_actions,
+                        new_rewards,
+                        self._dones[env_num],
+                    ))
 
             # Clear the memory that has been stored in the replay buffer.
             self.clear_memory(env_num)
 
+        return samples
+
     def _update_meta(self, level, env_num):
         """Determine whether a meta-policy should update its action.
 
@@ -794,22 +958,85 @@ class GoalConditionedPolicy(Policy):
         # the time since the most recent sample began collecting step samples
         t_start = len(self._observations[env_num])
 
-        # meta-action period of the given level
-        if isinstance(self.meta_period, int):
-            level_period = self.meta_period ** (self.num_levels - level - 1)
+        return t_start % self._level_period(level) == 0
+
+    def _level_period(self, level):
+        """Return the number of environment steps between actions by a level.
+
+        Parameters
+        ----------
+        level : int
+            the level of the policy
+
+        Returns
+        -------
+        int
+            the meta-action period of the given level
+        """
+        if level >= self.num_levels - 1:
+            return 1
+        elif isinstance(self.meta_period, int):
+            return self.meta_period ** (self.num_levels - level - 1)
         else:
-            level_period = reduce((lambda x, y: x*y), self.meta_period[level:])
+            return reduce((lambda x, y: x*y), self.meta_period[level:])
+
+    def _intrinsic_rewards(self, env_num):
+        """Compute the intrinsic rewards of the current meta-period.
 
-        return t_start % level_period == 0
+        The intrinsic rewards of every step are computed by a single batched
+        call to the intrinsic reward function for each goal-conditioned level,
+        and are then summed over the meta-period of the level.
+
+        Parameters
+        ----------
+        env_num : int
+            the environment number. Used to handle situations when multiple
+            parallel environments are being used.
+
+        Returns
+        -------
+        list of list of float
+            the intrinsic rewards of every level but the highest, ordered from
+            highest to lowest level policy
+        """
+        observations = np.asarray(self._observations[env_num])
+        obs0 = observations[:-1]
+        obs1 = observations[1:]
+
+        rewards = []
+        for level in range(1, self.num_levels):
+            # Compute the intrinsic reward at every step.
+            rew = self.intrinsic_reward_scale[level - 1] * \
+                self.intrinsic_reward_fn(
+                    states=obs0,
+                    goals=np.asarray(self._goals[env_num][level - 1]),
+                    next_states=obs1,
+                )
+
+            # Sum the rewards between consecutive actions by the level.
+            period = self._level_period(level)
+            rewards.append(list(np.add.reduceat(
+                rew, np.arange(0, len(rew), period))))
+
+        return rewards
 
     def clear_memory(self, env_num):
-        """Clear internal memory that is used by the replay buffer."""
-        self._actions[env_num] = [[] for _ in range(self.num_levels)]
-        self._rewards[env_num] = \
-            [[0]] + [[] for _ in range(self.num_levels - 1)]
-        self._observations[env_num] = []
-        self._contexts[env_num] = []
-        self._dones[env_num] = []
+        """Clear internal memory that is used by the replay buffer.
+
+        Parameters
+        ----------
+        env_num : int or array_like of int
+            the environment number, or the numbers of all environments whose
+            memory is cleared at once
+        """
+        for num in np.atleast_1d(env_num):
+            self._actions[num] = [[] for _ in range(self.num_levels)]
+            self._rewards[num] = \
+                [[0]] + [[] for _ in range(self.num_levels - 1)]
+            self._observations[num] = []
+            self._contexts[num] = []
+            self._dones[num] = []
+            self._goals[num] = [[] for _ in range(self.num_levels - 1)]
 
     def get_td_map(self):
         """See parent class."""
@@ -915,18 +1142,15 @@ class GoalConditionedPolicy(Policy):
         sampled_actions = self._sample(meta_obs0, meta_obs1, meta_action, k)
         assert sampled_actions.shape == (batch_size, goal_dim, k)
 
-        # Compute the fitness of each candidate goal. The fitness is the sum of
-        # the log-probabilities of each action for the given goal.
-        fitness = self._log_probs(
-            sampled_actions, worker_obses, worker_actions)
-        assert fitness.shape == (batch_size, k)
-
-        # For each sample, choose the meta action that maximizes the fitness.
-        indx = np.argmax(fitness, 1)
-        best_goals = np.asarray(
-            [sampled_actions[i, :, indx[i]] for i in range(batch_size)])
+        # Compute the fitness of each candidate goal, and choose the meta
+        # action that maximizes the fitness for each sample. The fitness is the
+        # sum of the log-probabilities of each action for the given goal.
+        indx = self.sess.run(
+            self._best_meta_action_indx,
+            feed_dict=self._log_probs_feed_dict(
+                sampled_actions, worker_obses, worker_actions))
 
-        return best_goals
+        return sampled_actions[np.arange(batch_size), :, indx]
 
     def _sample(self, meta_obs0, meta_obs1, meta_action, num_samples, sc=0.5):
         """Sample different goals.
@@ -966,36 +1190,25 @@ class GoalConditionedPolicy(Policy):
         random_samples = num_samples - 2
 
         # Compute the mean and std for the Gaussian distribution to sample
-        # from, and well as the maxima and minima.
+        # from.
         loc = meta_obs1[:, self.goal_indices] - meta_obs0[:, self.goal_indices]
-        scale = [sc * spec_range / 2]
-        minimum, maximum = [goal_space.low], [goal_space.high]
-
-        new_loc = np.zeros((batch_size, goal_dim, random_samples))
-        new_scale = np.zeros((batch_size, goal_dim, random_samples))
-        for i in range(random_samples):
-            new_loc[:, :, i] = loc
-            new_scale[:, :, i] = scale
-
-        new_minimum = np.zeros((batch_size, goal_dim, num_samples))
-        new_maximum = np.zeros((batch_size, goal_dim, num_samples))
-        for i in range(num_samples):
-            new_minimum[:, :, i] = minimum
-            new_maximum[:, :, i] = maximum
+        scale = sc * spec_range / 2
 
         # Generate random samples for the above distribution.
         normal_samples = np.random.normal(
-            size=(random_samples * batch_size * goal_dim))
-        normal_samples = normal_samples.reshape(
-            (batch_size, goal_dim, random_samples))
+            size=(batch_size, goal_dim, random_samples))
 
-        samples = np.zeros((batch_size, goal_dim, num_samples))
-        samples[:, :, :-2] = new_loc + normal_samples * new_scale
-        samples[:, :, -2] = loc
-        samples[:, :, -1] = meta_action
+        samples = np.concatenate((
+            loc[:, :, None] + normal_samples * scale[None, :, None],
+            loc[:, :, None],
+            meta_action[:, :, None],
+        ), axis=2)
 
         # Clip the values based on the meta action space range.
-        samples = np.minimum(np.maximum(samples, new_minimum), new_maximum)
+        samples = np.clip(
+            samples,
+            goal_space.low[None, :, None],
+            goal_space.high[None, :, None])
 
         return samples
 
@@ -1024,13 +1237,124 @@ class GoalConditionedPolicy(Policy):
         -----
         * _sample_best_meta_action(self):
         """
+        return self.sess.run(
+            self._meta_action_fitness,
+            feed_dict=self._log_probs_feed_dict(
+                meta_actions, worker_obses, worker_actions))
+
+    def _log_probs_feed_dict(self, meta_actions, worker_obses, worker_actions):
+        """Return the feed_dict to compute the fitness of candidate goals.
+
+        The worker observations of every candidate goal and step in the meta
+        period are stacked into a single batch of size batch_size * num_samples
+        * meta_period, with the goals (context) of the observations replaced by
+        the candidate goals. These are passed through the worker policy in a
+        single forward pass.
+
+        Parameters
+        ----------
+        meta_actions : array_like
+            (batch_size, m_ac_dim, num_samples) matrix of candidate higher-
+            level policy actions
+        worker_obses : array_like
+            (batch_size, w_obs_dim, meta_period + 1) matrix of lower-level
+            policy observations
+        worker_actions : array_like
+            (batch_size, w_ac_dim, meta_period) list of lower-level policy
+            actions
+
+        Returns
+        -------
+        dict
+            the feed_dict for the _meta_action_fitness and
+            _best_meta_action_indx operations
+        """
+        batch_size, goal_dim, num_samples = meta_actions.shape
+        _, ac_dim, meta_period = worker_actions.shape
+        shape = (batch_size, num_samples, meta_period)
+
+        # Remove the last observation since it does not correspond to any
+        # action for the current meta-period.
+        obses = worker_obses[:, :, :-1].transpose((0, 2, 1))
+
+        # Create a goal for each candidate and observation in a meta period.
+        goals = np.broadcast_to(
+            meta_actions.transpose((0, 2, 1))[:, :, None, :],
+            shape + (goal_dim,))
+
+        # If relative goals are being used, update the later goals to match
+        # what they would be under the relative goals difference approach.
+        if self.relative_goals:
+            goal_diff = obses - obses[:, :1, :]
+            goals = goals + goal_diff[:, None, :, self.goal_indices]
+
+        # Since the worker observations contain the goal (context) for the
+        # last `goal_dim` elements, these elements are replaced by the
+        # candidate goals.
+        obs = np.concatenate((
+            np.broadcast_to(
+                obses[:, None, :, :-goal_dim],
+                shape + (obses.shape[2] - goal_dim,)),
+            goals,
+        ), axis=3)
+
+        # Repeat the worker actions for each candidate goal.
+        actions = np.broadcast_to(
+            worker_actions.transpose((0, 2, 1))[:, None, :, :],
+            shape + (ac_dim,))
+
+        worker = self.policy[-1]
+        return {
+            worker.obs_ph: obs.reshape((-1, obs.shape[3])),
+            worker.action_ph: actions.reshape((-1, ac_dim)),
+            worker.phase_ph: 0,
+            worker.rate_ph: 0.0,
+            self._log_probs_shape_ph: shape,
+        }
+
+    def _setup_off_policy_corrections(self):
+        """Create the operations used by the off-policy corrections.
+
+        These operations compute the fitness of every candidate goal, and
+        choose the goals with the highest fitness, from the log-probabilities
+        of the worker actions in a batch created by `_log_probs_feed_dict`.
+        """
+        with tf.compat.v1.variable_scope("off_policy_corrections"):
+            # the (batch_size, num_samples, meta_period) shape of the batch
+            self._log_probs_shape_ph = tf.compat.v1.placeholder(
+                tf.int32,
+                shape=(3,),
+                name="log_probs_shape")
+
+            # Sum the log-probabilities of every candidate goal over the meta
+            # period to get the fitness of each candidate goal.
+            log_probs = tf.reshape(
+                self._worker_log_probs(), self._log_probs_shape_ph)
+            self._meta_action_fitness = tf.reduce_sum(log_probs, axis=2)
+
+            # For each sample, choose the meta action that maximizes the
+            # fitness.
+            self._best_meta_action_indx = tf.argmax(
+                self._meta_action_fitness, axis=1)
+
+    def _worker_log_probs(self):
+        """Return the log-probability of the worker actions.
+
+        The log-probabilities are computed for the observations and actions in
+        the obs_ph and action_ph placeholders of the worker policy.
+
+        Returns
+        -------
+        tf.Variable
+            (batch_size,) vector of log-probabilities
+        """
         raise NotImplementedError
 
     # ======================================================================= #
     #                       Auxiliary methods for HAC                         #
     # ======================================================================= #
 
-    def _hindsight_actions_goals(self, initial_observations, initial_rewards):
+    def _hindsight_actions_goals(self, initial_observations):
         """Calculate hindsight goal and action transitions.
 
         These are then stored in the replay buffer along with the original
@@ -1042,10 +1366,8 @@ class GoalConditionedPolicy(Policy):
         Parameters
         ----------
         initial_observations : array_like
-            the original worker observations with the non-hindsight goals
-            appended to them
-        initial_rewards : array_like
-            the original intrinsic rewards
+            the observations at every step of the meta-period, including the
+            final observation
 
         Returns
         -------
@@ -1059,33 +1381,51 @@ class GoalConditionedPolicy(Policy):
         -----
         * store_transition(self):
         """
-        new_goals = []
-        observations = deepcopy(initial_observations)
-        rewards = deepcopy(initial_rewards)
-        hindsight_goal = 0 if self.relative_goals \
-            else observations[-1][self.goal_indices]
-        obs_tp1 = observations[-1]
-
-        for i in range(1, len(observations) + 1):
-            obs_t = observations[-i]
-
-            # Calculate the hindsight goal in using relative goals. If not, the
-            # hindsight goal is simply a subset of the final state observation.
-            if self.relative_goals:
-                hindsight_goal += \
-                    obs_tp1[self.goal_indices] - obs_t[self.goal_indices]
-
-            # Modify the Worker intrinsic rewards based on the new hindsight
-            # goal.
-            if i > 1:
-                # FIXME: intrinsic_reward_scale
-                rewards[-(i - 1)] = self.intrinsic_reward_scale[0] \
-                    * self.intrinsic_reward_fn(obs_t, hindsight_goal, obs_tp1)
-
-            obs_tp1 = deepcopy(obs_t)
-            new_goals = [deepcopy(hindsight_goal)] + new_goals
-
-        return new_goals, rewards
+        observations = np.asarray(initial_observations)
+        states = observations[:, self.goal_indices]
+
+        # Calculate the hindsight goal in using relative goals. These are
+        # accumulated backwards from the final state. If not, the hindsight
+        # goal is simply a subset of the final state observation.
+        if self.relative_goals:
+            goals = np.zeros_like(states)
+            goals[:-1] = np.cumsum(
+                (states[1:] - states[:-1])[::-1], axis=0)[::-1]
+        else:
+            goals = np.repeat(states[-1:], len(states), axis=0)
+
+        # Modify the Worker intrinsic rewards based on the new hindsight goals.
+        rewards = self._hindsight_rewards(
+            states=observations[:-1],
+            goals=goals[:-1],
+            next_states=observations[1:],
+        )
+
+        return list(goals), list(rewards)
+
+    def _hindsight_rewards(self, states, goals, next_states):
+        """Return the Worker intrinsic rewards for a batch of hindsight goals.
+
+        This is also used by the replay buffer to relabel samples when
+        `hindsight_relabel_prob` is not None.
+
+        Parameters
+        ----------
+        states : array_like
+            (batch_size, obs_dim) matrix of observations
+        goals : array_like
+            (batch_size, goal_dim) matrix of hindsight goals
+        next_states : array_like
+            (batch_size, obs_dim) matrix of next step observations
+
+        Returns
+        -------
+        array_like
+            (batch_size,) vector of intrinsic rewards
+        """
+        # FIXME: intrinsic_reward_scale
+        return self.intrinsic_reward_scale[0] * self.intrinsic_reward_fn(
+            states=states, goals=goals, next_states=next_states)
 
     # ======================================================================= #
     #                       Auxiliary methods for CHER                        #
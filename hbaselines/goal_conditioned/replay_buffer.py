@@ -1,8 +1,9 @@
 """Script containing the HierReplayBuffer object."""
 import numpy as np
-import random
 from functools import reduce
 
+from hbaselines.fcnet.replay_buffer import ring_slices
+
 
 class HierReplayBuffer(object):
     """Hierarchical variant of ReplayBuffer.
@@ -27,6 +28,22 @@ class HierReplayBuffer(object):
         the number of elements in the meta-action
     num_levels : int
         the number of levels in the hierarchy
+    relabel_prob : float or None
+        the probability that a sample is relabeled with hindsight goals and
+        rewards when it is sampled. Set to None to disable relabeling.
+    goal_indices : list of int or None
+        the indices of the observations that correspond to the goals. Used
+        only if `relabel_prob` is not None.
+    relative_goals : bool
+        specifies whether the goals are relative or absolute. Used only if
+        `relabel_prob` is not None.
+    reward_fn : function or None
+        the function that computes the intrinsic rewards of a batch of
+        transitions from the observations, hindsight goals, and next
+        observations. Used only if `relabel_prob` is not None.
+    rng : numpy.random.RandomState or module
+        the random number generator used to sample batches. Defaults to the
+        global generator of numpy.
     """
 
     def __init__(self,
@@ -37,7 +54,11 @@ class HierReplayBuffer(object):
                  ac_dim,
                  co_dim,
                  goal_dim,
-                 num_levels):
+                 num_levels,
+                 relabel_prob=None,
+                 goal_indices=None,
+                 relative_goals=False,
+                 reward_fn=None):
         """Instantiate the hierarchical replay buffer.
 
         Parameters
@@ -60,7 +81,23 @@ class HierReplayBuffer(object):
             the number of elements in the meta-action
         num_levels : int
             the number of levels in the hierarchy
+        relabel_prob : float or None
+            the probability that a sample is relabeled with hindsight goals
+            and rewards when it is sampled. Set to None to disable relabeling.
+        goal_indices : list of int or None
+            the indices of the observations that correspond to the goals.
+            Used only if `relabel_prob` is not None.
+        relative_goals : bool
+            specifies whether the goals are relative or absolute. Used only if
+            `relabel_prob` is not None.
+        reward_fn : function or None
+            the function that computes the intrinsic rewards of a batch of
+            transitions from the observations, hindsight goals, and next
+            observations. Used only if `relabel_prob` is not None.
         """
+        assert relabel_prob is None or num_levels == 2, \
+            "Hindsight relabeling only works for two-level hierarchies."
+
         self.buffer_size = buffer_size
         self.batch_size = batch_size
         self.meta_period = meta_period
@@ -69,16 +106,45 @@ class HierReplayBuffer(object):
         self.co_dim = co_dim
         self.goal_dim = goal_dim
         self.num_levels = num_levels
+        self.relabel_prob = relabel_prob
+        self.goal_indices = goal_indices
+        self.relative_goals = relative_goals
+        self.reward_fn = reward_fn
+        self.rng = np.random
 
         # some useful attributes
         self._size = 0
         self._current_idx = 0
         self._next_idx = 0
-        self._obs_t = [[] for _ in range(buffer_size)]
-        self._context_t = [[] for _ in range(buffer_size)]
-        self._action_t = [[] for _ in range(buffer_size)]
-        self._reward_t = [[] for _ in range(buffer_size)]
-        self._done_t = [[] for _ in range(buffer_size)]
+
+        # the number of environment steps in a sample, and the number of steps
+        # between actions by every level (with an additional level below the
+        # lowest level, whose period is also one)
+        self._periods = [self._level_period(i) for i in range(num_levels + 1)]
+        horizon = self._periods[0]
+
+        # Preallocate the samples. Samples that are truncated by the end of an
+        # episode are padded by zeros, with the length of every sample stored
+        # in the _len_t term.
+        self._obs_t = np.zeros(
+            (buffer_size, horizon + 1, obs_dim), dtype=np.float32)
+        self._context_t = None if co_dim is None else np.zeros(
+            (buffer_size, 2, co_dim), dtype=np.float32)
+        self._action_t = [
+            np.zeros((buffer_size, horizon // self._periods[i + 1] + 1,
+                      ac_dim if i == num_levels - 1 else goal_dim),
+                     dtype=np.float32)
+            for i in range(num_levels)
+        ]
+        self._action_len_t = np.zeros(
+            (buffer_size, num_levels), dtype=np.int32)
+        self._reward_t = [
+            np.zeros((buffer_size, horizon // self._periods[i]),
+                     dtype=np.float32)
+            for i in range(num_levels)
+        ]
+        self._done_t = np.zeros((buffer_size, horizon), dtype=np.float32)
+        self._len_t = np.zeros(buffer_size, dtype=np.int32)
 
     def __len__(self):
         """Return the number of elements stored."""
@@ -97,10 +163,16 @@ class HierReplayBuffer(object):
     def save(self, save_path):
         """Save parameters for the replay buffer."""
         np.save(save_path + '.obs_t.npy', self._obs_t)
-        np.save(save_path + '.context_t.npy', self._context_t)
-        np.save(save_path + '.action_t.npy', self._action_t)
-        np.save(save_path + '.reward_t.npy', self._reward_t)
+        if self._context_t is not None:
+            np.save(save_path + '.context_t.npy', self._context_t)
+        for i in range(self.num_levels):
+            np.save(save_path + '.action_t_{}.npy'.format(i),
+                    self._action_t[i])
+            np.save(save_path + '.reward_t_{}.npy'.format(i),
+                    self._reward_t[i])
+        np.save(save_path + '.action_len_t.npy', self._action_len_t)
         np.save(save_path + '.done_t.npy', self._done_t)
+        np.save(save_path + '.len_t.npy', self._len_t)
         np.save(save_path + '.config.npy', np.array([
             self.buffer_size,
             self.batch_size,
@@ -110,15 +182,13 @@ class HierReplayBuffer(object):
             self.co_dim,
             self.goal_dim,
             self.num_levels,
-        ]))
+            self._size,
+            self._current_idx,
+            self._next_idx,
+        ], dtype=object), allow_pickle=True)
 
     def load(self, save_path):
         """Load parameters for the replay buffer."""
-        self._obs_t = np.load(save_path + '.obs_t.npy')
-        self._context_t = np.load(save_path + '.context_t.npy')
-        self._action_t = np.load(save_path + '.action_t.npy')
-        self._reward_t = np.load(save_path + '.reward_t.npy')
-        self._done_t = np.load(save_path + '.done_t.npy')
         (self.buffer_size,
          self.batch_size,
          self.meta_period,
@@ -126,7 +196,26 @@ class HierReplayBuffer(object):
          self.ac_dim,
          self.co_dim,
          self.goal_dim,
-         self.num_levels) = np.load(save_path + '.config.npy')
+         self.num_levels,
+         self._size,
+         self._current_idx,
+         self._next_idx) = np.load(
+            save_path + '.config.npy', allow_pickle=True)
+        self._periods = [
+            self._level_period(i) for i in range(self.num_levels + 1)]
+
+        self._obs_t = np.load(save_path + '.obs_t.npy')
+        self._context_t = None if self.co_dim is None else np.load(
+            save_path + '.context_t.npy')
+        self._action_t = [
+            np.load(save_path + '.action_t_{}.npy'.format(i))
+            for i in range(self.num_levels)]
+        self._reward_t = [
+            np.load(save_path + '.reward_t_{}.npy'.format(i))
+            for i in range(self.num_levels)]
+        self._action_len_t = np.load(save_path + '.action_len_t.npy')
+        self._done_t = np.load(save_path + '.done_t.npy')
+        self._len_t = np.load(save_path + '.len_t.npy')
 
     def is_full(self):
         """Check whether the replay buffer is full or not.
@@ -154,16 +243,76 @@ class HierReplayBuffer(object):
         done_t : list of float or list of bool
             a list of environment done masks
         """
-        self._obs_t[self._next_idx] = obs_t
-        self._context_t[self._next_idx] = context_t
-        self._action_t[self._next_idx] = action_t
-        self._reward_t[self._next_idx] = reward_t
-        self._done_t[self._next_idx] = done_t
+        self.add_batch(
+            obs_t=[obs_t],
+            context_t=[context_t],
+            action_t=[action_t],
+            reward_t=[reward_t],
+            done_t=[done_t],
+        )
+
+    def add_batch(self, obs_t, context_t, action_t, reward_t, done_t):
+        """Add a batch of new transitions to the buffer.
+
+        The samples are padded into arrays of the shape of the buffer, which
+        are then written with one slice assignment per element (two if the
+        batch wraps around the end of the buffer).
+
+        Parameters
+        ----------
+        obs_t : list of array_like
+            the list of environment observations of every sample
+        context_t : list of array_like
+            the first and last context from the environment of every sample
+        action_t : list of array_like
+            a list of actions performed by every policy in the hierarchy, for
+            every sample
+        reward_t : list of list of float
+            the list of of rewards experienced by every policy in the
+            hierarchy, for every sample
+        done_t : list of list of float or list of list of bool
+            a list of environment done masks of every sample
+        """
+        num_samples = len(obs_t)
+
+        # Write the elements of the samples, and pad the remaining elements of
+        # truncated samples with zeros.
+        obs = np.zeros((num_samples,) + self._obs_t.shape[1:], np.float32)
+        action = [np.zeros((num_samples,) + self._action_t[i].shape[1:],
+                           np.float32) for i in range(self.num_levels)]
+        action_len = np.zeros((num_samples, self.num_levels), np.int32)
+        reward = [np.zeros((num_samples,) + self._reward_t[i].shape[1:],
+                           np.float32) for i in range(self.num_levels)]
+        done = np.zeros((num_samples,) + self._done_t.shape[1:], np.float32)
+        length = np.zeros(num_samples, np.int32)
+        for k in range(num_samples):
+            obs[k, :len(obs_t[k])] = obs_t[k]
+            for i in range(self.num_levels):
+                action[i][k, :len(action_t[k][i])] = action_t[k][i]
+                action_len[k, i] = len(action_t[k][i])
+                reward[i][k, :len(reward_t[k][i])] = reward_t[k][i]
+            done[k, :len(done_t[k])] = done_t[k]
+            length[k] = len(obs_t[k]) - 1
+
+        for buffer_slice, batch_slice in ring_slices(
+                self._next_idx, num_samples, self.buffer_size):
+            self._obs_t[buffer_slice] = obs[batch_slice]
+            if self._context_t is not None:
+                self._context_t[buffer_slice] = [
+                    [np.ravel(context[0]), np.ravel(context[-1])]
+                    for context in context_t[batch_slice]]
+            for i in range(self.num_levels):
+                self._action_t[i][buffer_slice] = action[i][batch_slice]
+                self._reward_t[i][buffer_slice] = reward[i][batch_slice]
+            self._action_len_t[buffer_slice] = action_len[batch_slice]
+            self._done_t[buffer_slice] = done[batch_slice]
+            self._len_t[buffer_slice] = length[batch_slice]
 
         # Increment the next index and size terms
-        self._current_idx = self._next_idx
-        self._next_idx = (self._next_idx + 1) % self.buffer_size
-        self._size = min(self._size + 1, self.buffer_size)
+        self._current_idx = \
+            (self._next_idx + num_samples - 1) % self.buffer_size
+        self._next_idx = (self._next_idx + num_samples) % self.buffer_size
+        self._size = min(self._size + num_samples, self.buffer_size)
 
     def sample(self, with_additional, collect_levels=None):
         """Sample a batch of experiences.
@@ -305,121 +454,180 @@ class HierReplayBuffer(object):
         num_levels = self.num_levels
         collect_levels = collect_levels or list(range(num_levels))
         obses = [[] for _ in range(num_levels)]
-        contexts = [[] for _ in range(num_levels)]
         actions = [[] for _ in range(num_levels)]
         next_obses = [[] for _ in range(num_levels)]
-        next_contexts = [[] for _ in range(num_levels)]
         rewards = [[] for _ in range(num_levels)]
         dones = [[] for _ in range(num_levels)]
 
+        idxes = self.rng.randint(0, self._size, size=self.batch_size)
+
+        # the number of environment steps in every sample
+        total_time = self._len_t[idxes]
+
+        # Choose the samples that are relabeled with hindsight goals and
+        # rewards, and compute the hindsight goals of these samples.
+        if self.relabel_prob is not None:
+            relabel = np.flatnonzero(
+                self.rng.uniform(size=self.batch_size) < self.relabel_prob)
+            hindsight_goals = self._hindsight_goals(
+                idxes[relabel], total_time[relabel])
+        else:
+            relabel = None
+
+        # Collect the sample information for the highest level policy. This
+        # will be the first or last element in the sample, depended on if the
+        # element represents the start of end of a sample (e.g. next_obs).
+        if 0 in collect_levels:
+            obses[0] = self._get_obs(
+                self._obs_t[idxes, 0],
+                None if self._context_t is None else
+                self._context_t[idxes, 0], 1)
+            next_obses[0] = self._get_obs(
+                self._obs_t[idxes, total_time],
+                None if self._context_t is None else
+                self._context_t[idxes, 1], 1)
+            actions[0] = self._action_t[0][idxes, 0]
+            rewards[0] = self._reward_t[0][idxes, 0]
+            if relabel is not None:
+                actions[0][relabel] = hindsight_goals[:, 0]
+            dones[0] = self._done_t[idxes, total_time - 1]
+
+        # Choose a subsample taking a specific point in time.
+        sample_time = (self.rng.uniform(size=self.batch_size)
+                       * (total_time - 1)).astype(int)
+
+        # Collect samples for each level.
+        for i in reversed(range(1, num_levels)):
+            # Compute the level number, with zero corresponding to the lowest
+            # (worker) policy.
+            level_num = num_levels - i - 1
+
+            # meta-action period of the given level
+            level_period = self._periods[i]
+
+            if i in collect_levels:
+                indx_next_obs = np.minimum(
+                    sample_time + level_period, total_time)
+                indx_context = sample_time // level_period
+
+                if level_num in [0, 1]:
+                    indx_actions = sample_time
+                else:
+                    if isinstance(meta_period, int):
+                        indx_actions = np.trunc(
+                            sample_time / meta_period ** level_num - 1)
+                    else:
+                        indx_actions = np.trunc(sample_time / reduce(
+                            (lambda x, y: x * y), meta_period[-level_num+1:]))
+                    indx_actions = indx_actions.astype(int)
+                    # Negative indices are relative to the number of actions
+                    # in the sample.
+                    indx_actions = np.where(
+                        indx_actions < 0,
+                        indx_actions + self._action_len_t[idxes, i],
+                        indx_actions)
+
+                context = self._action_t[i - 1][idxes, indx_context]
+                next_context = self._action_t[i - 1][idxes, indx_context + 1]
+                rewards[i] = self._reward_t[i][idxes, indx_context]
+
+                # Replace the goals and intrinsic rewards of the relabeled
+                # samples with their hindsight counterparts.
+                if relabel is not None and i == num_levels - 1:
+                    t = sample_time[relabel]
+                    rows = np.arange(len(relabel))
+                    context[relabel] = hindsight_goals[rows, t]
+                    next_context[relabel] = hindsight_goals[rows, t + 1]
+                    rewards[i][relabel] = self.reward_fn(
+                        states=self._obs_t[idxes[relabel], t],
+                        goals=hindsight_goals[rows, t],
+                        next_states=self._obs_t[idxes[relabel], t + 1],
+                    )
+
+                obses[i] = self._get_obs(
+                    self._obs_t[idxes, sample_time], context, 1)
+                next_obses[i] = self._get_obs(
+                    self._obs_t[idxes, indx_next_obs], next_context, 1)
+                actions[i] = self._action_t[i][idxes, indx_actions]
+                dones[i] = self._done_t[idxes, sample_time]
+
+            # Update the sample time to match the start of the meta period for
+            # the next higher-level.
+            sample_time -= sample_time % self._periods[i - 1]
+
         # Do not encode additional information information in samples if it is
         # not needed. Waste of compute resources.
+        # TODO: only works for two level hierarchies.
         if with_additional:
-            worker_ob_dim = self.obs_dim + self.goal_dim
-            worker_ac_dim = self.ac_dim
+            horizon = self._periods[0]
+            goals = self._action_t[0][idxes, :horizon + 1]
+            if relabel is not None:
+                goals[relabel] = hindsight_goals
             additional = {
-                "worker_obses": np.zeros(
-                    (self.batch_size, worker_ob_dim, self.meta_period + 1),
-                    dtype=np.float32),
-                "worker_actions": np.zeros(
-                    (self.batch_size, worker_ac_dim, self.meta_period),
-                    dtype=np.float32),
+                "worker_obses": np.concatenate(
+                    (self._obs_t[idxes], goals),
+                    axis=2).transpose((0, 2, 1)),
+                "worker_actions": self._action_t[-1][
+                    idxes, :horizon].transpose((0, 2, 1)),
             }
         else:
             additional = {}
 
-        idxes = np.random.randint(0, self._size, size=self.batch_size)
-
-        for k, indx in enumerate(idxes):
-            # Extract the elements of the sample.
-            candidate_obs = self._obs_t[indx]
-            candidate_context = self._context_t[indx]
-            candidate_action = self._action_t[indx]
-            candidate_reward = self._reward_t[indx]
-            candidate_done = self._done_t[indx]
-
-            # Collect the sample information for the highest level policy. This
-            # will be the first or last element in the list, depended on if the
-            # element represents the start of end of a sample (e.g. next_obs).
-            if 0 in collect_levels:
-                obses[0].append(candidate_obs[0])
-                contexts[0].append(candidate_context[0])
-                actions[0].append(candidate_action[0][0])
-                next_obses[0].append(candidate_obs[-1])
-                next_contexts[0].append(candidate_context[-1])
-                rewards[0].append(candidate_reward[0][0])
-                dones[0].append(candidate_done[-1])
-
-            # Choose a subsample taking a specific point in time.
-            total_time = len(candidate_obs) - 1
-            sample_time = int(random.random() * (total_time - 1))
-
-            # Collect samples for each level.
-            for i in reversed(range(1, num_levels)):
-                # Compute the level number, with zero corresponding to the
-                # lowest (worker) policy.
-                level_num = num_levels - i - 1
-
-                # meta-action period of the given level
-                if level_num == 0:
-                    level_period = 1
-                elif isinstance(meta_period, int):
-                    level_period = meta_period ** level_num
-                else:
-                    level_period = reduce(
-                        (lambda x, y: x * y), meta_period[-level_num:])
+        return obses, next_obses, actions, rewards, dones, additional
 
-                if i in collect_levels:
-                    obses[i].append(candidate_obs[sample_time])
-                    dones[i].append(candidate_done[sample_time])
+    def _hindsight_goals(self, idxes, total_time):
+        """Return the hindsight goals at every step of a set of samples.
 
-                    indx_next_obs = min(sample_time + level_period, total_time)
-                    next_obses[i].append(candidate_obs[indx_next_obs])
+        If goals are absolute, the hindsight goal is the final state of the
+        sample. Otherwise, it is the change in state between the current and
+        final step.
 
-                    indx_context = int(sample_time / level_period)
-                    contexts[i].append(candidate_action[i - 1][indx_context])
-                    next_contexts[i].append(
-                        candidate_action[i - 1][indx_context + 1])
+        Parameters
+        ----------
+        idxes : array_like
+            the indices of the samples in the buffer
+        total_time : array_like
+            the number of environment steps in every sample
 
-                    if level_num in [0, 1]:
-                        indx_actions = sample_time
-                    elif isinstance(meta_period, int):
-                        indx_actions = int(
-                            sample_time / meta_period ** level_num - 1)
-                    else:
-                        indx_actions = int(sample_time / reduce(
-                            (lambda x, y: x * y), meta_period[-level_num+1:]))
-                    actions[i].append(candidate_action[i][indx_actions])
+        Returns
+        -------
+        array_like
+            (len(idxes), horizon + 1, goal_dim) tensor of hindsight goals. The
+            goals of steps beyond the end of a sample are set to zero.
+        """
+        states = self._obs_t[idxes][:, :, self.goal_indices]
+        final_states = states[np.arange(len(idxes)), total_time][:, None]
+
+        if self.relative_goals:
+            goals = final_states - states
+        else:
+            goals = np.repeat(final_states, states.shape[1], axis=1)
 
-                    indx_rewards = indx_context
-                    rewards[i].append(candidate_reward[i][indx_rewards])
+        # Zero the goals of the padded elements of truncated samples.
+        goals[np.arange(states.shape[1]) > total_time[:, None]] = 0
 
-                # Update the sample time to match the start of the meta period
-                # for the next higher-level.
-                if isinstance(meta_period, int):
-                    sample_time -= sample_time % meta_period ** (num_levels-i)
-                else:
-                    sample_time -= sample_time % reduce(
-                        (lambda x, y: x * y), meta_period[-level_num-1:])
-
-            # TODO: only works for two level hierarchies.
-            if with_additional:
-                for j in range(len(candidate_obs)):
-                    additional["worker_obses"][k, :, j] = self._get_obs(
-                        candidate_obs[j], candidate_action[0][j], 0)
-                for j in range(len(candidate_action[-1])):
-                    additional["worker_actions"][k, :, j] = \
-                        candidate_action[-1][j]
-
-        # Convert everything to an array.
-        for i in collect_levels:
-            obses[i] = self._get_obs(obses[i], contexts[i], 1)
-            next_obses[i] = self._get_obs(next_obses[i], next_contexts[i], 1)
-            actions[i] = np.asarray(actions[i])
-            rewards[i] = np.asarray(rewards[i])
-            dones[i] = np.asarray(dones[i])
+        return goals
 
-        return obses, next_obses, actions, rewards, dones, additional
+    def _level_period(self, level):
+        """Return the number of environment steps between actions by a level.
+
+        Parameters
+        ----------
+        level : int
+            the level number, with zero corresponding to the highest level
+            policy. Levels at and beyond `num_levels - 1` have a period of one.
+
+        Returns
+        -------
+        int
+            the meta-action period of the level
+        """
+        if level >= self.num_levels - 1:
+            return 1
+        elif isinstance(self.meta_period, int):
+            return self.meta_period ** (self.num_levels - level - 1)
+        else:
+            return reduce((lambda x, y: x * y), self.meta_period[level:])
 
     @staticmethod
     def _get_obs(obs, context, axis=0):
@@ -449,7 +657,7 @@ class HierReplayBuffer(object):
             the processed observation
         """
         obs = np.asarray(obs)
-        if context[0] is not None:
+        if context is not None and context[0] is not None:
             context = np.asarray(context)
             context = context.flatten() if axis == 0 else context
             obs = np.concatenate((obs, context), axis=axis)
@@ -1,6 +1,4 @@
 """SAC-compatible goal-conditioned hierarchical policy."""
-import numpy as np
-
 from hbaselines.goal_conditioned.base import GoalConditionedPolicy as \
     BaseGoalConditionedPolicy
 from hbaselines.fcnet.sac import FeedForwardPolicy
@@ -22,6 +20,9 @@ class GoalConditionedPolicy(BaseGoalConditionedPolicy):
                  tau,
                  gamma,
                  use_huber,
+                 prioritized_replay,
+                 replay_buffer_path,
+                 reduced_precision_replay,
                  l2_penalty,
                  model_params,
                  target_entropy,
@@ -33,6 +34,7 @@ class GoalConditionedPolicy(BaseGoalConditionedPolicy):
                  off_policy_corrections,
                  hindsight,
                  subgoal_testing_rate,
+                 hindsight_relabel_prob,
                  cooperative_gradients,
                  cg_weights,
                  cg_delta,
@@ -74,6 +76,15 @@ class GoalConditionedPolicy(BaseGoalConditionedPolicy):
             specifies whether to use the huber distance function as the loss
             for the critic. If set to False, the mean-squared error metric is
             used instead
+        prioritized_replay : bool
+            whether to use prioritized experience replay. Not supported by
+            goal-conditioned policies.
+        replay_buffer_path : str or None
+            the directory in which the replay buffer is stored as memory-mapped
+            files. Not supported by goal-conditioned policies.
+        reduced_precision_replay : bool
+            whether to store the observations in the replay buffer with reduced
+            precision. Not supported by goal-conditioned policies.
         l2_penalty : float
             L2 regularization penalty. This is applied to the policy network.
         model_params : dict
@@ -107,6 +118,12 @@ class GoalConditionedPolicy(BaseGoalConditionedPolicy):
         subgoal_testing_rate : float
             rate at which the original (non-hindsight) sample is stored in the
             replay buffer as well. Used only if `hindsight` is set to True.
+        hindsight_relabel_prob : float or None
+            the probability that a sample is relabeled with hindsight goals and
+            rewards when it is sampled from the replay buffer. If set to None,
+            hindsight samples are instead computed and stored in the replay
+            buffer when every meta-period ends. Used only if `hindsight` is set
+            to True.
         cooperative_gradients : bool
             whether to use the cooperative gradient update procedure for the
             higher-level policy. See: https://arxiv.org/abs/1912.02368v1
@@ -138,6 +155,9 @@ class GoalConditionedPolicy(BaseGoalConditionedPolicy):
         self.tau = tau
         self.gamma = gamma
         self.use_huber = use_huber
+        self.prioritized_replay = prioritized_replay
+        self.replay_buffer_path = replay_buffer_path
+        self.reduced_precision_replay = reduced_precision_replay
 
         super(GoalConditionedPolicy, self).__init__(
             sess=sess,
@@ -152,6 +172,9 @@ class GoalConditionedPolicy(BaseGoalConditionedPolicy):
             tau=tau,
             gamma=gamma,
             use_huber=use_huber,
+            prioritized_replay=prioritized_replay,
+            replay_buffer_path=replay_buffer_path,
+            reduced_precision_replay=reduced_precision_replay,
             l2_penalty=l2_penalty,
             model_params=model_params,
             num_levels=num_levels,
@@ -162,6 +185,7 @@ class GoalConditionedPolicy(BaseGoalConditionedPolicy):
             off_policy_corrections=off_policy_corrections,
             hindsight=hindsight,
             subgoal_testing_rate=subgoal_testing_rate,
+            hindsight_relabel_prob=hindsight_relabel_prob,
             cooperative_gradients=cooperative_gradients,
             cg_weights=cg_weights,
             cg_delta=cg_delta,
@@ -183,98 +207,13 @@ class GoalConditionedPolicy(BaseGoalConditionedPolicy):
     #                       Auxiliary methods for HIRO                        #
     # ======================================================================= #
 
-    def _log_probs(self, meta_actions, worker_obses, worker_actions):
-        """Calculate the log probability of the next goal by the meta-policies.
+    def _worker_log_probs(self):
+        """See parent class.
 
-        Parameters
-        ----------
-        meta_actions : array_like
-            (batch_size, m_ac_dim, num_samples) matrix of candidate higher-
-            level policy actions
-        worker_obses : array_like
-            (batch_size, w_obs_dim, meta_period + 1) matrix of lower-level
-            policy observations
-        worker_actions : array_like
-            (batch_size, w_ac_dim, meta_period) list of lower-level policy
-            actions
-
-        Returns
-        -------
-        array_like
-            (batch_size, num_samples) fitness associated with every state /
-            action / goal pair
-
-        Helps
-        -----
-        * _sample_best_meta_action(self):
+        The log-probability of an action is computed by the logp_action
+        attribute of the SAC lower-level policy.
         """
-        fitness = []
-        batch_size, goal_dim, num_samples = meta_actions.shape
-        _, _, meta_period = worker_actions.shape
-
-        # Loop through the elements of the batch.
-        for i in range(batch_size):
-            # Extract the candidate goals for the current element in the batch.
-            # The worker observations and actions from the meta period of the
-            # current batch are also collected to compute the log-probability
-            # of a given candidate goal.
-            goals_per_sample = meta_actions[i, :, :].T
-            worker_obses_per_sample = worker_obses[i, :, :].T
-            worker_actions_per_sample = worker_actions[i, :, :].T
-
-            # This will be used to store the cumulative log-probabilities of a
-            # given candidate goal for the entire meta-period.
-            fitness_per_sample = np.zeros(num_samples)
-
-            # Create repeated representations of each worker action for each
-            # candidate goal.
-            tiled_worker_actions_per_sample = np.tile(
-                worker_actions_per_sample, (num_samples, 1))
-
-            # Create repeated representations of each worker observation for
-            # each candidate goal. The indexing of worker_obses_per_sample is
-            # meant to do the following:
-            #  1. We remove the last observation since it does not correspond
-            #     to any action for the current meta-period.
-            #  2. Unlike the TD3 implementation, we keep the trailing context
-            #     (goal) terms since they are needed to compute the log-prob
-            #     of a given action when feeding to logp_action.
-            tiled_worker_obses_per_sample = np.tile(
-                worker_obses_per_sample[:-1, :], (num_samples, 1))
-
-            # Create repeated representations of each candidate goal for each
-            # worker observation in a meta period.
-            tiled_goals_per_sample = np.tile(
-                goals_per_sample, meta_period).reshape(
-                (num_samples * meta_period, goal_dim))
-
-            # If relative goals are being used, update the later goals to match
-            # what they would be under the relative goals difference approach.
-            if self.relative_goals:
-                goal_diff = worker_obses_per_sample[:-1, :] - np.tile(
-                    worker_obses_per_sample[0, :], (meta_period, 1))
-                tiled_goals_per_sample += \
-                    np.tile(goal_diff, (num_samples, 1))[:, :goal_dim]
-
-            # Compute the log-probability of each action using the logp_action
-            # attribute of the SAC lower-level policy.
-            normalized_error = self.sess.run(
-                self.policy[-1].logp_action,
-                feed_dict={
-                    self.policy[-1].obs_ph: tiled_worker_obses_per_sample,
-                    self.policy[-1].action_ph: tiled_worker_actions_per_sample,
-                }
-            )
-
-            # Sum the different normalized errors to get the fitness of each
-            # candidate goal.
-            for j in range(num_samples):
-                fitness_per_sample[j] = np.sum(
-                    normalized_error[j * meta_period: (j+1) * meta_period])
-
-            fitness.append(fitness_per_sample)
-
-        return np.array(fitness)
+        return self.policy[-1].logp_action
 
     # ======================================================================= #
     #                       Auxiliary methods for CHER                        #
@@ -26,7 +26,11 @@ class GoalConditionedPolicy(BaseGoalConditionedPolicy):
                  noise,
                  target_policy_noise,
                  target_noise_clip,
+                 fused_update,
                  use_huber,
+                 prioritized_replay,
+                 replay_buffer_path,
+                 reduced_precision_replay,
                  l2_penalty,
                  model_params,
                  num_levels,
@@ -37,6 +41,7 @@ class GoalConditionedPolicy(BaseGoalConditionedPolicy):
                  off_policy_corrections,
                  hindsight,
                  subgoal_testing_rate,
+                 hindsight_relabel_prob,
                  cooperative_gradients,
                  cg_weights,
                  cg_delta,
@@ -83,10 +88,22 @@ class GoalConditionedPolicy(BaseGoalConditionedPolicy):
             actor policy. See TD3 paper for more.
         target_noise_clip : float
             clipping term for the noise injected in the target actor policy
+        fused_update : bool
+            whether to perform multiple training steps within a single session
+            call. Not supported by goal-conditioned policies.
         use_huber : bool
             specifies whether to use the huber distance function as the loss
             for the critic. If set to False, the mean-squared error metric is
             used instead
+        prioritized_replay : bool
+            whether to use prioritized experience replay. Not supported by
+            goal-conditioned policies.
+        replay_buffer_path : str or None
+            the directory in which the replay buffer is stored as memory-mapped
+            files. Not supported by goal-conditioned policies.
+        reduced_precision_replay : bool
+            whether to store the observations in the replay buffer with reduced
+            precision. Not supported by goal-conditioned policies.
         l2_penalty : float
             L2 regularization penalty. This is applied to the policy network.
         model_params : dict
@@ -117,6 +134,12 @@ class GoalConditionedPolicy(BaseGoalConditionedPolicy):
         subgoal_testing_rate : float
             rate at which the original (non-hindsight) sample is stored in the
             replay buffer as well. Used only if `hindsight` is set to True.
+        hindsight_relabel_prob : float or None
+            the probability that a sample is relabeled with hindsight goals and
+            rewards when it is sampled from the replay buffer. If set to None,
+            hindsight samples are instead computed and stored in the replay
+            buffer when every meta-period ends. Used only if `hindsight` is set
+            to True.
         cooperative_gradients : bool
             whether to use the cooperative gradient update procedure for the
             higher-level policy. See: https://arxiv.org/abs/1912.02368v1
@@ -148,6 +171,14 @@ class GoalConditionedPolicy(BaseGoalConditionedPolicy):
         self.tau = tau
         self.gamma = gamma
         self.use_huber = use_huber
+        self.prioritized_replay = prioritized_replay
+        self.replay_buffer_path = replay_buffer_path
+        self.reduced_precision_replay = reduced_precision_replay
+        self.fused_update = False
+
+        if fused_update:
+            print("WARNING: fused_update is not supported by goal-conditioned "
+                  "policies. Ignoring.")
 
         # Utility method for indexing the goal out of an observation variable.
         self.crop_to_goal = lambda g: tf.gather(
@@ -169,6 +200,9 @@ class GoalConditionedPolicy(BaseGoalConditionedPolicy):
             tau=tau,
             gamma=gamma,
             use_huber=use_huber,
+            prioritized_replay=prioritized_replay,
+            replay_buffer_path=replay_buffer_path,
+            reduced_precision_replay=reduced_precision_replay,
             l2_penalty=l2_penalty,
             model_params=model_params,
             num_levels=num_levels,
@@ -179,6 +213,7 @@ class GoalConditionedPolicy(BaseGoalConditionedPolicy):
             off_policy_corrections=off_policy_corrections,
             hindsight=hindsight,
             subgoal_testing_rate=subgoal_testing_rate,
+            hindsight_relabel_prob=hindsight_relabel_prob,
             cooperative_gradients=cooperative_gradients,
             cg_weights=cg_weights,
             cg_delta=cg_delta,
@@ -195,6 +230,7 @@ class GoalConditionedPolicy(BaseGoalConditionedPolicy):
                 noise=noise,
                 target_policy_noise=target_policy_noise,
                 target_noise_clip=target_noise_clip,
+                fused_update=False,
             ),
         )
 
@@ -202,103 +238,16 @@ class GoalConditionedPolicy(BaseGoalConditionedPolicy):
     #                       Auxiliary methods for HIRO                        #
     # ======================================================================= #
 
-    def _log_probs(self, meta_actions, worker_obses, worker_actions):
-        """Calculate the log probability of the next goal by the meta-policies.
+    def _worker_log_probs(self):
+        """See parent class.
 
-        Parameters
-        ----------
-        meta_actions : array_like
-            (batch_size, m_ac_dim, num_samples) matrix of candidate higher-
-            level policy actions
-        worker_obses : array_like
-            (batch_size, w_obs_dim, meta_period + 1) matrix of lower-level
-            policy observations
-        worker_actions : array_like
-            (batch_size, w_ac_dim, meta_period) list of lower-level policy
-            actions
-
-        Returns
-        -------
-        array_like
-            (batch_size, num_samples) fitness associated with every state /
-            action / goal pair
-
-        Helps
-        -----
-        * _sample_best_meta_action(self):
+        The log-probability of an action is approximated by the negative mean
+        squared error between the action and the action that is computed by
+        the current instantiation of the worker policy.
         """
-        fitness = []
-        batch_size, goal_dim, num_samples = meta_actions.shape
-        _, _, meta_period = worker_actions.shape
-
-        # Loop through the elements of the batch.
-        for i in range(batch_size):
-            # Extract the candidate goals for the current element in the batch.
-            # The worker observations and actions from the meta period of the
-            # current batch are also collected to compute the log-probability
-            # of a given candidate goal.
-            goals_per_sample = meta_actions[i, :, :].T
-            worker_obses_per_sample = worker_obses[i, :, :].T
-            worker_actions_per_sample = worker_actions[i, :, :].T
-
-            # This will be used to store the cumulative log-probabilities of a
-            # given candidate goal for the entire meta-period.
-            fitness_per_sample = np.zeros(num_samples)
-
-            # Create repeated representations of each worker observation for
-            # each candidate goal. The indexing of worker_obses_per_sample is
-            # meant to do the following:
-            #  1. We remove the last observation since it does not correspond
-            #     to any action for the current meta-period.
-            #  2. Since the worker observations contain the goal (context) for
-            #     the last `goal_dim` elements, these elements are removed to
-            #     only provide the environmental observation.
-            tiled_worker_obses_per_sample = np.tile(
-                worker_obses_per_sample[:-1, :-goal_dim],
-                (num_samples, 1)
-            )
-
-            # Create repeated representations of each candidate goal for each
-            # worker observation in a meta period.
-            tiled_goals_per_sample = np.tile(
-                goals_per_sample, meta_period).reshape(
-                (num_samples * meta_period, goal_dim))
-
-            # If relative goals are being used, update the later goals to match
-            # what they would be under the relative goals difference approach.
-            if self.relative_goals:
-                goal_diff = worker_obses_per_sample[:-1, :] - np.tile(
-                    worker_obses_per_sample[0, :], (meta_period, 1))
-                tiled_goals_per_sample += \
-                    np.tile(goal_diff, (num_samples, 1))[:, self.goal_indices]
-
-            # Compute the actions the Worker would perform given a specific
-            # observation/goal for the current instantiation of the policy.
-            pred_actions = self.policy[-1].get_action(
-                tiled_worker_obses_per_sample,
-                tiled_goals_per_sample,
-                apply_noise=False,
-                random_actions=False
-            )
-
-            # Compute error as the distance between expected and actual actions
-            normalized_error = -np.mean(
-                np.square(
-                    np.tile(worker_actions_per_sample, (num_samples, 1))
-                    - pred_actions
-                ),
-                axis=1
-            )
-
-            # Sum the different normalized errors to get the fitness of each
-            # candidate goal.
-            for j in range(num_samples):
-                fitness_per_sample[j] = np.sum(
-                    normalized_error[j * meta_period: (j+1) * meta_period])
-
-            fitness.append(fitness_per_sample)
-
-        return np.array(fitness)
+        worker = self.policy[-1]
+        return -tf.reduce_mean(
+            tf.square(worker.action_ph - worker.actor_tf), axis=1)
 
     # ======================================================================= #
     #                       Auxiliary methods for CHER                        #
@@ -1,7 +1,10 @@
 """Multi-agent base policy."""
+import os
 import tensorflow as tf
+import numpy as np
 
 from hbaselines.base_policies import Policy
+from hbaselines.utils.slot_allocator import SlotAllocator
 
 
 class MultiAgentPolicy(Policy):
@@ -81,6 +84,10 @@ class MultiAgentPolicy(Policy):
     n_agents : int
         the expected number of agents in the environment. Only relevant if
         using shared policies with MADDPG or goal-conditioned hierarchies.
+    joint_update : bool
+        whether to update all agents of an independent MADDPG policy within a
+        single session call, using batches sampled at common indices from the
+        replay buffers of every agent
     base_policy : type [ hbaselines.base_policies.Policy ]
         the base (single agent) policy model used by all agents within the
         network
@@ -103,6 +110,7 @@ class MultiAgentPolicy(Policy):
                  shared,
                  maddpg,
                  n_agents,
+                 joint_update,
                  base_policy,
                  all_ob_space=None,
                  num_envs=1,
@@ -144,6 +152,10 @@ class MultiAgentPolicy(Policy):
         n_agents : int
             the expected number of agents in the environment. Only relevant if
             using shared policies with MADDPG or goal-conditioned hierarchies.
+        joint_update : bool
+            whether to update all agents of an independent MADDPG policy within
+            a single session call, using batches sampled at common indices from
+            the replay buffers of every agent
         additional_params : dict
             additional algorithm-specific policy parameters. Used internally by
             the class when instantiating other (child) policies.
@@ -168,12 +180,19 @@ class MultiAgentPolicy(Policy):
         self.maddpg = maddpg
         self.all_ob_space = all_ob_space
         self.n_agents = n_agents
+        self.joint_update = joint_update
         self.base_policy = base_policy
         self.additional_params = additional_params or {}
 
         # Used to maintain memory on the env_num used for individual agents.
         # Key: agent ID, Element: agent env number.
-        self._agent_index = [{} for _ in range(num_envs)]
+        self._agent_index = [
+            SlotAllocator(n_agents or 0) for _ in range(num_envs)]
+
+        if joint_update and (shared or not maddpg):
+            print("WARNING: joint_update is only supported by independent "
+                  "MADDPG policies. Ignoring.")
+            self.joint_update = False
 
         # Setup the agents and the necessary objects and operations needed to
         # support the training procedure.
@@ -252,6 +271,55 @@ class MultiAgentPolicy(Policy):
                 env_num=env_num,
             )
 
+    def get_action_batch(self,
+                         obs,
+                         context,
+                         apply_noise,
+                         random_actions,
+                         env_num):
+        """Compute the actions for multiple environments in a single call.
+
+        Parameters
+        ----------
+        obs : list of dict of array_like
+            the observations from each environment, with each element
+            corresponding to a unique agent (as defined by the key)
+        context : list of array_like or None
+            the contextual term for each agent in each environment. Set to None
+            if no context is provided by the environment.
+        apply_noise : bool
+            whether to add Gaussian noise to the output of the actor. Defaults
+            to False
+        random_actions : bool
+            if set to True, actions are sampled randomly from the action space
+            instead of being computed by the policy. This is used for
+            exploration purposes.
+        env_num : list of int
+            the environment number of each element in `obs`
+
+        Returns
+        -------
+        list of dict of array_like
+            computed action by the policy for each environment. The output
+            keys match the input keys
+        """
+        if self.maddpg:
+            return [self._get_action_maddpg(
+                obs=obs[j],
+                context=None if context is None else context[j],
+                apply_noise=apply_noise,
+                random_actions=random_actions,
+                env_num=env_num[j],
+            ) for j in range(len(env_num))]
+        else:
+            return self._get_action_batch_basic(
+                obs=obs,
+                context=context,
+                apply_noise=apply_noise,
+                random_actions=random_actions,
+                env_num=env_num,
+            )
+
     def store_transition(self,
                          obs0,
                          context0,
@@ -377,6 +445,12 @@ class MultiAgentPolicy(Policy):
                 # Add the outer scope if provided.
                 scope_i = key if scope is None else "{}/{}".format(scope, key)
 
+                # Each agent stores its replay buffer in a separate directory.
+                policy_parameters_i = policy_parameters.copy()
+                if policy_parameters.get("replay_buffer_path") is not None:
+                    policy_parameters_i["replay_buffer_path"] = os.path.join(
+                        policy_parameters["replay_buffer_path"], key)
+
                 # Each agent requires a new feed-forward policy.
                 with tf.compat.v1.variable_scope(key):
                     self.agents[key] = self.base_policy(
@@ -385,7 +459,7 @@ class MultiAgentPolicy(Policy):
                         ac_space=self.ac_space[key],
                         co_space=self.co_space[key],
                         scope=scope_i,
-                        **policy_parameters
+                        **policy_parameters_i
                     )
 
     def _initialize_basic(self):
@@ -405,35 +479,80 @@ class MultiAgentPolicy(Policy):
                           random_actions,
                           env_num):
         """See get_action."""
-        actions = {}
-
-        # Update the index of agent observations. This helps support action
-        # computations for agents with memory (e.g. goal-conditioned policies)
-        # and variable agents (e.g. the highway and I-210  networks).
+        # Shared policies compute the actions of every agent in a single call
+        # to the policy, by treating the agents as a batch of environments.
         if self.shared:
-            self._update_agent_index(obs, env_num)
+            return self._get_action_batch_basic(
+                obs=[obs],
+                context=None if context is None else [context],
+                apply_noise=apply_noise,
+                random_actions=random_actions,
+                env_num=[env_num],
+            )[0]
 
+        actions = {}
         for key in obs.keys():
-            # Use the same policy for all operations if shared, and the
-            # corresponding policy otherwise.
-            agent = self.agents["policy"] if self.shared else self.agents[key]
-            env_num_i = \
-                self.n_agents * env_num + self._agent_index[env_num][key] \
-                if self.shared else env_num
-
             # Get the contextual term. This accounts for cases when the context
             # is set to None.
             context_i = context if context is None else context[key]
 
             # Compute the action of the provided observation.
-            actions[key] = agent.get_action(
+            actions[key] = self.agents[key].get_action(
                 obs=obs[key],
                 context=context_i,
                 apply_noise=apply_noise,
                 random_actions=random_actions,
-                env_num=env_num_i,
+                env_num=env_num,
+            )
+
+        return actions
+
+    def _get_action_batch_basic(self,
+                                obs,
+                                context,
+                                apply_noise,
+                                random_actions,
+                                env_num):
+        """See get_action_batch."""
+        # Group the observations by the policy that computes their actions.
+        # Shared policies compute the actions of every agent in every
+        # environment in a single call.
+        groups = {}
+        for j, num in enumerate(env_num):
+            # Update the index of agent observations. This helps support action
+            # computations for agents with memory (e.g. goal-conditioned
+            # policies) and variable agents (e.g. the highway and I-210
+            # networks).
+            if self.shared:
+                self._update_agent_index(obs[j], num)
+
+            for key in obs[j].keys():
+                name = "policy" if self.shared else key
+                env_num_i = \
+                    self.n_agents * num + self._agent_index[num][key] \
+                    if self.shared else num
+                context_i = None if context is None or context[j] is None \
+                    else context[j][key]
+
+                groups.setdefault(name, []).append(
+                    (j, key, obs[j][key], context_i, env_num_i))
+
+        actions = [{} for _ in range(len(env_num))]
+        for name, group in groups.items():
+            j, key, obs_i, context_i, env_num_i = zip(*group)
+
+            # Compute the actions of all observations assigned to the policy.
+            action = self.agents[name].get_action_batch(
+                obs=list(obs_i),
+                context=None if context_i[0] is None else list(context_i),
+                apply_noise=apply_noise,
+                random_actions=random_actions,
+                env_num=list(env_num_i),
             )
 
+            for k in range(len(group)):
+                actions[j[k]][key[k]] = action[k]
+
         return actions
 
     def _store_transition_basic(self,
@@ -448,17 +567,32 @@ class MultiAgentPolicy(Policy):
                                 env_num,
                                 evaluate):
         """See store_transition."""
-        for key in obs0.keys():
-            # If the agent has exited the environment, ignore it.
-            if key not in obs1.keys():
-                continue
-
-            # Use the same policy for all operations if shared, and the
-            # corresponding policy otherwise.
-            agent = self.agents["policy"] if self.shared else self.agents[key]
-            env_num_i = \
-                self.n_agents * env_num + self._agent_index[env_num][key] \
-                if self.shared else env_num
+        # If the agent has exited the environment, ignore it.
+        keys = [key for key in obs0.keys() if key in obs1.keys()]
+
+        # Shared policies store the transitions of every agent in a single
+        # call to the policy, by treating the agents as a batch of
+        # environments.
+        if self.shared:
+            self.agents["policy"].store_transition_batch(
+                obs0=[obs0[key] for key in keys],
+                context0=None if context0 is None
+                else [context0[key] for key in keys],
+                action=[action[key] for key in keys],
+                reward=[reward[key] for key in keys],
+                obs1=[obs1[key] for key in keys],
+                context1=None if context1 is None
+                else [context1[key] for key in keys],
+                done=[float(done[key]) for key in keys],
+                is_final_step=is_final_step,
+                env_num=list(self.n_agents * env_num +
+                             self._agent_index[env_num].slots(keys)),
+                evaluate=evaluate,
+            )
+            return
+
+        for key in keys:
+            agent = self.agents[key]
 
             # Get the contextual term. This accounts for cases when the context
             # is set to None.
@@ -476,7 +610,7 @@ class MultiAgentPolicy(Policy):
                 done=float(done[key]),
                 is_final_step=is_final_step,
                 evaluate=evaluate,
-                env_num=env_num_i,
+                env_num=env_num,
             )
 
     def _get_td_map_basic(self):
@@ -511,37 +645,22 @@ class MultiAgentPolicy(Policy):
             the environment number. Used to handle situations when multiple
             parallel environments are being used.
         """
-        # Check if the old agents are still available.
-        for key in list(self._agent_index[env_num].keys()):
-            if key not in obs.keys():
-                # If using a goal-conditioned policy, clear memory so that the
-                # higher level policies are forced to compute a new meta-action
-                # when using this env num.
-                agent = self.agents["policy"]
-                agent.clear_memory(
-                    self.n_agents * env_num + self._agent_index[env_num][key])
-
-                # Remove vehicles from the agent indices if it is not longer
-                # available.
-                del self._agent_index[env_num][key]
-
-        # Collect the indices that are still available.
-        free_indices = sorted(list(
-            set(range(self.n_agents)) -
-            set(self._agent_index[env_num].values())))
-
-        # Check if new agents are available.
-        for key in obs.keys():
-            # Provide the newest agent one of the old free indices.
-            if key not in self._agent_index[env_num].keys():
-                # Do not add new agents after the maximum number has been set.
-                if len(free_indices) == 0:
-                    raise ValueError(
-                        "Too many agents are available. Please set n_agents "
-                        "to a larger value.")
-
-                self._agent_index[env_num][key] = free_indices[0]
-                free_indices = free_indices[1:]
+        # Release the indices of agents that are no longer available, and
+        # assign free indices to new agents.
+        try:
+            released = self._agent_index[env_num].update(obs.keys())
+        except ValueError:
+            # Do not add new agents after the maximum number has been set.
+            raise ValueError(
+                "Too many agents are available. Please set n_agents to a "
+                "larger value.")
+
+        # If using a goal-conditioned policy, clear memory so that the higher
+        # level policies are forced to compute a new meta-action when using
+        # the released env nums.
+        if len(released) > 0:
+            self.agents["policy"].clear_memory(
+                self.n_agents * env_num + np.asarray(released))
 
     # ======================================================================= #
     #               MADDPG version of required abstract methods.              #
@@ -19,11 +19,15 @@ class MultiGoalConditionedPolicy(BasePolicy):
                  tau,
                  gamma,
                  use_huber,
+                 prioritized_replay,
+                 replay_buffer_path,
+                 reduced_precision_replay,
                  l2_penalty,
                  model_params,
                  noise,
                  target_policy_noise,
                  target_noise_clip,
+                 fused_update,
                  num_levels,
                  meta_period,
                  intrinsic_reward_type,
@@ -32,6 +36,7 @@ class MultiGoalConditionedPolicy(BasePolicy):
                  off_policy_corrections,
                  hindsight,
                  subgoal_testing_rate,
+                 hindsight_relabel_prob,
                  cooperative_gradients,
                  cg_weights,
                  cg_delta,
@@ -42,6 +47,7 @@ class MultiGoalConditionedPolicy(BasePolicy):
                  shared,
                  maddpg,
                  n_agents,
+                 joint_update,
                  env_name="",
                  num_envs=1,
                  all_ob_space=None,
@@ -77,6 +83,15 @@ class MultiGoalConditionedPolicy(BasePolicy):
             specifies whether to use the huber distance function as the loss
             for the critic. If set to False, the mean-squared error metric is
             used instead
+        prioritized_replay : bool
+            whether to use prioritized experience replay. Not supported by
+            goal-conditioned policies.
+        replay_buffer_path : str or None
+            the directory in which the replay buffer is stored as memory-mapped
+            files. Not supported by goal-conditioned policies.
+        reduced_precision_replay : bool
+            whether to store the observations in the replay buffer with reduced
+            precision. Not supported by goal-conditioned policies.
         l2_penalty : float
             L2 regularization penalty. This is applied to the policy network.
         model_params : dict
@@ -90,6 +105,9 @@ class MultiGoalConditionedPolicy(BasePolicy):
             actor policy. See TD3 paper for more.
         target_noise_clip : float
             clipping term for the noise injected in the target actor policy
+        fused_update : bool
+            whether to perform multiple training steps within a single session
+            call. Not supported by goal-conditioned policies.
         num_levels : int
             number of levels within the hierarchy. Must be greater than 1. Two
             levels correspond to a Manager/Worker paradigm.
@@ -133,6 +151,12 @@ class MultiGoalConditionedPolicy(BasePolicy):
         subgoal_testing_rate : float
             rate at which the original (non-hindsight) sample is stored in the
             replay buffer as well. Used only if `hindsight` is set to True.
+        hindsight_relabel_prob : float or None
+            the probability that a sample is relabeled with hindsight goals and
+            rewards when it is sampled from the replay buffer. If set to None,
+            hindsight samples are instead computed and stored in the replay
+            buffer when every meta-period ends. Used only if `hindsight` is set
+            to True.
         cooperative_gradients : bool
             whether to use the cooperative gradient update procedure for the
             higher-level policy. See: https://arxiv.org/abs/1912.02368v1
@@ -167,6 +191,10 @@ class MultiGoalConditionedPolicy(BasePolicy):
         n_agents : int
             the expected number of agents in the environment. Only relevant if
             using shared policies with MADDPG or goal-conditioned hierarchies.
+        joint_update : bool
+            whether to update all agents of an independent MADDPG policy within
+            a single session call, using batches sampled at common indices from
+            the replay buffers of every agent
         scope : str
             an upper-level scope term. Used by policies that call this one.
         """
@@ -177,6 +205,9 @@ class MultiGoalConditionedPolicy(BasePolicy):
         self.tau = tau
         self.gamma = gamma
         self.use_huber = use_huber
+        self.prioritized_replay = prioritized_replay
+        self.replay_buffer_path = replay_buffer_path
+        self.reduced_precision_replay = reduced_precision_replay
 
         super(MultiGoalConditionedPolicy, self).__init__(
             sess=sess,
@@ -190,6 +221,7 @@ class MultiGoalConditionedPolicy(BasePolicy):
             maddpg=maddpg,
             all_ob_space=all_ob_space,
             n_agents=n_agents,
+            joint_update=joint_update,
             base_policy=GoalConditionedPolicy,
             num_envs=num_envs,
             scope=scope,
@@ -201,9 +233,13 @@ class MultiGoalConditionedPolicy(BasePolicy):
                 tau=tau,
                 gamma=gamma,
                 use_huber=use_huber,
+                prioritized_replay=prioritized_replay,
+                replay_buffer_path=replay_buffer_path,
+                reduced_precision_replay=reduced_precision_replay,
                 noise=noise,
                 target_policy_noise=target_policy_noise,
                 target_noise_clip=target_noise_clip,
+                fused_update=fused_update,
                 num_levels=num_levels,
                 meta_period=meta_period,
                 intrinsic_reward_type=intrinsic_reward_type,
@@ -212,6 +248,7 @@ class MultiGoalConditionedPolicy(BasePolicy):
                 off_policy_corrections=off_policy_corrections,
                 hindsight=hindsight,
                 subgoal_testing_rate=subgoal_testing_rate,
+                hindsight_relabel_prob=hindsight_relabel_prob,
                 cooperative_gradients=cooperative_gradients,
                 cg_weights=cg_weights,
                 cg_delta=cg_delta,
@@ -27,6 +27,7 @@ class MultiFeedForwardPolicy(BasePolicy):
                  shared,
                  maddpg,
                  n_agents,
+                 joint_update,
                  all_ob_space=None,
                  num_envs=1,
                  scope=None):
@@ -56,6 +57,10 @@ class MultiFeedForwardPolicy(BasePolicy):
             the number of agents in the networks. This is needed if using
             MADDPG with a shared policy to compute the length of the full
             action space. Otherwise, it is not used.
+        joint_update : bool
+            whether to update all agents of an independent MADDPG policy within
+            a single session call, using batches sampled at common indices from
+            the replay buffers of every agent
         scope : str
             an upper-level scope term. Used by policies that call this one.
         """
@@ -71,6 +76,7 @@ class MultiFeedForwardPolicy(BasePolicy):
             maddpg=maddpg,
             all_ob_space=all_ob_space,
             n_agents=n_agents,
+            joint_update=joint_update,
             base_policy=FeedForwardPolicy,
             num_envs=num_envs,
             scope=scope,
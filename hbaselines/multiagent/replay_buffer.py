@@ -1,12 +1,33 @@
 """Script contain the MultiReplayBuffer object."""
+import os
 import numpy as np
 
+from hbaselines.fcnet.replay_buffer import NextObservations
+from hbaselines.fcnet.replay_buffer import create_buffer_array
+from hbaselines.utils.misc import ensure_dir
+from hbaselines.utils.segment_tree import SumSegmentTree
+from hbaselines.utils.segment_tree import MinSegmentTree
+
 
 class MultiReplayBuffer(object):
     """Experience replay buffer for independent multi-agent settings.
 
     This replay buffer supports centralized training by including a full-states
-    term for training centralized critics.
+    term for training centralized critics. The next observations and next
+    full-state observations are stored in a sequential-frame layout, see
+    NextObservations.
+
+    Attributes
+    ----------
+    storage_path : str or None
+        the directory of the memory-mapped files that store the content of the
+        buffer. None if the buffer is stored in memory.
+    next_obs : NextObservations
+        the next observations and next full-state observations that are not
+        stored in `obs_t` and `all_obs_t`
+    rng : numpy.random.RandomState or module
+        the random number generator used to sample batches. Defaults to the
+        global generator of numpy.
     """
 
     def __init__(self,
@@ -15,7 +36,9 @@ class MultiReplayBuffer(object):
                  obs_dim,
                  ac_dim,
                  all_obs_dim,
-                 all_ac_dim):
+                 all_ac_dim,
+                 storage_path=None,
+                 storage_dtype=None):
         """Instantiate a buffer.
 
         Parameters
@@ -33,39 +56,69 @@ class MultiReplayBuffer(object):
             number of elements in the full state observations
         all_ac_dim : int
             number of elements in the actions of all agents
+        storage_path : str or None
+            the directory in which the content of the buffer is stored as
+            memory-mapped files. If these files already exist, they are
+            reopened in place. If set to None, the buffer is stored in memory.
+        storage_dtype : dict or None
+            the reduced-precision data type of the observations and full state
+            observations, under the keys "obs_t" and "all_obs_t". See the
+            ReplayBuffer object in hbaselines/fcnet/replay_buffer.py. If set
+            to None, all elements are stored as float32.
         """
         self._maxsize = buffer_size
         self._size = 0
         self._next_idx = 0
         self._batch_size = batch_size
-
-        self.obs_t = np.zeros(
-            (buffer_size, obs_dim), dtype=np.float32)
-        self.action_t = np.zeros(
-            (buffer_size, ac_dim), dtype=np.float32)
-        self.reward = np.zeros(
-            buffer_size, dtype=np.float32)
-        self.obs_tp1 = np.zeros(
-            (buffer_size, obs_dim), dtype=np.float32)
-        self.done = np.zeros(
-            buffer_size, dtype=np.float32)
-        self.all_obs_t = np.zeros(
-            (buffer_size, all_obs_dim), dtype=np.float32)
-        self.all_action_t = np.zeros(
-            (buffer_size, all_ac_dim), dtype=np.float32)
-        self.all_obs_tp1 = np.zeros(
-            (buffer_size, all_obs_dim), dtype=np.float32)
+        self.storage_path = storage_path
+        self.storage_dtype = storage_dtype or {}
+
+        if storage_path is not None:
+            ensure_dir(storage_path)
+
+        def _create(name, shape):
+            return create_buffer_array(
+                shape=shape,
+                storage_dtype=self.storage_dtype.get(name),
+                path=None if storage_path is None else os.path.join(
+                    storage_path, name))
+
+        self.obs_t = _create(
+            "obs_t", (buffer_size, obs_dim))
+        self.action_t = _create(
+            "action_t", (buffer_size, ac_dim))
+        self.reward = _create(
+            "reward", (buffer_size,))
+        self.done = _create(
+            "done", (buffer_size,))
+        self.all_obs_t = _create(
+            "all_obs_t", (buffer_size, all_obs_dim))
+        self.all_action_t = _create(
+            "all_action_t", (buffer_size, all_ac_dim))
+        self.next_obs = NextObservations(buffer_size)
+        self.rng = np.random
 
     def save(self, save_path):
-        """Save parameters for the replay buffer."""
-        np.save(save_path + '.obs_t.npy', self.obs_t)
-        np.save(save_path + '.action_t.npy', self.action_t)
-        np.save(save_path + '.reward.npy', self.reward)
-        np.save(save_path + '.obs_tp1.npy', self.obs_tp1)
-        np.save(save_path + '.done.npy', self.done)
-        np.save(save_path + '.all_obs_t.npy', self.all_obs_t)
-        np.save(save_path + '.all_action_t.npy', self.all_action_t)
-        np.save(save_path + '.all_obs_tp1.npy', self.all_obs_tp1)
+        """Save parameters for the replay buffer.
+
+        If the buffer is stored in memory-mapped files, these files are
+        flushed to disk in place, and only the configuration of the buffer is
+        saved under `save_path`.
+        """
+        if self.storage_path is None:
+            np.save(save_path + '.obs_t.npy', self.obs_t)
+            np.save(save_path + '.action_t.npy', self.action_t)
+            np.save(save_path + '.reward.npy', self.reward)
+            np.save(save_path + '.done.npy', self.done)
+            np.save(save_path + '.all_obs_t.npy', self.all_obs_t)
+            np.save(save_path + '.all_action_t.npy', self.all_action_t)
+        else:
+            for array in [self.obs_t, self.action_t, self.reward, self.done,
+                          self.all_obs_t, self.all_action_t]:
+                array.flush()
+
+        self.next_obs.save(save_path)
+
         np.save(save_path + '.config.npy', np.array([
             self._maxsize,
             self._size,
@@ -73,15 +126,22 @@ class MultiReplayBuffer(object):
             self._batch_size]))
 
     def load(self, save_path):
-        """Load parameters for the replay buffer."""
-        self.obs_t = np.load(save_path + '.obs_t.npy')
-        self.action_t = np.load(save_path + '.action_t.npy')
-        self.reward = np.load(save_path + '.reward.npy')
-        self.obs_tp1 = np.load(save_path + '.obs_tp1.npy')
-        self.done = np.load(save_path + '.done.npy')
-        self.all_obs_t = np.load(save_path + '.all_obs_t.npy')
-        self.all_action_t = np.load(save_path + '.all_action_t.npy')
-        self.all_obs_tp1 = np.load(save_path + '.all_obs_tp1.npy')
+        """Load parameters for the replay buffer.
+
+        If the buffer is stored in memory-mapped files, the content of these
+        files (reopened in place when the buffer was created) is used, and
+        only the configuration of the buffer is loaded from `save_path`.
+        """
+        if self.storage_path is None:
+            self.obs_t[:] = np.load(save_path + '.obs_t.npy')
+            self.action_t = np.load(save_path + '.action_t.npy')
+            self.reward = np.load(save_path + '.reward.npy')
+            self.done = np.load(save_path + '.done.npy')
+            self.all_obs_t[:] = np.load(save_path + '.all_obs_t.npy')
+            self.all_action_t = np.load(save_path + '.all_action_t.npy')
+
+        self.next_obs.load(save_path, num_fields=2)
+
         (self._maxsize,
          self._size,
          self._next_idx,
@@ -124,7 +184,8 @@ class MultiReplayBuffer(object):
             done,
             all_obs_t,
             all_action_t,
-            all_obs_tp1):
+            all_obs_tp1,
+            env_num=0):
         """Add a new transition to the buffer.
 
         Parameters
@@ -145,16 +206,18 @@ class MultiReplayBuffer(object):
             the actions of all agents, sorted by the agent IDs
         all_obs_tp1 : array_like
             the current full state observation
+        env_num : int
+            the environment number of the transition
         """
-        for i in range(len(obs_t)):
-            self.obs_t[self._next_idx, :] = obs_t
-            self.action_t[self._next_idx, :] = action
-            self.reward[self._next_idx] = reward
-            self.obs_tp1[self._next_idx, :] = obs_tp1
-            self.done[self._next_idx] = done
+        self.obs_t[self._next_idx, :] = obs_t
+        self.action_t[self._next_idx, :] = action
+        self.reward[self._next_idx] = reward
+        self.done[self._next_idx] = done
         self.all_obs_t[self._next_idx, :] = all_obs_t
         self.all_action_t[self._next_idx, :] = all_action_t
-        self.all_obs_tp1[self._next_idx, :] = all_obs_tp1
+        self.next_obs.add(
+            self._next_idx, [obs_t, all_obs_t], [obs_tp1, all_obs_tp1],
+            env_num)
 
         # Increment the next index and size terms
         self._next_idx = (self._next_idx + 1) % self._maxsize
@@ -162,14 +225,17 @@ class MultiReplayBuffer(object):
 
     def _encode_sample(self, idxes):
         """Convert the indices to appropriate samples."""
+        obs_tp1, all_obs_tp1 = self.next_obs.get(
+            idxes, [self.obs_t, self.all_obs_t])
+
         return self.obs_t[idxes, :], \
             self.action_t[idxes, :], \
             self.reward[idxes], \
-            self.obs_tp1[idxes, :], \
+            obs_tp1, \
             self.done[idxes], \
             self.all_obs_t[idxes, :], \
             self.all_action_t[idxes, :], \
-            self.all_obs_tp1[idxes, :]
+            all_obs_tp1
 
     def sample(self, **_kwargs):
         """Sample a batch of experiences.
@@ -198,16 +264,263 @@ class MultiReplayBuffer(object):
             (batch_size, all_obs_dim) batch of next step full-state
             observations
         """
-        indices = np.random.randint(0, self._size, size=self._batch_size)
+        indices = self.rng.randint(0, self._size, size=self._batch_size)
+
+        if self.storage_path is not None:
+            # Read the memory-mapped files in increasing order of the indices,
+            # to reduce the number of page faults and random disk accesses.
+            indices.sort()
+
         return self._encode_sample(indices)
 
 
+def sample_joint(replay_buffers):
+    """Sample a batch of experiences at common indices from multiple buffers.
+
+    The buffers are expected to be filled in lockstep, e.g. the buffers of the
+    agents of an independent MADDPG policy in an environment with a fixed set
+    of agents, so that the samples at a given index correspond to the same
+    transition in every buffer. The indices are drawn from the range of the
+    smallest buffer, using the random number generator and batch size of the
+    first buffer.
+
+    Parameters
+    ----------
+    replay_buffers : list of MultiReplayBuffer
+        the replay buffers to sample from
+
+    Returns
+    -------
+    list of tuple
+        the batch of every buffer, in the same order and format as the output
+        from `MultiReplayBuffer.sample`
+    """
+    size = min(len(replay_buffer) for replay_buffer in replay_buffers)
+    indices = replay_buffers[0].rng.randint(
+        0, size, size=replay_buffers[0]._batch_size)
+
+    if any(rb.storage_path is not None for rb in replay_buffers):
+        # Read the memory-mapped files in increasing order of the indices.
+        indices.sort()
+
+    return [rb._encode_sample(indices) for rb in replay_buffers]
+
+
+class PrioritizedMultiReplayBuffer(MultiReplayBuffer):
+    """Prioritized variant of MultiReplayBuffer.
+
+    Transitions are sampled with a probability proportional to their priority
+    raised to the power alpha, and the bias introduced by this non-uniform
+    sampling is corrected by importance sampling weights. The priorities are
+    stored in array-based segment trees, which support batched sampling and
+    priority updates in O(log N) operations per element.
+
+    See: https://arxiv.org/abs/1511.05952
+    """
+
+    def __init__(self,
+                 buffer_size,
+                 batch_size,
+                 obs_dim,
+                 ac_dim,
+                 all_obs_dim,
+                 all_ac_dim,
+                 storage_path=None,
+                 storage_dtype=None,
+                 alpha=0.6,
+                 beta=0.4,
+                 eps=1e-6):
+        """Instantiate a buffer.
+
+        Parameters
+        ----------
+        buffer_size : int
+            Max number of transitions to store in the buffer. When the buffer
+            overflows the old memories are dropped.
+        batch_size : int
+            number of elements that are to be returned as a batch
+        obs_dim : int
+            number of elements in the observations of a single agent
+        ac_dim : int
+            number of elements in the actions of a single agent
+        all_obs_dim : int
+            number of elements in the full state observations
+        all_ac_dim : int
+            number of elements in the actions of all agents
+        storage_path : str or None
+            the directory in which the content of the buffer is stored as
+            memory-mapped files. The priorities are always stored in memory.
+        storage_dtype : dict or None
+            the reduced-precision data type of the observations and full state
+            observations. See parent class.
+        alpha : float
+            how much prioritization is used (0 - no prioritization, 1 - full
+            prioritization)
+        beta : float
+            to what degree to use importance weights (0 - no corrections, 1 -
+            full correction)
+        eps : float
+            small value that is added to the priorities to ensure that every
+            transition can be sampled
+        """
+        super(PrioritizedMultiReplayBuffer, self).__init__(
+            buffer_size=buffer_size,
+            batch_size=batch_size,
+            obs_dim=obs_dim,
+            ac_dim=ac_dim,
+            all_obs_dim=all_obs_dim,
+            all_ac_dim=all_ac_dim,
+            storage_path=storage_path,
+            storage_dtype=storage_dtype,
+        )
+
+        self.alpha = alpha
+        self.beta = beta
+        self.eps = eps
+
+        self._it_sum = SumSegmentTree(buffer_size)
+        self._it_min = MinSegmentTree(buffer_size)
+        self._max_priority = 1.0
+
+    def save(self, save_path):
+        """See parent class."""
+        super(PrioritizedMultiReplayBuffer, self).save(save_path)
+        np.save(save_path + '.priority.npy',
+                self._it_sum[np.arange(self._size)])
+
+    def load(self, save_path):
+        """See parent class."""
+        super(PrioritizedMultiReplayBuffer, self).load(save_path)
+        priority = np.load(save_path + '.priority.npy')
+        self._it_sum[np.arange(len(priority))] = priority
+        self._it_min[np.arange(len(priority))] = priority
+        if len(priority) > 0:
+            self._max_priority = np.max(priority) ** (1 / self.alpha)
+
+    def add(self,
+            obs_t,
+            action,
+            reward,
+            obs_tp1,
+            done,
+            all_obs_t,
+            all_action_t,
+            all_obs_tp1,
+            env_num=0):
+        """See parent class.
+
+        New transitions are assigned the maximum priority seen so far, to
+        ensure that they are sampled at least once.
+        """
+        idx = self._next_idx
+
+        super(PrioritizedMultiReplayBuffer, self).add(
+            obs_t, action, reward, obs_tp1, done, all_obs_t, all_action_t,
+            all_obs_tp1, env_num)
+
+        self._it_sum[idx] = self._max_priority ** self.alpha
+        self._it_min[idx] = self._max_priority ** self.alpha
+
+    def sample(self, with_weights=False, **_kwargs):
+        """Sample a batch of experiences.
+
+        The batch is stratified, with one element sampled from each of
+        `batch_size` equally sized ranges of the cumulative priorities.
+
+        Parameters
+        ----------
+        with_weights : bool
+            whether to return the importance sampling weights and the indices
+            of the sampled transitions as well
+
+        Returns
+        -------
+        array_like
+            (batch_size, obs_dim) batch of observations
+        array_like
+            (batch_size, ac_dim) batch of actions executed given obs_batch
+        array_like
+            (batch_size,) vector of  rewards received as results of executing
+            act_batch
+        array_like
+            (batch_size, obs_dim) batch of next step observations seen after
+            executing act_batch
+        list of bool
+            done_mask[i] = 1 if executing act_batch[i] resulted in the end of
+            an episode and 0 otherwise.
+        array_like
+            (batch_size, all_obs_dim) batch of full-state observations
+        array_like
+            (batch_size, all_ac_dim) batch of the actions of all agents, sorted
+            by the agent IDs.
+        array_like
+            (batch_size, all_obs_dim) batch of next step full-state
+            observations
+        array_like
+            (batch_size,) vector of importance sampling weights, normalized by
+            the maximum possible weight. Only returned if `with_weights` is set
+            to True.
+        array_like
+            (batch_size,) vector of the indices of the sampled transitions, to
+            be passed to `update_priorities`. Only returned if `with_weights`
+            is set to True.
+        """
+        total = self._it_sum.reduce()
+        prefixsums = (np.arange(self._batch_size)
+                      + self.rng.uniform(size=self._batch_size)) \
+            * total / self._batch_size
+        idxes = np.minimum(
+            self._it_sum.find_prefixsum_idx(prefixsums), self._size - 1)
+
+        batch = self._encode_sample(idxes)
+
+        if not with_weights:
+            return batch
+
+        # Compute the importance sampling weights, normalized by the weight of
+        # the transition with the lowest priority.
+        p_min = self._it_min.reduce() / total
+        p_sample = self._it_sum[idxes] / total
+        weights = (p_sample / p_min) ** -self.beta
+
+        return batch + (weights.astype(np.float32), idxes)
+
+    def update_priorities(self, idxes, td_errors):
+        """Update the priorities of a batch of sampled transitions.
+
+        Parameters
+        ----------
+        idxes : array_like
+            the indices of the transitions, as returned by `sample`
+        td_errors : array_like
+            the TD errors of the transitions. The absolute value of these
+            terms (plus a small constant) are used as the new priorities.
+        """
+        priorities = np.abs(np.ravel(td_errors)) + self.eps
+
+        self._it_sum[idxes] = priorities ** self.alpha
+        self._it_min[idxes] = priorities ** self.alpha
+
+        self._max_priority = max(self._max_priority, np.max(priorities))
+
+
 class SharedReplayBuffer(object):
     """Experience replay buffer for shared multi-agent settings.
 
     This replay buffer supports centralized training by including a full-states
     term for training centralized critics. In addition, information from all
-    agents are stored under the same replay buffer.
+    agents are stored under the same replay buffer. The next observations of
+    all agents and next full-state observations are stored in a
+    sequential-frame layout, see NextObservations.
+
+    Attributes
+    ----------
+    next_obs : NextObservations
+        the next observations of every agent and next full-state observations
+        that are not stored in `obs_t` and `all_obs_t`
+    rng : numpy.random.RandomState or module
+        the random number generator used to sample batches. Defaults to the
+        global generator of numpy.
     """
 
     def __init__(self,
@@ -216,7 +529,8 @@ class SharedReplayBuffer(object):
                  obs_dim,
                  ac_dim,
                  n_agents,
-                 all_obs_dim):
+                 all_obs_dim,
+                 storage_dtype=None):
         """Instantiate a buffer.
 
         Parameters
@@ -235,29 +549,34 @@ class SharedReplayBuffer(object):
             using shared policies with MADDPG or goal-conditioned hierarchies.
         all_obs_dim : int
             number of elements in the full state observations
+        storage_dtype : dict or None
+            the reduced-precision data type of the observations of every agent
+            and full state observations, under the keys "obs_t" and
+            "all_obs_t". See the ReplayBuffer object in
+            hbaselines/fcnet/replay_buffer.py. If set to None, all elements
+            are stored as float32.
         """
         self._maxsize = buffer_size
         self._size = 0
         self._next_idx = 0
         self._batch_size = batch_size
+        self.storage_dtype = storage_dtype or {}
 
         self.obs_t = [
-            np.zeros((buffer_size, obs_dim), dtype=np.float32)
+            create_buffer_array(
+                (buffer_size, obs_dim), self.storage_dtype.get("obs_t"))
             for _ in range(n_agents)]
         self.action = [
             np.zeros((buffer_size, ac_dim), dtype=np.float32)
             for _ in range(n_agents)]
         self.reward = np.zeros(
             buffer_size, dtype=np.float32)
-        self.obs_tp1 = [
-            np.zeros((buffer_size, obs_dim), dtype=np.float32)
-            for _ in range(n_agents)]
         self.done = np.zeros(
             buffer_size, dtype=np.float32)
-        self.all_obs_t = np.zeros(
-            (buffer_size, all_obs_dim), dtype=np.float32)
-        self.all_obs_tp1 = np.zeros(
-            (buffer_size, all_obs_dim), dtype=np.float32)
+        self.all_obs_t = create_buffer_array(
+            (buffer_size, all_obs_dim), self.storage_dtype.get("all_obs_t"))
+        self.next_obs = NextObservations(buffer_size)
+        self.rng = np.random
 
     def __len__(self):
         """Return the number of elements stored."""
@@ -295,7 +614,8 @@ class SharedReplayBuffer(object):
             obs_tp1,
             done,
             all_obs_t,
-            all_obs_tp1):
+            all_obs_tp1,
+            env_num=0):
         """Add a new transition to the buffer.
 
         Parameters
@@ -314,15 +634,20 @@ class SharedReplayBuffer(object):
             the last full state observation
         all_obs_tp1 : array_like
             the current full state observation
+        env_num : int
+            the environment number of the transition
         """
         for i in range(len(obs_t)):
             self.obs_t[i][self._next_idx, :] = obs_t[i]
             self.action[i][self._next_idx, :] = action[i]
-            self.reward[self._next_idx] = reward
-            self.obs_tp1[i][self._next_idx, :] = obs_tp1[i]
-            self.done[self._next_idx] = done
+        self.reward[self._next_idx] = reward
+        self.done[self._next_idx] = done
         self.all_obs_t[self._next_idx, :] = all_obs_t
-        self.all_obs_tp1[self._next_idx, :] = all_obs_tp1
+        self.next_obs.add(
+            self._next_idx,
+            list(obs_t) + [all_obs_t],
+            list(obs_tp1) + [all_obs_tp1],
+            env_num)
 
         # Increment the next index and size terms
         self._next_idx = (self._next_idx + 1) % self._maxsize
@@ -330,13 +655,15 @@ class SharedReplayBuffer(object):
 
     def _encode_sample(self, idxes):
         """Convert the indices to appropriate samples."""
+        next_obs = self.next_obs.get(idxes, self.obs_t + [self.all_obs_t])
+
         return [obs_t[idxes, :] for obs_t in self.obs_t], \
             [action[idxes, :] for action in self.action], \
             self.reward[idxes], \
-            [obs_tp1[idxes, :] for obs_tp1 in self.obs_tp1], \
+            next_obs[:-1], \
             self.done[idxes], \
             self.all_obs_t[idxes, :], \
-            self.all_obs_tp1[idxes, :]
+            next_obs[-1]
 
     def sample(self, **_kwargs):
         """Sample a batch of experiences.
@@ -363,5 +690,5 @@ class SharedReplayBuffer(object):
             (batch_size, all_obs_dim) batch of next step full-state
             observations
         """
-        indices = np.random.randint(0, self._size, size=self._batch_size)
+        indices = self.rng.randint(0, self._size, size=self._batch_size)
         return self._encode_sample(indices)
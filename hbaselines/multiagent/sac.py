@@ -1,11 +1,14 @@
 """SAC-compatible multi-agent feedforward policy."""
+import os
 import tensorflow as tf
 import numpy as np
 
 from hbaselines.multiagent.base import MultiAgentPolicy as BasePolicy
 from hbaselines.fcnet.sac import FeedForwardPolicy
 from hbaselines.multiagent.replay_buffer import MultiReplayBuffer
+from hbaselines.multiagent.replay_buffer import PrioritizedMultiReplayBuffer
 from hbaselines.multiagent.replay_buffer import SharedReplayBuffer
+from hbaselines.multiagent.replay_buffer import sample_joint
 from hbaselines.utils.tf_util import create_fcnet
 from hbaselines.utils.tf_util import create_conv
 from hbaselines.utils.tf_util import get_trainable_vars
@@ -37,7 +40,9 @@ class MultiFeedForwardPolicy(BasePolicy):
     target_entropy : float
         target entropy used when learning the entropy coefficient
     replay_buffer : MultiReplayBuffer or SharedReplayBuffer
-        the replay buffer for each agent
+        the replay buffer for each agent. A PrioritizedMultiReplayBuffer is
+        used instead of MultiReplayBuffer if `prioritized_replay` is set to
+        True.
     terminals1 : tf.compat.v1.placeholder
         placeholder for the next step terminals for each agent
     rew_ph : tf.compat.v1.placeholder
@@ -59,6 +64,9 @@ class MultiFeedForwardPolicy(BasePolicy):
         normalization layer. Set to True in training and False in testing.
     rate_ph : tf.compat.v1.placeholder
         the probability that each element is dropped if dropout is implemented
+    weight_ph : tf.compat.v1.placeholder
+        placeholder for the importance sampling weights of the samples for
+        each agent. Defaults to ones if not fed.
     deterministic_action : tf.Variable
         the output from the deterministic actor
     policy_out : tf.Variable
@@ -84,6 +92,8 @@ class MultiFeedForwardPolicy(BasePolicy):
         observations
     critic_loss : tf.Operation
         the operation that returns the loss of the critic
+    td_error : tf.Variable
+        the TD errors of the first Q-function
     critic_optimizer : tf.Operation
         the operation that updates the trainable parameters of the critic
     target_init_updates : tf.Operation
@@ -99,6 +109,10 @@ class MultiFeedForwardPolicy(BasePolicy):
         the operation that returns the loss of the actor
     actor_optimizer : tf.Operation
         the operation that updates the trainable parameters of the actor
+    joint_optimizer : tf.Operation
+        the operation that updates the critics, actors, entropy terms, and
+        target networks of all agents. Only used if `joint_update` is set to
+        True.
     """
 
     def __init__(self,
@@ -114,12 +128,16 @@ class MultiFeedForwardPolicy(BasePolicy):
                  tau,
                  gamma,
                  use_huber,
+                 prioritized_replay,
+                 replay_buffer_path,
+                 reduced_precision_replay,
                  l2_penalty,
                  model_params,
                  target_entropy,
                  shared,
                  maddpg,
                  n_agents,
+                 joint_update,
                  all_ob_space=None,
                  num_envs=1,
                  scope=None):
@@ -154,6 +172,21 @@ class MultiFeedForwardPolicy(BasePolicy):
             specifies whether to use the huber distance function as the loss
             for the critic. If set to False, the mean-squared error metric is
             used instead
+        prioritized_replay : bool
+            whether to use prioritized experience replay, with the absolute TD
+            errors of the sampled transitions used as their new priorities.
+            See: https://arxiv.org/abs/1511.05952
+        replay_buffer_path : str or None
+            the directory in which the replay buffer is stored as
+            memory-mapped files, allowing buffers that do not fit in memory.
+            If the files already exist, they are reopened in place, which
+            allows runs to be resumed. If set to None, the replay buffer is
+            stored in memory.
+        reduced_precision_replay : bool
+            whether to store the observations in the replay buffer with reduced
+            precision, with the image channels quantized to uint8 and the
+            remaining elements stored as float16. The observations are
+            converted back to float32 when sampled.
         l2_penalty : float
             L2 regularization penalty. This is applied to the policy network.
         model_params : dict
@@ -172,6 +205,10 @@ class MultiFeedForwardPolicy(BasePolicy):
         n_agents : int
             the expected number of agents in the environment. Only relevant if
             using shared policies with MADDPG or goal-conditioned hierarchies.
+        joint_update : bool
+            whether to update all agents of an independent MADDPG policy within
+            a single session call, using batches sampled at common indices from
+            the replay buffers of every agent
         scope : str
             an upper-level scope term. Used by policies that call this one.
         """
@@ -207,6 +244,14 @@ class MultiFeedForwardPolicy(BasePolicy):
         self.tau = tau
         self.gamma = gamma
         self.use_huber = use_huber
+        self.prioritized_replay = prioritized_replay
+        self.replay_buffer_path = replay_buffer_path
+        self.reduced_precision_replay = reduced_precision_replay
+
+        if joint_update and prioritized_replay:
+            print("WARNING: joint_update is not supported with prioritized "
+                  "replay. Ignoring.")
+            joint_update = False
 
         # variables to be initialized later (if MADDPG is used)
         self.replay_buffer = None
@@ -220,6 +265,7 @@ class MultiFeedForwardPolicy(BasePolicy):
         self.all_action_ph = None
         self.phase_ph = None
         self.rate_ph = None
+        self.weight_ph = None
         self.deterministic_action = None
         self.policy_out = None
         self.logp_pi = None
@@ -231,6 +277,7 @@ class MultiFeedForwardPolicy(BasePolicy):
         self.alpha = None
         self.value_target = None
         self.critic_loss = None
+        self.td_error = None
         self.critic_optimizer = None
         self.target_init_updates = None
         self.target_soft_updates = None
@@ -238,6 +285,7 @@ class MultiFeedForwardPolicy(BasePolicy):
         self.alpha_optimizer = None
         self.actor_loss = None
         self.actor_optimizer = None
+        self.joint_optimizer = None
 
         super(MultiFeedForwardPolicy, self).__init__(
             sess=sess,
@@ -251,6 +299,7 @@ class MultiFeedForwardPolicy(BasePolicy):
             maddpg=maddpg,
             all_ob_space=all_ob_space,
             n_agents=n_agents,
+            joint_update=joint_update,
             num_envs=num_envs,
             base_policy=FeedForwardPolicy,
             scope=scope,
@@ -262,6 +311,9 @@ class MultiFeedForwardPolicy(BasePolicy):
                 tau=tau,
                 gamma=gamma,
                 use_huber=use_huber,
+                prioritized_replay=prioritized_replay,
+                replay_buffer_path=replay_buffer_path,
+                reduced_precision_replay=reduced_precision_replay,
                 target_entropy=target_entropy,
             ),
         )
@@ -283,6 +335,15 @@ class MultiFeedForwardPolicy(BasePolicy):
 
     def _setup_maddpg_shared(self, scope):
         """Perform shared form of MADDPG setup."""
+        if self.prioritized_replay:
+            print("WARNING: prioritized_replay is not supported by shared "
+                  "MADDPG policies. Ignoring.")
+            self.prioritized_replay = False
+        if self.replay_buffer_path is not None:
+            print("WARNING: replay_buffer_path is not supported by shared "
+                  "MADDPG policies. Ignoring.")
+            self.replay_buffer_path = None
+
         # Create an input placeholder for the full state observations.
         self.all_obs_ph = tf.compat.v1.placeholder(
             tf.float32,
@@ -310,7 +371,11 @@ class MultiFeedForwardPolicy(BasePolicy):
             obs_dim=ob_dim[0],
             ac_dim=self.ac_space.shape[0],
             n_agents=self.n_agents,
-            all_obs_dim=self.all_ob_space.shape[0]
+            all_obs_dim=self.all_ob_space.shape[0],
+            storage_dtype=dict(
+                obs_t=self._get_storage_dtype(self.model_params),
+                all_obs_t="float16",
+            ) if self.reduced_precision_replay else None,
         )
 
         # Initialize some attributes.
@@ -386,6 +451,7 @@ class MultiFeedForwardPolicy(BasePolicy):
 
         # Create the policy update and logging operations of the agent.
         (self.critic_loss,
+         self.td_error,
          self.critic_optimizer,
          self.target_init_updates,
          self.target_soft_updates,
@@ -417,6 +483,7 @@ class MultiFeedForwardPolicy(BasePolicy):
         self.replay_buffer = {}
         self.terminals1 = {}
         self.rew_ph = {}
+        self.weight_ph = {}
         self.action_ph = {}
         self.obs_ph = {}
         self.obs1_ph = {}
@@ -445,13 +512,24 @@ class MultiFeedForwardPolicy(BasePolicy):
                 self.ob_space[key], self.co_space[key])
 
             # Create a replay buffer object.
-            self.replay_buffer[key] = MultiReplayBuffer(
+            if self.prioritized_replay:
+                replay_buffer_cls = PrioritizedMultiReplayBuffer
+            else:
+                replay_buffer_cls = MultiReplayBuffer
+
+            self.replay_buffer[key] = replay_buffer_cls(
                 buffer_size=self.buffer_size,
                 batch_size=self.batch_size,
                 obs_dim=ob_dim[0],
                 ac_dim=self.ac_space[key].shape[0],
                 all_obs_dim=self.all_ob_space.shape[0],
                 all_ac_dim=all_ac_dim,
+                storage_path=None if self.replay_buffer_path is None
+                else os.path.join(self.replay_buffer_path, key),
+                storage_dtype=dict(
+                    obs_t=self._get_storage_dtype(self.model_params),
+                    all_obs_t="float16",
+                ) if self.reduced_precision_replay else None,
             )
 
             with tf.compat.v1.variable_scope(key, reuse=False):
@@ -480,6 +558,11 @@ class MultiFeedForwardPolicy(BasePolicy):
                     tf.float32,
                     shape=(None, 1),
                     name='rewards')
+                self.weight_ph[key] = \
+                    tf.compat.v1.placeholder_with_default(
+                        tf.ones_like(self.rew_ph[key]),
+                        shape=(None, 1),
+                        name='weights')
                 self.action_ph[key] = tf.compat.v1.placeholder(
                     tf.float32,
                     shape=(None,) + self.ac_space[key].shape,
@@ -527,6 +610,7 @@ class MultiFeedForwardPolicy(BasePolicy):
         # Now that we have all actors, we can start constructing centralized
         # critic targets and all update procedures.
         self.critic_loss = {}
+        self.td_error = {}
         self.critic_optimizer = {}
         self.target_init_updates = {}
         self.target_soft_updates = {}
@@ -543,6 +627,7 @@ class MultiFeedForwardPolicy(BasePolicy):
             # Create the policy update and logging operations of the agent.
             with tf.compat.v1.variable_scope(key, reuse=False):
                 (self.critic_loss[key],
+                 self.td_error[key],
                  self.critic_optimizer[key],
                  self.target_init_updates[key],
                  self.target_soft_updates[key],
@@ -563,9 +648,20 @@ class MultiFeedForwardPolicy(BasePolicy):
                     value_fn=self.value_fn[key],
                     log_alpha=self.log_alpha[key],
                     target_entropy=self.target_entropy[key],
-                    policy_out=self.policy_out[key]
+                    policy_out=self.policy_out[key],
+                    weight_ph=self.weight_ph[key]
                 )
 
+        # Group the update operations of all agents, to be run within a single
+        # session call.
+        if self.joint_update:
+            self.joint_optimizer = tf.group(*[
+                op for key in self.critic_optimizer.keys()
+                for op in (self.critic_optimizer[key],
+                           self.actor_optimizer[key],
+                           self.alpha_optimizer[key],
+                           self.target_soft_updates[key])])
+
     def _setup_agent(self,
                      obs_ph,
                      action_ph,
@@ -660,7 +756,8 @@ class MultiFeedForwardPolicy(BasePolicy):
                          value_fn,
                          log_alpha,
                          target_entropy,
-                         policy_out):
+                         policy_out,
+                         weight_ph=None):
         """Create the optimizer and logging operations for a single agent.
 
         Parameters
@@ -696,11 +793,16 @@ class MultiFeedForwardPolicy(BasePolicy):
             given agent
         policy_out : tf.Variable
             the output from the stochastic actor of a given agent
+        weight_ph : tf.compat.v1.placeholder or None
+            placeholder for the importance sampling weights of the samples.
+            If set to None, all samples are weighted equally.
 
         Returns
         -------
         critic_loss : tf.Variable
             the loss of the critic
+        td_error : tf.Variable
+            the TD errors of the first Q-function
         critic_optimizer : tf.Operation
             the operation that updates the trainable parameters of the critic
         target_init_updates : tf.Operation
@@ -727,7 +829,7 @@ class MultiFeedForwardPolicy(BasePolicy):
             )
 
         # Setup the target critic and critic update procedure.
-        critic_loss, critic_optimizer = self._setup_critic_update(
+        critic_loss, td_error, critic_optimizer = self._setup_critic_update(
             qf1_pi=qf1_pi,
             qf2_pi=qf2_pi,
             rew_ph=rew_ph,
@@ -738,7 +840,8 @@ class MultiFeedForwardPolicy(BasePolicy):
             alpha=alpha,
             logp_pi=logp_pi,
             value_fn=value_fn,
-            scope=scope
+            scope=scope,
+            weight_ph=weight_ph
         )
 
         # Create the target update operations.
@@ -777,8 +880,8 @@ class MultiFeedForwardPolicy(BasePolicy):
             logp_pi=logp_pi
         )
 
-        return critic_loss, critic_optimizer, init, soft, alpha_l, alpha_o, \
-            actor_l, actor_o
+        return critic_loss, td_error, critic_optimizer, init, soft, alpha_l, \
+            alpha_o, actor_l, actor_o
 
     def make_actor(self, obs, ac_space, action, reuse=False, scope="pi"):
         """Create the actor variables.
@@ -978,7 +1081,8 @@ class MultiFeedForwardPolicy(BasePolicy):
                              alpha,
                              logp_pi,
                              value_fn,
-                             scope):
+                             scope,
+                             weight_ph=None):
         """Create the critic loss and optimization process.
 
         Parameters
@@ -1008,11 +1112,16 @@ class MultiFeedForwardPolicy(BasePolicy):
             the output from the value function
         scope : str
             an outer scope term
+        weight_ph : tf.compat.v1.placeholder or None
+            placeholder for the importance sampling weights of the samples.
+            If set to None, all samples are weighted equally.
 
         Returns
         -------
         tf.Operation
             the operation that returns the loss of the critic
+        tf.Variable
+            the TD errors of the first Q-function
         tf.Operation
             the operation that updates the trainable parameters of the critic
         """
@@ -1039,15 +1148,21 @@ class MultiFeedForwardPolicy(BasePolicy):
         else:
             loss_fn = tf.compat.v1.losses.mean_squared_error
 
+        weights = 1.0 if weight_ph is None else weight_ph
+
         # Compute Q-Function loss
-        qf1_loss = loss_fn(q_backup, qf1)
-        qf2_loss = loss_fn(q_backup, qf2)
+        qf1_loss = loss_fn(q_backup, qf1, weights=weights)
+        qf2_loss = loss_fn(q_backup, qf2, weights=weights)
+
+        # the TD errors of the first Q-function, used as the priorities of the
+        # samples when using prioritized experience replay
+        td_error = q_backup - qf1
 
         # Target for value fn regression
         # We update the vf towards the min of two Q-functions in order to
         # reduce overestimation bias from function approximation error.
         v_backup = tf.stop_gradient(min_qf_pi - alpha * logp_pi)
-        value_loss = loss_fn(value_fn, v_backup)
+        value_loss = loss_fn(value_fn, v_backup, weights=weights)
 
         critic_loss = (qf1_loss, qf2_loss, value_loss)
 
@@ -1057,7 +1172,7 @@ class MultiFeedForwardPolicy(BasePolicy):
             qf1_loss + qf2_loss + value_loss,
             var_list=get_trainable_vars(scope_name))
 
-        return critic_loss, critic_optimizer
+        return critic_loss, td_error, critic_optimizer
 
     def _setup_actor_update(self,
                             qf1_pi,
@@ -1287,6 +1402,46 @@ class MultiFeedForwardPolicy(BasePolicy):
             # Perform the update operations.
             self.sess.run(step_ops, feed_dict)
 
+        # =================================================================== #
+        #                 Joint independent update procedure                  #
+        # =================================================================== #
+
+        elif self.joint_update:
+            keys = sorted(self.replay_buffer.keys())
+
+            # Not enough samples in the replay buffers.
+            if not all(self.replay_buffer[key].can_sample() for key in keys):
+                return
+
+            # Get a batch from every agent, at common indices.
+            batches = sample_joint([self.replay_buffer[key] for key in keys])
+
+            # Prepare the feed_dict information.
+            feed_dict = {
+                self.phase_ph: 1,
+                self.rate_ph: 0.5,
+            }
+            for key, batch in zip(keys, batches):
+                obs0, actions, rewards, obs1, done1, all_obs0, all_actions, \
+                    all_obs1 = batch
+
+                # Normalize the actions (bounded between [-1, 1]).
+                actions = (actions - self._ac_mean[key]) / self._ac_mag[key]
+
+                feed_dict.update({
+                    self.rew_ph[key]: rewards.reshape(-1, 1),
+                    self.terminals1[key]: done1.reshape(-1, 1),
+                    self.obs_ph[key]: obs0,
+                    self.action_ph[key]: actions,
+                    self.obs1_ph[key]: obs1,
+                    self.all_obs_ph[key]: all_obs0,
+                    self.all_action_ph[key]: all_actions,
+                    self.all_obs1_ph[key]: all_obs1,
+                })
+
+            # Perform the update operations of all agents.
+            self.sess.run(self.joint_optimizer, feed_dict)
+
         # =================================================================== #
         #                    Independent update procedure                     #
         # =================================================================== #
@@ -1299,8 +1454,14 @@ class MultiFeedForwardPolicy(BasePolicy):
                     continue
 
                 # Get a batch.
-                obs0, actions, rewards, obs1, done1, all_obs0, all_actions, \
-                    all_obs1 = self.replay_buffer[key].sample()
+                if self.prioritized_replay:
+                    obs0, actions, rewards, obs1, done1, all_obs0, \
+                        all_actions, all_obs1, weights, idxes = \
+                        self.replay_buffer[key].sample(with_weights=True)
+                else:
+                    obs0, actions, rewards, obs1, done1, all_obs0, \
+                        all_actions, all_obs1 = \
+                        self.replay_buffer[key].sample()
 
                 # Reshape to match previous behavior and placeholder shape.
                 rewards = rewards.reshape(-1, 1)
@@ -1311,6 +1472,7 @@ class MultiFeedForwardPolicy(BasePolicy):
 
                 # Collect all update and loss call operations.
                 step_ops = [
+                    self.td_error[key],
                     self.critic_optimizer[key],
                     self.actor_optimizer[key],
                     self.alpha_optimizer[key],
@@ -1330,9 +1492,15 @@ class MultiFeedForwardPolicy(BasePolicy):
                     self.phase_ph: 1,
                     self.rate_ph: 0.5,
                 }
+                if self.prioritized_replay:
+                    feed_dict[self.weight_ph[key]] = weights.reshape(-1, 1)
 
                 # Perform the update operations.
-                self.sess.run(step_ops, feed_dict)
+                td_error = self.sess.run(step_ops, feed_dict)[0]
+
+                # Update the priorities of the sampled transitions.
+                if self.prioritized_replay:
+                    self.replay_buffer[key].update_priorities(idxes, td_error)
 
     def _get_action_maddpg(self,
                            obs,
@@ -1419,7 +1587,8 @@ class MultiFeedForwardPolicy(BasePolicy):
                 obs_tp1=list_obs1,
                 done=float(done["__all__"]),
                 all_obs_t=all_obs0,
-                all_obs_tp1=all_obs1
+                all_obs_tp1=all_obs1,
+                env_num=env_num,
             )
         else:
             # Collect the actions in order as listed by their agent IDs.
@@ -1444,7 +1613,8 @@ class MultiFeedForwardPolicy(BasePolicy):
                     done=float(done[key]),
                     all_obs_t=all_obs0,
                     all_action_t=combines_actions,
-                    all_obs_tp1=all_obs1
+                    all_obs_tp1=all_obs1,
+                    env_num=env_num,
                 )
 
     def _get_td_map_maddpg(self):
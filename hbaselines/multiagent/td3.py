@@ -1,4 +1,5 @@
 """TD3-compatible multi-agent feedforward policy."""
+import os
 import tensorflow as tf
 import numpy as np
 from functools import reduce
@@ -6,7 +7,9 @@ from functools import reduce
 from hbaselines.fcnet.td3 import FeedForwardPolicy
 from hbaselines.multiagent.base import MultiAgentPolicy as BasePolicy
 from hbaselines.multiagent.replay_buffer import MultiReplayBuffer
+from hbaselines.multiagent.replay_buffer import PrioritizedMultiReplayBuffer
 from hbaselines.multiagent.replay_buffer import SharedReplayBuffer
+from hbaselines.multiagent.replay_buffer import sample_joint
 from hbaselines.utils.tf_util import create_fcnet
 from hbaselines.utils.tf_util import create_conv
 from hbaselines.utils.tf_util import get_trainable_vars
@@ -36,7 +39,9 @@ class MultiFeedForwardPolicy(BasePolicy):
     target_noise_clip : float
         clipping term for the noise injected in the target actor policy
     replay_buffer : MultiReplayBuffer or SharedReplayBuffer
-        the replay buffer for each agent
+        the replay buffer for each agent. A PrioritizedMultiReplayBuffer is
+        used instead of MultiReplayBuffer if `prioritized_replay` is set to
+        True.
     terminals1 : tf.compat.v1.placeholder
         placeholder for the next step terminals for each agent
     rew_ph : tf.compat.v1.placeholder
@@ -58,6 +63,9 @@ class MultiFeedForwardPolicy(BasePolicy):
         normalization layer. Set to True in training and False in testing.
     rate_ph : tf.compat.v1.placeholder
         the probability that each element is dropped if dropout is implemented
+    weight_ph : tf.compat.v1.placeholder
+        placeholder for the importance sampling weights of the samples for
+        each agent. Defaults to ones if not fed.
     actor_tf : tf.Variable
         the output from the actor network
     critic_tf : list of tf.Variable
@@ -67,6 +75,8 @@ class MultiFeedForwardPolicy(BasePolicy):
         the output from a noisy version of the target actor network
     critic_loss : tf.Operation
         the operation that returns the loss of the critic
+    td_error : tf.Variable
+        the TD errors of the first critic
     critic_optimizer : tf.Operation
         the operation that updates the trainable parameters of the critic
     target_init_updates : tf.Operation
@@ -78,6 +88,12 @@ class MultiFeedForwardPolicy(BasePolicy):
         the operation that returns the loss of the actor
     actor_optimizer : tf.Operation
         the operation that updates the trainable parameters of the actor
+    joint_critic_optimizer : tf.Operation
+        the operation that updates the critics of all agents. Only used if
+        `joint_update` is set to True.
+    joint_actor_optimizer : tf.Operation
+        the operation that updates the actors and target networks of all
+        agents. Only used if `joint_update` is set to True.
     """
 
     def __init__(self,
@@ -93,14 +109,19 @@ class MultiFeedForwardPolicy(BasePolicy):
                  tau,
                  gamma,
                  use_huber,
+                 prioritized_replay,
+                 replay_buffer_path,
+                 reduced_precision_replay,
                  l2_penalty,
                  model_params,
                  noise,
                  target_policy_noise,
                  target_noise_clip,
+                 fused_update,
                  shared,
                  maddpg,
                  n_agents,
+                 joint_update,
                  all_ob_space=None,
                  num_envs=1,
                  scope=None):
@@ -135,6 +156,21 @@ class MultiFeedForwardPolicy(BasePolicy):
             specifies whether to use the huber distance function as the loss
             for the critic. If set to False, the mean-squared error metric is
             used instead
+        prioritized_replay : bool
+            whether to use prioritized experience replay, with the absolute TD
+            errors of the sampled transitions used as their new priorities.
+            See: https://arxiv.org/abs/1511.05952
+        replay_buffer_path : str or None
+            the directory in which the replay buffer is stored as
+            memory-mapped files, allowing buffers that do not fit in memory.
+            If the files already exist, they are reopened in place, which
+            allows runs to be resumed. If set to None, the replay buffer is
+            stored in memory.
+        reduced_precision_replay : bool
+            whether to store the observations in the replay buffer with reduced
+            precision, with the image channels quantized to uint8 and the
+            remaining elements stored as float16. The observations are
+            converted back to float32 when sampled.
         l2_penalty : float
             L2 regularization penalty. This is applied to the policy network.
         model_params : dict
@@ -148,6 +184,9 @@ class MultiFeedForwardPolicy(BasePolicy):
             actor policy. See TD3 paper for more.
         target_noise_clip : float
             clipping term for the noise injected in the target actor policy
+        fused_update : bool
+            whether to perform multiple training steps within a single session
+            call. Not supported by multi-agent policies.
         shared : bool
             whether to use a shared policy for all agents
         maddpg : bool
@@ -159,6 +198,10 @@ class MultiFeedForwardPolicy(BasePolicy):
         n_agents : int
             the expected number of agents in the environment. Only relevant if
             using shared policies with MADDPG or goal-conditioned hierarchies.
+        joint_update : bool
+            whether to update all agents of an independent MADDPG policy within
+            a single session call, using batches sampled at common indices from
+            the replay buffers of every agent
         scope : str
             an upper-level scope term. Used by policies that call this one.
         """
@@ -191,6 +234,19 @@ class MultiFeedForwardPolicy(BasePolicy):
         self.tau = tau
         self.gamma = gamma
         self.use_huber = use_huber
+        self.prioritized_replay = prioritized_replay
+        self.replay_buffer_path = replay_buffer_path
+        self.reduced_precision_replay = reduced_precision_replay
+        self.fused_update = False
+
+        if fused_update:
+            print("WARNING: fused_update is not supported by multi-agent "
+                  "policies. Ignoring.")
+
+        if joint_update and prioritized_replay:
+            print("WARNING: joint_update is not supported with prioritized "
+                  "replay. Ignoring.")
+            joint_update = False
 
         # variables to be initialized later (if MADDPG is used)
         self.replay_buffer = None
@@ -204,15 +260,19 @@ class MultiFeedForwardPolicy(BasePolicy):
         self.all_action_ph = None
         self.phase_ph = None
         self.rate_ph = None
+        self.weight_ph = None
         self.actor_tf = None
         self.critic_tf = None
         self.actor_target = None
         self.critic_loss = None
+        self.td_error = None
         self.critic_optimizer = None
         self.target_init_updates = None
         self.target_soft_updates = None
         self.actor_loss = None
         self.actor_optimizer = None
+        self.joint_critic_optimizer = None
+        self.joint_actor_optimizer = None
 
         super(MultiFeedForwardPolicy, self).__init__(
             sess=sess,
@@ -226,6 +286,7 @@ class MultiFeedForwardPolicy(BasePolicy):
             maddpg=maddpg,
             all_ob_space=all_ob_space,
             n_agents=n_agents,
+            joint_update=joint_update,
             num_envs=num_envs,
             base_policy=FeedForwardPolicy,
             scope=scope,
@@ -237,9 +298,13 @@ class MultiFeedForwardPolicy(BasePolicy):
                 tau=tau,
                 gamma=gamma,
                 use_huber=use_huber,
+                prioritized_replay=prioritized_replay,
+                replay_buffer_path=replay_buffer_path,
+                reduced_precision_replay=reduced_precision_replay,
                 noise=noise,
                 target_policy_noise=target_policy_noise,
                 target_noise_clip=target_noise_clip,
+                fused_update=False,
             ),
         )
 
@@ -260,6 +325,15 @@ class MultiFeedForwardPolicy(BasePolicy):
 
     def _setup_maddpg_shared(self, scope):
         """Perform shared form of MADDPG setup."""
+        if self.prioritized_replay:
+            print("WARNING: prioritized_replay is not supported by shared "
+                  "MADDPG policies. Ignoring.")
+            self.prioritized_replay = False
+        if self.replay_buffer_path is not None:
+            print("WARNING: replay_buffer_path is not supported by shared "
+                  "MADDPG policies. Ignoring.")
+            self.replay_buffer_path = None
+
         # Create an input placeholder for the full state observations.
         self.all_obs_ph = tf.compat.v1.placeholder(
             tf.float32,
@@ -287,7 +361,11 @@ class MultiFeedForwardPolicy(BasePolicy):
             obs_dim=ob_dim[0],
             ac_dim=self.ac_space.shape[0],
             n_agents=self.n_agents,
-            all_obs_dim=self.all_ob_space.shape[0]
+            all_obs_dim=self.all_ob_space.shape[0],
+            storage_dtype=dict(
+                obs_t=self._get_storage_dtype(self.model_params),
+                all_obs_t="float16",
+            ) if self.reduced_precision_replay else None,
         )
 
         # Initialize some attributes.
@@ -354,6 +432,7 @@ class MultiFeedForwardPolicy(BasePolicy):
 
         # Create the policy update and logging operations of the agent.
         (self.critic_loss,
+         self.td_error,
          self.critic_optimizer,
          self.target_init_updates,
          self.target_soft_updates,
@@ -378,6 +457,7 @@ class MultiFeedForwardPolicy(BasePolicy):
         self.replay_buffer = {}
         self.terminals1 = {}
         self.rew_ph = {}
+        self.weight_ph = {}
         self.action_ph = {}
         self.obs_ph = {}
         self.obs1_ph = {}
@@ -401,13 +481,24 @@ class MultiFeedForwardPolicy(BasePolicy):
                 None if self.co_space is None else self.co_space[key])
 
             # Create a replay buffer object.
-            self.replay_buffer[key] = MultiReplayBuffer(
+            if self.prioritized_replay:
+                replay_buffer_cls = PrioritizedMultiReplayBuffer
+            else:
+                replay_buffer_cls = MultiReplayBuffer
+
+            self.replay_buffer[key] = replay_buffer_cls(
                 buffer_size=self.buffer_size,
                 batch_size=self.batch_size,
                 obs_dim=ob_dim[0],
                 ac_dim=self.ac_space[key].shape[0],
                 all_obs_dim=self.all_ob_space.shape[0],
                 all_ac_dim=all_ac_dim,
+                storage_path=None if self.replay_buffer_path is None
+                else os.path.join(self.replay_buffer_path, key),
+                storage_dtype=dict(
+                    obs_t=self._get_storage_dtype(self.model_params),
+                    all_obs_t="float16",
+                ) if self.reduced_precision_replay else None,
             )
 
             with tf.compat.v1.variable_scope(key, reuse=False):
@@ -436,6 +527,11 @@ class MultiFeedForwardPolicy(BasePolicy):
                     tf.float32,
                     shape=(None, 1),
                     name='rewards')
+                self.weight_ph[key] = \
+                    tf.compat.v1.placeholder_with_default(
+                        tf.ones_like(self.rew_ph[key]),
+                        shape=(None, 1),
+                        name='weights')
                 self.action_ph[key] = tf.compat.v1.placeholder(
                     tf.float32,
                     shape=(None,) + self.ac_space[key].shape,
@@ -478,6 +574,7 @@ class MultiFeedForwardPolicy(BasePolicy):
         # Now that we have all actor targets, we can start constructing
         # centralized critic targets and all update procedures.
         self.critic_loss = {}
+        self.td_error = {}
         self.critic_optimizer = {}
         self.target_init_updates = {}
         self.target_soft_updates = {}
@@ -492,6 +589,7 @@ class MultiFeedForwardPolicy(BasePolicy):
             # Create the policy update and logging operations of the agent.
             with tf.compat.v1.variable_scope(key, reuse=False):
                 (self.critic_loss[key],
+                 self.td_error[key],
                  self.critic_optimizer[key],
                  self.target_init_updates[key],
                  self.target_soft_updates[key],
@@ -505,9 +603,21 @@ class MultiFeedForwardPolicy(BasePolicy):
                     all_obs1_ph=self.all_obs1_ph[key],
                     rew_ph=self.rew_ph[key],
                     terminals1=self.terminals1[key],
-                    combined_actors=combined_actors
+                    combined_actors=combined_actors,
+                    weight_ph=self.weight_ph[key]
                 )
 
+        # Group the update operations of all agents, to be run within a single
+        # session call.
+        if self.joint_update:
+            self.joint_critic_optimizer = tf.group(*[
+                self.critic_optimizer[key][i]
+                for key in self.critic_optimizer.keys() for i in range(2)])
+            self.joint_actor_optimizer = tf.group(*[
+                op for key in self.actor_optimizer.keys()
+                for op in (self.actor_optimizer[key],
+                           self.target_soft_updates[key])])
+
     def _setup_agent(self,
                      obs_ph,
                      obs1_ph,
@@ -584,7 +694,8 @@ class MultiFeedForwardPolicy(BasePolicy):
                          all_obs1_ph,
                          rew_ph,
                          terminals1,
-                         combined_actors):
+                         combined_actors,
+                         weight_ph=None):
         """Create the optimizer and logging operations for a single agent.
 
         Parameters
@@ -608,11 +719,16 @@ class MultiFeedForwardPolicy(BasePolicy):
         combined_actors : tf.Variable
             the output from all actors, as a function of the agent's policy
             parameters
+        weight_ph : tf.compat.v1.placeholder or None
+            placeholder for the importance sampling weights of the samples.
+            If set to None, all samples are weighted equally.
 
         Returns
         -------
         tf.Variable
             the loss of the critic
+        tf.Variable
+            the TD errors of the first critic
         tf.Operation
             the operation that updates the trainable parameters of the critic
         tf.Operation
@@ -626,13 +742,14 @@ class MultiFeedForwardPolicy(BasePolicy):
             the operation that updates the trainable parameters of the actor
         """
         # Setup the target critic and critic update procedure.
-        critic_loss, critic_optimizer = self._setup_critic_update(
+        critic_loss, td_error, critic_optimizer = self._setup_critic_update(
             critic=critic_tf,
             all_obs1_ph=all_obs1_ph,
             actor_target=noisy_actor_target,
             rew_ph=rew_ph,
             done1=terminals1,
-            scope=scope
+            scope=scope,
+            weight_ph=weight_ph
         )
 
         # Create the target update operations.
@@ -656,8 +773,8 @@ class MultiFeedForwardPolicy(BasePolicy):
             actor_tf=actor_tf
         )
 
-        return critic_loss, critic_optimizer, init, soft, actor_loss, \
-            actor_optimizer
+        return critic_loss, td_error, critic_optimizer, init, soft, \
+            actor_loss, actor_optimizer
 
     def make_actor(self, obs, ac_space, reuse=False, scope="pi"):
         """Create an actor tensor.
@@ -791,7 +908,8 @@ class MultiFeedForwardPolicy(BasePolicy):
                              actor_target,
                              rew_ph,
                              done1,
-                             scope):
+                             scope,
+                             weight_ph=None):
         """Create the critic loss and optimization process.
 
         Parameters
@@ -808,11 +926,16 @@ class MultiFeedForwardPolicy(BasePolicy):
             placeholder for the done mask of the agent
         scope : str
             an outer scope term
+        weight_ph : tf.compat.v1.placeholder or None
+            placeholder for the importance sampling weights of the samples.
+            If set to None, all samples are weighted equally.
 
         Returns
         -------
         tf.Operation
             the operation that returns the loss of the critic
+        tf.Variable
+            the TD errors of the first critic
         tf.Operation
             the operation that updates the trainable parameters of the critic
         """
@@ -842,7 +965,9 @@ class MultiFeedForwardPolicy(BasePolicy):
         else:
             loss_fn = tf.compat.v1.losses.mean_squared_error
 
-        critic_loss = [loss_fn(q, target_q) for q in critic]
+        weights = 1.0 if weight_ph is None else weight_ph
+        critic_loss = [loss_fn(q, target_q, weights=weights) for q in critic]
+        td_error = target_q - critic[0]
 
         critic_optimizer = []
 
@@ -867,7 +992,7 @@ class MultiFeedForwardPolicy(BasePolicy):
                 loss=loss,
                 var_list=get_trainable_vars(scope_name)))
 
-        return critic_loss, critic_optimizer
+        return critic_loss, td_error, critic_optimizer
 
     def _setup_actor_update(self, all_obs_ph, combined_actors, scope):
         """Create the actor loss and optimization process.
@@ -1032,6 +1157,50 @@ class MultiFeedForwardPolicy(BasePolicy):
             # Perform the update operations.
             self.sess.run(step_ops, feed_dict=feed_dict)
 
+        # =================================================================== #
+        #                 Joint independent update procedure                  #
+        # =================================================================== #
+
+        elif self.joint_update:
+            keys = sorted(self.replay_buffer.keys())
+
+            # Not enough samples in the replay buffers.
+            if not all(self.replay_buffer[key].can_sample() for key in keys):
+                return
+
+            # Get a batch from every agent, at common indices.
+            batches = sample_joint([self.replay_buffer[key] for key in keys])
+
+            # Update operations for the critic networks.
+            step_ops = [self.joint_critic_optimizer]
+
+            if update_actor:
+                # Actor updates and target soft update operations.
+                step_ops += [self.joint_actor_optimizer]
+
+            # Prepare the feed_dict information.
+            feed_dict = {
+                self.phase_ph: 1,
+                self.rate_ph: 0.5,
+            }
+            for key, batch in zip(keys, batches):
+                obs0, actions, rewards, obs1, done1, all_obs0, all_actions, \
+                    all_obs1 = batch
+
+                feed_dict.update({
+                    self.obs_ph[key]: obs0,
+                    self.obs1_ph[key]: obs1,
+                    self.action_ph[key]: actions,
+                    self.all_obs_ph[key]: all_obs0,
+                    self.all_obs1_ph[key]: all_obs1,
+                    self.all_action_ph[key]: all_actions,
+                    self.rew_ph[key]: rewards.reshape(-1, 1),
+                    self.terminals1[key]: done1.reshape(-1, 1),
+                })
+
+            # Perform the update operations of all agents.
+            self.sess.run(step_ops, feed_dict=feed_dict)
+
         # =================================================================== #
         #                    Independent update procedure                     #
         # =================================================================== #
@@ -1044,15 +1213,22 @@ class MultiFeedForwardPolicy(BasePolicy):
                     continue
 
                 # Get a batch.
-                obs0, actions, rewards, obs1, done1, all_obs0, all_actions, \
-                    all_obs1 = self.replay_buffer[key].sample()
+                if self.prioritized_replay:
+                    obs0, actions, rewards, obs1, done1, all_obs0, \
+                        all_actions, all_obs1, weights, idxes = \
+                        self.replay_buffer[key].sample(with_weights=True)
+                else:
+                    obs0, actions, rewards, obs1, done1, all_obs0, \
+                        all_actions, all_obs1 = \
+                        self.replay_buffer[key].sample()
 
                 # Reshape to match previous behavior and placeholder shape.
                 rewards = rewards.reshape(-1, 1)
                 done1 = done1.reshape(-1, 1)
 
                 # Update operations for the critic networks.
-                step_ops = [self.critic_optimizer[key][0],
+                step_ops = [self.td_error[key],
+                            self.critic_optimizer[key][0],
                             self.critic_optimizer[key][1]]
 
                 if update_actor:
@@ -1071,9 +1247,15 @@ class MultiFeedForwardPolicy(BasePolicy):
                     self.rew_ph[key]: rewards,
                     self.terminals1[key]: done1
                 }
+                if self.prioritized_replay:
+                    feed_dict[self.weight_ph[key]] = weights.reshape(-1, 1)
 
                 # Perform the update operations.
-                self.sess.run(step_ops, feed_dict=feed_dict)
+                td_error = self.sess.run(step_ops, feed_dict=feed_dict)[0]
+
+                # Update the priorities of the sampled transitions.
+                if self.prioritized_replay:
+                    self.replay_buffer[key].update_priorities(idxes, td_error)
 
     def _get_action_maddpg(self,
                            obs,
@@ -1151,7 +1333,8 @@ class MultiFeedForwardPolicy(BasePolicy):
                 obs_tp1=list_obs1,
                 done=float(done["__all__"] and not is_final_step),
                 all_obs_t=all_obs0,
-                all_obs_tp1=all_obs1
+                all_obs_tp1=all_obs1,
+                env_num=env_num,
             )
         else:
             # Collect the actions in order as listed by their agent IDs.
@@ -1176,7 +1359,8 @@ class MultiFeedForwardPolicy(BasePolicy):
                     done=float(done[key] and not is_final_step),
                     all_obs_t=all_obs0,
                     all_action_t=combines_actions,
-                    all_obs_tp1=all_obs1
+                    all_obs_tp1=all_obs1,
+                    env_num=env_num,
                 )
 
     def _get_td_map_maddpg(self):
@@ -39,6 +39,8 @@ try:
         import RingSingleAgentEnv
     from hbaselines.envs.mixed_autonomy.envs.ring_nonflow \
         import RingMultiAgentEnv
+    from hbaselines.envs.mixed_autonomy.envs.ring_nonflow \
+        import RingVecEnv
 except (ImportError, ModuleNotFoundError) as e:  # pragma: no cover
     # ray seems to have a bug that requires you to install ray[tune] twice
     if "ray" in str(e):  # pragma: no cover
@@ -809,6 +811,20 @@ def _get_ring_env_attributes(scale):
                 "ring-v{}.json".format(scale - 1)),
             sims_per_step=1,
         ),
+        "vec_env": lambda num_envs: RingVecEnv(
+            num_envs=num_envs,
+            length=[250 * scale, 360 * scale],
+            num_vehicles=22 * scale,
+            dt=0.2,
+            horizon=3000,
+            rl_ids=[22 * i for i in range(scale)],
+            warmup_steps=0,
+            initial_state=os.path.join(
+                hbaselines_config.PROJECT_PATH,
+                "hbaselines/envs/mixed_autonomy/envs/initial_states/"
+                "ring-v{}.json".format(scale - 1)),
+            sims_per_step=1,
+        ),
     }
 
 
@@ -960,6 +976,40 @@ def create_env(env,
     return env, obs
 
 
+def create_vec_env(env, num_envs, evaluate=False):
+    """Return a vectorized variant of the environment, if one is available.
+
+    Vectorized variants simulate several instances of an environment within a
+    single object. These are currently available for the single agent,
+    training variants of the fast ring environments.
+
+    Parameters
+    ----------
+    env : str
+        the name of the environment
+    num_envs : int
+        the number of instances of the environment
+    evaluate : bool
+        specifies whether this is a training or evaluation environment
+
+    Returns
+    -------
+    hbaselines.envs.mixed_autonomy.envs.ring_nonflow.RingVecEnv or None
+        the vectorized environment. Set to None if no vectorized variant is
+        available.
+    array_like or None
+        the observations from the environments upon reset, with one row per
+        environment. Set to None if no vectorized variant is available.
+    """
+    if evaluate or env not in ["ring-v{}-fast".format(i) for i in range(5)]:
+        return None, None
+
+    scale = int(env[6]) + 1
+    env = _get_ring_env_attributes(scale)["vec_env"](num_envs)
+
+    return env, env.reset()
+
+
 def import_flow_env(env_name, render, shared, maddpg, evaluate):
     """Import an environment from the flow/examples folder.
 
@@ -4,6 +4,7 @@ import errno
 import functools
 import inspect
 import warnings
+import numpy as np
 
 
 def ensure_dir(path):
@@ -58,3 +59,37 @@ def recursive_update(d, u):
         else:
             d[k] = v
     return d
+
+
+def create_array(shape, dtype, path=None):
+    """Create a zero-initialized array, optionally backed by a file on disk.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        the shape of the array
+    dtype : type
+        the data type of the array
+    path : str or None
+        the .npy file of the memory-mapped array. If this file already exists
+        and stores an array of the same shape and type, it is reopened in
+        place and its content is preserved. Otherwise, a new file is created.
+        If set to None, the array is allocated in memory.
+
+    Returns
+    -------
+    np.ndarray or np.memmap
+        the array
+    """
+    shape = tuple(shape)
+
+    if path is None:
+        return np.zeros(shape, dtype=dtype)
+
+    if os.path.exists(path):
+        array = np.lib.format.open_memmap(path, mode="r+")
+        if array.shape == shape and array.dtype == dtype:
+            return array
+        del array
+
+    return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
@@ -0,0 +1,188 @@
+"""Script containing the background batch prefetching object."""
+import threading
+import queue
+import numpy as np
+
+
+class PrefetchReplayBuffer(object):
+    """Replay buffer wrapper that samples batches in a background thread.
+
+    After a batch is requested via `sample`, the following batches are
+    sampled by a background thread and stored in a bounded queue, such that
+    the sampling procedure overlaps with the policy update that consumes the
+    current batch (TensorFlow releases the GIL within `sess.run`).
+
+    The results do not depend on the timing of the background thread:
+
+    * The prefetched batches are discarded whenever the content of the replay
+      buffer is modified (via `add`, `add_batch`, `update_priorities`, or
+      `load`), or when a batch is requested with different arguments. Every
+      batch is therefore sampled from the current content of the buffer.
+    * The i-th batch returned by the wrapper is sampled with a random number
+      generator that is seeded by (seed, i).
+
+    All other attributes and methods are forwarded to the wrapped buffer.
+
+    Attributes
+    ----------
+    replay_buffer : Any
+        the wrapped replay buffer. Must sample batches with the random number
+        generator stored under its `rng` attribute.
+    queue_size : int
+        the maximum number of prefetched batches
+    seed : int or None
+        the seed of the random number generators used to sample batches. If
+        set to None, the seed is drawn from the global generator of numpy when
+        the first batch is sampled (i.e. after the global seed of a training
+        procedure is set).
+    """
+
+    def __init__(self, replay_buffer, queue_size, seed=None):
+        """Instantiate the wrapper.
+
+        Parameters
+        ----------
+        replay_buffer : Any
+            the replay buffer to wrap
+        queue_size : int
+            the maximum number of prefetched batches
+        seed : int or None
+            the seed of the random number generators used to sample batches.
+            If set to None, the seed is drawn from the global generator of
+            numpy when the first batch is sampled.
+        """
+        assert queue_size > 0, "queue_size must be a positive integer."
+
+        self.replay_buffer = replay_buffer
+        self.queue_size = queue_size
+        self.seed = seed
+
+        # the number of batches returned so far
+        self._num_batches = 0
+        # the arguments of the prefetched batches
+        self._sample_args = None
+        # the queue of prefetched batches, the background thread, and the
+        # event used to stop it
+        self._queue = None
+        self._thread = None
+        self._stop = None
+        # lock over the content of the replay buffer
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        """Forward unknown attributes to the wrapped buffer."""
+        if name == "replay_buffer":
+            raise AttributeError(name)
+        return getattr(self.replay_buffer, name)
+
+    def __len__(self):
+        """Return the number of elements stored."""
+        return len(self.replay_buffer)
+
+    def sample(self, *args, **kwargs):
+        """Return the next batch of experiences.
+
+        The arguments are passed to the `sample` method of the replay buffer.
+        """
+        if self._thread is not None and self._sample_args != (args, kwargs):
+            self._stop_prefetch()
+
+        if self.seed is None:
+            self.seed = np.random.randint(2 ** 31 - 1)
+
+        if self._thread is None:
+            # Sample the current batch, and start prefetching the next ones.
+            batch = self._sample_batch(self._num_batches, args, kwargs)
+            self._start_prefetch(self._num_batches + 1, args, kwargs)
+        else:
+            batch = self._queue.get()
+            if isinstance(batch, Exception):
+                self._stop_prefetch()
+                raise batch
+
+        self._num_batches += 1
+
+        return batch
+
+    def add(self, *args, **kwargs):
+        """See the `add` method of the replay buffer."""
+        return self._modify(self.replay_buffer.add, args, kwargs)
+
+    def add_batch(self, *args, **kwargs):
+        """See the `add_batch` method of the replay buffer."""
+        return self._modify(self.replay_buffer.add_batch, args, kwargs)
+
+    def update_priorities(self, *args, **kwargs):
+        """See the `update_priorities` method of the replay buffer."""
+        return self._modify(
+            self.replay_buffer.update_priorities, args, kwargs)
+
+    def load(self, *args, **kwargs):
+        """See the `load` method of the replay buffer."""
+        return self._modify(self.replay_buffer.load, args, kwargs)
+
+    def close(self):
+        """Stop the background thread."""
+        self._stop_prefetch()
+
+    def _modify(self, method, args, kwargs):
+        """Call a method that modifies the content of the replay buffer.
+
+        The prefetched batches, which were sampled from the previous content
+        of the buffer, are discarded.
+        """
+        self._stop_prefetch()
+        with self._lock:
+            return method(*args, **kwargs)
+
+    def _sample_batch(self, num, args, kwargs):
+        """Sample the batch with the given index."""
+        with self._lock:
+            self.replay_buffer.rng = np.random.RandomState([self.seed, num])
+            return self.replay_buffer.sample(*args, **kwargs)
+
+    def _start_prefetch(self, num, args, kwargs):
+        """Start prefetching batches, starting from the given index."""
+        self._sample_args = (args, kwargs)
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._prefetch,
+            args=(num, args, kwargs, self._queue, self._stop),
+            daemon=True)
+        self._thread.start()
+
+    def _stop_prefetch(self):
+        """Stop the background thread and discard the prefetched batches."""
+        if self._thread is None:
+            return
+
+        self._stop.set()
+
+        # Empty the queue, in case the thread is waiting for a free slot.
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+
+        self._thread.join()
+        self._thread = None
+        self._queue = None
+        self._stop = None
+        self._sample_args = None
+
+    def _prefetch(self, num, args, kwargs, batches, stop):
+        """Sample batches until the stop event is set.
+
+        Errors raised while sampling are passed to the consumer through the
+        queue.
+        """
+        while not stop.is_set():
+            try:
+                batch = self._sample_batch(num, args, kwargs)
+            except Exception as e:
+                batches.put(e)
+                return
+            batches.put(batch)
+            num += 1
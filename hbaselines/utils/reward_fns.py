@@ -27,11 +27,15 @@ def negative_distance(states,
     Parameters
     ----------
     states : array_like
-        A (num_state_dims,) array representing a batch of states.
+        A (num_state_dims,) array representing a single state, or a
+        (batch_size, num_state_dims) array representing a batch of states.
     next_states : array_like
-        A (num_state_dims,) array representing a batch of next states.
+        A (num_state_dims,) array representing a single next state, or a
+        (batch_size, num_state_dims) array representing a batch of next
+        states.
     goals : array_like
-        A (num_context_dims,) array representing a batch of contexts.
+        A (num_context_dims,) array representing a single context, or a
+        (batch_size, num_context_dims) array representing a batch of contexts.
     state_scales : float
         multiplicative scale for (next) states
     goal_scales : float
@@ -64,10 +68,10 @@ def negative_distance(states,
     """
     # Get the indexed versions of the states and goals.
     if state_indices is not None:
-        states = states[state_indices]
-        next_states = next_states[state_indices]
+        states = states[..., state_indices]
+        next_states = next_states[..., state_indices]
     if goal_indices is not None:
-        goals = goals[goal_indices]
+        goals = goals[..., goal_indices]
 
     # Check for relative context.
     if relative_context:
@@ -79,7 +83,7 @@ def negative_distance(states,
     dist = np.sum(sq_dists, -1)
     dist = np.sqrt(dist + epsilon)
 
-    bonus = float(dist < bonus_epsilon)
+    bonus = np.where(dist < bonus_epsilon, 1., 0.)
     dist *= reward_scales
 
     return output_activation(bonus + offset - dist)
@@ -1,9 +1,18 @@
 """Script containing the environment sampler method."""
 import ray
+import numpy as np
+import tensorflow as tf
+from copy import deepcopy
 from gym.spaces import Box
 
 from hbaselines.algorithms.utils import get_obs
+from hbaselines.algorithms.utils import is_goal_conditioned_policy
 from hbaselines.utils.env_util import create_env
+from hbaselines.utils.env_util import create_vec_env
+from hbaselines.utils.tf_util import make_session
+from hbaselines.utils.tf_util import get_actor_vars
+from hbaselines.utils.tf_util import SetFromFlat
+from hbaselines.utils.transport import SharedMemoryTransport
 
 
 class Sampler(object):
@@ -13,6 +22,10 @@ class Sampler(object):
     ----------
     env : gym.Env
         the training / evaluation environment
+    policy_tf : hbaselines.base_policies.Policy or None
+        a local copy of the policy, used to compute actions within the sampler
+        when `collect_samples` is called. Set to None until `setup_policy` is
+        called.
     """
 
     def __init__(self, env_name, render, shared, maddpg, evaluate, env_num):
@@ -47,10 +60,42 @@ class Sampler(object):
         self._env_num = env_num
         self._render = render
 
+        self.policy_tf = None
+        self._sess = None
+        self._set_from_flat = None
+        self._transport = None
+
     def get_init_obs(self):
         """Return the initial observation from the environment."""
         return self._init_obs.copy()
 
+    def attach_transport(self, path, num_envs, capacity, ob_shape, ac_shape):
+        """Write the samples of collect_sample into shared memory.
+
+        Once attached, `collect_sample` returns the output from the `put`
+        method of the transport. See SharedMemoryTransport.
+
+        Parameters
+        ----------
+        path : str
+            the directory of the memory-mapped files
+        num_envs : int
+            the number of environments
+        capacity : int
+            the number of slots for every environment
+        ob_shape : tuple of int
+            the shape of the observations
+        ac_shape : tuple of int
+            the shape of the actions
+        """
+        self._transport = SharedMemoryTransport(
+            num_envs=num_envs,
+            capacity=capacity,
+            ob_shape=ob_shape,
+            ac_shape=ac_shape,
+            path=path,
+        )
+
     def get_context(self):
         """Collect the contextual term. None if it is not passed."""
         return [self.env.current_context] if hasattr(
@@ -116,6 +161,9 @@ class Sampler(object):
               of a single observation if no reset occured, and a tuple of (last
               observation from the previous rollout, first observation of the
               next rollout) if a reset occured.
+
+            If a shared-memory transport is attached, the output from its
+            `put` method is returned instead.
         """
         # Execute the next action.
         obs, reward, done, info = self.env.step(action)
@@ -139,7 +187,7 @@ class Sampler(object):
             reset_obs = None
             reset_all_obs = None
 
-        return {
+        sample = {
             "obs": obs if not reset else (obs, reset_obs),
             "context": context,
             "action": action,
@@ -150,6 +198,156 @@ class Sampler(object):
             "info": info,
         }
 
+        # Write the sample into shared memory, if a transport is attached.
+        if self._transport is not None:
+            sample = self._transport.put(sample)
+
+        return sample
+
+    def setup_policy(self,
+                     policy,
+                     ob_space,
+                     ac_space,
+                     co_space,
+                     policy_kwargs):
+        """Create a local copy of the policy to compute actions with.
+
+        The policy is created within a separate graph and single-CPU session.
+        Its actor weights are set via `set_weights`.
+
+        Parameters
+        ----------
+        policy : type [ hbaselines.base_policies.Policy ]
+            the policy model to use
+        ob_space : gym.spaces.*
+            the observation space of the environment
+        ac_space : gym.spaces.*
+            the action space of the environment
+        co_space : gym.spaces.*
+            the context space of the environment
+        policy_kwargs : dict
+            policy-specific hyperparameters
+        """
+        policy_kwargs = policy_kwargs.copy()
+        policy_kwargs["num_envs"] = 1
+
+        # The local copy is only used to compute actions, and therefore does
+        # not need the replay buffer and training operations of the learner.
+        # Its replay buffer is kept as small as possible, and is never stored
+        # in the memory-mapped files of the learner.
+        worker_kwargs = dict(
+            buffer_size=policy_kwargs.get("batch_size"),
+            replay_buffer_path=None,
+            prioritized_replay=False,
+            fused_update=False,
+        )
+        for key, value in worker_kwargs.items():
+            if key in policy_kwargs:
+                policy_kwargs[key] = value
+
+        graph = tf.Graph()
+        with graph.as_default():
+            self._sess = make_session(num_cpu=1, graph=graph)
+
+            # Create the policy.
+            self.policy_tf = policy(
+                self._sess, ob_space, ac_space, co_space, **policy_kwargs)
+
+            # Create an operation to import the actor weights of the learner.
+            self._set_from_flat = SetFromFlat(
+                get_actor_vars(), sess=self._sess)
+
+            # Initialize the model parameters.
+            self._sess.run(tf.compat.v1.global_variables_initializer())
+
+    def set_weights(self, weights, steps=None):
+        """Set the actor weights of the local copy of the policy.
+
+        Parameters
+        ----------
+        weights : array_like
+            the flattened actor weights of the learner, as returned by a
+            GetFlat operation over `get_actor_vars`
+        steps : int or None
+            the number of steps performed by the policy of the learner. This
+            is used by goal-conditioned policies to determine the levels that
+            are pretrained, which would otherwise only count the steps of
+            this sampler.
+        """
+        self._set_from_flat(weights)
+
+        if steps is not None and \
+                is_goal_conditioned_policy(type(self.policy_tf)):
+            self.policy_tf._steps = steps
+
+    def collect_samples(self, obs, n_steps, apply_noise, random_actions):
+        """Perform the sample collection operation over multiple steps.
+
+        Actions are computed by the local copy of the policy. Goal-conditioned
+        policies additionally update their internal memory using the collected
+        samples, so that the meta-actions are recomputed at the end of every
+        meta period.
+
+        Parameters
+        ----------
+        obs : array_like or dict of array_like
+            the current observation of the environment
+        n_steps : int
+            the number of steps to collect samples from
+        apply_noise : bool
+            whether to add Gaussian noise to the output of the actor
+        random_actions : bool
+            if set to True, actions are sampled randomly from the action space
+            instead of being computed by the policy. This is used for
+            exploration purposes.
+
+        Returns
+        -------
+        list of dict
+            the output from `collect_sample` at every step. For
+            goal-conditioned policies, this includes a "meta_action" term that
+            contains the meta-actions the step was performed under.
+        """
+        goal_conditioned = is_goal_conditioned_policy(type(self.policy_tf))
+
+        samples = []
+        for _ in range(n_steps):
+            # Compute the next action.
+            context = self.get_context()
+            action = self.policy_tf.get_action(
+                np.array(obs).reshape((-1,) + self.policy_tf.ob_space.shape),
+                context,
+                apply_noise=apply_noise,
+                random_actions=random_actions,
+            ).flatten()
+
+            # Update the environment.
+            sample = self.collect_sample(action)
+            reset = sample["done"]
+            obs1 = sample["obs"][0] if reset else sample["obs"]
+
+            if goal_conditioned:
+                sample["meta_action"] = deepcopy(self.policy_tf.meta_action[0])
+
+                # Update the meta-period bookkeeping of the policy. Samples are
+                # not stored, so the done mask is not augmented.
+                self.policy_tf.store_transition(
+                    obs0=obs,
+                    context0=sample["context"],
+                    action=action,
+                    reward=sample["reward"],
+                    obs1=obs1,
+                    context1=sample["context"],
+                    done=sample["done"],
+                    is_final_step=False,
+                    evaluate=True,
+                )
+
+            samples.append(sample)
+            obs = sample["obs"][1] if reset else sample["obs"]
+
+        return samples
+
 
 @ray.remote
 class RaySampler(Sampler):
@@ -159,3 +357,242 @@ class RaySampler(Sampler):
     """
 
     pass
+
+
+class VecSampler(object):
+    """Environment sampler object for multiple environments.
+
+    This object steps several environments within a single process, thereby
+    avoiding the overhead of inter-process communication for environments
+    that are cheap to simulate. If a vectorized variant of the environment is
+    available (see create_vec_env), all environments are simulated by this
+    single object instead.
+
+    Attributes
+    ----------
+    sampler : list of Sampler
+        the sampler of each environment. Empty if a vectorized environment is
+        used.
+    vec_env : object or None
+        the vectorized environment. Set to None if one is not available.
+    """
+
+    def __init__(self,
+                 env_name,
+                 render,
+                 shared,
+                 maddpg,
+                 evaluate,
+                 env_num,
+                 num_envs):
+        """Instantiate the sampler object.
+
+        Parameters
+        ----------
+        env_name : str
+            the name of the environment
+        render : bool
+            whether to render the environment
+        shared : bool
+            specifies whether agents in an environment are meant to share
+            policies. This is solely used by multi-agent Flow environments.
+        maddpg : bool
+            whether to use an environment variant that is compatible with the
+            MADDPG algorithm
+        evaluate : bool
+            specifies whether this is a training or evaluation environment
+        env_num : int
+            the environment number of the first environment. The remaining
+            environments are numbered sequentially.
+        num_envs : int
+            the number of environments to create
+        """
+        self.vec_env, self._init_obs = create_vec_env(
+            env=env_name,
+            num_envs=num_envs,
+            evaluate=evaluate,
+        )
+
+        if self.vec_env is None:
+            self.sampler = [
+                Sampler(
+                    env_name=env_name,
+                    render=render,
+                    shared=shared,
+                    maddpg=maddpg,
+                    evaluate=evaluate,
+                    env_num=env_num + i,
+                )
+                for i in range(num_envs)
+            ]
+        else:
+            self.sampler = []
+
+        self._env_num = env_num
+        self._num_envs = num_envs
+        self._transport = None
+
+    def _get_samplers(self, env_num):
+        """Return the samplers of the specified environments."""
+        if env_num is None:
+            return self.sampler
+        return [self.sampler[num - self._env_num] for num in env_num]
+
+    def get_init_obs(self):
+        """Return the initial observation from every environment."""
+        if self.vec_env is not None:
+            return [ob.copy() for ob in self._init_obs]
+        return [sampler.get_init_obs() for sampler in self.sampler]
+
+    def attach_transport(self, path, num_envs, capacity, ob_shape, ac_shape):
+        """Write the samples of every environment into shared memory.
+
+        See Sampler.attach_transport.
+        """
+        if self.vec_env is not None:
+            self._transport = SharedMemoryTransport(
+                num_envs=num_envs,
+                capacity=capacity,
+                ob_shape=ob_shape,
+                ac_shape=ac_shape,
+                path=path,
+            )
+            return
+
+        for sampler in self.sampler:
+            sampler.attach_transport(
+                path, num_envs, capacity, ob_shape, ac_shape)
+
+    def get_context(self, env_num=None):
+        """Collect the contextual terms. None if they are not passed.
+
+        Parameters
+        ----------
+        env_num : list of int, optional
+            the environment numbers of the environments to collect the
+            contextual terms from. Defaults to all environments.
+
+        Returns
+        -------
+        list of list of array_like or list of None
+            the contextual term of each environment
+        """
+        if self.vec_env is not None:
+            if env_num is None:
+                env_num = range(self._env_num, self._env_num + self._num_envs)
+            contexts = getattr(self.vec_env, "current_context", None)
+            if contexts is None:
+                return [None for _ in env_num]
+            return [[contexts[num - self._env_num]] for num in env_num]
+        return [sampler.get_context()
+                for sampler in self._get_samplers(env_num)]
+
+    def observation_space(self):
+        """Return the environment's observation space."""
+        if self.vec_env is not None:
+            return self.vec_env.observation_space
+        return self.sampler[0].observation_space()
+
+    def action_space(self):
+        """Return the environment's action space."""
+        if self.vec_env is not None:
+            return self.vec_env.action_space
+        return self.sampler[0].action_space()
+
+    def context_space(self):
+        """Return the environment's context space."""
+        if self.vec_env is not None:
+            return getattr(self.vec_env, "context_space", None)
+        return self.sampler[0].context_space()
+
+    def all_observation_space(self):
+        """Return the environment's full observation space."""
+        if self.vec_env is not None:
+            return getattr(
+                self.vec_env, "all_observation_space", Box(-1, 1, (1,)))
+        return self.sampler[0].all_observation_space()
+
+    def horizon(self):
+        """Return the environment's time horizon."""
+        if self.vec_env is not None:
+            return self.vec_env.horizon
+        return self.sampler[0].horizon()
+
+    def collect_sample(self, action, env_num=None):
+        """Perform the sample collection operation over a single step.
+
+        Every environment is reset individually once it is done, in the same
+        manner as `Sampler.collect_sample`.
+
+        Parameters
+        ----------
+        action : list of array_like
+            the action to be performed by the agent(s) within each environment
+        env_num : list of int, optional
+            the environment numbers of the environments to step. Defaults to
+            all environments.
+
+        Returns
+        -------
+        list of dict
+            the output from `Sampler.collect_sample` for each environment
+        """
+        if self.vec_env is not None:
+            return self._collect_vec_sample(action, env_num)
+
+        return [sampler.collect_sample(action_i) for sampler, action_i in
+                zip(self._get_samplers(env_num), action)]
+
+    def _collect_vec_sample(self, action, env_num):
+        """Perform a single step within the vectorized environment.
+
+        See collect_sample.
+        """
+        if env_num is None:
+            env_num = list(range(
+                self._env_num, self._env_num + self._num_envs))
+        env_ids = np.asarray(env_num) - self._env_num
+
+        # Get the contextual terms. These are collected before the step, since
+        # the environments that are done are reset within it.
+        contexts = getattr(self.vec_env, "current_context", None)
+        if contexts is not None:
+            contexts = [np.copy(contexts[i]) for i in env_ids]
+
+        obs, reward, done, info = self.vec_env.step(
+            np.asarray(action), env_ids)
+
+        samples = []
+        for i, num in enumerate(env_num):
+            # The final observation of a rollout is stored in the info dict.
+            terminal_obs = info[i].pop("terminal_observation", None)
+            reset = bool(done[i])
+
+            sample = {
+                "obs": (terminal_obs, obs[i]) if reset else obs[i],
+                "context": None if contexts is None else contexts[i],
+                "action": action[i],
+                "reward": float(reward[i]),
+                "done": reset,
+                "env_num": num,
+                "all_obs": (None, None) if reset else None,
+                "info": info[i],
+            }
+
+            # Write the sample into shared memory, if a transport is attached.
+            if self._transport is not None:
+                sample = self._transport.put(sample)
+
+            samples.append(sample)
+
+        return samples
+
+
+@ray.remote
+class RayVecSampler(VecSampler):
+    """Ray-compatible variant of the multi-environment sampler object.
+
+    Used to collect samples from groups of environments in parallel.
+    """
+
+    pass
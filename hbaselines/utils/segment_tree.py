@@ -0,0 +1,121 @@
+"""Script containing the segment tree objects used for prioritized replay."""
+import numpy as np
+
+
+class SegmentTree(object):
+    """Array-based segment tree.
+
+    The tree is stored in a single array of size 2 * capacity, where the
+    capacity is rounded up to the next power of two. The root is located at
+    index 1, the children of node i are located at indices 2i and 2i+1, and
+    the leaves occupy the second half of the array. All operations are
+    performed on batches of indices, with one vectorized operation per level
+    of the tree.
+
+    Attributes
+    ----------
+    capacity : int
+        the number of leaves in the tree
+    depth : int
+        the number of levels in the tree below the root
+    operation : numpy.ufunc
+        the operation used to combine the values of two children
+    neutral_element : float
+        the value of unused leaves, such that operation(x, neutral_element)
+        is equal to x
+    """
+
+    def __init__(self, capacity, operation, neutral_element):
+        """Instantiate the segment tree.
+
+        Parameters
+        ----------
+        capacity : int
+            the minimum number of leaves in the tree
+        operation : numpy.ufunc
+            the operation used to combine the values of two children
+        neutral_element : float
+            the value of unused leaves
+        """
+        self.depth = max(int(np.ceil(np.log2(capacity))), 0)
+        self.capacity = 2 ** self.depth
+        self.operation = operation
+        self.neutral_element = neutral_element
+        self._value = np.full(
+            2 * self.capacity, neutral_element, dtype=np.float64)
+
+    def __setitem__(self, idxes, values):
+        """Set the values of a batch of leaves.
+
+        The values of the nodes above the leaves are recomputed one level at a
+        time, in O(batch_size * log(capacity)) operations overall.
+        """
+        nodes = np.asarray(idxes, dtype=np.int64).reshape(-1) + self.capacity
+        self._value[nodes] = values
+
+        # Duplicate nodes are assigned the same value, and are therefore not
+        # removed.
+        for _ in range(self.depth):
+            nodes //= 2
+            self._value[nodes] = self.operation(
+                self._value[2 * nodes], self._value[2 * nodes + 1])
+
+    def __getitem__(self, idxes):
+        """Return the values of a batch of leaves."""
+        return self._value[np.asarray(idxes, dtype=np.int64) + self.capacity]
+
+    def reduce(self):
+        """Return the result of the operation over all leaves."""
+        return self._value[1]
+
+
+class SumSegmentTree(SegmentTree):
+    """Segment tree that computes the sum of its leaves."""
+
+    def __init__(self, capacity):
+        """See parent class."""
+        super(SumSegmentTree, self).__init__(
+            capacity=capacity,
+            operation=np.add,
+            neutral_element=0.)
+
+    def find_prefixsum_idx(self, prefixsums):
+        """Find the leaves at which a batch of prefix sums are reached.
+
+        For every prefix sum p, this returns the highest index i such that the
+        sum of the leaves before i is less than or equal to p.
+
+        Parameters
+        ----------
+        prefixsums : array_like
+            the prefix sums, each between 0 and the sum of all leaves
+
+        Returns
+        -------
+        array_like
+            the index of the leaf of every prefix sum
+        """
+        prefixsums = np.array(prefixsums, dtype=np.float64)
+        nodes = np.ones(len(prefixsums), dtype=np.int64)
+
+        # Descend the tree, moving to the right child whenever the prefix sum
+        # exceeds the sum of the left child.
+        for _ in range(self.depth):
+            left = 2 * nodes
+            left_sum = self._value[left]
+            go_right = prefixsums >= left_sum
+            prefixsums -= left_sum * go_right
+            nodes = left + go_right
+
+        return nodes - self.capacity
+
+
+class MinSegmentTree(SegmentTree):
+    """Segment tree that computes the minimum of its leaves."""
+
+    def __init__(self, capacity):
+        """See parent class."""
+        super(MinSegmentTree, self).__init__(
+            capacity=capacity,
+            operation=np.minimum,
+            neutral_element=float("inf"))
@@ -0,0 +1,172 @@
+"""Script containing the slot allocator used to index variable agents."""
+import heapq
+import numpy as np
+from collections.abc import Mapping
+
+
+class SlotAllocator(Mapping):
+    """Allocator of a fixed number of dense slots to a variable set of keys.
+
+    This object maps the IDs of agents that enter and exit an environment
+    (e.g. the vehicles in the highway and I-210 networks) to dense row indices
+    in [0, num_slots). The free slots are kept in a min-heap, so that new keys
+    are always assigned the lowest free slot and acquiring and releasing a
+    slot are O(log n) operations, and a bitmap of the occupied slots is
+    maintained for vectorized operations over the slots.
+
+    The object behaves as a read-only dictionary from keys to slots.
+
+    Attributes
+    ----------
+    num_slots : int
+        the number of slots
+    occupied : array_like
+        a boolean mask of the slots that are currently assigned to a key
+    keys_array : list
+        the key assigned to every slot, or None if the slot is free
+    """
+
+    def __init__(self, num_slots):
+        """Instantiate the allocator.
+
+        Parameters
+        ----------
+        num_slots : int
+            the number of slots
+        """
+        self.num_slots = num_slots
+        self.occupied = np.zeros(num_slots, dtype=bool)
+        self.keys_array = [None for _ in range(num_slots)]
+        self._slots = {}
+        # a min-heap of the free slots, so that the lowest free slots are
+        # assigned first
+        self._free = list(range(num_slots))
+
+    def __getitem__(self, key):
+        """Return the slot of a key."""
+        return self._slots[key]
+
+    def __iter__(self):
+        """Iterate over the keys that are currently assigned a slot."""
+        return iter(self._slots)
+
+    def __len__(self):
+        """Return the number of occupied slots."""
+        return len(self._slots)
+
+    @property
+    def num_free(self):
+        """Return the number of free slots."""
+        return len(self._free)
+
+    def acquire(self, key):
+        """Assign a free slot to a key.
+
+        Parameters
+        ----------
+        key : hashable
+            the key. If the key already has a slot, this slot is returned.
+
+        Returns
+        -------
+        int
+            the slot of the key
+
+        Raises
+        ------
+        ValueError
+            if no free slots are available
+        """
+        slot = self._slots.get(key)
+        if slot is not None:
+            return slot
+
+        if len(self._free) == 0:
+            raise ValueError("No free slots are available.")
+
+        slot = heapq.heappop(self._free)
+        self._slots[key] = slot
+        self.keys_array[slot] = key
+        self.occupied[slot] = True
+
+        return slot
+
+    def release(self, key):
+        """Free the slot of a key.
+
+        Parameters
+        ----------
+        key : hashable
+            the key
+
+        Returns
+        -------
+        int
+            the slot that was freed
+        """
+        slot = self._slots.pop(key)
+        self.keys_array[slot] = None
+        self.occupied[slot] = False
+        heapq.heappush(self._free, slot)
+
+        return slot
+
+    def update(self, keys):
+        """Match the assigned keys to a new set of keys.
+
+        The slots of keys that are no longer available are released, and new
+        keys are assigned free slots. The slots of all other keys are left
+        unchanged.
+
+        Parameters
+        ----------
+        keys : iterable
+            the keys that are currently available
+
+        Returns
+        -------
+        list of int
+            the slots that were released
+
+        Raises
+        ------
+        ValueError
+            if the number of new keys exceeds the number of free slots
+        """
+        keys = list(keys)
+        available = set(keys)
+
+        # Release the keys that have exited.
+        released = [self.release(key) for key in
+                    [key for key in self._slots if key not in available]]
+
+        # Assign slots to the keys that have entered.
+        new_keys = [key for key in keys if key not in self._slots]
+        if len(new_keys) > len(self._free):
+            raise ValueError("No free slots are available.")
+        for key in new_keys:
+            self.acquire(key)
+
+        return released
+
+    def slots(self, keys):
+        """Return the slots of a list of keys.
+
+        Parameters
+        ----------
+        keys : iterable
+            the keys
+
+        Returns
+        -------
+        array_like
+            the slot of every key, in order
+        """
+        return np.array([self._slots[key] for key in keys], dtype=np.int64)
+
+    def clear(self):
+        """Release all slots."""
+        self.occupied[:] = False
+        self.keys_array = [None for _ in range(self.num_slots)]
+        self._slots = {}
+        self._free = list(range(self.num_slots))
@@ -68,6 +68,26 @@ def get_globals_vars(name=None):
         tf.compat.v1.GraphKeys.GLOBAL_VARIABLES, scope=name)
 
 
+def get_actor_vars(name=None):
+    """Return the trainable variables of the actor networks of a policy.
+
+    These are the variables under the "model/pi" scope(s) of the policy,
+    excluding those of target and old policies.
+
+    Parameters
+    ----------
+    name : str
+        the scope
+
+    Returns
+    -------
+    list of tf.Variable
+        trainable variables of the actor networks, in order of creation
+    """
+    return [var for var in get_trainable_vars(name)
+            if "model/pi/" in var.name and "oldpi/" not in var.name]
+
+
 def reduce_std(tensor, axis=None, keepdims=False):
     """Get the standard deviation of a Tensor.
 
@@ -235,6 +255,65 @@ class GetFlat(object):
             return self.sess.run(self.operation)
 
 
+def conjugate_gradient(f_ax, b_vec, cg_iters=10, residual_tol=1e-10):
+    """Create the operation that solves Ax = b via the conjugate gradient.
+
+    The iterations are unrolled within the graph, so that the solution is
+    computed within a single session call. The matrix A is never formed;
+    instead, f_ax is called once per iteration to create the product of A
+    with the current search direction. Once the residual falls below the
+    tolerance, the remaining iterations leave the solution unchanged.
+
+    Based on https://epubs.siam.org/doi/book/10.1137/1.9781611971446 Demmel
+    p 312.
+
+    Parameters
+    ----------
+    f_ax : function
+        creates the tensor of the Matrix A dot the vector x (x being the input
+        tensor of the function)
+    b_vec : tf.Tensor
+        vector b, where Ax = b
+    cg_iters : int
+        the number of iterations
+    residual_tol : float
+        the break point if the residual is below this value
+
+    Returns
+    -------
+    tf.Tensor
+        vector x, where Ax = b
+    """
+    # the first basis vector
+    first_basis_vect = b_vec
+    # the residual
+    residual = b_vec
+    # vector x, where Ax = b
+    x_var = tf.zeros_like(b_vec)
+    # L2 norm of the residual
+    residual_dot_residual = tf.reduce_sum(residual * residual)
+
+    for _ in range(cg_iters):
+        converged = residual_dot_residual < residual_tol
+        z_var = f_ax(first_basis_vect)
+        v_var = tf.where(
+            converged,
+            tf.zeros_like(residual_dot_residual),
+            tf.math.divide_no_nan(
+                residual_dot_residual,
+                tf.reduce_sum(first_basis_vect * z_var)))
+        x_var += v_var * first_basis_vect
+        residual -= v_var * z_var
+        new_residual_dot_residual = tf.reduce_sum(residual * residual)
+        mu_val = tf.math.divide_no_nan(
+            new_residual_dot_residual, residual_dot_residual)
+        first_basis_vect = residual + mu_val * first_basis_vect
+
+        residual_dot_residual = new_residual_dot_residual
+
+    return x_var
+
+
 def get_target_updates(_vars, target_vars, tau, verbose=0):
     """Get target update operations.
 
@@ -725,52 +804,77 @@ def create_conv(obs,
         return pi_h
 
 
-def gae_returns(mb_rewards, mb_values, mb_dones, last_values, gamma, lam):
+def gae_returns(mb_rewards,
+                mb_values,
+                mb_dones,
+                last_values,
+                gamma,
+                lam,
+                mb_lengths=None):
     """Compute the bootstrapped/discounted returns.
 
+    The samples are indexed by time along the last axis, and the returns of
+    all leading indices (e.g. environments) are computed at once. Only the
+    recursion of the advantages over time is computed by a Python loop.
+
     Parameters
     ----------
     mb_rewards : array_like
-        a minibatch of rewards from a given environment
+        a minibatch of rewards, of shape (..., n_steps)
     mb_values : array_like
-        a minibatch of values computed by the policy from a given
-        environment
+        a minibatch of values computed by the policy, of shape (..., n_steps)
     mb_dones : array_like
-        a minibatch of done masks from a given environment
+        a minibatch of done masks, of shape (..., n_steps)
     last_values : array_like
         the value associated with the current observation within the
-        environment
+        environment, one per leading index
     gamma : float
         discount factor
     lam : float
         factor for trade-off of bias vs variance for Generalized Advantage
         Estimator
+    mb_lengths : array_like or None
+        the number of valid steps of every leading index. The returns of the
+        steps after these are unspecified. If set to None, all steps are
+        valid.
 
     Returns
     -------
     array_like
         GAE-style expected discounted returns.
     """
-    n_steps = mb_rewards.shape[0]
+    mb_rewards = np.asarray(mb_rewards)
+    mb_values = np.asarray(mb_values)
+    mb_dones = np.asarray(mb_dones, dtype=mb_rewards.dtype)
+    batch_shape = mb_rewards.shape[:-1]
+    n_steps = mb_rewards.shape[-1]
+
+    if mb_lengths is None:
+        mb_lengths = np.full(batch_shape, n_steps)
+    mb_lengths = np.asarray(mb_lengths).reshape(batch_shape + (1,))
+    last_values = np.asarray(last_values).reshape(batch_shape + (1,))
+
+    # whether every step is the last valid step
+    is_last = np.arange(n_steps) == mb_lengths - 1
+
+    # The values and done masks of the next steps. The last valid step is
+    # bootstrapped off the last value, and uses its own done mask.
+    last_dones = np.take_along_axis(
+        mb_dones, np.maximum(mb_lengths - 1, 0), axis=-1)
+    next_values = np.where(
+        is_last, last_values, np.roll(mb_values, -1, axis=-1))
+    next_nonterminal = 1.0 - np.where(
+        is_last, last_dones, np.roll(mb_dones, -1, axis=-1))
 
     # Discount/bootstrap off value fn.
-    mb_advs = np.zeros_like(mb_rewards)
-    mb_vactual = np.zeros_like(mb_rewards)
-    lastgaelam = 0
+    deltas = mb_rewards + gamma * next_values * next_nonterminal - mb_values
+    coefs = gamma * lam * next_nonterminal * (1 - is_last)
+
+    mb_advs = np.zeros_like(deltas)
+    lastgaelam = np.zeros(batch_shape, dtype=deltas.dtype)
     for t in reversed(range(n_steps)):
-        if t == n_steps - 1:
-            nextnonterminal = 1.0 - mb_dones[-1]
-            nextvalues = last_values
-            mb_vactual[t] = mb_rewards[t]
-        else:
-            nextnonterminal = 1.0 - mb_dones[t+1]
-            nextvalues = mb_values[t+1]
-            mb_vactual[t] = mb_rewards[t] \
-                + gamma * nextnonterminal * nextvalues
-        delta = mb_rewards[t] \
-            + gamma * nextvalues * nextnonterminal - mb_values[t]
-        mb_advs[t] = lastgaelam = delta \
-            + gamma * lam * nextnonterminal * lastgaelam
+        mb_advs[..., t] = lastgaelam = deltas[..., t] \
+            + coefs[..., t] * lastgaelam
     mb_returns = mb_advs + mb_values
 
     return mb_returns
@@ -781,66 +885,64 @@ def process_minibatch(mb_obs,
                       mb_actions,
                       mb_values,
                       mb_neglogpacs,
-                      mb_all_obs,
                       mb_rewards,
-                      mb_returns,
                       mb_dones,
+                      mb_lengths,
                       last_values,
                       gamma,
-                      lam,
-                      num_envs):
+                      lam):
     """Process a minibatch of samples.
 
-    This method re-formats the data to numpy arrays that can be passed to
-    the tensorflow placeholders, and computes the GAE terms
+    This method computes the GAE terms of the samples of all environments at
+    once, and flattens the valid steps of every environment (in the order of
+    the environments) to numpy arrays that can be passed to the tensorflow
+    placeholders. The minibatch is expected to be stored with the steps of
+    every environment along the second axis, see RolloutBuffer in
+    hbaselines/fcnet/replay_buffer.py.
 
     Parameters
     ----------
     mb_obs : array_like
-        a minibatch of observations
-    mb_contexts : array_like
-        a minibatch of contextual terms
+        a minibatch of observations, of shape (num_envs, n_steps, ob_dim)
+    mb_contexts : array_like or None
+        a minibatch of contextual terms, of shape (num_envs, n_steps, co_dim).
+        None if no context is provided by the environment.
     mb_actions : array_like
-        a minibatch of actions
+        a minibatch of actions, of shape (num_envs, n_steps, ac_dim)
     mb_values : array_like
-        a minibatch of estimated values by the policy
-    mb_neglogpacs : array_like
-        a minibatch of the negative log-likelihood of performed actions
-    mb_all_obs : array_like
-        a minibatch of full state observations (for multiagent envs)
+        a minibatch of estimated values by the policy, of shape
+        (num_envs, n_steps)
+    mb_neglogpacs : array_like or None
+        a minibatch of the negative log-likelihood of performed actions, of
+        shape (num_envs, n_steps)
     mb_rewards : array_like
-        a minibatch of environment rewards
-    mb_returns : array_like
-        a minibatch of expected discounted returns
+        a minibatch of environment rewards, of shape (num_envs, n_steps)
     mb_dones : array_like
-        a minibatch of done masks
+        a minibatch of done masks, of shape (num_envs, n_steps)
+    mb_lengths : array_like
+        the number of valid steps of every environment
     last_values : array_like
-        the value associated with the current observation within the
+        the value associated with the current observation within every
         environment
     gamma : float
         discount factor
     lam : float
         factor for trade-off of bias vs variance for Generalized Advantage
         Estimator
-    num_envs : int
-        number of environments used to run simulations in parallel.
 
     Returns
     -------
     array_like
         the reformatted minibatch of observations
-    array_like
+    array_like or None
         the reformatted minibatch of contextual terms
     array_like
         the reformatted minibatch of actions
     array_like
         the reformatted minibatch of estimated values by the policy
-    array_like
+    array_like or None
         the reformatted minibatch of the negative log-likelihood of
         performed actions
-    array_like
-        the reformatted minibatch of full state observations (for
-        multiagent envs)
     array_like
         the reformatted minibatch of environment rewards
     array_like
@@ -852,56 +954,39 @@ def process_minibatch(mb_obs,
     int
         the number of sampled steps in the minibatch
     """
-    n_steps = 0
-
-    for env_num in range(num_envs):
-        # Convert the data to numpy arrays.
-        mb_obs[env_num] = np.concatenate(mb_obs[env_num], axis=0)
-        mb_rewards[env_num] = np.asarray(mb_rewards[env_num])
-        mb_actions[env_num] = np.concatenate(mb_actions[env_num], axis=0)
-        mb_values[env_num] = np.concatenate(mb_values[env_num], axis=0)
-        mb_dones[env_num] = np.asarray(mb_dones[env_num])
-        n_steps += mb_obs[env_num].shape[0]
-        if mb_neglogpacs is not None:
-            mb_neglogpacs[env_num] = np.concatenate(
-                mb_neglogpacs[env_num], axis=0)
-
-        # Compute the bootstrapped/discounted returns.
-        mb_returns[env_num] = gae_returns(
-            mb_rewards=mb_rewards[env_num],
-            mb_values=mb_values[env_num],
-            mb_dones=mb_dones[env_num],
-            last_values=last_values[env_num],
-            gamma=gamma,
-            lam=lam,
-        )
+    # Compute the bootstrapped/discounted returns.
+    mb_returns = gae_returns(
+        mb_rewards=mb_rewards,
+        mb_values=mb_values,
+        mb_dones=mb_dones,
+        last_values=last_values,
+        gamma=gamma,
+        lam=lam,
+        mb_lengths=mb_lengths,
+    )
+
+    # Flatten the valid steps of every environment.
+    mask = np.arange(mb_rewards.shape[1]) < np.reshape(mb_lengths, (-1, 1))
+    n_steps = int(mask.sum())
 
-    # Concatenate the stored data.
-    if num_envs > 1:
-        mb_obs = np.concatenate(mb_obs, axis=0)
-        mb_contexts = np.concatenate(mb_contexts, axis=0)
-        mb_actions = np.concatenate(mb_actions, axis=0)
-        mb_values = np.concatenate(mb_values, axis=0)
-        mb_all_obs = np.concatenate(mb_all_obs, axis=0)
-        mb_returns = np.concatenate(mb_returns, axis=0)
-        if mb_neglogpacs is not None:
-            mb_neglogpacs = np.concatenate(mb_neglogpacs, axis=0)
-    else:
-        mb_obs = mb_obs[0]
-        mb_contexts = mb_contexts[0]
-        mb_actions = mb_actions[0]
-        mb_values = mb_values[0]
-        mb_all_obs = mb_all_obs[0]
-        mb_returns = mb_returns[0]
-        if mb_neglogpacs is not None:
-            mb_neglogpacs = mb_neglogpacs[0]
+    def _flatten(val):
+        return None if val is None else val[mask]
+
+    mb_obs = _flatten(mb_obs)
+    mb_contexts = _flatten(mb_contexts)
+    mb_actions = _flatten(mb_actions)
+    mb_values = _flatten(mb_values)
+    mb_neglogpacs = _flatten(mb_neglogpacs)
+    mb_rewards = _flatten(mb_rewards)
+    mb_returns = _flatten(mb_returns)
+    mb_dones = _flatten(mb_dones)
 
     # Compute the advantages.
     advs = mb_returns - mb_values
     mb_advs = (advs - advs.mean()) / (advs.std() + 1e-8)
 
     return mb_obs, mb_contexts, mb_actions, mb_values, mb_neglogpacs, \
-        mb_all_obs, mb_rewards, mb_returns, mb_dones, mb_advs, n_steps
+        mb_rewards, mb_returns, mb_dones, mb_advs, n_steps
 
 
 def setup_target_updates(model_scope, target_scope, scope, tau, verbose):
@@ -942,3 +1027,77 @@ def setup_target_updates(model_scope, target_scope, scope, tau, verbose):
         get_trainable_vars(model_scope),
         get_trainable_vars(target_scope),
         tau, verbose)
+
+
+def replay_iterator(sample_fn, ob_dim, ac_dim, with_weights=False):
+    """Create the tensors of the minibatches sampled from a replay buffer.
+
+    The minibatches are passed into the graph by a dataset whose elements are
+    generated by `sample_fn`, instead of via a feed_dict, and are placed in a
+    staging area by the returned put operation. The returned tensors refer to
+    the oldest minibatch in the staging area, which is removed from the staging
+    area by every session call that computes an operation that depends on
+    these tensors.
+
+    A session call that computes both the put operation and operations that
+    depend on the returned tensors samples the next minibatch concurrently
+    with the operations that consume the current one. Since sampling only
+    occurs within these session calls, the replay buffer is never sampled
+    while transitions are being added to it. If the staging area is empty, the
+    returned tensors wait for the put operation of the same session call.
+
+    Parameters
+    ----------
+    sample_fn : function
+        the method that samples a minibatch, see the `sample` method of the
+        replay buffers in hbaselines/fcnet/replay_buffer.py
+    ob_dim : tuple of int
+        the shape of the observations
+    ac_dim : tuple of int
+        the shape of the actions
+    with_weights : bool
+        whether `sample_fn` returns the importance sampling weights and the
+        indices of the sampled transitions as well
+
+    Returns
+    -------
+    tuple of tf.Tensor
+        the observations, actions, rewards, next observations, and done masks
+        of the minibatch, followed by its importance sampling weights and
+        indices if `with_weights` is set to True. The rewards, done masks, and
+        weights are of shape (batch_size, 1).
+    tf.Operation
+        the operation that samples a minibatch and places it in the staging
+        area
+    """
+    def _generator():
+        while True:
+            yield tuple(sample_fn())
+
+    output_types = (tf.float32,) * 5
+    output_shapes = (
+        tf.TensorShape((None,) + tuple(ob_dim)),
+        tf.TensorShape((None,) + tuple(ac_dim)),
+        tf.TensorShape([None]),
+        tf.TensorShape((None,) + tuple(ob_dim)),
+        tf.TensorShape([None]),
+    )
+    if with_weights:
+        output_types += (tf.float32, tf.int64)
+        output_shapes += (tf.TensorShape([None]), tf.TensorShape([None]))
+
+    dataset = tf.data.Dataset.from_generator(
+        _generator, output_types, output_shapes)
+    next_batch = tf.compat.v1.data.make_one_shot_iterator(dataset).get_next()
+
+    # Stage the sampled minibatches, to be consumed by later session calls.
+    staging_area = tf.contrib.staging.StagingArea(
+        dtypes=list(output_types), shapes=list(output_shapes))
+    put_op = staging_area.put(list(next_batch))
+    batch = list(staging_area.get())
+
+    # Match the shapes of the placeholders of the policies.
+    for i in [2, 4] + ([5] if with_weights else []):
+        batch[i] = tf.expand_dims(batch[i], axis=1)
+
+    return tuple(batch), put_op
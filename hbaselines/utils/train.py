@@ -31,6 +31,11 @@ def get_hyperparameters(args, policy):
         "save_replay_buffer": args.save_replay_buffer,
         "verbose": args.verbose,
         "num_envs": args.num_envs,
+        "envs_per_worker": args.envs_per_worker,
+        "policy_lag": args.policy_lag,
+        "worker_sync_freq": args.worker_sync_freq,
+        "shared_memory": args.shared_memory,
+        "prefetch_batches": args.prefetch_batches,
         "_init_setup_model": True,
     }
 
@@ -74,9 +79,13 @@ def get_hyperparameters(args, policy):
             "tau": args.tau,
             "gamma": args.gamma,
             "use_huber": args.use_huber,
+            "prioritized_replay": args.prioritized_replay,
+            "replay_buffer_path": args.replay_buffer_path,
+            "reduced_precision_replay": args.reduced_precision_replay,
             "noise": args.noise,
             "target_policy_noise": args.target_policy_noise,
             "target_noise_clip": args.target_noise_clip,
+            "fused_update": args.fused_update,
         })
 
     # add SAC parameters
@@ -89,6 +98,9 @@ def get_hyperparameters(args, policy):
             "tau": args.tau,
             "gamma": args.gamma,
             "use_huber": args.use_huber,
+            "prioritized_replay": args.prioritized_replay,
+            "replay_buffer_path": args.replay_buffer_path,
+            "reduced_precision_replay": args.reduced_precision_replay,
             "target_entropy": args.target_entropy,
         })
 
@@ -118,6 +130,7 @@ def get_hyperparameters(args, policy):
             "vf_stepsize": args.vf_stepsize,
             "cg_damping": args.cg_damping,
             "max_kl": args.max_kl,
+            "fisher_fraction": args.fisher_fraction,
         })
 
     # add GoalConditionedPolicy parameters
@@ -131,6 +144,7 @@ def get_hyperparameters(args, policy):
             "off_policy_corrections": args.off_policy_corrections,
             "hindsight": args.hindsight,
             "subgoal_testing_rate": args.subgoal_testing_rate,
+            "hindsight_relabel_prob": args.hindsight_relabel_prob,
             "cooperative_gradients": args.cooperative_gradients,
             "cg_weights": args.cg_weights,
             "cg_delta": args.cg_delta,
@@ -145,6 +159,7 @@ def get_hyperparameters(args, policy):
             "shared": args.shared,
             "maddpg": args.maddpg,
             "n_agents": args.n_agents,
+            "joint_update": args.joint_update,
         })
 
     # add the policy_kwargs term to the algorithm parameters
@@ -285,6 +300,37 @@ def create_algorithm_parser(parser):
              'Each environment is run on a separate CPUS and uses the same '
              'policy as the rest. Must be less than or equal to '
              'nb_rollout_steps.')
+    parser.add_argument(
+        '--envs_per_worker', type=int, default=1,
+        help='number of environments stepped within each sampler process. If '
+             'greater than one, the num_envs environments are divided between '
+             'ceil(num_envs / envs_per_worker) processes, and are stepped '
+             'inline if a single process is required.')
+    parser.add_argument(
+        '--policy_lag', type=int, default=0,
+        help='the maximum number of policy updates that may occur between the '
+             'computation of an action and the storage of the resulting '
+             'sample. If set to a value greater than zero and multiple '
+             'environments are used, environments continue stepping while the '
+             'policy is being trained.')
+    parser.add_argument(
+        '--worker_sync_freq', type=int, default=None,
+        help='if set, and multiple environments are used, each sampler holds '
+             'a copy of the policy and computes actions locally for the '
+             'entire rollout. The actor weights of the samplers are updated '
+             'every worker_sync_freq policy updates.')
+    parser.add_argument(
+        '--shared_memory', action='store_true',
+        help='whether the samplers pass the observations, actions, rewards, '
+             'and done masks to the learner through shared memory instead of '
+             'Ray\'s object store. Only utilized by single-agent policies '
+             'with multiple sampler processes.')
+    parser.add_argument(
+        '--prefetch_batches', type=int, default=0,
+        help='the maximum number of batches that are sampled from the replay '
+             'buffer by a background thread, ahead of the policy updates that '
+             'consume them. If set to zero, batches are sampled within the '
+             'policy updates. Only utilized by off-policy policies.')
     parser.add_argument(
         '--verbose', type=int, default=2,
         help='the verbosity level: 0 none, 1 training information, '
@@ -341,6 +387,26 @@ def create_td3_parser(parser):
         help="specifies whether to use the huber distance function as the "
              "loss for the critic. If set to False, the mean-squared error "
              "metric is used instead")
+    parser.add_argument(
+        "--prioritized_replay",
+        action="store_true",
+        help="whether to use prioritized experience replay, with the "
+             "absolute TD errors of the sampled transitions used as their "
+             "new priorities")
+    parser.add_argument(
+        "--replay_buffer_path",
+        type=str,
+        default=None,
+        help="the directory in which the replay buffer is stored as "
+             "memory-mapped files. If the files already exist, they are "
+             "reopened in place. If not specified, the replay buffer is "
+             "stored in memory.")
+    parser.add_argument(
+        "--reduced_precision_replay",
+        action="store_true",
+        help="whether to store the observations in the replay buffer with "
+             "reduced precision, with the image channels quantized to uint8 "
+             "and the remaining elements stored as float16")
     parser.add_argument(
         "--noise",
         type=float,
@@ -360,6 +426,12 @@ def create_td3_parser(parser):
         type=float,
         default=TD3_PARAMS["target_noise_clip"],
         help="clipping term for the noise injected in the target actor policy")
+    parser.add_argument(
+        "--fused_update",
+        action="store_true",
+        help="whether to perform the training steps of a training iteration "
+             "within a single session call, via an in-graph loop. Not "
+             "supported by goal-conditioned or multi-agent policies.")
 
     return parser
 
@@ -402,6 +474,26 @@ def create_sac_parser(parser):
         help="specifies whether to use the huber distance function as the "
              "loss for the critic. If set to False, the mean-squared error "
              "metric is used instead")
+    parser.add_argument(
+        "--prioritized_replay",
+        action="store_true",
+        help="whether to use prioritized experience replay, with the "
+             "absolute TD errors of the sampled transitions used as their "
+             "new priorities")
+    parser.add_argument(
+        "--replay_buffer_path",
+        type=str,
+        default=None,
+        help="the directory in which the replay buffer is stored as "
+             "memory-mapped files. If the files already exist, they are "
+             "reopened in place. If not specified, the replay buffer is "
+             "stored in memory.")
+    parser.add_argument(
+        "--reduced_precision_replay",
+        action="store_true",
+        help="whether to store the observations in the replay buffer with "
+             "reduced precision, with the image channels quantized to uint8 "
+             "and the remaining elements stored as float16")
     parser.add_argument(
         "--target_entropy",
         type=float,
@@ -518,6 +610,12 @@ def create_trpo_parser(parser):
         type=float,
         default=TRPO_PARAMS["max_kl"],
         help="the Kullback-Leibler loss threshold")
+    parser.add_argument(
+        "--fisher_fraction",
+        type=float,
+        default=TRPO_PARAMS["fisher_fraction"],
+        help="the fraction of the batch used to compute the Fisher-vector "
+             "products of the conjugate gradient calculation")
 
     return parser
 
@@ -647,6 +745,15 @@ def create_goal_conditioned_parser(parser):
         help="rate at which the original (non-hindsight) sample is stored in "
              "the replay buffer as well. Used only if `hindsight` is set to "
              "True.")
+    parser.add_argument(
+        "--hindsight_relabel_prob",
+        type=float,
+        default=GOAL_CONDITIONED_PARAMS["hindsight_relabel_prob"],
+        help="the probability that a sample is relabeled with hindsight goals "
+             "and rewards when it is sampled from the replay buffer. If not "
+             "set, hindsight samples are instead computed and stored in the "
+             "replay buffer when every meta-period ends. Used only if "
+             "`hindsight` is set to True.")
     parser.add_argument(
         "--cooperative_gradients",
         action="store_true",
@@ -705,6 +812,12 @@ def create_multi_feedforward_parser(parser):
         help="the expected number of agents in the environment. Only relevant "
              "if using shared policies with MADDPG or goal-conditioned "
              "hierarchies.")
+    parser.add_argument(
+        "--joint_update",
+        action="store_true",
+        help="whether to update all agents of an independent MADDPG policy "
+             "within a single session call, using batches sampled at common "
+             "indices from the replay buffers of every agent")
 
     return parser
 
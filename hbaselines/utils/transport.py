@@ -0,0 +1,159 @@
+"""Script containing the shared-memory sample transport object."""
+import os
+import shutil
+import tempfile
+import numpy as np
+
+
+class SharedMemoryTransport(object):
+    """Shared-memory transport of samples from the samplers to the learner.
+
+    The observations, actions, rewards, and done masks of every step are
+    written by the samplers into preallocated ring arrays, with `capacity`
+    slots for every environment. These arrays are memory-mapped from files in
+    a shared-memory file system (/dev/shm, if available), and are read by the
+    learner without copying. Only the slot index and the remaining (small)
+    terms of a sample, i.e. the contextual term and info dict, are
+    communicated through Ray.
+
+    Note that the arrays returned by `get` are only valid until the
+    corresponding slot is written to again, `capacity` steps later.
+
+    Attributes
+    ----------
+    path : str
+        the directory of the memory-mapped files
+    capacity : int
+        the number of slots for every environment
+    obs : np.memmap
+        the observation after every step
+    reset_obs : np.memmap
+        the initial observation of the next rollout, for steps that ended in a
+        reset
+    action : np.memmap
+        the action performed at every step
+    reward : np.memmap
+        the reward from every step
+    done : np.memmap
+        the done mask of every step
+    """
+
+    def __init__(self,
+                 num_envs,
+                 capacity,
+                 ob_shape,
+                 ac_shape,
+                 path=None):
+        """Instantiate the transport object.
+
+        Parameters
+        ----------
+        num_envs : int
+            the number of environments
+        capacity : int
+            the number of slots for every environment
+        ob_shape : tuple of int
+            the shape of the observations
+        ac_shape : tuple of int
+            the shape of the actions
+        path : str or None
+            the directory of the memory-mapped files. If set to None, a new
+            directory is created and the arrays are allocated. Otherwise, the
+            arrays that were allocated in this directory are opened.
+        """
+        create = path is None
+        if create:
+            path = tempfile.mkdtemp(
+                prefix="hbaselines-",
+                dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+
+        self.path = path
+        self.capacity = capacity
+        self._next_slot = [0 for _ in range(num_envs)]
+
+        def _open(name, shape, dtype):
+            return np.lib.format.open_memmap(
+                os.path.join(path, "{}.npy".format(name)),
+                mode="w+" if create else "r+",
+                dtype=dtype,
+                shape=(num_envs, capacity) + tuple(shape) if create else None)
+
+        self.obs = _open("obs", ob_shape, np.float32)
+        self.reset_obs = _open("reset_obs", ob_shape, np.float32)
+        self.action = _open("action", ac_shape, np.float32)
+        self.reward = _open("reward", (), np.float32)
+        self.done = _open("done", (), np.bool_)
+
+    def unlink(self):
+        """Remove the memory-mapped files.
+
+        Processes that have already opened the arrays may continue to use
+        them. The memory is released once the last of these processes exits.
+        """
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def put(self, sample):
+        """Write a sample into the next slot of its environment.
+
+        Parameters
+        ----------
+        sample : dict
+            the output from the `collect_sample` method of a sampler
+
+        Returns
+        -------
+        dict
+            the terms of the sample that are not written to shared memory, as
+            well as the environment number, slot index, and reset flag
+        """
+        num = sample["env_num"]
+        slot = self._next_slot[num]
+        self._next_slot[num] = (slot + 1) % self.capacity
+
+        reset = bool(sample["done"])
+        if reset:
+            self.obs[num, slot] = sample["obs"][0]
+            self.reset_obs[num, slot] = sample["obs"][1]
+        else:
+            self.obs[num, slot] = sample["obs"]
+        self.action[num, slot] = sample["action"]
+        self.reward[num, slot] = sample["reward"]
+        self.done[num, slot] = reset
+
+        return {
+            "env_num": num,
+            "slot": slot,
+            "reset": reset,
+            "context": sample["context"],
+            "info": sample["info"],
+        }
+
+    def get(self, message):
+        """Read a sample that was written by `put`.
+
+        Parameters
+        ----------
+        message : dict
+            the output from `put`
+
+        Returns
+        -------
+        dict
+            the sample, in the format returned by the `collect_sample` method
+            of a sampler
+        """
+        num = message["env_num"]
+        slot = message["slot"]
+        reset = message["reset"]
+
+        return {
+            "obs": (self.obs[num, slot], self.reset_obs[num, slot])
+            if reset else self.obs[num, slot],
+            "context": message["context"],
+            "action": self.action[num, slot].copy(),
+            "reward": float(self.reward[num, slot]),
+            "done": reset,
+            "env_num": num,
+            "all_obs": (None, None) if reset else None,
+            "info": message["info"],
+        }
@@ -4,6 +4,8 @@ import numpy as np
 import random
 import os
 import json
+import shutil
+import tempfile
 from copy import deepcopy
 
 from flow.core.params import EnvParams
@@ -51,6 +53,10 @@ from hbaselines.envs.mixed_autonomy.envs.av_multi \
 from hbaselines.envs.mixed_autonomy.envs.ring_nonflow import RingEnv
 from hbaselines.envs.mixed_autonomy.envs.ring_nonflow import RingSingleAgentEnv
 from hbaselines.envs.mixed_autonomy.envs.ring_nonflow import RingMultiAgentEnv
+from hbaselines.envs.mixed_autonomy.envs.ring_nonflow import RingVecEnv
+from hbaselines.envs.mixed_autonomy.envs.utils import convert_initial_states
+from hbaselines.envs.mixed_autonomy.envs.utils import load_initial_states
+from hbaselines.envs.mixed_autonomy.envs.utils import _INITIAL_STATE_STORES
 
 from hbaselines.envs.point2d import Point2DEnv
 from hbaselines.utils.env_util import create_env
@@ -2229,6 +2235,81 @@ class TestRingNonFlow(unittest.TestCase):
              0., 0., 0., 0., 0., 0.]
         )
 
+    def test_vec_env(self):
+        """Validate the functionality of the RingVecEnv class.
+
+        This tests checks that expected outputs are returned for the following
+        methods:
+
+        1. action_space
+        2. observation_space
+        3. get_state
+        4. compute_reward
+        5. step, for all and a subset of the rings, with automatic resets
+        """
+        set_seed(0)
+
+        # Create the environment.
+        init_parameters = deepcopy(self._init_parameters)
+        init_parameters["rl_ids"] = [0, 11]
+        init_parameters["length"] = [250, 360]
+        init_parameters["horizon"] = 2
+        del init_parameters["gen_emission"]
+        del init_parameters["maddpg"]
+        env = RingVecEnv(num_envs=3, **init_parameters)
+
+        # test case 1
+        test_space(
+            env.observation_space,
+            expected_min=np.array([-float("inf") for _ in range(30)]),
+            expected_max=np.array([float("inf") for _ in range(30)]),
+            expected_size=30,
+        )
+
+        # test case 2
+        test_space(
+            env.action_space,
+            expected_min=np.array([-1.0 for _ in range(2)]),
+            expected_max=np.array([1.0 for _ in range(2)]),
+            expected_size=2,
+        )
+
+        # test case 3
+        env.reset()
+        env.headways = np.array([[5 * i for i in range(22)]] * 3)
+        env.speeds = np.array([[i for i in range(22)]] * 3)
+        obs = env.get_state()
+        self.assertEqual(obs.shape, (3, 30))
+        for i in range(3):
+            np.testing.assert_almost_equal(
+                obs[i],
+                [0., 0.1, 0., 0., 0., 0., 0., 0., 0., 0., 0., 0., 0., 0., 0.,
+                 1.1, 1.2, 0.55, 0., 0., 0., 0., 0., 0., 0., 0., 0., 0., 0.,
+                 0.]
+            )
+
+        # test case 4
+        env._v_eq = np.array([0., 10., 11.])
+        np.testing.assert_almost_equal(
+            env.compute_reward(), [0., -0.5, -0.605])
+
+        # test case 5
+        env.reset()
+        obs, reward, done, info = env.step(np.zeros((3, 2)))
+        self.assertEqual(obs.shape, (3, 30))
+        self.assertEqual(reward.shape, (3,))
+        np.testing.assert_array_equal(done, [False, False, False])
+        np.testing.assert_array_equal(env.t, [1, 1, 1])
+
+        obs, reward, done, info = env.step(np.zeros((2, 2)), env_ids=[0, 2])
+        self.assertEqual(obs.shape, (2, 30))
+        np.testing.assert_array_equal(done, [True, True])
+        np.testing.assert_array_equal(env.t, [0, 1, 0])
+        self.assertEqual(
+            sorted(info[0].keys()),
+            ["abs_accel", "speed", "terminal_observation", "v_eq",
+             "v_eq_frac", "v_eq_frac_final"])
+
     def test_set_length(self):
         """Validates the functionality of the _set_length method.
 
@@ -2319,6 +2400,100 @@ class TestRingNonFlow(unittest.TestCase):
              8.90890994, 10.27611265]
         )
 
+    def test_initial_state_store(self):
+        """Validates the functionality of the binary initial state store.
+
+        This is done for the following cases
+
+        1. the converted states match the states in the json file
+        2. the same initial states are chosen as with the json file
+        3. stores are shared by all environments within a process
+        """
+        tmp_dir = tempfile.mkdtemp()
+        path = convert_initial_states(
+            self._initial_state_path, os.path.join(tmp_dir, "ring-v0.npy"))
+        store = load_initial_states(path)
+
+        # test case 1
+        self.assertListEqual(
+            sorted(store.keys()), sorted(self._initial_state.keys()))
+        start, end = store._offsets[260]
+        np.testing.assert_almost_equal(
+            store.states[start:end], self._initial_state["260"])
+
+        # test case 2
+        set_seed(0)
+        pos, vel = RingEnv._set_initial_state(
+            length=260,
+            num_vehicles=22,
+            initial_state=store,
+            min_gap=0.5
+        )
+        set_seed(0)
+        expected_pos, expected_vel = RingEnv._set_initial_state(
+            length=260,
+            num_vehicles=22,
+            initial_state=self._initial_state,
+            min_gap=0.5
+        )
+        np.testing.assert_almost_equal(pos, expected_pos)
+        np.testing.assert_almost_equal(vel, expected_vel)
+
+        # test case 3
+        init_parameters = deepcopy(self._init_parameters)
+        init_parameters["initial_state"] = path
+        env1 = RingEnv(**init_parameters)
+        env2 = RingEnv(**init_parameters)
+        self.assertIs(env1.initial_state, store)
+        self.assertIs(env2.initial_state, store)
+
+        shutil.rmtree(tmp_dir)
+
+    def test_initial_state_store_fallback(self):
+        """Validates the temporary files of converted initial states.
+
+        The converted files cannot be written next to the json files, whose
+        paths are occupied by directories, and are therefore written to the
+        temporary directory. This is done for the following cases
+
+        1. json files with the same name do not share converted files
+        2. modified json files are converted again
+        """
+        tmp_dirs = [tempfile.mkdtemp() for _ in range(2)]
+        paths = []
+        for i, tmp_dir in enumerate(tmp_dirs):
+            path = os.path.abspath(os.path.join(tmp_dir, "ring-v0.json"))
+            with open(path, "w") as fp:
+                json.dump({str(260 + i): self._initial_state["260"][:2]}, fp)
+
+            # Occupy the path of the converted file next to the json file.
+            os.mkdir(os.path.join(tmp_dir, "ring-v0.npy"))
+            os.utime(os.path.join(tmp_dir, "ring-v0.npy"), (0, 0))
+            paths.append(path)
+
+        # test case 1
+        stores = [load_initial_states(path) for path in paths]
+        self.assertNotEqual(stores[0].path, stores[1].path)
+        self.assertListEqual(stores[0].keys(), ["260"])
+        self.assertListEqual(stores[1].keys(), ["261"])
+
+        # test case 2
+        with open(paths[0], "w") as fp:
+            json.dump({"262": self._initial_state["260"][:2]}, fp)
+        mtime = os.path.getmtime(stores[0].path) + 10
+        os.utime(paths[0], (mtime, mtime))
+        del _INITIAL_STATE_STORES[paths[0]]
+
+        store = load_initial_states(paths[0])
+        self.assertEqual(store.path, stores[0].path)
+        self.assertListEqual(store.keys(), ["262"])
+
+        for path in [stores[0].path, stores[1].path]:
+            os.remove(path)
+            os.remove(os.path.splitext(path)[0] + ".index.npz")
+        for tmp_dir in tmp_dirs:
+            shutil.rmtree(tmp_dir)
+
     def test_update_state(self):
         """Validates the functionality of the _update_state method.
 
@@ -271,6 +271,204 @@ class TestTD3FeedForwardPolicy(unittest.TestCase):
         # Kill the session,
         policy_params['sess'].close()
 
+    def test_get_action_batch(self):
+        """Check the functionality of the get_action_batch() method.
+
+        This test validates that the actions of multiple environments are
+        computed in a single call and match the outputs of get_action.
+        """
+        policy_params = deepcopy(self.policy_params)
+        policy_params['sess'] = tf.compat.v1.Session()
+        policy = TD3FeedForwardPolicy(**policy_params)
+
+        # Initialize the variables of the policy.
+        policy.sess.run(tf.compat.v1.global_variables_initializer())
+        policy.initialize()
+
+        obs = [np.array([[0., 1.]]),
+               np.array([[1., 2.]]),
+               np.array([[2., 3.]])]
+        context = [np.array([0., 1., 2.]) for _ in range(3)]
+
+        # Test the outputs from the policy.
+        actions = policy.get_action_batch(
+            obs, context,
+            apply_noise=False,
+            random_actions=False,
+            env_num=[0, 1, 2],
+        )
+        self.assertEqual(len(actions), 3)
+        for obs_i, context_i, action_i in zip(obs, context, actions):
+            self.assertEqual(action_i.shape, (1, 1))
+            np.testing.assert_almost_equal(
+                action_i,
+                policy.get_action(obs_i, context_i.reshape(1, -1),
+                                  apply_noise=False, random_actions=False))
+
+        # Test the outputs when sampling random actions.
+        actions = policy.get_action_batch(
+            obs, context,
+            apply_noise=False,
+            random_actions=True,
+            env_num=[0, 1, 2],
+        )
+        self.assertEqual([action_i.shape for action_i in actions],
+                         [(1, 1), (1, 1), (1, 1)])
+
+        # Kill the session,
+        policy_params['sess'].close()
+
+    def test_input_placeholders(self):
+        """Check that the input placeholders are only used for inference.
+
+        This is done for the following cases:
+
+        1. the phase and rate placeholders default to their testing values
+        2. operations that depend on the observation placeholder fail if it is
+           not fed, instead of consuming a batch from the input pipeline
+        """
+        policy_params = deepcopy(self.policy_params)
+        policy_params['sess'] = tf.compat.v1.Session()
+        policy = TD3FeedForwardPolicy(**policy_params)
+
+        # Initialize the variables of the policy.
+        policy.sess.run(tf.compat.v1.global_variables_initializer())
+
+        # test case 1
+        self.assertFalse(policy.sess.run(policy.phase_ph))
+        self.assertAlmostEqual(policy.sess.run(policy.rate_ph), 0.)
+
+        # test case 2
+        self.assertRaises(
+            tf.errors.InvalidArgumentError,
+            policy.sess.run, policy.actor_tf)
+
+        # Kill the session,
+        policy_params['sess'].close()
+
+    def test_update_input_pipeline(self):
+        """Check the functionality of the update() method.
+
+        This test validates that the update step that samples its batch via
+        the input pipeline results in the same TD errors and parameters as the
+        update step from the same batch via update_from_batch.
+        """
+        results = []
+        for use_pipeline in [False, True]:
+            with tf.Graph().as_default():
+                tf.compat.v1.set_random_seed(0)
+
+                policy_params = deepcopy(self.policy_params)
+                policy_params['sess'] = tf.compat.v1.Session()
+                policy_params['batch_size'] = 4
+                policy_params['target_policy_noise'] = 0.
+                policy_params['prioritized_replay'] = True
+                policy = TD3FeedForwardPolicy(**policy_params)
+
+                policy.sess.run(tf.compat.v1.global_variables_initializer())
+                policy.initialize()
+
+                np.random.seed(0)
+                for _ in range(10):
+                    policy.replay_buffer.add(
+                        obs_t=np.random.uniform(size=5),
+                        action=np.random.uniform(-1, 1, size=1),
+                        reward=np.random.uniform(),
+                        obs_tp1=np.random.uniform(size=5),
+                        done=0.,
+                    )
+
+                if use_pipeline:
+                    policy.update()
+                else:
+                    obs0, actions, rewards, obs1, done1, weights, idxes = \
+                        policy.replay_buffer.sample(with_weights=True)
+                    td_error = policy.update_from_batch(
+                        obs0, actions, rewards, obs1, done1, weights=weights)
+                    policy.replay_buffer.update_priorities(idxes, td_error)
+
+                results.append((
+                    policy.replay_buffer._it_sum[np.arange(10)],
+                    policy.sess.run(get_trainable_vars()),
+                ))
+
+                # Kill the session,
+                policy_params['sess'].close()
+
+        (priorities, params), (pipeline_priorities, pipeline_params) = results
+        np.testing.assert_almost_equal(priorities, pipeline_priorities, 5)
+        for param, pipeline_param in zip(params, pipeline_params):
+            np.testing.assert_almost_equal(param, pipeline_param, 5)
+
+    def test_update_fused(self):
+        """Check the functionality of the fused training operations.
+
+        This test validates that the fused training steps result in the same
+        TD errors and parameters as the same number of separate training
+        steps, when the actor and target networks are updated as well as
+        otherwise.
+        """
+        np.random.seed(0)
+        batches = [(
+            np.random.uniform(size=(4, 5)),
+            np.random.uniform(-1, 1, size=(4, 1)),
+            np.random.uniform(size=4),
+            np.random.uniform(size=(4, 5)),
+            np.random.randint(2, size=4),
+        ) for _ in range(3)]
+
+        for update_actor in [True, False]:
+            results = []
+            for fused_update in [False, True]:
+                with tf.Graph().as_default():
+                    tf.compat.v1.set_random_seed(0)
+
+                    policy_params = deepcopy(self.policy_params)
+                    policy_params['sess'] = tf.compat.v1.Session()
+                    policy_params['target_policy_noise'] = 0.
+                    policy_params['fused_update'] = fused_update
+                    policy = TD3FeedForwardPolicy(**policy_params)
+
+                    policy.sess.run(
+                        tf.compat.v1.global_variables_initializer())
+                    policy.initialize()
+
+                    if fused_update:
+                        obs0, actions, rewards, obs1, terminals1 = [
+                            np.stack([batch[i] for batch in batches])
+                            for i in range(5)]
+                        td_error = policy.sess.run(
+                            policy.fused_td_error[update_actor],
+                            feed_dict={
+                                policy.fused_obs_ph: obs0,
+                                policy.fused_action_ph: actions,
+                                policy.fused_rew_ph:
+                                    rewards.reshape(3, -1, 1),
+                                policy.fused_obs1_ph: obs1,
+                                policy.fused_terminals1:
+                                    terminals1.reshape(3, -1, 1),
+                                policy.phase_ph: 1,
+                                policy.rate_ph: 0.5,
+                            })
+                    else:
+                        td_error = [
+                            policy.update_from_batch(
+                                *batch, update_actor=update_actor)
+                            for batch in batches]
+
+                    results.append((
+                        np.asarray(td_error),
+                        policy.sess.run(get_trainable_vars()),
+                    ))
+
+                    # Kill the session,
+                    policy_params['sess'].close()
+
+            (td_error, params), (fused_td_error, fused_params) = results
+            np.testing.assert_almost_equal(td_error, fused_td_error, 5)
+            for param, fused_param in zip(params, fused_params):
+                np.testing.assert_almost_equal(param, fused_param, 5)
+
 
 class TestSACFeedForwardPolicy(unittest.TestCase):
     """Test FeedForwardPolicy in hbaselines/fcnet/sac.py."""
@@ -513,6 +711,34 @@ class TestSACFeedForwardPolicy(unittest.TestCase):
         # Kill the session,
         policy_params['sess'].close()
 
+    def test_input_placeholders(self):
+        """Check that the input placeholders are only used for inference.
+
+        This is done for the following cases:
+
+        1. the phase and rate placeholders default to their testing values
+        2. operations that depend on the observation placeholder fail if it is
+           not fed, instead of consuming a batch from the input pipeline
+        """
+        policy_params = deepcopy(self.policy_params)
+        policy_params['sess'] = tf.compat.v1.Session()
+        policy = SACFeedForwardPolicy(**policy_params)
+
+        # Initialize the variables of the policy.
+        policy.sess.run(tf.compat.v1.global_variables_initializer())
+
+        # test case 1
+        self.assertFalse(policy.sess.run(policy.phase_ph))
+        self.assertAlmostEqual(policy.sess.run(policy.rate_ph), 0.)
+
+        # test case 2
+        self.assertRaises(
+            tf.errors.InvalidArgumentError,
+            policy.sess.run, policy.deterministic_action)
+
+        # Kill the session,
+        policy_params['sess'].close()
+
 
 class TestPPOFeedForwardPolicy(unittest.TestCase):
     """Test FeedForwardPolicy in hbaselines/fcnet/ppo.py."""
@@ -630,6 +856,78 @@ class TestPPOFeedForwardPolicy(unittest.TestCase):
         # Kill the session,
         policy_params['sess'].close()
 
+    def test_update_values(self):
+        """Validate the values and log-likelihoods computed within update.
+
+        The rollout buffer is filled by two environments with different numbers
+        of steps. This method tests that:
+
+        1. the batched values and negative log-likelihoods match those
+           computed for every sample individually
+        2. the negative log-likelihoods score the stored actions
+        """
+        policy_params = deepcopy(self.policy_params)
+        policy_params['sess'] = tf.compat.v1.Session()
+        policy_params['num_envs'] = 2
+        policy_params['n_minibatches'] = 1
+        policy_params['n_opt_epochs'] = 1
+        policy = PPOFeedForwardPolicy(**policy_params)
+
+        # Initialize the variables of the policy.
+        policy.sess.run(tf.compat.v1.global_variables_initializer())
+        policy.initialize()
+
+        values, neglogps, expected_neglogps = [], [], []
+        for env_num, num_steps in [(0, 3), (1, 5)]:
+            for step in range(num_steps):
+                obs0 = np.random.uniform(-2, 2, 2)
+                context0 = np.random.uniform(-3, 3, 3)
+                action = np.random.uniform(-1, 1, 1)
+
+                policy.store_transition(
+                    obs0=obs0,
+                    context0=context0,
+                    action=action,
+                    reward=float(step),
+                    obs1=np.random.uniform(-2, 2, 2),
+                    context1=context0,
+                    done=False,
+                    is_final_step=False,
+                    env_num=env_num,
+                )
+
+                # Compute the terms of the sample individually.
+                value, neglogp, pi_mean, pi_logstd = policy.sess.run(
+                    [policy.value_flat, policy.neglogp, policy.pi_mean,
+                     policy.pi_logstd],
+                    feed_dict={
+                        policy.obs_ph: policy._get_obs(
+                            obs0[None], context0[None], axis=1),
+                        policy.action_ph: action[None],
+                        policy.phase_ph: 0,
+                        policy.rate_ph: 0.0,
+                    })
+                values.append(value[0])
+                neglogps.append(neglogp[0])
+                expected_neglogps.append(
+                    0.5 * np.sum(np.square(
+                        (action - pi_mean) / np.exp(pi_logstd)))
+                    + 0.5 * np.log(2.0 * np.pi) + np.sum(pi_logstd))
+
+        policy.update()
+
+        # test case 1
+        np.testing.assert_almost_equal(policy.mb_values, values, decimal=5)
+        np.testing.assert_almost_equal(
+            policy.mb_neglogpacs, neglogps, decimal=5)
+
+        # test case 2
+        np.testing.assert_almost_equal(
+            policy.mb_neglogpacs, expected_neglogps, decimal=4)
+
+        # Kill the session,
+        policy_params['sess'].close()
+
 
 class TestTRPOFeedForwardPolicy(unittest.TestCase):
     """Test FeedForwardPolicy in hbaselines/fcnet/trpo.py."""
@@ -711,6 +1009,9 @@ class TestTRPOFeedForwardPolicy(unittest.TestCase):
         self.assertEqual(
             tuple(v.__int__() for v in policy.old_vpred_ph.shape),
             (None,))
+        self.assertEqual(
+            tuple(v.__int__() for v in policy.fisher_obs_ph.shape),
+            (None, 5))
 
         # Kill the session,
         policy_params['sess'].close()
@@ -807,6 +807,26 @@ class TestBaseGoalConditionedPolicy(unittest.TestCase):
             -2.2360679775221506
         )
 
+    def test_intrinsic_rewards_batch(self):
+        """Validate the intrinsic rewards of a batch of transitions.
+
+        The rewards computed for a batch of transitions should match the
+        rewards of the transitions computed one at a time.
+        """
+        policy_params = self.policy_params.copy()
+        policy_params["intrinsic_reward_type"] = "scaled_exp_negative_distance"
+        policy = TD3GoalConditionedPolicy(**policy_params)
+
+        states = np.array([[1, 2], [3, 4], [5, 6]])
+        goals = np.array([[4, 5], [0, 1], [5, 6]])
+        next_states = np.array([[7, 8], [1, 2], [5, 6]])
+
+        np.testing.assert_almost_equal(
+            policy.intrinsic_reward_fn(states, goals, next_states),
+            [policy.intrinsic_reward_fn(states[i], goals[i], next_states[i])
+             for i in range(3)]
+        )
+
     def test_sample_best_meta_action(self):
         """Check the functionality of the _sample_best_meta_action() method."""
         pass  # TODO
@@ -1555,8 +1575,64 @@ class TestTD3GoalConditionedPolicy(unittest.TestCase):
             np.testing.assert_almost_equal(model_val, target_val)
 
     def test_log_probs(self):
-        """Check the functionality of the log_probs() method."""
-        pass  # TODO
+        """Check the functionality of the log_probs() method.
+
+        This test checks for the following features:
+
+        1. that the fitness of every candidate goal matches the negative
+           squared error between the worker actions and the actions computed
+           by the worker policy, summed over the meta period
+        2. that _sample_best_meta_action returns the candidate goals with the
+           highest fitness
+        """
+        policy_params = self.policy_params.copy()
+        policy_params['num_levels'] = 2
+        policy_params['off_policy_corrections'] = True
+        policy = TD3GoalConditionedPolicy(**policy_params)
+        policy.sess.run(tf.compat.v1.global_variables_initializer())
+
+        batch_size, goal_dim, num_samples, meta_period = 3, 2, 4, 5
+        meta_actions = np.random.uniform(
+            size=(batch_size, goal_dim, num_samples))
+        worker_obses = np.random.uniform(
+            size=(batch_size, 2 + goal_dim, meta_period + 1))
+        worker_actions = np.random.uniform(
+            size=(batch_size, 1, meta_period))
+
+        # test case 1
+        fitness = policy._log_probs(
+            meta_actions, worker_obses, worker_actions)
+        self.assertTupleEqual(fitness.shape, (batch_size, num_samples))
+
+        for i in range(batch_size):
+            for j in range(num_samples):
+                pred_actions = policy.policy[-1].get_action(
+                    worker_obses[i, :2, :-1].T,
+                    np.tile(meta_actions[i, :, j], (meta_period, 1)),
+                    apply_noise=False,
+                    random_actions=False,
+                )
+                self.assertAlmostEqual(
+                    fitness[i, j],
+                    -np.sum(np.square(worker_actions[i].T - pred_actions)),
+                    places=5)
+
+        # test case 2
+        meta_obs0 = np.random.uniform(size=(batch_size, 2))
+        meta_obs1 = np.random.uniform(size=(batch_size, 2))
+        meta_action = np.random.uniform(size=(batch_size, goal_dim))
+
+        np.random.seed(0)
+        best_goals = policy._sample_best_meta_action(
+            meta_obs0, meta_obs1, meta_action, worker_obses, worker_actions,
+            k=num_samples)
+        np.random.seed(0)
+        candidates = policy._sample(
+            meta_obs0, meta_obs1, meta_action, num_samples)
+        fitness = policy._log_probs(candidates, worker_obses, worker_actions)
+        np.testing.assert_array_almost_equal(
+            best_goals,
+            candidates[np.arange(batch_size), :, np.argmax(fitness, 1)])
 
     def test_cooperative_gradients(self):
         """Check the functionality of the cooperative-gradients feature."""
@@ -258,6 +258,48 @@ class TestMultiAgentPolicy(unittest.TestCase):
             [0., 0., 0., 0., 0., 0., 0., 0.]
         )
 
+    def test_get_action_shared(self):
+        """Check the functionality of the get_action() method.
+
+        This test checks that the actions of all agents of a shared policy,
+        which are computed in a single call to the policy, match the actions
+        computed for each agent individually.
+        """
+        policy_params = self.policy_params_shared.copy()
+        policy_params["maddpg"] = False
+        policy_params["n_agents"] = 2
+        policy = TD3MultiFeedForwardPolicy(**policy_params)
+
+        # Initialize the variables of the policy.
+        policy.sess.run(tf.compat.v1.global_variables_initializer())
+
+        # Run the initialize method.
+        policy.initialize()
+
+        obs = {"a": np.array([[0., 1., 2.]]), "b": np.array([[3., 4., 5.]])}
+        context = {"a": np.array([0., 1.]), "b": np.array([2., 3.])}
+
+        actions = policy.get_action(
+            obs=obs,
+            context=context,
+            apply_noise=False,
+            random_actions=False,
+            env_num=0,
+        )
+
+        self.assertListEqual(sorted(actions.keys()), ["a", "b"])
+        for key in ["a", "b"]:
+            np.testing.assert_almost_equal(
+                actions[key],
+                policy.agents["policy"].get_action(
+                    obs=obs[key],
+                    context=context[key][None],
+                    apply_noise=False,
+                    random_actions=False,
+                ),
+                decimal=5,
+            )
+
     def test_update_agent_index(self):
         """Validates the functionality of the _update_agent_index method.
 
@@ -301,6 +343,13 @@ class TestMultiAgentPolicy(unittest.TestCase):
         # test case 2                                                         #
         # =================================================================== #
 
+        # Add memory to the agents that are removed in the next step ("a" in
+        # the first environment and "b" in the second), and to an agent that
+        # remains ("b" in the first environment).
+        agent = policy.agents["policy"]
+        for num in [0, 1, 5]:
+            agent._observations[num] = [policy.ob_space.sample()]
+
         policy._update_agent_index(
             obs={
                 "b": policy.ob_space.sample(),
@@ -319,6 +368,10 @@ class TestMultiAgentPolicy(unittest.TestCase):
         self.assertEqual(policy._agent_index[0], {'b': 1, 'c': 0})
         self.assertEqual(policy._agent_index[1], {'c': 1, 'd': 0})
 
+        self.assertEqual(agent._observations[0], [])
+        self.assertEqual(agent._observations[5], [])
+        self.assertEqual(len(agent._observations[1]), 1)
+
 
 class TestTD3MultiFeedForwardPolicy(unittest.TestCase):
     """Test MultiFeedForwardPolicy in hbaselines/multiagent/td3.py."""
@@ -1506,6 +1559,74 @@ class TestTD3MultiFeedForwardPolicy(unittest.TestCase):
                       [3., 3., 3., 3., 3., 3., 3., 3., 3., 3.]])
         )
 
+    def test_update_joint(self):
+        """Validate the functionality of the joint update procedure.
+
+        This test checks that the joint update is only enabled for independent
+        MADDPG policies, and that a single call to update modifies the
+        parameters of every agent.
+        """
+        policy_params = self.policy_params_shared.copy()
+        policy_params["maddpg"] = True
+        policy_params["n_agents"] = 2
+        policy_params["joint_update"] = True
+        policy = TD3MultiFeedForwardPolicy(**policy_params)
+        self.assertFalse(policy.joint_update)
+
+        # Clear the graph.
+        tf.compat.v1.reset_default_graph()
+        self.sess.close()
+        self.sess = tf.compat.v1.Session()
+
+        policy_params = self.policy_params_independent.copy()
+        policy_params["sess"] = self.sess
+        policy_params["maddpg"] = True
+        policy_params["joint_update"] = True
+        policy_params["batch_size"] = 4
+        policy = TD3MultiFeedForwardPolicy(**policy_params)
+        self.assertTrue(policy.joint_update)
+
+        # Initialize the variables of the policy.
+        policy.sess.run(tf.compat.v1.global_variables_initializer())
+        policy.initialize()
+
+        for i in range(4):
+            policy.store_transition(
+                obs0={"a": np.array([i for _ in range(5)]),
+                      "b": np.array([i for _ in range(6)])},
+                context0={"a": np.array([i for _ in range(3)]),
+                          "b": np.array([i for _ in range(4)])},
+                action={"a": np.array([i for _ in range(1)]),
+                        "b": np.array([i for _ in range(2)])},
+                reward={"a": i, "b": i},
+                obs1={"a": np.array([i+1 for _ in range(5)]),
+                      "b": np.array([i+1 for _ in range(6)])},
+                context1={"a": np.array([i for _ in range(3)]),
+                          "b": np.array([i for _ in range(4)])},
+                done={"a": False, "b": False, "__all__": False},
+                is_final_step=False,
+                evaluate=False,
+                env_num=0,
+                all_obs0=np.array([i for _ in range(18)]),
+                all_obs1=np.array([i+1 for _ in range(18)]),
+            )
+
+        var_list = [
+            'a/model/pi/output/kernel:0',
+            'a/model/qf_0/qf_output/kernel:0',
+            'b/model/pi/output/kernel:0',
+            'b/model/qf_0/qf_output/kernel:0',
+        ]
+        with tf.compat.v1.variable_scope(
+                tf.compat.v1.get_variable_scope(), reuse=True):
+            before = policy.sess.run(var_list)
+            policy.update()
+            after = policy.sess.run(var_list)
+
+        # The actor and critic of every agent should have been updated.
+        for val_before, val_after in zip(before, after):
+            self.assertFalse(np.allclose(val_before, val_after))
+
 
 class TestSACMultiFeedForwardPolicy(unittest.TestCase):
     """Test MultiFeedForwardPolicy in hbaselines/multiagent/sac.py."""
@@ -1,11 +1,16 @@
 import unittest
-import random
+import shutil
+import tempfile
+import os
 import numpy as np
 
 from hbaselines.fcnet.replay_buffer import ReplayBuffer
+from hbaselines.fcnet.replay_buffer import PrioritizedReplayBuffer
+from hbaselines.fcnet.replay_buffer import RolloutBuffer
 from hbaselines.goal_conditioned.replay_buffer import HierReplayBuffer
 from hbaselines.multiagent.replay_buffer import MultiReplayBuffer
 from hbaselines.multiagent.replay_buffer import SharedReplayBuffer
+from hbaselines.multiagent.replay_buffer import sample_joint
 
 
 class TestReplayBuffer(unittest.TestCase):
@@ -59,6 +64,402 @@ class TestReplayBuffer(unittest.TestCase):
         np.testing.assert_array_almost_equal(obs_tp1, [[3]])
         np.testing.assert_array_almost_equal(done, [False])
 
+    def test_add_batch(self):
+        """Test the `add_batch` method the replay buffer.
+
+        The content of the buffer after adding a batch of samples that wraps
+        around the end of the buffer matches the content after adding the
+        same samples one at a time.
+        """
+        replay_buffer = ReplayBuffer(
+            buffer_size=5, batch_size=1, obs_dim=2, ac_dim=1)
+        batch_buffer = ReplayBuffer(
+            buffer_size=5, batch_size=1, obs_dim=2, ac_dim=1)
+
+        # Samples of two agents, the first of which continue each other.
+        obs_t = np.array([[0, 0], [5, 5], [1, 1], [6, 6]])
+        action = np.array([[0], [1], [2], [3]])
+        reward = np.array([0, 1, 2, 3])
+        obs_tp1 = np.array([[1, 1], [6, 6], [2, 2], [7, 7]])
+        done = np.array([0, 0, 0, 1])
+
+        for k in range(3):
+            replay_buffer.add(obs_t[k], action[k], reward[k], obs_tp1[k],
+                              done[k])
+        batch_buffer.add_batch(obs_t[:3], action[:3], reward[:3],
+                               obs_tp1[:3], done[:3])
+
+        for k in range(4):
+            replay_buffer.add(obs_t[k], action[k], reward[k], obs_tp1[k],
+                              done[k])
+        batch_buffer.add_batch(obs_t, action, reward, obs_tp1, done)
+
+        self.assertEqual(len(batch_buffer), 5)
+        self.assertEqual(batch_buffer._next_idx, 2)
+        self.assertEqual(batch_buffer._current_idx, 1)
+
+        idxes = np.arange(5)
+        for expected, actual in zip(replay_buffer._encode_sample(idxes),
+                                    batch_buffer._encode_sample(idxes)):
+            np.testing.assert_array_almost_equal(expected, actual)
+
+
+class TestNextObservations(unittest.TestCase):
+    """Tests for the sequential-frame layout of the ReplayBuffer object."""
+
+    def test_next_obs(self):
+        """Validate that the next observations are reconstructed correctly.
+
+        This is done for a buffer containing two episodes, in which only the
+        next observations of the last transition of every completed episode
+        should be stored in the side table, and those of the most recent
+        transition should be pending. The buffer is then filled past its
+        capacity to check that overwritten elements are handled properly.
+        """
+        replay_buffer = ReplayBuffer(
+            buffer_size=4, batch_size=4, obs_dim=1, ac_dim=1)
+
+        # Add an episode of length 2, and part of an episode of length 2. The
+        # observations are not exactly representable as float32 values.
+        for obs_t, obs_tp1 in [(0, 1), (1, 2), (10, 11), (11, 12)]:
+            replay_buffer.add(
+                obs_t=np.array([obs_t / 10.]),
+                action=np.array([0]),
+                reward=0,
+                obs_tp1=np.array([obs_tp1 / 10.]),
+                done=False
+            )
+
+        self.assertListEqual(sorted(replay_buffer.next_obs.table.keys()),
+                             [1])
+        self.assertEqual(replay_buffer.next_obs.pending[0][0], 3)
+        np.testing.assert_array_equal(
+            replay_buffer.next_obs.next_idx, [1, -1, 3, -1])
+        obs_t, _, _, obs_tp1, _ = replay_buffer._encode_sample(
+            np.array([0, 1, 2, 3]))
+        np.testing.assert_array_almost_equal(
+            obs_t[:, 0], [0., 0.1, 1., 1.1])
+        np.testing.assert_array_almost_equal(
+            obs_tp1[:, 0], [0.1, 0.2, 1.1, 1.2])
+
+        # Continue the last episode, overwriting the first element.
+        replay_buffer.add(
+            obs_t=np.array([1.2]),
+            action=np.array([0]),
+            reward=0,
+            obs_tp1=np.array([1.3]),
+            done=False
+        )
+
+        self.assertListEqual(sorted(replay_buffer.next_obs.table.keys()),
+                             [1])
+        self.assertEqual(replay_buffer.next_obs.pending[0][0], 0)
+        np.testing.assert_array_equal(
+            replay_buffer.next_obs.next_idx, [-1, -1, 3, 0])
+        obs_t, _, _, obs_tp1, _ = replay_buffer._encode_sample(
+            np.array([0, 1, 2, 3]))
+        np.testing.assert_array_almost_equal(
+            obs_t[:, 0], [1.2, 0.1, 1., 1.1])
+        np.testing.assert_array_almost_equal(
+            obs_tp1[:, 0], [1.3, 0.2, 1.1, 1.2])
+
+    def test_next_obs_interleaved(self):
+        """Validate the layout for transitions of interleaved environments.
+
+        The transitions of four environments are added in an interleaved
+        order, with one and two batches of transitions, and with episodes
+        that end at different steps. Only the next observations of the last
+        transition of every completed episode should be stored in the side
+        table.
+        """
+        num_envs = 4
+        replay_buffer = ReplayBuffer(
+            buffer_size=64, batch_size=4, obs_dim=2, ac_dim=1)
+
+        obs_t, obs_tp1 = [], []
+        for step in range(12):
+            obs0 = np.array([[env, step % (env + 3)]
+                             for env in range(num_envs)], dtype=np.float32)
+            obs1 = np.array([[env, step % (env + 3) + 1]
+                             for env in range(num_envs)], dtype=np.float32)
+            # Reset the episodes at the end of their period.
+            obs1[:, 1] = np.where(
+                obs1[:, 1] == np.arange(num_envs) + 3, -1, obs1[:, 1])
+            obs_t.append(obs0)
+            obs_tp1.append(obs1)
+
+            if step % 2 == 0:
+                for env in range(num_envs):
+                    replay_buffer.add(
+                        obs_t=obs0[env],
+                        action=np.array([0]),
+                        reward=0,
+                        obs_tp1=obs1[env],
+                        done=False,
+                        env_num=env,
+                    )
+            else:
+                replay_buffer.add_batch(
+                    obs_t=obs0,
+                    action=np.zeros((num_envs, 1)),
+                    reward=np.zeros(num_envs),
+                    obs_tp1=obs1,
+                    done=np.zeros(num_envs),
+                    env_num=np.arange(num_envs),
+                )
+
+        # Check that only the ends of the completed episodes are stored. The
+        # episodes that end at the last step are still pending.
+        num_episodes = sum(11 // (env + 3) for env in range(num_envs))
+        self.assertEqual(len(replay_buffer.next_obs.table), num_episodes)
+        self.assertEqual(len(replay_buffer.next_obs.pending), num_envs)
+
+        # Check that all next observations are reconstructed correctly.
+        idxes = np.arange(12 * num_envs)
+        obs0, _, _, obs1, _ = replay_buffer._encode_sample(idxes)
+        np.testing.assert_array_almost_equal(obs0, np.concatenate(obs_t))
+        np.testing.assert_array_almost_equal(obs1, np.concatenate(obs_tp1))
+
+    def test_next_obs_overwrite(self):
+        """Check the pending next observations when the buffer wraps around.
+
+        Two batches of transitions are added after a single transition, so
+        that the oldest transitions are overwritten by the second batch. The
+        pending next observations should be stored in the same arrays as long
+        as the episode continues.
+        """
+        replay_buffer = ReplayBuffer(
+            buffer_size=4, batch_size=4, obs_dim=1, ac_dim=1)
+
+        replay_buffer.add(
+            obs_t=np.array([0]),
+            action=np.array([0]),
+            reward=0,
+            obs_tp1=np.array([1]),
+            done=False,
+        )
+        pending_obs = replay_buffer.next_obs.pending[0][1]
+
+        for start in [1, 4]:
+            replay_buffer.add_batch(
+                obs_t=np.arange(start, start + 3).reshape(3, 1),
+                action=np.zeros((3, 1)),
+                reward=np.zeros(3),
+                obs_tp1=np.arange(start + 1, start + 4).reshape(3, 1),
+                done=np.zeros(3),
+            )
+
+        # Check that the episode continues in the same arrays.
+        self.assertEqual(replay_buffer.next_obs.table, {})
+        self.assertEqual(replay_buffer.next_obs.pending[0][0], 2)
+        self.assertIs(replay_buffer.next_obs.pending[0][1], pending_obs)
+        np.testing.assert_array_almost_equal(pending_obs[0], [7])
+
+        # Check that the next observations of the remaining transitions are
+        # reconstructed correctly.
+        obs0, _, _, obs1, _ = replay_buffer._encode_sample(np.arange(4))
+        np.testing.assert_array_almost_equal(obs0, [[4], [5], [6], [3]])
+        np.testing.assert_array_almost_equal(obs1, [[5], [6], [7], [4]])
+
+
+class TestMemmapReplayBuffer(unittest.TestCase):
+    """Tests for the ReplayBuffer object with memory-mapped storage."""
+
+    def setUp(self):
+        self.storage_path = tempfile.mkdtemp()
+        self.replay_buffer = ReplayBuffer(
+            buffer_size=4,
+            batch_size=2,
+            obs_dim=1,
+            ac_dim=1,
+            storage_path=os.path.join(self.storage_path, "rb"))
+
+    def tearDown(self):
+        del self.replay_buffer
+        shutil.rmtree(self.storage_path)
+
+    def test_reopen(self):
+        """Validate that a saved buffer can be reopened in place.
+
+        The content of the buffer should be restored from the memory-mapped
+        files, with only the configuration stored in the checkpoint.
+        """
+        # Add the elements.
+        for i in range(3):
+            self.replay_buffer.add(
+                obs_t=np.array([i]),
+                action=np.array([i]),
+                reward=i,
+                obs_tp1=np.array([i + 1]),
+                done=False
+            )
+
+        save_path = os.path.join(self.storage_path, "ckpt")
+        self.replay_buffer.save(save_path)
+        self.assertFalse(os.path.exists(save_path + ".obs_t.npy"))
+
+        # Reopen the buffer from the same directory.
+        replay_buffer = ReplayBuffer(
+            buffer_size=4,
+            batch_size=2,
+            obs_dim=1,
+            ac_dim=1,
+            storage_path=os.path.join(self.storage_path, "rb"))
+        replay_buffer.load(save_path)
+
+        self.assertEqual(len(replay_buffer), 3)
+        np.testing.assert_array_almost_equal(
+            replay_buffer.reward, [0, 1, 2, 0])
+        np.testing.assert_array_almost_equal(
+            replay_buffer.obs_t[:, 0], [0, 1, 2, 0])
+
+        # Sampled indices are sorted before being read.
+        obs_t, _, _, _, _ = replay_buffer.sample()
+        self.assertTrue(obs_t[0, 0] <= obs_t[1, 0])
+
+
+class TestReducedPrecisionReplayBuffer(unittest.TestCase):
+    """Tests for the ReplayBuffer object with reduced-precision storage."""
+
+    def setUp(self):
+        self.replay_buffer = ReplayBuffer(
+            buffer_size=2,
+            batch_size=2,
+            obs_dim=3,
+            ac_dim=1,
+            storage_dtype={"obs_t": [(2, "uint8"), (None, "float16")]})
+
+    def tearDown(self):
+        del self.replay_buffer
+
+    def test_storage(self):
+        """Validate the storage and sampling of quantized observations.
+
+        The first two elements of the observations are quantized to uint8,
+        and the last element is stored as float16. Sampled observations are
+        converted back to float32.
+        """
+        obs_t = self.replay_buffer.obs_t
+        self.assertEqual(obs_t.shape, (2, 3))
+        self.assertEqual(obs_t.arrays[0].dtype, np.uint8)
+        self.assertEqual(obs_t.arrays[1].dtype, np.float16)
+
+        self.replay_buffer.add(
+            obs_t=np.array([0.5, 2., 1/3]),
+            action=np.array([0]),
+            reward=0,
+            obs_tp1=np.array([0., 1., 2/3]),
+            done=False
+        )
+        self.replay_buffer.add(
+            obs_t=np.array([0., 1., 2/3]),
+            action=np.array([1]),
+            reward=1,
+            obs_tp1=np.array([1., 0., 1.]),
+            done=True
+        )
+
+        np.testing.assert_array_equal(obs_t.arrays[0], [[128, 255], [0, 255]])
+        np.testing.assert_array_almost_equal(
+            obs_t[:, 2], [1/3, 2/3], decimal=3)
+
+        obs0, _, _, obs1, _ = self.replay_buffer._encode_sample(
+            np.array([0, 1]))
+        self.assertEqual(obs0.dtype, np.float32)
+        self.assertEqual(obs1.dtype, np.float32)
+
+        # The next observations of the first transition are read from the
+        # quantized observations of the second.
+        np.testing.assert_array_almost_equal(obs0[:, 0], [128/255, 0])
+        np.testing.assert_array_almost_equal(obs1[:, 0], [0, 1])
+
+
+class TestPrioritizedReplayBuffer(unittest.TestCase):
+    """Tests for the PrioritizedReplayBuffer object."""
+
+    def setUp(self):
+        self.replay_buffer = PrioritizedReplayBuffer(
+            buffer_size=4, batch_size=2, obs_dim=1, ac_dim=1)
+
+        # Add the elements.
+        for i in range(4):
+            self.replay_buffer.add(
+                obs_t=np.array([i]),
+                action=np.array([i]),
+                reward=i,
+                obs_tp1=np.array([i + 1]),
+                done=False
+            )
+
+    def tearDown(self):
+        del self.replay_buffer
+
+    def test_sample_weights(self):
+        """Validate the weights and indices returned by `sample`.
+
+        New elements are assigned the maximum priority, so all weights are
+        initially one.
+        """
+        obs_t, actions_t, rewards, obs_tp1, done, weights, idxes = \
+            self.replay_buffer.sample(with_weights=True)
+
+        np.testing.assert_array_almost_equal(obs_t[:, 0], idxes)
+        np.testing.assert_array_almost_equal(rewards, idxes)
+        np.testing.assert_array_almost_equal(weights, [1., 1.])
+
+    def test_update_priorities(self):
+        """Validate the functionality of the `update_priorities` method.
+
+        Once all but one element are assigned a (near) zero priority, only
+        the remaining element should be sampled, with a weight smaller than
+        one.
+        """
+        self.replay_buffer.update_priorities(
+            np.array([0, 1, 2, 3]), np.array([0., 0., 5., 0.]))
+
+        np.random.seed(0)
+        _, _, rewards, _, _, weights, idxes = \
+            self.replay_buffer.sample(with_weights=True)
+
+        np.testing.assert_array_equal(idxes, [2, 2])
+        np.testing.assert_array_almost_equal(rewards, [2, 2])
+        self.assertTrue(all(weights < 1))
+
+
+class TestRolloutBuffer(unittest.TestCase):
+    """Tests for the RolloutBuffer object."""
+
+    def test_add_get(self):
+        """Validate the functionality of the `add` and `get` methods.
+
+        The capacity is doubled once it is exceeded by one environment, and
+        the samples of the environments are returned with the steps along the
+        second axis.
+        """
+        rollout_buffer = RolloutBuffer(num_envs=3, capacity=2)
+
+        for i in range(3):
+            rollout_buffer.add(0, obs=np.array([i, i]), reward=i)
+        rollout_buffer.add(2, obs=np.array([5, 5]), reward=5)
+
+        self.assertEqual(rollout_buffer.capacity, 4)
+        self.assertEqual(rollout_buffer.storage["obs"].shape, (3, 4, 2))
+
+        samples, num_steps = rollout_buffer.get([0, 2])
+        np.testing.assert_array_equal(num_steps, [3, 1])
+        np.testing.assert_array_almost_equal(
+            samples["obs"][0], [[0, 0], [1, 1], [2, 2]])
+        np.testing.assert_array_almost_equal(samples["obs"][1, 0], [5, 5])
+        np.testing.assert_array_almost_equal(samples["reward"][0], [0, 1, 2])
+
+        # The samples are overwritten once the storage is cleared.
+        rollout_buffer.clear()
+        rollout_buffer.add(2, obs=np.array([6, 6]), reward=6)
+
+        samples, num_steps = rollout_buffer.get([2])
+        np.testing.assert_array_equal(num_steps, [1])
+        np.testing.assert_array_almost_equal(samples["obs"], [[[6, 6]]])
+
 
 class TestHierReplayBuffer(unittest.TestCase):
     """Tests for the HierReplayBuffer object."""
@@ -84,8 +485,17 @@ class TestHierReplayBuffer(unittest.TestCase):
 
     def test_add_sample(self):
         """Test the `add` and `sample` methods the replay buffer."""
-        # Set the random seed.
-        random.seed(0)
+        # Set the random seed of the replay buffer.
+        self.replay_buffer.rng = np.random.RandomState(0)
+
+        # Compute the time steps that are sampled by the replay buffer. Each
+        # call to `sample` draws the sample indices, followed by the time
+        # steps within the samples of 9 environment steps.
+        rng = np.random.RandomState(0)
+        sample_time = []
+        for _ in range(2):
+            rng.randint(0, 2, size=1)
+            sample_time.append(int(rng.uniform() * 8))
 
         obs_t = [np.array([0]), np.array([1]), np.array([2]),
                  np.array([3]), np.array([4]), np.array([5]),
@@ -133,51 +543,220 @@ class TestHierReplayBuffer(unittest.TestCase):
         # Check can_sample in the True case.
         self.assertEqual(self.replay_buffer.can_sample(), True)
 
-        # Test the `sample` method.
+        # Test the `sample` method. The observations, actions, and rewards
+        # of every step are equal to the time step, and the contexts of the
+        # lower levels are the actions of the level above them. The middle
+        # level is sampled at the start of the meta period of the time step.
+        t = sample_time[0]
+        t_meta = t - t % 3
         obs0, obs1, act, rew, done, _ = self.replay_buffer.sample(False)
         np.testing.assert_array_almost_equal(obs0[0], [[0, 0]])
-        np.testing.assert_array_almost_equal(obs0[1], [[6, 2]])
-        np.testing.assert_array_almost_equal(obs0[2], [[6, 6]])
+        np.testing.assert_array_almost_equal(
+            obs0[1], [[t_meta, t_meta // 3]])
+        np.testing.assert_array_almost_equal(obs0[2], [[t, t]])
 
         np.testing.assert_array_almost_equal(obs1[0], [[9, 1]])
-        np.testing.assert_array_almost_equal(obs1[1], [[9, 3]])
-        np.testing.assert_array_almost_equal(obs1[2], [[7, 7]])
+        np.testing.assert_array_almost_equal(
+            obs1[1], [[t_meta + 3, t_meta // 3 + 1]])
+        np.testing.assert_array_almost_equal(obs1[2], [[t + 1, t + 1]])
 
         np.testing.assert_array_almost_equal(act[0], [[0]])
-        np.testing.assert_array_almost_equal(act[1], [[6]])
-        np.testing.assert_array_almost_equal(act[2], [[6]])
+        np.testing.assert_array_almost_equal(act[1], [[t_meta]])
+        np.testing.assert_array_almost_equal(act[2], [[t]])
 
         np.testing.assert_array_almost_equal(rew[0], [0])
-        np.testing.assert_array_almost_equal(rew[1], [2])
-        np.testing.assert_array_almost_equal(rew[2], [6])
+        np.testing.assert_array_almost_equal(rew[1], [t_meta // 3])
+        np.testing.assert_array_almost_equal(rew[2], [t])
 
         np.testing.assert_array_almost_equal(done[0], [0])
         np.testing.assert_array_almost_equal(done[1], [0])
         np.testing.assert_array_almost_equal(done[2], [0])
 
         # Test the `sample` method with collect_levels set to a subset.
+        t = sample_time[1]
         obs0, obs1, act, rew, done, _ = self.replay_buffer.sample(
             False, collect_levels=[0, 2])
         np.testing.assert_array_almost_equal(obs0[0], [[0, 0]])
         np.testing.assert_array_almost_equal(obs0[1], [])
-        np.testing.assert_array_almost_equal(obs0[2], [[6, 6]])
+        np.testing.assert_array_almost_equal(obs0[2], [[t, t]])
 
         np.testing.assert_array_almost_equal(obs1[0], [[9, 1]])
         np.testing.assert_array_almost_equal(obs1[1], [])
-        np.testing.assert_array_almost_equal(obs1[2], [[7, 7]])
+        np.testing.assert_array_almost_equal(obs1[2], [[t + 1, t + 1]])
 
         np.testing.assert_array_almost_equal(act[0], [[0]])
         np.testing.assert_array_almost_equal(act[1], [])
-        np.testing.assert_array_almost_equal(act[2], [[6]])
+        np.testing.assert_array_almost_equal(act[2], [[t]])
 
         np.testing.assert_array_almost_equal(rew[0], [0])
         np.testing.assert_array_almost_equal(rew[1], [])
-        np.testing.assert_array_almost_equal(rew[2], [6])
+        np.testing.assert_array_almost_equal(rew[2], [t])
 
         np.testing.assert_array_almost_equal(done[0], [0])
         np.testing.assert_array_almost_equal(done[1], [])
         np.testing.assert_array_almost_equal(done[2], [0])
 
+    def test_add_batch(self):
+        """Test the `add_batch` method the replay buffer.
+
+        The content of the buffer after adding a batch of samples, one of
+        which is truncated, matches the content after adding the same samples
+        one at a time.
+        """
+        replay_buffer = HierReplayBuffer(
+            buffer_size=3, batch_size=1, meta_period=2, obs_dim=1, ac_dim=1,
+            co_dim=1, goal_dim=1, num_levels=2)
+        batch_buffer = HierReplayBuffer(
+            buffer_size=3, batch_size=1, meta_period=2, obs_dim=1, ac_dim=1,
+            co_dim=1, goal_dim=1, num_levels=2)
+
+        samples = [
+            dict(obs_t=[np.array([0]), np.array([1]), np.array([2])],
+                 context_t=[np.array([0]), np.array([1])],
+                 action_t=[[np.array([0]), np.array([1])],
+                           [np.array([0]), np.array([1]), np.array([2])]],
+                 reward_t=[[0], [0, 1]],
+                 done_t=[False, False]),
+            dict(obs_t=[np.array([3]), np.array([4])],
+                 context_t=[np.array([2]), np.array([3])],
+                 action_t=[[np.array([3]), np.array([4])],
+                           [np.array([3]), np.array([4])]],
+                 reward_t=[[1], [3]],
+                 done_t=[True]),
+        ]
+
+        # Fill the buffer so that the batch wraps around the end of it.
+        for sample in samples + samples:
+            replay_buffer.add(**sample)
+        batch_buffer.add(**samples[0])
+        batch_buffer.add(**samples[1])
+        batch_buffer.add_batch(**{
+            key: [sample[key] for sample in samples]
+            for key in samples[0].keys()})
+
+        self.assertEqual(len(batch_buffer), 3)
+        self.assertEqual(batch_buffer._next_idx, 1)
+        self.assertEqual(batch_buffer._current_idx, 0)
+
+        for attr in ["_obs_t", "_context_t", "_action_len_t", "_done_t",
+                     "_len_t"]:
+            np.testing.assert_array_almost_equal(
+                getattr(replay_buffer, attr), getattr(batch_buffer, attr))
+        for i in range(2):
+            np.testing.assert_array_almost_equal(
+                replay_buffer._action_t[i], batch_buffer._action_t[i])
+            np.testing.assert_array_almost_equal(
+                replay_buffer._reward_t[i], batch_buffer._reward_t[i])
+
+    def test_sample_with_additional(self):
+        """Test the `sample` method with additional information.
+
+        This is done for a two-level hierarchy and a sample that was truncated
+        by the end of an episode. The unavailable elements of the worker
+        observations and actions are expected to be set to zero.
+        """
+        replay_buffer = HierReplayBuffer(
+            buffer_size=1,
+            batch_size=1,
+            meta_period=3,
+            obs_dim=1,
+            ac_dim=1,
+            co_dim=None,
+            goal_dim=1,
+            num_levels=2,
+        )
+
+        # Add a full sample, followed by a truncated sample that overwrites
+        # it.
+        replay_buffer.add(
+            obs_t=[np.array([0]), np.array([1]), np.array([2]),
+                   np.array([3])],
+            action_t=[[np.array([4]), np.array([5]), np.array([6]),
+                       np.array([7])],
+                      [np.array([8]), np.array([9]), np.array([10])]],
+            context_t=[None, None],
+            reward_t=[[0], [1, 2, 3]],
+            done_t=[False, False, False],
+        )
+        replay_buffer.add(
+            obs_t=[np.array([0]), np.array([1]), np.array([2])],
+            action_t=[[np.array([4]), np.array([5]), np.array([6])],
+                      [np.array([8]), np.array([9])]],
+            context_t=[None, None],
+            reward_t=[[0], [1, 2]],
+            done_t=[False, True],
+        )
+
+        obs0, obs1, _, _, done, additional = replay_buffer.sample(True)
+        np.testing.assert_array_almost_equal(obs0[0], [[0]])
+        np.testing.assert_array_almost_equal(obs1[0], [[2]])
+        np.testing.assert_array_almost_equal(done[0], [1])
+        np.testing.assert_array_almost_equal(
+            additional["worker_obses"], [[[0, 1, 2, 0], [4, 5, 6, 0]]])
+        np.testing.assert_array_almost_equal(
+            additional["worker_actions"], [[[8, 9, 0]]])
+
+    def test_sample_relabel(self):
+        """Test the `sample` method when relabeling with hindsight goals.
+
+        Every sample is relabeled with absolute hindsight goals, which are
+        equal to the final observation of the sample. The intrinsic rewards of
+        the worker are recomputed from these goals.
+        """
+        # Relabeling is not supported by hierarchies with more than two levels.
+        self.assertRaises(
+            AssertionError,
+            HierReplayBuffer,
+            buffer_size=1,
+            batch_size=1,
+            meta_period=3,
+            obs_dim=1,
+            ac_dim=1,
+            co_dim=None,
+            goal_dim=1,
+            num_levels=3,
+            relabel_prob=1,
+            goal_indices=[0],
+            relative_goals=False,
+            reward_fn=None,
+        )
+
+        replay_buffer = HierReplayBuffer(
+            buffer_size=1,
+            batch_size=1,
+            meta_period=3,
+            obs_dim=1,
+            ac_dim=1,
+            co_dim=None,
+            goal_dim=1,
+            num_levels=2,
+            relabel_prob=1,
+            goal_indices=[0],
+            relative_goals=False,
+            reward_fn=lambda states, goals, next_states:
+                -np.abs(next_states[:, 0] - goals[:, 0]),
+        )
+
+        replay_buffer.add(
+            obs_t=[np.array([0]), np.array([1]), np.array([2]),
+                   np.array([3])],
+            action_t=[[np.array([4]), np.array([5]), np.array([6]),
+                       np.array([7])],
+                      [np.array([8]), np.array([9]), np.array([10])]],
+            context_t=[None, None],
+            reward_t=[[0], [1, 2, 3]],
+            done_t=[False, False, False],
+        )
+
+        obs0, obs1, act, rew, _, additional = replay_buffer.sample(True)
+        np.testing.assert_array_almost_equal(act[0], [[3]])
+        np.testing.assert_array_almost_equal(obs0[1][:, 1], [3])
+        np.testing.assert_array_almost_equal(obs1[1][:, 1], [3])
+        np.testing.assert_array_almost_equal(
+            rew[1], obs0[1][:, 0] - 2)
+        np.testing.assert_array_almost_equal(
+            additional["worker_obses"], [[[0, 1, 2, 3], [3, 3, 3, 3]]])
+
 
 class TestMultiReplayBuffer(unittest.TestCase):
     """Tests for the MultiReplayBuffer object."""
@@ -200,11 +779,10 @@ class TestMultiReplayBuffer(unittest.TestCase):
         self.assertTupleEqual(self.replay_buffer.obs_t.shape, (2, 1))
         self.assertTupleEqual(self.replay_buffer.action_t.shape, (2, 2))
         self.assertTupleEqual(self.replay_buffer.reward.shape, (2,))
-        self.assertTupleEqual(self.replay_buffer.obs_tp1.shape, (2, 1))
         self.assertTupleEqual(self.replay_buffer.done.shape, (2,))
         self.assertTupleEqual(self.replay_buffer.all_obs_t.shape, (2, 3))
         self.assertTupleEqual(self.replay_buffer.all_action_t.shape, (2, 4))
-        self.assertTupleEqual(self.replay_buffer.all_obs_tp1.shape, (2, 3))
+        self.assertDictEqual(self.replay_buffer.next_obs.table, {})
 
     def test_buffer_size(self):
         """Validate the buffer_size output from the replay buffer."""
@@ -257,6 +835,49 @@ class TestMultiReplayBuffer(unittest.TestCase):
         np.testing.assert_array_almost_equal(all_actions_t, [[5, 5, 5, 5]])
         np.testing.assert_array_almost_equal(all_obs_tp1, [[6, 6, 6]])
 
+    def test_sample_joint(self):
+        """Validate that sample_joint samples all buffers at common indices."""
+        replay_buffers = [MultiReplayBuffer(
+            buffer_size=10,
+            batch_size=8,
+            obs_dim=1,
+            ac_dim=2,
+            all_obs_dim=3,
+            all_ac_dim=4,
+        ) for _ in range(3)]
+
+        # Add the transitions of every agent in lockstep.
+        for i in range(6):
+            for j, replay_buffer in enumerate(replay_buffers):
+                replay_buffer.add(
+                    obs_t=np.array([i + 10 * j]),
+                    action=np.array([i, i]),
+                    reward=i + 10 * j,
+                    obs_tp1=np.array([i + 10 * j + 1]),
+                    done=False,
+                    all_obs_t=np.array([i, i, i]),
+                    all_action_t=np.array([i, i, i, i]),
+                    all_obs_tp1=np.array([i + 1, i + 1, i + 1])
+                )
+
+        batches = sample_joint(replay_buffers)
+        self.assertEqual(len(batches), 3)
+
+        # The samples of all buffers should correspond to the same steps.
+        for j, batch in enumerate(batches):
+            obs_t, actions_t, rewards, obs_tp1, _, all_obs_t, _, _ = batch
+            self.assertTupleEqual(obs_t.shape, (8, 1))
+            np.testing.assert_array_almost_equal(
+                obs_t, batches[0][0] + 10 * j)
+            np.testing.assert_array_almost_equal(
+                obs_tp1, obs_t + 1)
+            np.testing.assert_array_almost_equal(
+                rewards, obs_t[:, 0])
+            np.testing.assert_array_almost_equal(
+                all_obs_t, batches[0][5])
+            np.testing.assert_array_almost_equal(
+                actions_t[:, 0], obs_t[:, 0] - 10 * j)
+
 
 class TestSharedReplayBuffer(unittest.TestCase):
     """Tests for the SharedReplayBuffer object."""
@@ -280,17 +901,15 @@ class TestSharedReplayBuffer(unittest.TestCase):
         # each agent.
         self.assertEqual(len(self.replay_buffer.obs_t), 3)
         self.assertEqual(len(self.replay_buffer.action), 3)
-        self.assertEqual(len(self.replay_buffer.obs_tp1), 3)
 
         # Check the sizes of the individual variables.
         self.assertTupleEqual(self.replay_buffer.reward.shape, (2,))
         self.assertTupleEqual(self.replay_buffer.done.shape, (2,))
         self.assertTupleEqual(self.replay_buffer.all_obs_t.shape, (2, 4))
-        self.assertTupleEqual(self.replay_buffer.all_obs_tp1.shape, (2, 4))
+        self.assertDictEqual(self.replay_buffer.next_obs.table, {})
         for i in range(3):  # loop through num_agents
             self.assertTupleEqual(self.replay_buffer.obs_t[i].shape, (2, 1))
             self.assertTupleEqual(self.replay_buffer.action[i].shape, (2, 2))
-            self.assertTupleEqual(self.replay_buffer.obs_tp1[i].shape, (2, 1))
 
     def test_buffer_size(self):
         """Validate the buffer_size output from the replay buffer."""
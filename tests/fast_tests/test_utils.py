@@ -3,6 +3,7 @@ import unittest
 import tensorflow as tf
 import numpy as np
 import random
+from types import SimpleNamespace
 from gym.spaces import Box
 
 from hbaselines.utils.eval import parse_options as parse_eval_options
@@ -17,6 +18,16 @@ from hbaselines.utils.tf_util import conv_layer
 from hbaselines.utils.tf_util import apply_squashing_func
 from hbaselines.utils.tf_util import get_trainable_vars
 from hbaselines.utils.tf_util import gaussian_likelihood
+from hbaselines.utils.tf_util import gae_returns
+from hbaselines.utils.tf_util import conjugate_gradient
+from hbaselines.utils.sampler import Sampler
+from hbaselines.utils.sampler import VecSampler
+from hbaselines.utils.transport import SharedMemoryTransport
+from hbaselines.utils.segment_tree import SumSegmentTree
+from hbaselines.utils.segment_tree import MinSegmentTree
+from hbaselines.utils.slot_allocator import SlotAllocator
+from hbaselines.utils.prefetch import PrefetchReplayBuffer
+from hbaselines.fcnet.replay_buffer import ReplayBuffer
 from hbaselines.goal_conditioned.td3 import GoalConditionedPolicy \
     as TD3GoalConditionedPolicy
 from hbaselines.multiagent.td3 import MultiFeedForwardPolicy \
@@ -89,6 +100,11 @@ class TestTrain(unittest.TestCase):
             'meta_update_freq': 10,
             'save_replay_buffer': False,
             'num_envs': 1,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'l2_penalty': FEEDFORWARD_PARAMS["l2_penalty"],
             'model_params:layers': None,
             'model_params:filters': None,
@@ -104,9 +120,13 @@ class TestTrain(unittest.TestCase):
             'model_params:model_type': 'fcnet',
             'model_params:strides': None,
             'use_huber': False,
+            'prioritized_replay': False,
+            'replay_buffer_path': None,
+            'reduced_precision_replay': False,
             'noise': TD3_PARAMS['noise'],
             'target_policy_noise': TD3_PARAMS['target_policy_noise'],
             'target_noise_clip': TD3_PARAMS['target_noise_clip'],
+            'fused_update': False,
             'buffer_size': TD3_PARAMS['buffer_size'],
             'batch_size': TD3_PARAMS['batch_size'],
             'actor_lr': TD3_PARAMS['actor_lr'],
@@ -129,6 +149,11 @@ class TestTrain(unittest.TestCase):
             'actor_update_freq': 2,
             'meta_update_freq': 10,
             'num_envs': 1,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'save_replay_buffer': False,
             '_init_setup_model': True,
             'policy_kwargs': {
@@ -141,7 +166,12 @@ class TestTrain(unittest.TestCase):
                 'noise': TD3_PARAMS['noise'],
                 'target_policy_noise': TD3_PARAMS['target_policy_noise'],
                 'target_noise_clip': TD3_PARAMS['target_noise_clip'],
+                'fused_update': TD3_PARAMS['fused_update'],
                 'use_huber': TD3_PARAMS['use_huber'],
+                'prioritized_replay': TD3_PARAMS['prioritized_replay'],
+                'replay_buffer_path': TD3_PARAMS['replay_buffer_path'],
+                'reduced_precision_replay':
+                    TD3_PARAMS['reduced_precision_replay'],
                 'l2_penalty': FEEDFORWARD_PARAMS["l2_penalty"],
                 'model_params': {
                     'model_type': model_params["model_type"],
@@ -199,7 +229,11 @@ class TestTrain(unittest.TestCase):
                 '--num_envs', '21',
                 '--target_policy_noise', '22',
                 '--target_noise_clip', '23',
+                '--fused_update',
                 '--use_huber',
+                '--prioritized_replay',
+                '--replay_buffer_path', 'rb_dir',
+                '--reduced_precision_replay',
                 '--l2_penalty', '1',
                 '--model_params:model_type', 'model_type',
                 '--model_params:layers', '24', '25',
@@ -245,6 +279,11 @@ class TestTrain(unittest.TestCase):
             'nb_train_steps': 7,
             'noise': 20.0,
             'num_envs': 21,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'render': True,
             'render_eval': True,
             'reward_scale': 10.0,
@@ -252,10 +291,14 @@ class TestTrain(unittest.TestCase):
             'save_replay_buffer': True,
             'seed': 3,
             'target_noise_clip': 23.0,
+            'fused_update': True,
             'target_policy_noise': 22.0,
             'tau': 18.0,
             'total_steps': 2,
             'use_huber': True,
+            'prioritized_replay': True,
+            'replay_buffer_path': 'rb_dir',
+            'reduced_precision_replay': True,
             'verbose': 11,
             'ckpt_path': 'blank',
         })
@@ -275,6 +318,11 @@ class TestTrain(unittest.TestCase):
             'nb_rollout_steps': 8,
             'nb_train_steps': 7,
             'num_envs': 21,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'policy_kwargs': {
                 'actor_lr': 16.0,
                 'batch_size': 15,
@@ -299,9 +347,13 @@ class TestTrain(unittest.TestCase):
                 },
                 'noise': 20.0,
                 'target_noise_clip': 23.0,
+                'fused_update': True,
                 'target_policy_noise': 22.0,
                 'tau': 18.0,
-                'use_huber': True
+                'use_huber': True,
+                'prioritized_replay': True,
+                'replay_buffer_path': 'rb_dir',
+                'reduced_precision_replay': True
             },
         })
 
@@ -334,6 +386,11 @@ class TestTrain(unittest.TestCase):
             'meta_update_freq': 10,
             'save_replay_buffer': False,
             'num_envs': 1,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'l2_penalty': FEEDFORWARD_PARAMS["l2_penalty"],
             'model_params:layers': None,
             'model_params:filters': None,
@@ -349,9 +406,13 @@ class TestTrain(unittest.TestCase):
             'model_params:model_type': 'fcnet',
             'model_params:strides': None,
             'use_huber': False,
+            'prioritized_replay': False,
+            'replay_buffer_path': None,
+            'reduced_precision_replay': False,
             'noise': TD3_PARAMS['noise'],
             'target_policy_noise': TD3_PARAMS['target_policy_noise'],
             'target_noise_clip': TD3_PARAMS['target_noise_clip'],
+            'fused_update': False,
             'buffer_size': TD3_PARAMS['buffer_size'],
             'batch_size': TD3_PARAMS['batch_size'],
             'actor_lr': TD3_PARAMS['actor_lr'],
@@ -375,6 +436,7 @@ class TestTrain(unittest.TestCase):
             'relative_goals': False,
             'subgoal_testing_rate': GOAL_CONDITIONED_PARAMS[
                 'subgoal_testing_rate'],
+            'hindsight_relabel_prob': None,
             'ckpt_path': None,
         })
 
@@ -391,6 +453,11 @@ class TestTrain(unittest.TestCase):
             'actor_update_freq': 2,
             'meta_update_freq': 10,
             'num_envs': 1,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'save_replay_buffer': False,
             '_init_setup_model': True,
             'policy_kwargs': {
@@ -403,7 +470,12 @@ class TestTrain(unittest.TestCase):
                 'noise': TD3_PARAMS['noise'],
                 'target_policy_noise': TD3_PARAMS['target_policy_noise'],
                 'target_noise_clip': TD3_PARAMS['target_noise_clip'],
+                'fused_update': TD3_PARAMS['fused_update'],
                 'use_huber': TD3_PARAMS['use_huber'],
+                'prioritized_replay': TD3_PARAMS['prioritized_replay'],
+                'replay_buffer_path': TD3_PARAMS['replay_buffer_path'],
+                'reduced_precision_replay':
+                    TD3_PARAMS['reduced_precision_replay'],
                 'l2_penalty': FEEDFORWARD_PARAMS["l2_penalty"],
                 'model_params': {
                     'model_type': model_params["model_type"],
@@ -438,6 +510,7 @@ class TestTrain(unittest.TestCase):
                 'relative_goals': False,
                 'subgoal_testing_rate': GOAL_CONDITIONED_PARAMS[
                     'subgoal_testing_rate'],
+                'hindsight_relabel_prob': None,
             }
         })
 
@@ -457,6 +530,7 @@ class TestTrain(unittest.TestCase):
                 "--off_policy_corrections",
                 "--hindsight",
                 "--subgoal_testing_rate", "6",
+                "--hindsight_relabel_prob", "0.5",
                 "--cooperative_gradients",
                 "--cg_weights", "7",
                 "--cg_delta", "10",
@@ -491,6 +565,11 @@ class TestTrain(unittest.TestCase):
             'meta_update_freq': 10,
             'save_replay_buffer': False,
             'num_envs': 1,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'l2_penalty': FEEDFORWARD_PARAMS["l2_penalty"],
             'model_params:layers': None,
             'model_params:filters': None,
@@ -506,9 +585,13 @@ class TestTrain(unittest.TestCase):
             'model_params:model_type': 'fcnet',
             'model_params:strides': None,
             'use_huber': False,
+            'prioritized_replay': False,
+            'replay_buffer_path': None,
+            'reduced_precision_replay': False,
             'noise': TD3_PARAMS['noise'],
             'target_policy_noise': TD3_PARAMS['target_policy_noise'],
             'target_noise_clip': TD3_PARAMS['target_noise_clip'],
+            'fused_update': False,
             'buffer_size': TD3_PARAMS['buffer_size'],
             'batch_size': TD3_PARAMS['batch_size'],
             'actor_lr': TD3_PARAMS['actor_lr'],
@@ -529,6 +612,7 @@ class TestTrain(unittest.TestCase):
             'off_policy_corrections': True,
             'relative_goals': True,
             'subgoal_testing_rate': 6,
+            'hindsight_relabel_prob': 0.5,
             'ckpt_path': None,
         })
 
@@ -545,6 +629,11 @@ class TestTrain(unittest.TestCase):
             'actor_update_freq': 2,
             'meta_update_freq': 10,
             'num_envs': 1,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'save_replay_buffer': False,
             '_init_setup_model': True,
             'policy_kwargs': {
@@ -557,7 +646,12 @@ class TestTrain(unittest.TestCase):
                 'noise': TD3_PARAMS['noise'],
                 'target_policy_noise': TD3_PARAMS['target_policy_noise'],
                 'target_noise_clip': TD3_PARAMS['target_noise_clip'],
+                'fused_update': TD3_PARAMS['fused_update'],
                 'use_huber': TD3_PARAMS['use_huber'],
+                'prioritized_replay': TD3_PARAMS['prioritized_replay'],
+                'replay_buffer_path': TD3_PARAMS['replay_buffer_path'],
+                'reduced_precision_replay':
+                    TD3_PARAMS['reduced_precision_replay'],
                 'l2_penalty': FEEDFORWARD_PARAMS["l2_penalty"],
                 'model_params': {
                     'model_type': model_params["model_type"],
@@ -589,6 +683,7 @@ class TestTrain(unittest.TestCase):
                 'off_policy_corrections': True,
                 'relative_goals': True,
                 'subgoal_testing_rate': 6,
+                'hindsight_relabel_prob': 0.5,
             }
         })
 
@@ -621,6 +716,11 @@ class TestTrain(unittest.TestCase):
             'meta_update_freq': 10,
             'save_replay_buffer': False,
             'num_envs': 1,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'l2_penalty': FEEDFORWARD_PARAMS["l2_penalty"],
             'model_params:layers': None,
             'model_params:filters': None,
@@ -636,9 +736,13 @@ class TestTrain(unittest.TestCase):
             'model_params:model_type': 'fcnet',
             'model_params:strides': None,
             'use_huber': False,
+            'prioritized_replay': False,
+            'replay_buffer_path': None,
+            'reduced_precision_replay': False,
             'noise': TD3_PARAMS['noise'],
             'target_policy_noise': TD3_PARAMS['target_policy_noise'],
             'target_noise_clip': TD3_PARAMS['target_noise_clip'],
+            'fused_update': False,
             'buffer_size': TD3_PARAMS['buffer_size'],
             'batch_size': TD3_PARAMS['batch_size'],
             'actor_lr': TD3_PARAMS['actor_lr'],
@@ -648,6 +752,7 @@ class TestTrain(unittest.TestCase):
             'shared': False,
             'maddpg': False,
             'n_agents': MULTIAGENT_PARAMS["n_agents"],
+            'joint_update': False,
             'ckpt_path': None,
         })
 
@@ -664,6 +769,11 @@ class TestTrain(unittest.TestCase):
             'actor_update_freq': 2,
             'meta_update_freq': 10,
             'num_envs': 1,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'save_replay_buffer': False,
             '_init_setup_model': True,
             'policy_kwargs': {
@@ -676,7 +786,12 @@ class TestTrain(unittest.TestCase):
                 'noise': TD3_PARAMS['noise'],
                 'target_policy_noise': TD3_PARAMS['target_policy_noise'],
                 'target_noise_clip': TD3_PARAMS['target_noise_clip'],
+                'fused_update': TD3_PARAMS['fused_update'],
                 'use_huber': TD3_PARAMS['use_huber'],
+                'prioritized_replay': TD3_PARAMS['prioritized_replay'],
+                'replay_buffer_path': TD3_PARAMS['replay_buffer_path'],
+                'reduced_precision_replay':
+                    TD3_PARAMS['reduced_precision_replay'],
                 'l2_penalty': FEEDFORWARD_PARAMS["l2_penalty"],
                 'model_params': {
                     'model_type': model_params["model_type"],
@@ -697,6 +812,7 @@ class TestTrain(unittest.TestCase):
                 'shared': False,
                 'maddpg': False,
                 'n_agents': MULTIAGENT_PARAMS["n_agents"],
+                'joint_update': False,
             }
         })
 
@@ -734,6 +850,11 @@ class TestTrain(unittest.TestCase):
             'meta_update_freq': 10,
             'save_replay_buffer': False,
             'num_envs': 1,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'l2_penalty': FEEDFORWARD_PARAMS["l2_penalty"],
             'model_params:layers': None,
             'model_params:filters': None,
@@ -749,9 +870,13 @@ class TestTrain(unittest.TestCase):
             'model_params:model_type': 'fcnet',
             'model_params:strides': None,
             'use_huber': False,
+            'prioritized_replay': False,
+            'replay_buffer_path': None,
+            'reduced_precision_replay': False,
             'noise': TD3_PARAMS['noise'],
             'target_policy_noise': TD3_PARAMS['target_policy_noise'],
             'target_noise_clip': TD3_PARAMS['target_noise_clip'],
+            'fused_update': False,
             'buffer_size': TD3_PARAMS['buffer_size'],
             'batch_size': TD3_PARAMS['batch_size'],
             'actor_lr': TD3_PARAMS['actor_lr'],
@@ -761,6 +886,7 @@ class TestTrain(unittest.TestCase):
             'shared': True,
             'maddpg': True,
             'n_agents': 2,
+            'joint_update': False,
             'ckpt_path': None,
         })
 
@@ -777,6 +903,11 @@ class TestTrain(unittest.TestCase):
             'actor_update_freq': 2,
             'meta_update_freq': 10,
             'num_envs': 1,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'save_replay_buffer': False,
             '_init_setup_model': True,
             'policy_kwargs': {
@@ -789,7 +920,12 @@ class TestTrain(unittest.TestCase):
                 'noise': TD3_PARAMS['noise'],
                 'target_policy_noise': TD3_PARAMS['target_policy_noise'],
                 'target_noise_clip': TD3_PARAMS['target_noise_clip'],
+                'fused_update': TD3_PARAMS['fused_update'],
                 'use_huber': TD3_PARAMS['use_huber'],
+                'prioritized_replay': TD3_PARAMS['prioritized_replay'],
+                'replay_buffer_path': TD3_PARAMS['replay_buffer_path'],
+                'reduced_precision_replay':
+                    TD3_PARAMS['reduced_precision_replay'],
                 'l2_penalty': FEEDFORWARD_PARAMS["l2_penalty"],
                 'model_params': {
                     'model_type': model_params["model_type"],
@@ -810,6 +946,7 @@ class TestTrain(unittest.TestCase):
                 'shared': True,
                 'maddpg': True,
                 'n_agents': 2,
+                'joint_update': False,
             }
         })
 
@@ -842,6 +979,11 @@ class TestTrain(unittest.TestCase):
             'meta_update_freq': 10,
             'save_replay_buffer': False,
             'num_envs': 1,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'l2_penalty': FEEDFORWARD_PARAMS["l2_penalty"],
             'model_params:layers': None,
             'model_params:filters': None,
@@ -857,9 +999,13 @@ class TestTrain(unittest.TestCase):
             'model_params:model_type': 'fcnet',
             'model_params:strides': None,
             'use_huber': False,
+            'prioritized_replay': False,
+            'replay_buffer_path': None,
+            'reduced_precision_replay': False,
             'noise': TD3_PARAMS['noise'],
             'target_policy_noise': TD3_PARAMS['target_policy_noise'],
             'target_noise_clip': TD3_PARAMS['target_noise_clip'],
+            'fused_update': False,
             'buffer_size': TD3_PARAMS['buffer_size'],
             'batch_size': TD3_PARAMS['batch_size'],
             'actor_lr': TD3_PARAMS['actor_lr'],
@@ -883,9 +1029,11 @@ class TestTrain(unittest.TestCase):
             'relative_goals': False,
             'subgoal_testing_rate': GOAL_CONDITIONED_PARAMS[
                 'subgoal_testing_rate'],
+            'hindsight_relabel_prob': None,
             'shared': False,
             'maddpg': False,
             'n_agents': MULTIAGENT_PARAMS["n_agents"],
+            'joint_update': False,
             'ckpt_path': None,
         })
 
@@ -902,6 +1050,11 @@ class TestTrain(unittest.TestCase):
             'actor_update_freq': 2,
             'meta_update_freq': 10,
             'num_envs': 1,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'save_replay_buffer': False,
             '_init_setup_model': True,
             'policy_kwargs': {
@@ -914,7 +1067,12 @@ class TestTrain(unittest.TestCase):
                 'noise': TD3_PARAMS['noise'],
                 'target_policy_noise': TD3_PARAMS['target_policy_noise'],
                 'target_noise_clip': TD3_PARAMS['target_noise_clip'],
+                'fused_update': TD3_PARAMS['fused_update'],
                 'use_huber': TD3_PARAMS['use_huber'],
+                'prioritized_replay': TD3_PARAMS['prioritized_replay'],
+                'replay_buffer_path': TD3_PARAMS['replay_buffer_path'],
+                'reduced_precision_replay':
+                    TD3_PARAMS['reduced_precision_replay'],
                 'l2_penalty': FEEDFORWARD_PARAMS["l2_penalty"],
                 'model_params': {
                     'model_type': model_params["model_type"],
@@ -935,6 +1093,7 @@ class TestTrain(unittest.TestCase):
                 'shared': False,
                 'maddpg': False,
                 'n_agents': MULTIAGENT_PARAMS["n_agents"],
+                'joint_update': False,
             }
         })
 
@@ -954,12 +1113,14 @@ class TestTrain(unittest.TestCase):
                 "--off_policy_corrections",
                 "--hindsight",
                 "--subgoal_testing_rate", "6",
+                "--hindsight_relabel_prob", "0.5",
                 "--cooperative_gradients",
                 "--cg_weights", "7",
                 "--cg_delta", "9",
                 "--shared",
                 "--maddpg",
                 "--n_agents", "8",
+                "--joint_update",
             ],
             multiagent=True,
             hierarchical=True,
@@ -988,6 +1149,11 @@ class TestTrain(unittest.TestCase):
             'meta_update_freq': 10,
             'save_replay_buffer': False,
             'num_envs': 1,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'l2_penalty': FEEDFORWARD_PARAMS["l2_penalty"],
             'model_params:layers': None,
             'model_params:filters': None,
@@ -1003,9 +1169,13 @@ class TestTrain(unittest.TestCase):
             'model_params:model_type': 'fcnet',
             'model_params:strides': None,
             'use_huber': False,
+            'prioritized_replay': False,
+            'replay_buffer_path': None,
+            'reduced_precision_replay': False,
             'noise': TD3_PARAMS['noise'],
             'target_policy_noise': TD3_PARAMS['target_policy_noise'],
             'target_noise_clip': TD3_PARAMS['target_noise_clip'],
+            'fused_update': False,
             'buffer_size': TD3_PARAMS['buffer_size'],
             'batch_size': TD3_PARAMS['batch_size'],
             'actor_lr': TD3_PARAMS['actor_lr'],
@@ -1026,9 +1196,11 @@ class TestTrain(unittest.TestCase):
             'off_policy_corrections': True,
             'relative_goals': True,
             'subgoal_testing_rate': 6,
+            'hindsight_relabel_prob': 0.5,
             'shared': True,
             'maddpg': True,
             'n_agents': 8,
+            'joint_update': True,
             'ckpt_path': None,
         })
 
@@ -1045,6 +1217,11 @@ class TestTrain(unittest.TestCase):
             'actor_update_freq': 2,
             'meta_update_freq': 10,
             'num_envs': 1,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'save_replay_buffer': False,
             '_init_setup_model': True,
             'policy_kwargs': {
@@ -1057,7 +1234,12 @@ class TestTrain(unittest.TestCase):
                 'noise': TD3_PARAMS['noise'],
                 'target_policy_noise': TD3_PARAMS['target_policy_noise'],
                 'target_noise_clip': TD3_PARAMS['target_noise_clip'],
+                'fused_update': TD3_PARAMS['fused_update'],
                 'use_huber': TD3_PARAMS['use_huber'],
+                'prioritized_replay': TD3_PARAMS['prioritized_replay'],
+                'replay_buffer_path': TD3_PARAMS['replay_buffer_path'],
+                'reduced_precision_replay':
+                    TD3_PARAMS['reduced_precision_replay'],
                 'l2_penalty': FEEDFORWARD_PARAMS["l2_penalty"],
                 'model_params': {
                     'model_type': model_params["model_type"],
@@ -1089,9 +1271,11 @@ class TestTrain(unittest.TestCase):
                 'off_policy_corrections': True,
                 'relative_goals': True,
                 'subgoal_testing_rate': 6,
+                'hindsight_relabel_prob': 0.5,
                 'shared': True,
                 'maddpg': True,
                 'n_agents': 8,
+                'joint_update': True,
             }
         })
 
@@ -1146,6 +1330,11 @@ class TestTrain(unittest.TestCase):
             'meta_update_freq': 10,
             'save_replay_buffer': False,
             'num_envs': 1,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'l2_penalty': FEEDFORWARD_PARAMS["l2_penalty"],
             'model_params:layers': None,
             'model_params:filters': None,
@@ -1161,6 +1350,9 @@ class TestTrain(unittest.TestCase):
             'model_params:model_type': 'fcnet',
             'model_params:strides': None,
             'use_huber': False,
+            'prioritized_replay': False,
+            'replay_buffer_path': None,
+            'reduced_precision_replay': False,
             'target_entropy': SAC_PARAMS['target_entropy'],
             'buffer_size': SAC_PARAMS['buffer_size'],
             'batch_size': SAC_PARAMS['batch_size'],
@@ -1184,6 +1376,11 @@ class TestTrain(unittest.TestCase):
             'actor_update_freq': 2,
             'meta_update_freq': 10,
             'num_envs': 1,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'save_replay_buffer': False,
             '_init_setup_model': True,
             'policy_kwargs': {
@@ -1195,6 +1392,10 @@ class TestTrain(unittest.TestCase):
                 'gamma': SAC_PARAMS['gamma'],
                 'target_entropy': SAC_PARAMS['target_entropy'],
                 'use_huber': SAC_PARAMS['use_huber'],
+                'prioritized_replay': SAC_PARAMS['prioritized_replay'],
+                'replay_buffer_path': SAC_PARAMS['replay_buffer_path'],
+                'reduced_precision_replay':
+                    SAC_PARAMS['reduced_precision_replay'],
                 'l2_penalty': FEEDFORWARD_PARAMS["l2_penalty"],
                 'model_params': {
                     'model_type': model_params["model_type"],
@@ -1251,6 +1452,9 @@ class TestTrain(unittest.TestCase):
                 '--target_entropy', '20',
                 '--num_envs', '21',
                 '--use_huber',
+                '--prioritized_replay',
+                '--replay_buffer_path', 'rb_dir',
+                '--reduced_precision_replay',
                 '--model_params:model_type', 'model_type',
                 '--model_params:layer_norm',
                 '--model_params:batch_norm',
@@ -1295,6 +1499,11 @@ class TestTrain(unittest.TestCase):
             'nb_train_steps': 7,
             'target_entropy': 20.0,
             'num_envs': 21,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'render': True,
             'render_eval': True,
             'reward_scale': 10.0,
@@ -1304,6 +1513,9 @@ class TestTrain(unittest.TestCase):
             'tau': 18.0,
             'total_steps': 2,
             'use_huber': True,
+            'prioritized_replay': True,
+            'replay_buffer_path': 'rb_dir',
+            'reduced_precision_replay': True,
             'verbose': 11,
             'ckpt_path': None,
         })
@@ -1323,6 +1535,11 @@ class TestTrain(unittest.TestCase):
             'nb_rollout_steps': 8,
             'nb_train_steps': 7,
             'num_envs': 21,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'policy_kwargs': {
                 'actor_lr': 16.0,
                 'batch_size': 15,
@@ -1347,7 +1564,10 @@ class TestTrain(unittest.TestCase):
                 },
                 'target_entropy': 20.0,
                 'tau': 18.0,
-                'use_huber': True
+                'use_huber': True,
+                'prioritized_replay': True,
+                'replay_buffer_path': 'rb_dir',
+                'reduced_precision_replay': True
             },
         })
 
@@ -1395,6 +1615,11 @@ class TestTrain(unittest.TestCase):
             'meta_update_freq': 10,
             'save_replay_buffer': False,
             'num_envs': 1,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'l2_penalty': FEEDFORWARD_PARAMS["l2_penalty"],
             'model_params:layers': None,
             'model_params:filters': None,
@@ -1435,6 +1660,11 @@ class TestTrain(unittest.TestCase):
             'actor_update_freq': 2,
             'meta_update_freq': 10,
             'num_envs': 1,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'save_replay_buffer': False,
             '_init_setup_model': True,
             'policy_kwargs': {
@@ -1544,6 +1774,11 @@ class TestTrain(unittest.TestCase):
             'nb_rollout_steps': 8,
             'nb_train_steps': 7,
             'num_envs': 21,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'render': True,
             'render_eval': True,
             'reward_scale': 10.0,
@@ -1580,6 +1815,11 @@ class TestTrain(unittest.TestCase):
             'nb_rollout_steps': 8,
             'nb_train_steps': 7,
             'num_envs': 21,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'policy_kwargs': {
                 'cliprange': 24,
                 'cliprange_vf': 25,
@@ -1654,6 +1894,11 @@ class TestTrain(unittest.TestCase):
             'meta_update_freq': 10,
             'save_replay_buffer': False,
             'num_envs': 1,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'l2_penalty': FEEDFORWARD_PARAMS["l2_penalty"],
             'model_params:layers': None,
             'model_params:filters': None,
@@ -1674,6 +1919,7 @@ class TestTrain(unittest.TestCase):
             'gamma': TRPO_PARAMS["gamma"],
             'lam': TRPO_PARAMS["lam"],
             'max_kl': TRPO_PARAMS["max_kl"],
+            'fisher_fraction': TRPO_PARAMS["fisher_fraction"],
             'vf_iters': TRPO_PARAMS["vf_iters"],
             'vf_stepsize': TRPO_PARAMS["vf_stepsize"],
             'ckpt_path': None,
@@ -1692,6 +1938,11 @@ class TestTrain(unittest.TestCase):
             'actor_update_freq': 2,
             'meta_update_freq': 10,
             'num_envs': 1,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'save_replay_buffer': False,
             '_init_setup_model': True,
             'policy_kwargs': {
@@ -1701,6 +1952,7 @@ class TestTrain(unittest.TestCase):
                 'gamma': TRPO_PARAMS["gamma"],
                 'lam': TRPO_PARAMS["lam"],
                 'max_kl': TRPO_PARAMS["max_kl"],
+                'fisher_fraction': TRPO_PARAMS["fisher_fraction"],
                 'vf_iters': TRPO_PARAMS["vf_iters"],
                 'vf_stepsize': TRPO_PARAMS["vf_stepsize"],
                 'l2_penalty': FEEDFORWARD_PARAMS["l2_penalty"],
@@ -1762,6 +2014,7 @@ class TestTrain(unittest.TestCase):
                 '--gamma', '27',
                 '--lam', '28',
                 '--max_kl', '29',
+                '--fisher_fraction', '0.5',
                 '--vf_iters', '30',
                 '--vf_stepsize', '31',
             ],
@@ -1797,6 +2050,11 @@ class TestTrain(unittest.TestCase):
             'nb_rollout_steps': 8,
             'nb_train_steps': 7,
             'num_envs': 21,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'render': True,
             'render_eval': True,
             'reward_scale': 10.0,
@@ -1811,6 +2069,7 @@ class TestTrain(unittest.TestCase):
             'gamma': 27,
             'lam': 28,
             'max_kl': 29,
+            'fisher_fraction': 0.5,
             'vf_iters': 30,
             'vf_stepsize': 31,
             'ckpt_path': None,
@@ -1831,6 +2090,11 @@ class TestTrain(unittest.TestCase):
             'nb_rollout_steps': 8,
             'nb_train_steps': 7,
             'num_envs': 21,
+            'envs_per_worker': 1,
+            'policy_lag': 0,
+            'worker_sync_freq': None,
+            'shared_memory': False,
+            'prefetch_batches': 0,
             'policy_kwargs': {
                 'l2_penalty': FEEDFORWARD_PARAMS["l2_penalty"],
                 'cg_damping': 24,
@@ -1839,6 +2103,7 @@ class TestTrain(unittest.TestCase):
                 'gamma': 27,
                 'lam': 28,
                 'max_kl': 29,
+                'fisher_fraction': 0.5,
                 'vf_iters': 30,
                 'vf_stepsize': 31,
                 'model_params': {
@@ -2898,6 +3163,460 @@ class TestTFUtil(unittest.TestCase):
         # Clear the graph.
         tf.compat.v1.reset_default_graph()
 
+    def test_gae_returns(self):
+        """Check the functionality of the gae_returns() method.
+
+        The returns of multiple environments are computed at once, with the
+        last valid step of every environment bootstrapped off its last value.
+        """
+        returns = gae_returns(
+            mb_rewards=np.array([[1., 1., 1.], [1., 1., 0.]]),
+            mb_values=np.zeros((2, 3)),
+            mb_dones=np.zeros((2, 3)),
+            last_values=np.array([1., 2.]),
+            gamma=0.5,
+            lam=1.,
+            mb_lengths=np.array([3, 2]),
+        )
+        np.testing.assert_almost_equal(returns[0], [1.875, 1.75, 1.5])
+        np.testing.assert_almost_equal(returns[1, :2], [2., 2.])
+
+        # The returns of a single environment match the batched returns.
+        np.testing.assert_almost_equal(
+            gae_returns(
+                mb_rewards=np.array([1., 1.]),
+                mb_values=np.zeros(2),
+                mb_dones=np.zeros(2),
+                last_values=np.array([2.]),
+                gamma=0.5,
+                lam=1.,
+            ),
+            returns[1, :2])
+
+    def test_conjugate_gradient(self):
+        """Check the functionality of the conjugate_gradient() method.
+
+        The solution of a symmetric positive-definite system matches the one
+        computed by numpy.
+        """
+        a_mat = np.array([[4., 1., 0.], [1., 3., 1.], [0., 1., 2.]])
+        b_vec = np.array([1., 2., 3.])
+
+        x_var = conjugate_gradient(
+            f_ax=lambda vec: tf.linalg.matvec(
+                tf.constant(a_mat, dtype=tf.float32), vec),
+            b_vec=tf.constant(b_vec, dtype=tf.float32),
+            cg_iters=10,
+        )
+        np.testing.assert_almost_equal(
+            self.sess.run(x_var), np.linalg.solve(a_mat, b_vec), decimal=4)
+
+
+class TestSampler(unittest.TestCase):
+    """Unit tests for the classes and methods in utils/sampler.py."""
+
+    def test_setup_policy(self):
+        """Validate the functionality of the setup_policy method.
+
+        This is done for the following cases:
+
+        1. the local copy of the policy uses a replay buffer of the size of a
+           batch, without prioritized replay or memory-mapped storage
+        2. the policy hyperparameters of the learner are not modified
+        """
+        sampler = Sampler(
+            env_name="MountainCarContinuous-v0",
+            render=False,
+            shared=False,
+            maddpg=False,
+            evaluate=False,
+            env_num=0,
+        )
+
+        policy_kwargs = TD3_PARAMS.copy()
+        policy_kwargs.update(FEEDFORWARD_PARAMS.copy())
+        policy_kwargs.update(
+            verbose=0,
+            num_envs=2,
+            prioritized_replay=True,
+            fused_update=True,
+            replay_buffer_path="/tmp/replay_buffer",
+        )
+
+        sampler.setup_policy(
+            policy=TD3FeedForwardPolicy,
+            ob_space=sampler.observation_space(),
+            ac_space=sampler.action_space(),
+            co_space=sampler.context_space(),
+            policy_kwargs=policy_kwargs,
+        )
+
+        # test case 1
+        policy = sampler.policy_tf
+        self.assertEqual(policy.buffer_size, TD3_PARAMS["batch_size"])
+        self.assertFalse(policy.prioritized_replay)
+        self.assertFalse(policy.fused_update)
+        self.assertIsNone(policy.replay_buffer_path)
+
+        # test case 2
+        self.assertEqual(
+            policy_kwargs["buffer_size"], TD3_PARAMS["buffer_size"])
+        self.assertTrue(policy_kwargs["prioritized_replay"])
+        self.assertEqual(policy_kwargs["num_envs"], 2)
+
+        sampler.policy_tf.sess.close()
+
+    def test_vec_sampler(self):
+        """Validate the functionality of the VecSampler object.
+
+        This is done for the following cases:
+
+        1. the initial observations and spaces match those of the individual
+           environments
+        2. collect_sample steps the specified environments and returns their
+           environment numbers
+        3. the contextual terms and spaces are read from the vectorized
+           environment when one is available
+        4. the samples of the vectorized environment include the contextual
+           terms from before the step
+        """
+        sampler = VecSampler(
+            env_name="MountainCarContinuous-v0",
+            render=False,
+            shared=False,
+            maddpg=False,
+            evaluate=False,
+            env_num=2,
+            num_envs=3,
+        )
+
+        # test case 1
+        self.assertEqual(len(sampler.get_init_obs()), 3)
+        self.assertEqual(sampler.observation_space().shape, (2,))
+        self.assertEqual(sampler.action_space().shape, (1,))
+        self.assertEqual(sampler.get_context(), [None, None, None])
+        self.assertEqual(sampler.horizon(), 999)
+
+        # test case 2
+        ret = sampler.collect_sample(
+            action=[np.array([0.5]), np.array([-0.5])], env_num=[2, 4])
+        self.assertEqual([ret_i["env_num"] for ret_i in ret], [2, 4])
+        np.testing.assert_almost_equal(ret[0]["action"], [0.5])
+        np.testing.assert_almost_equal(ret[1]["action"], [-0.5])
+
+        # test case 3
+        sampler.vec_env = SimpleNamespace(
+            context_space=Box(-2, 2, (3,)),
+            all_observation_space=Box(-3, 3, (4,)),
+            current_context=[np.array([0.]), np.array([1.]), np.array([2.])],
+        )
+        self.assertEqual(sampler.context_space().shape, (3,))
+        self.assertEqual(sampler.all_observation_space().shape, (4,))
+        np.testing.assert_almost_equal(
+            sampler.get_context(), [[[0.]], [[1.]], [[2.]]])
+        np.testing.assert_almost_equal(
+            sampler.get_context(env_num=[4, 2]), [[[2.]], [[0.]]])
+
+        sampler.vec_env = SimpleNamespace()
+        self.assertIsNone(sampler.context_space())
+        self.assertEqual(sampler.all_observation_space().shape, (1,))
+        self.assertEqual(sampler.get_context(env_num=[3]), [None])
+
+        # test case 4
+        def _step(action, env_ids):
+            # Reset all environments, along with their contextual terms.
+            sampler.vec_env.current_context = [np.array([-1.])] * 3
+            return (
+                [np.zeros(2) for _ in env_ids],
+                np.zeros(len(env_ids)),
+                np.ones(len(env_ids)),
+                [{"terminal_observation": np.ones(2)} for _ in env_ids],
+            )
+
+        sampler.vec_env = SimpleNamespace(
+            current_context=[np.array([0.]), np.array([1.]), np.array([2.])],
+            step=_step,
+        )
+        ret = sampler.collect_sample(
+            action=[np.array([0.5]), np.array([-0.5])], env_num=[4, 3])
+        np.testing.assert_almost_equal(
+            [ret_i["context"] for ret_i in ret], [[2.], [1.]])
+
+        sampler.vec_env = SimpleNamespace(step=_step)
+        ret = sampler.collect_sample(action=[np.array([0.5])], env_num=[2])
+        self.assertIsNone(ret[0]["context"])
+
+
+class TestTransport(unittest.TestCase):
+    """Unit tests for the classes and methods in utils/transport.py."""
+
+    def test_shared_memory_transport(self):
+        """Validate the functionality of the SharedMemoryTransport object.
+
+        This is done for the following cases:
+
+        1. samples written by one transport object are read by another that
+           opens the same arrays, both with and without resets
+        2. slots are reused after `capacity` steps
+        """
+        learner = SharedMemoryTransport(
+            num_envs=2, capacity=2, ob_shape=(3,), ac_shape=(1,))
+        sampler = SharedMemoryTransport(
+            num_envs=2, capacity=2, ob_shape=(3,), ac_shape=(1,),
+            path=learner.path)
+        learner.unlink()
+
+        # test case 1
+        message = sampler.put({
+            "obs": np.array([1., 2., 3.]),
+            "context": None,
+            "action": np.array([0.5]),
+            "reward": 1.,
+            "done": False,
+            "env_num": 1,
+            "all_obs": None,
+            "info": {"a": 1},
+        })
+        self.assertEqual(message["slot"], 0)
+        sample = learner.get(message)
+        np.testing.assert_almost_equal(sample["obs"], [1., 2., 3.])
+        np.testing.assert_almost_equal(sample["action"], [0.5])
+        self.assertEqual(sample["reward"], 1.)
+        self.assertEqual(sample["done"], False)
+        self.assertEqual(sample["env_num"], 1)
+        self.assertIsNone(sample["all_obs"])
+        self.assertDictEqual(sample["info"], {"a": 1})
+
+        message = sampler.put({
+            "obs": (np.array([4., 5., 6.]), np.array([0., 0., 0.])),
+            "context": None,
+            "action": np.array([-0.5]),
+            "reward": 2.,
+            "done": True,
+            "env_num": 1,
+            "all_obs": (None, None),
+            "info": {},
+        })
+        self.assertEqual(message["slot"], 1)
+        sample = learner.get(message)
+        np.testing.assert_almost_equal(sample["obs"][0], [4., 5., 6.])
+        np.testing.assert_almost_equal(sample["obs"][1], [0., 0., 0.])
+        self.assertEqual(sample["done"], True)
+        self.assertEqual(sample["all_obs"], (None, None))
+
+        # test case 2
+        message = sampler.put({
+            "obs": np.array([7., 8., 9.]),
+            "context": None,
+            "action": np.array([0.]),
+            "reward": 3.,
+            "done": False,
+            "env_num": 1,
+            "all_obs": None,
+            "info": {},
+        })
+        self.assertEqual(message["slot"], 0)
+
+
+class TestSegmentTree(unittest.TestCase):
+    """Unit tests for the classes and methods in utils/segment_tree.py."""
+
+    def test_sum_segment_tree(self):
+        """Validate the functionality of the SumSegmentTree object.
+
+        This is done for the following cases:
+
+        1. the capacity is rounded up to the next power of two
+        2. the sum of the leaves is updated when setting a batch of leaves
+        3. prefix sums are mapped to the correct leaves
+        """
+        tree = SumSegmentTree(5)
+
+        # test case 1
+        self.assertEqual(tree.capacity, 8)
+
+        # test case 2
+        tree[[0, 1, 4]] = [1., 2., 3.]
+        self.assertAlmostEqual(tree.reduce(), 6.)
+        np.testing.assert_almost_equal(tree[[0, 1, 4]], [1., 2., 3.])
+
+        tree[[1]] = [0.5]
+        self.assertAlmostEqual(tree.reduce(), 4.5)
+
+        # test case 3
+        np.testing.assert_array_equal(
+            tree.find_prefixsum_idx([0., 0.99, 1.2, 1.6, 4.4]),
+            [0, 0, 1, 4, 4])
+
+    def test_min_segment_tree(self):
+        """Validate the functionality of the MinSegmentTree object."""
+        tree = MinSegmentTree(4)
+        self.assertEqual(tree.reduce(), float("inf"))
+
+        tree[[0, 2, 3]] = [3., 1., 2.]
+        self.assertAlmostEqual(tree.reduce(), 1.)
+
+        tree[[2]] = [4.]
+        self.assertAlmostEqual(tree.reduce(), 2.)
+
+
+class TestSlotAllocator(unittest.TestCase):
+    """Unit tests for the classes and methods in utils/slot_allocator.py."""
+
+    def test_slot_allocator(self):
+        """Validate the functionality of the SlotAllocator object.
+
+        This is done for the following cases:
+
+        1. new keys are assigned the lowest free slots
+        2. the slots of keys that are no longer available are released and
+           reassigned, while the slots of the remaining keys are unchanged
+        3. an error is raised if the number of keys exceeds the number of
+           slots
+        4. released slots are reassigned lowest first, independent of the
+           order in which they were released
+        """
+        allocator = SlotAllocator(3)
+
+        # test case 1
+        self.assertListEqual(allocator.update(["a", "b"]), [])
+        self.assertEqual(allocator, {"a": 0, "b": 1})
+        np.testing.assert_array_equal(allocator.occupied, [True, True, False])
+        np.testing.assert_array_equal(allocator.slots(["b", "a"]), [1, 0])
+        self.assertEqual(allocator.num_free, 1)
+
+        # test case 2
+        self.assertListEqual(allocator.update(["b", "c"]), [0])
+        self.assertEqual(allocator, {"b": 1, "c": 0})
+        self.assertListEqual(allocator.keys_array, ["c", "b", None])
+
+        self.assertEqual(allocator.release("c"), 0)
+        self.assertEqual(allocator.acquire("d"), 0)
+        self.assertEqual(allocator.acquire("d"), 0)
+
+        # test case 3
+        self.assertRaises(ValueError, allocator.update, ["b", "d", "e", "f"])
+
+        # test case 4
+        allocator.release("d")
+        allocator.release("b")
+        self.assertEqual(allocator.acquire("e"), 0)
+        self.assertEqual(allocator.acquire("f"), 1)
+        self.assertEqual(allocator.acquire("g"), 2)
+
+        allocator.clear()
+        self.assertEqual(len(allocator), 0)
+        self.assertEqual(allocator.num_free, 3)
+        self.assertEqual(allocator.acquire("h"), 0)
+
+
+class TestPrefetch(unittest.TestCase):
+    """Unit tests for the classes and methods in utils/prefetch.py."""
+
+    def setUp(self):
+        self.replay_buffer = ReplayBuffer(
+            buffer_size=100,
+            batch_size=4,
+            obs_dim=1,
+            ac_dim=1)
+
+        for i in range(50):
+            self.replay_buffer.add(
+                obs_t=np.array([i]),
+                action=np.array([i]),
+                reward=i,
+                obs_tp1=np.array([i + 1]),
+                done=False)
+
+    def tearDown(self):
+        del self.replay_buffer
+
+    def test_prefetch_replay_buffer(self):
+        """Validate the functionality of the PrefetchReplayBuffer object.
+
+        This is done for the following cases:
+
+        1. the i-th batch is sampled with a generator seeded by (seed, i),
+           independent of the timing of the background thread
+        2. the queue of prefetched batches is bounded
+        3. prefetched batches are discarded when the buffer is modified
+        """
+        prefetch = PrefetchReplayBuffer(
+            self.replay_buffer, queue_size=2, seed=1)
+        self.assertEqual(len(prefetch), 50)
+        self.assertTrue(prefetch.can_sample())
+
+        rewards = [prefetch.sample()[2] for _ in range(5)]
+
+        # test case 2
+        self.assertEqual(prefetch._queue.maxsize, 2)
+        self.assertLessEqual(prefetch._queue.qsize(), 2)
+
+        # test case 1
+        prefetch.close()
+        for i in range(5):
+            self.replay_buffer.rng = np.random.RandomState([1, i])
+            np.testing.assert_array_equal(
+                rewards[i], self.replay_buffer.sample()[2])
+
+        # test case 3
+        prefetch.add(
+            obs_t=np.array([50]),
+            action=np.array([50]),
+            reward=50,
+            obs_tp1=np.array([51]),
+            done=False)
+        self.assertIsNone(prefetch._thread)
+        self.assertEqual(len(prefetch), 51)
+
+        _, _, rewards, _, _ = prefetch.sample()
+        prefetch.close()
+        self.replay_buffer.rng = np.random.RandomState([1, 5])
+        np.testing.assert_array_equal(
+            rewards, self.replay_buffer.sample()[2])
+
+    def test_prefetch_add_batch(self):
+        """Validate that add_batch discards the prefetched batches.
+
+        The wrapper is created around a buffer with few elements, and a large
+        batch of transitions is added after a batch was sampled. The following
+        batches should be sampled from the new content of the buffer.
+        """
+        replay_buffer = ReplayBuffer(
+            buffer_size=100,
+            batch_size=4,
+            obs_dim=1,
+            ac_dim=1)
+        for i in range(8):
+            replay_buffer.add(
+                obs_t=np.array([i]),
+                action=np.array([i]),
+                reward=i,
+                obs_tp1=np.array([i + 1]),
+                done=False)
+
+        prefetch = PrefetchReplayBuffer(replay_buffer, queue_size=4, seed=1)
+        prefetch.sample()
+
+        prefetch.add_batch(
+            obs_t=np.arange(8, 58).reshape(-1, 1),
+            action=np.arange(8, 58).reshape(-1, 1),
+            reward=np.arange(8, 58),
+            obs_tp1=np.arange(9, 59).reshape(-1, 1),
+            done=np.zeros(50))
+        self.assertIsNone(prefetch._thread)
+        self.assertEqual(len(prefetch), 58)
+
+        rewards = [prefetch.sample()[2] for _ in range(4)]
+        prefetch.close()
+
+        # The batches should match those sampled from the new content.
+        for i in range(4):
+            replay_buffer.rng = np.random.RandomState([1, i + 1])
+            np.testing.assert_array_equal(
+                rewards[i], replay_buffer.sample()[2])
+        self.assertTrue(np.any(np.concatenate(rewards) >= 8))
+
 
 class TestEval(unittest.TestCase):
     """Unit tests for the classes and methods in utils/eval.py."""